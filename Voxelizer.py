@@ -1,610 +1,1079 @@
-# WARNING: this script requires Pillow to be installed on your device
-import maya.cmds as cmds
-import math
-from PIL import Image, ImageDraw
-from os import path
-
-
-class Voxelizer(object):
-    def __init__(self, width=300, height=385, voxel_size=50):
-        self.window = cmds.window(title="Voxelizer v1.0", wh=(width + 4, height), menuBar=True, s=False)
-
-        self.obj = ''
-        self.container = ''
-        self.fluid_shape = ''
-        self.emitter = ''
-        self.group_name = ''
-        self.color_resolution = 0
-        self.export_path = ''
-        self.voxel_size = voxel_size
-        # voxel_list[i] = (position, color, texture ID)
-        self.voxel_list = []
-
-        self.layout = cmds.rowColumnLayout(nc=1, w=width, h=height)
-
-
-        cmds.separator(style="none", height=10, p=self.layout)
-        cmds.button(l="Select Object", c=self.select_object, p=self.layout, w=width, bgc=[0.7,0.7,0.7])
-
-        cmds.separator(style="none", height=5, p=self.layout)
-        cmds.separator(style="in", height=10, p=self.layout)
-        cmds.separator(style="none", height=5, p=self.layout)
-
-        # CREATE COLUMN
-        self.create_column = cmds.columnLayout(p=self.layout, cal='center', en=False)
-
-        self.voxel_density_row = cmds.rowLayout(nc=3, p=self.create_column)
-        cmds.text("Voxel Density: ", p=self.voxel_density_row, w=width / 4)
-        self.voxel_density_int_field = cmds.intField(p=self.voxel_density_row, v=voxel_size, min=3, w=width/3,
-                                                     cc=self.create_container, en=False)
-
-        cmds.separator(style="none", height=5, p=self.create_column)
-        self.color_check_box = cmds.checkBox(l="Use Texture", w=width, p=self.create_column, cc=self.toggle_color)
-
-        self.texture_import_row = cmds.rowLayout(nc=4, p=self.create_column, vis=False)
-        cmds.text("Texture Path: ", p=self.texture_import_row, w=width / 4.5, align='left')
-        self.import_path_text_field = cmds.textField(p=self.texture_import_row, w=width / 1.7)
-        cmds.button(l="Browse", c=self.select_import_texture, p=self.texture_import_row)
-
-        cmds.separator(style="none", height=10,p=self.create_column)
-
-        self.create_voxels_button = cmds.button(l="Create Voxels", c=self.store_values, p=self.create_column,
-                                                w=width)
-        # CREATE COLUMN END
-
-        cmds.separator(style="none", height=5, p=self.layout)
-        cmds.separator(style="in", height=10, p=self.layout)
-        cmds.separator(style="none", height=5, p=self.layout)
-
-
-        # TEXTURE COLUMN
-        self.texture_column = cmds.columnLayout(p=self.layout, vis=False)
-        cmds.separator(style="none", height=1, p=self.texture_column)
-
-        self.texture_export_row = cmds.rowLayout(nc=4, p=self.texture_column)
-        cmds.text("Export Path: ", p=self.texture_export_row, w=width / 4.5, align='left')
-        self.export_path_text_field = cmds.textField(p=self.texture_export_row, w=width/1.7)
-        cmds.button(l="Browse", c=self.select_export_folder, p=self.texture_export_row)
-
-        cmds.separator(style="none", height=5, p=self.texture_column)
-        self.texture_scale_row = cmds.rowLayout(nc=3, p=self.texture_column)
-        cmds.text("Texture Scale: ", p=self.texture_scale_row, w=width / 3, align='left')
-        self.texture_scale_int_field = cmds.intField(p=self.texture_scale_row, v=10, min=1, w=width / 3)
-
-        self.color_threshold_row = cmds.rowLayout(nc=3, p=self.texture_column)
-        cmds.text("Color Threshold: ", p=self.color_threshold_row, w=width / 3, align='left')
-        self.color_threshold_int_field = cmds.intField(p=self.color_threshold_row, v=5, min=0, max=255, w=width / 3)
-        cmds.separator(style="none", height=5, p=self.texture_column)
-        self.create_texture_button = cmds.button(l="Create Texture", c=self.create_texture, p=self.texture_column,
-                                                 w=width)
-        cmds.separator(style="none", height=10, p=self.texture_column)
-        self.move_UV_button = cmds.button(l="Move UV's", c=self.move_UV, p=self.texture_column, en=False, w=width)
-        cmds.separator(style="none", height=10, p=self.texture_column)
-        self.apply_texture_button = cmds.button(l="Apply Texture", c=self.apply_texture,
-                                                 p=self.texture_column, en=False, w=width)
-        # TEXTURE COLUMN END
-
-        cmds.separator(style="none", height=5, p=self.layout)
-        cmds.separator(style="in", height=10, p=self.layout)
-        cmds.separator(style="none", height=5, p=self.layout)
-
-        self.combine_voxels_button = cmds.button(l="Combine Into One Mesh", c=self.combine_voxels,
-                                                 p=self.layout, en=False, bgc= [0.2,0.2,0.2])
-
-        cmds.showWindow(self.window)
-
-
-    def bounding_box(self, obj):
-        """
-        Calculates the measurements of the bounding box of the given object.
-        :param obj: object to calculate box for
-        :return: list [width x, height y, depth z]
-        """
-        bounding_box = cmds.exactWorldBoundingBox(obj)
-        # returns float[x_min, y_min, z_min, x_max, y_max, z_max]
-        # calculate bounding box dimensions
-        box_x = bounding_box[3] - bounding_box[0]
-        box_y = bounding_box[4] - bounding_box[1]
-        box_z = bounding_box[5] - bounding_box[2]
-        bbox = [box_x, box_y, box_z]
-        return bbox
-
-
-    def clear(self, clear_all:bool):
-        """
-        Resets all variables and deletes any geometry previously created by the script.
-        :param clear_all: whether to also clear self.obj and self.voxel_list or not
-        :return:
-        """
-        if cmds.objExists(self.container):
-            cmds.delete(self.container)
-        if cmds.objExists(self.emitter):
-            cmds.delete(self.emitter)
-        self.preview_box = ''
-        self.container = ''
-        self.fluid_shape = ''
-        self.emitter = ''
-        self.group_name = ''
-        if clear_all:
-            self.obj = ''
-            self.voxel_list = []
-
-
-    def reset(self):
-        """
-        Resets all UI elements back to default.
-        :return:
-        """
-        cmds.columnLayout(self.create_column, e=True, en=True)
-        cmds.columnLayout(self.texture_column, e=True, vis=False)
-        cmds.rowLayout(self.texture_import_row, e=True, vis=False)
-        cmds.button(self.move_UV_button, e=True, en=False)
-        cmds.button(self.apply_texture_button, e=True, en=False)
-        cmds.button(self.combine_voxels_button, e=True, en=False)
-        cmds.checkBox(self.color_check_box, e=True, v=False)
-        cmds.textField(self.import_path_text_field, e=True, tx='')
-        cmds.textField(self.export_path_text_field, e=True, tx='')
-
-
-    def higher_root_with_remainder(self, number:int):
-        """
-        Calculates what the nearest even root above the given number is, and returns both it and the difference from
-        the number.
-        :param number: The number to calculate the higher root for.
-        :return: [higher_root, short]
-        """
-        root = math.sqrt(number)
-        higher_root = math.ceil(root)
-        short = (higher_root * higher_root) - number
-
-        result = [higher_root, short]
-        return result
-
-
-    def warning_window(self, window_title: str, error_message: str):
-        """
-        Creates a new, small window to inform the user that there is a mistake in the input.
-        :param window_title: the label of the window
-        :param error_message: the message the window will display
-        :return:
-        """
-        num_lines = error_message.count("\n")
-        warning_window_height = 75
-        if num_lines > 0:
-            warning_window_height += 12*num_lines
-        error_window = cmds.window(title=window_title, wh=(300, warning_window_height), s=False)
-        cmds.showWindow(error_window)
-        error_layout = cmds.rowColumnLayout(nc=1)
-        cmds.separator(style="none", height=10, p=error_layout)
-        cmds.text(label=error_message, p=error_layout, align="center", w=300)
-        cmds.separator(style="none", height=10, p=error_layout)
-        cmds.button(p=error_layout, l="OK", command="cmds.deleteUI('%s')" % error_window, align="center", w=300)
-
-
-    def checkProgressEscape(self):
-        """
-        Checks if the progress window has been cancelled.
-        :return: true if user cancelled the action, otherwise false
-        """
-        cancelled = cmds.progressWindow(query=True, isCancelled=True)
-        if cancelled:
-            cmds.progressWindow(endProgress=1)
-        return cancelled
-
-
-    def toggle_color(self, state: bool):
-        """
-        Hides or shows the texture import row and decreases or increases the window height based on the color checkbox.
-        :param state: Whether the checkbox is set to True or False
-        :return:
-        """
-        cmds.rowLayout(self.texture_import_row, e=True, vis=state)
-        old_height = cmds.window(self.window, q=True, h=True)
-        if state:
-            new_height = old_height + 25
-        else:
-            new_height = old_height - 25
-        cmds.window(self.window, e=True, h=new_height)
-
-
-    def select_object(self, ignore):
-        """
-        Stores the selected object and unlocks the first section of the UI.
-        :param ignore:
-        :return:
-        """
-        target = cmds.ls(sl=True)
-        amount_selected = len(target)
-        print(cmds.objectType(target))
-        if amount_selected == 1:
-            self.clear(True)
-            self.reset()
-            self.obj = str(cmds.ls(sl=True, long=True))[3:-2]
-            self.create_container('ignore')
-            cmds.button(self.create_voxels_button, e=True, en=True)
-            cmds.columnLayout(self.create_column, e=True, en=True)
-            cmds.intField(self.voxel_density_int_field, e=True, en=True)
-        elif amount_selected == 0:
-            self.warning_window('Error', 'No object was selected!')
-        elif amount_selected > 1:
-            self.warning_window('Error', 'More than one object was selected!')
-
-
-    def select_import_texture(self, ignore):
-        """
-        Opens a file dialogue for the user to select the texture of the object. Filters for image files only. The
-        directory is saved inside the import path text field.
-        :param ignore:
-        :return:
-        """
-        image_filter = "Image Files (*.png *.jpg *.jpeg *.dds *.bmp *.tiff *.gif)"
-        temp_path = cmds.fileDialog2(fileMode=1, dialogStyle=1, ff=image_filter)[0]
-        cmds.textField(self.import_path_text_field,e=True, tx=temp_path)
-
-
-    def select_export_folder(self, ignore):
-        """
-        Opens a file dialogue for the user to select the folder to export the new texture to.. The directory is saved
-        inside the export path text field.
-        :param ignore:
-        :return:
-        """
-        temp_path = cmds.fileDialog2(fileMode=2, dialogStyle=1)[0]
-        cmds.textField(self.export_path_text_field,e=True, tx=temp_path)
-
-
-    def create_container(self, ignore):
-        """
-        Creates a 3D container and an emitter from object with the correct attributes. The container is moved to
-        encapsulate the entire object.
-        :param ignore:
-        :return:
-        """
-        self.clear(False)
-
-        # 1) create 3D container
-
-        cmds.Create3DContainer()
-        self.container = str(cmds.ls(sl=True, long=True))[3:-2]
-
-        # create bbox to get measurements for 3D container
-        bbox = self.bounding_box(self.obj)
-        # round up size on all sides to be safe
-        for x in range(len(bbox)):
-            bbox[x] *= 1.1
-
-        resolution = cmds.intField(self.voxel_density_int_field, q=True, v=True)
-        # set attributes of 3D container
-        cmds.setAttr(f'{self.container}.baseResolution', resolution)
-        cmds.setAttr(f'{self.container}.dimensionsW', bbox[0])
-        cmds.setAttr(f'{self.container}.dimensionsH', bbox[1])
-        cmds.setAttr(f'{self.container}.dimensionsD', bbox[2])
-        cmds.setAttr(f'{self.container}.densityMethod', 1)
-        cmds.setAttr(f'{self.container}.colorMethod', 2)
-        cmds.setAttr(f'{self.fluid_shape}.boundaryDraw', 2)
-
-        # 2) create emitter from object
-
-        cmds.select([self.container, self.obj])
-        cmds.EmitFluidFromObject()
-        cmds.select(self.container, d=True)
-        self.emitter = str(cmds.ls(sl=True, long=True))[3:-2]
-        cmds.setAttr(f'{self.emitter}.densityMethod', 2)
-        cmds.setAttr(f'{self.container}.autoResize', 1)
-
-        # make fluid sim use colors of mesh
-        if cmds.checkBox(self.color_check_box, q=True, v=True):
-            texture_path = cmds.textField(self.import_path_text_field, q=True, tx=True)
-            cmds.setAttr(f'{self.emitter}.emitFluidColor', 1)
-            node_name = f'{self.obj}_texture'
-            # create new file render node
-            cmds.createNode('file', n=node_name)
-            # set texture in file
-            cmds.setAttr(f'{node_name}.fileTextureName', texture_path, type='string')
-            # make emitter particle color use render node
-            cmds.defaultNavigation(ce=True, source=node_name, destination=f'{self.emitter}.particleColor')
-
-        # get fluidShape name
-        fluid_shapes = cmds.ls('fluidShape*')
-        digits = []
-        for x in range(len(fluid_shapes)):
-            digit = fluid_shapes[x].replace('fluidShape', '')
-            if digit.isnumeric():
-                digits.append(digit)
-        self.fluid_shape = f"fluidShape{max(digits)}"
-
-        # we let the simulation run for 1 frame so the fluid container changes size according to the object
-        cmds.playbackOptions(loop='once')
-        cmds.playbackOptions(minTime=0, maxTime=1)
-        cmds.currentTime(0)
-        cmds.play(f=True, wait=True)
-        cmds.playbackOptions(minTime=0, maxTime=20)
-
-        # get center pivot of object
-        old_piv = cmds.xform(self.obj, q=True, piv=True, ws=True)
-        cmds.xform(self.obj, cp=True)
-        center_piv = cmds.xform(self.obj, q=True, piv=True, ws=True)
-        pos = cmds.xform(self.obj, q=True, piv=True, ws=True)
-        # move object pivot back to original spot
-        cmds.xform(self.obj, piv=(old_piv[0], old_piv[1], old_piv[2]), ws=True)
-        cmds.move(pos[0], pos[1], pos[2], self.container, a=True)
-
-        cmds.select(clear=True)
-
-
-    def store_values(self, ignore):
-        """
-        Stores the position and color values (if applicable) of each voxel in the list. Then it deletes the container
-        and emitter, and hides the object.
-        :param ignore:
-        :return:
-        """
-        i = True
-        # check if user selected a texture if they wish to generate a texture
-        color_check_box = cmds.checkBox(self.color_check_box, q=True, v=True)
-        texture_path = cmds.textField(self.import_path_text_field, q=True, tx=True)
-        if color_check_box and len(texture_path) == 0:
-            result = cmds.confirmDialog(title="Warning", message="No texture selected. Continue?",
-                                       button=["Yes", "Cancel"], defaultButton="Yes",
-                                       cancelButton="Cancel", dismissString="Cancel")
-            if result != "Yes":
-                i = False
-        elif color_check_box and not path.exists(texture_path):
-            self.warning_window("Error", "Invalid texture path!")
-            i = False
-
-        if i:
-            self.create_container('ignore')
-
-            # 3) run simulation
-
-            # if the simulation only runs for 1 frame, there are holes in the voxel mesh, so we let it run longer
-            cmds.playbackOptions(loop='once')
-            cmds.playbackOptions(minTime=0, maxTime=20)
-            cmds.currentTime(0)
-            cmds.play(f=True, wait=True)
-            cmds.playbackOptions(minTime=0, maxTime=100)
-
-
-            cmds.select(self.container)
-
-            container_size = self.bounding_box(self.container)
-            res = cmds.getAttr(f'{self.fluid_shape}.resolution')[0]
-            dynamic_offset = cmds.getAttr(f'{self.fluid_shape}.dynamicOffset')[0]
-            self.voxel_size = container_size[0] / res[0]
-
-            # 4) store values
-
-            cmds.select(self.container)
-
-            for x in range(res[0]):
-                for y in range(res[1]):
-                    for z in range(res[2]):
-                        density = cmds.getFluidAttr(at = 'density', xi=x, yi=y, zi=z)
-                        if density[0] > 0.0:
-                            color = cmds.getFluidAttr(at='color', xi=x, yi=y, zi=z)
-                            # get pos of cur particle
-                            c = cmds.fluidVoxelInfo(f'{self.fluid_shape}', xi=x, yi=y, zi=z, vc=True)
-                            pos = (c[0] + dynamic_offset[0]), (c[1] + dynamic_offset[1]), (c[2] + dynamic_offset[2])
-                            self.voxel_list.append([pos,color,0])
-
-            cmds.hide(self.obj)
-            cmds.delete([self.container, self.emitter])
-            self.create_voxels()
-
-
-    def create_voxels(self):
-        """
-        Creates the voxels in the correct positions and groups them.
-        :return:
-        """
-        # create group
-        resolution = cmds.intField(self.voxel_density_int_field, q=True, v=True)
-        self.group_name = f"{self.obj}_{resolution}"
-        cmds.group(empty=True, name=self.group_name)
-
-        voxel_count = len(self.voxel_list)
-
-        # create progress bar window
-        cmds.progressWindow(title="Generating Voxels", progress=0,
-                            status=f'0 of {voxel_count}', isInterruptable=True)
-
-        for voxel in range(voxel_count):
-            if self.checkProgressEscape():
-                return
-            # update progress bar
-            amount = 100.0 / voxel_count * (voxel + 1)
-            cmds.progressWindow(e=True, pr=amount, status=f'Generated {voxel} of {voxel_count}')
-
-            pos = self.voxel_list[voxel][0]
-            # create voxel
-            cmds.polyCube(w=self.voxel_size, h=self.voxel_size, d=self.voxel_size)
-            # move voxel to correct position
-            cmds.move(pos[0], pos[1], pos[2])
-            # rename voxel
-            voxel_name = f"{self.group_name}_voxel_{voxel}"
-            cmds.rename(voxel_name)
-            cmds.parent(voxel_name, self.group_name)
-        cmds.progressWindow(endProgress=1)
-
-        cmds.button(self.combine_voxels_button, e=True, en=True)
-        if cmds.checkBox(self.color_check_box, q=True, v=True):
-            cmds.columnLayout(self.texture_column, e=True, vis=True)
-        cmds.columnLayout(self.create_column, e=True, en=False)
-
-        cmds.currentTime(0)
-        cmds.select(clear=True)
-
-
-    def create_texture(self, ignore):
-        """
-        Generates a texture and saves it at the user specified location. Also stores the color id of each voxel
-        on the texture inside self.voxel_list[voxel][2].
-        :param ignore:
-        :return:
-        """
-        export_folder = cmds.textField(self.export_path_text_field, q=True, tx=True)
-
-        if path.exists(export_folder):
-            color_array = []
-            color_threshold = cmds.intField(self.color_threshold_int_field, q=True, v=True)
-            color_scale = cmds.intField(self.texture_scale_int_field, q=True, v=True)
-
-            for voxel in range(len(self.voxel_list)):
-                color_value = [0, 0, 0]
-                # pillow uses 255 color system instead of a 0 to 1 float, so we have to convert the values first
-                color_value[0] = round(self.voxel_list[voxel][1][0] * 255)
-                color_value[1] = round(self.voxel_list[voxel][1][1] * 255)
-                color_value[2] = round(self.voxel_list[voxel][1][2] * 255)
-
-                # we loop over every existing color already in the array to compare to the current color
-                is_new_color = True
-                diff = [0, 0, 0]
-                for color_compare in range(len(color_array)):
-                    diff[0] = abs(color_array[color_compare][0] - color_value[0])
-                    diff[1] = abs(color_array[color_compare][1] - color_value[1])
-                    diff[2] = abs(color_array[color_compare][2] - color_value[2])
-                    # if an existing color is closer than the threshold, the loop stops and the color is flagged
-                    if max(diff) < color_threshold:
-                        self.voxel_list[voxel][2] = color_compare
-                        is_new_color = False
-                        break
-                # only if none of the previous colors were close enough does the color get appended to the array
-                if is_new_color:
-                    color_array.append(color_value)
-                    self.voxel_list[voxel][2] = len(color_array)-1
-
-            # textures need to be square, so we get the closest root above the color array count
-            self.color_resolution = (self.higher_root_with_remainder(len(color_array))[0])
-            # because having miniscule textures can cause issues in some software,
-            # we upscale each color tile by a user specified size
-            image_resolution = color_scale * self.color_resolution
-
-            # create the image using the image resolution, and creates an object with it that can be drawn in
-            img = Image.new('RGB', (image_resolution, image_resolution))
-            drawing = ImageDraw.Draw(img)
-
-            ind = 0
-            break_flag = False
-            for w in range(self.color_resolution):
-                for h in range(self.color_resolution):
-                    rect_start = (h * color_scale, w * color_scale)
-                    rect_end = (h * color_scale + color_scale, w * color_scale + color_scale)
-                    drawing.rectangle((rect_start, rect_end), width=0,
-                                      fill=(color_array[ind][0], color_array[ind][1], color_array[ind][2]))
-                    ind += 1
-                    # a lot of the time, there will be more color tiles than there are colors, so we need to check if
-                    # the end has been reached yet, and add black tiles for the remaining spaces
-                    if ind == len(color_array):
-                        color_array.append((0,0,0))
-
-            self.export_path = f'{export_folder}\\{self.obj}_{color_threshold}.png'
-            img.save(self.export_path)
-            self.warning_window("Success", "Texture saved successfully.")
-
-            cmds.button(self.move_UV_button, e=True, en=True)
-        else:
-            self.warning_window("Error", "Invalid export path!")
-
-
-    def move_UV(self, ignore):
-        """
-        Goes over each voxel and moves its vertices to the location on the texture that matches its color id.
-        :param ignore:
-        :return:
-        """
-
-        cmds.progressWindow(title="Moving UV's", progress=0,
-                            status=f'0 of {len(self.voxel_list)}', isInterruptable=True)
-
-        for voxel in range(len(self.voxel_list)):
-            if self.checkProgressEscape():
-                return
-            amount = 100.0 / len(self.voxel_list) * (voxel + 1)
-            cmds.progressWindow(e=True, pr=amount, status=f'Moved {voxel} of {len(self.voxel_list)}')
-
-            cmds.select(f"{self.group_name}_voxel_{voxel}")
-            cmds.ConvertSelectionToUVs()
-            # first, we move the uv vertices to the center of the top left pixel
-            center = (1/self.color_resolution)/2
-            cmds.polyEditUV(r=False,u=center,v=1-center)
-            color_id = self.voxel_list[voxel][2]
-            move_u = (color_id % self.color_resolution) * (1/self.color_resolution)
-            move_v = math.floor(color_id/self.color_resolution) * (1/self.color_resolution)
-            cmds.polyEditUV(r=True, u=move_u, v=-move_v)
-
-        cmds.progressWindow(endProgress=1)
-        cmds.select(f"{self.group_name}_voxel_0", r=True)
-        cmds.select(clear=True)
-
-        cmds.button(self.apply_texture_button, e=True, en=True)
-
-
-    def apply_texture(self, ignore):
-        """
-        Creates a new material with a connected file node linking to the exported texture, and applies it to the voxels.
-        :param ignore:
-        :return:
-        """
-        # create new material
-        density = cmds.intField(self.voxel_density_int_field, q=True, v=True)
-        name = f"{self.obj}_tex_{density}"
-        node_type = "lambert"
-        material = cmds.shadingNode(node_type, name=name, asShader=True)
-        sg = cmds.sets(name="%sSG" % name, empty=True, renderable=True, noSurfaceShader=True)
-        cmds.connectAttr("%s.outColor" % material, "%s.surfaceShader" % sg)
-
-        # create file node
-        node_name = name + '_node'
-        cmds.createNode('file', n=node_name)
-        # select texture and store it in file
-        texture_path = self.export_path
-        cmds.setAttr(f'{node_name}.fileTextureName', texture_path, type='string')
-
-        # link node to material
-        cmds.defaultNavigation(ce=True, source=node_name, destination=f'{material}.color')
-
-        # apply material to all voxels
-        cmds.select(f"{self.group_name}_voxel_*", r=True)
-        meshes = cmds.ls(selection=True, dag=True, type="mesh", noIntermediate=True)
-        cmds.sets(meshes, forceElement=sg)
-
-        cmds.select(clear=True)
-
-
-    def combine_voxels(self, ignore):
-        """
-        Combines all generated voxels into a single mesh. It does NOT fuse them together.
-        :param ignore:
-        :return:
-        """
-        """
-        cmds.progressWindow(title="Moving UV's", progress=0,
-                            status=f'0 of {len(self.voxel_list)}', isInterruptable=True)
-
-        cmds.select(f"{self.group_name}_voxel_0", r=True)
-        cmds.rename(self.group_name+"_merged")
-        for voxel in range(len(self.voxel_list)-1):
-            if self.checkProgressEscape():
-                return
-            amount = 100.0 / len(self.voxel_list) * (voxel + 1)
-            cmds.progressWindow(e=True, pr=amount, status=f'Deleted {voxel} of {len(self.voxel_list)}')
-
-            cur_voxel = f"{self.group_name}_voxel_{voxel+1}"
-            cmds.select([self.group_name+"_merged", cur_voxel], r=True)
-            cmds.CombinePolygons()
-            cmds.DeleteHistory()
-            cmds.rename(self.group_name + "_merged")
-            
-        cmds.progressWindow(endProgress=1)
-        """
-        cmds.DeleteHistory()
-        cmds.select(self.group_name, hi=True)
-        cmds.CombinePolygons()
-        cmds.DeleteHistory()
-        cmds.rename(self.group_name)
-
-        cmds.columnLayout(self.texture_column, e=True, en=False)
-
-
-voxelizer = Voxelizer()
+# WARNING: this script requires Pillow and numpy to be installed on your device, and the voxel_*.py modules
+# that come with it need to be in the same scripts folder
+import maya.cmds
+import maya.utils
+import maya.api.OpenMaya as om
+import numpy as np
+import voxel_animation
+import voxel_cache
+import voxel_chunks
+import voxel_engine
+import voxel_export
+import voxel_file
+import voxel_grid
+import voxel_instances
+import voxel_mesh
+import voxel_palette
+import voxel_parallel
+import voxel_profile
+import voxel_pyramid
+import voxel_sampling
+import voxel_texture
+import voxel_worker
+import re
+from os import makedirs, path
+
+# every cmds call goes through this, so they can be counted while profiling
+cmds = voxel_profile.CountedModule(maya.cmds, 'cmds')
+
+
+class Voxelizer(object):
+    def __init__(self, width=300, height=770, voxel_size=50):
+        self.window = cmds.window(title="Voxelizer v1.0", wh=(width + 4, height), menuBar=True, s=False)
+
+        self.obj = ''
+        # cube that shows the size of the voxel grid before voxelizing
+        self.preview_box = ''
+        self.group_name = ''
+        # uv_table[color id] = (u, v) of the center of that color on the texture
+        self.uv_table = []
+        # colors of the texture, None until create_texture made one
+        self.palette = None
+        self.export_path = ''
+        self.voxel_size = voxel_size
+        # positions, colors and texture IDs of all voxels
+        self.voxel_grid = None
+        # index into voxel_grid of the voxel each face of the generated mesh belongs to
+        self.face_voxels = []
+        # color ID of each face when the faces are merged, since merged faces no longer belong to a single voxel
+        self.face_color_ids = []
+        # finished voxel grids of earlier runs, kept on disk so they survive closing Maya
+        self.voxel_cache = voxel_cache.VoxelCache(path.join(cmds.internalVar(userAppDir=True), 'voxelizer_cache'))
+        # mip map of the densest voxels made of the current mesh, lower densities are derived from it
+        self.voxel_pyramid = None
+        self.pyramid_key = ''
+        # times the stages of every button while profiling is on, and writes them next to the cache
+        self.profiler = voxel_profile.Profiler(enabled=False)
+        cmds.profiler = self.profiler
+        # voxel_worker.BackgroundJob of the last Create Voxels, which computes the voxels while Maya stays usable
+        self.job = None
+
+        self.layout = cmds.rowColumnLayout(nc=1, w=width, h=height)
+
+
+        cmds.separator(style="none", height=10, p=self.layout)
+        self.select_object_button = cmds.button(l="Select Object", c=self.select_object, p=self.layout, w=width,
+                                                bgc=[0.7,0.7,0.7])
+        cmds.separator(style="none", height=5, p=self.layout)
+        self.load_voxels_button = cmds.button(l="Load Voxels", c=self.load_voxels, p=self.layout, w=width)
+
+        cmds.separator(style="none", height=5, p=self.layout)
+        cmds.separator(style="in", height=10, p=self.layout)
+        cmds.separator(style="none", height=5, p=self.layout)
+
+        # CREATE COLUMN
+        self.create_column = cmds.columnLayout(p=self.layout, cal='center', en=False)
+
+        self.voxel_density_row = cmds.rowLayout(nc=3, p=self.create_column)
+        cmds.text("Voxel Density: ", p=self.voxel_density_row, w=width / 4)
+        self.voxel_density_int_field = cmds.intField(p=self.voxel_density_row, v=voxel_size, min=3, w=width/3,
+                                                     cc=self.create_preview_box, en=False)
+
+        self.workers_row = cmds.rowLayout(nc=3, p=self.create_column)
+        cmds.text("Workers: ", p=self.workers_row, w=width / 4)
+        self.workers_int_field = cmds.intField(p=self.workers_row, v=voxel_parallel.default_workers(), min=1,
+                                               w=width / 3)
+
+        self.profiling_row = cmds.rowLayout(nc=2, p=self.create_column)
+        cmds.text("Profiling: ", p=self.profiling_row, w=width / 4)
+        self.profiling_option_menu = cmds.optionMenu(p=self.profiling_row, w=width / 2)
+        for mode in voxel_profile.PROFILE_MODES:
+            cmds.menuItem(l=mode, p=self.profiling_option_menu)
+
+        self.fill_row = cmds.rowLayout(nc=2, p=self.create_column)
+        cmds.text("Fill: ", p=self.fill_row, w=width / 4)
+        self.fill_option_menu = cmds.optionMenu(p=self.fill_row, w=width / 2, cc=self.toggle_fill)
+        for fill in voxel_engine.FILL_MODES:
+            cmds.menuItem(l=fill, p=self.fill_option_menu)
+
+        self.shell_thickness_row = cmds.rowLayout(nc=3, p=self.create_column)
+        cmds.text("Shell Thickness: ", p=self.shell_thickness_row, w=width / 4)
+        self.shell_thickness_int_field = cmds.intField(p=self.shell_thickness_row, v=1, min=1, w=width / 3, en=False)
+
+        self.gap_size_row = cmds.rowLayout(nc=3, p=self.create_column)
+        cmds.text("Gap Size: ", p=self.gap_size_row, w=width / 4)
+        self.gap_size_int_field = cmds.intField(p=self.gap_size_row, v=0, min=0, w=width / 3, en=False)
+
+        self.voxel_output_row = cmds.rowLayout(nc=2, p=self.create_column)
+        cmds.text("Output: ", p=self.voxel_output_row, w=width / 4)
+        self.voxel_output_option_menu = cmds.optionMenu(p=self.voxel_output_row, w=width / 2)
+        for voxel_output in voxel_instances.VOXEL_OUTPUTS:
+            cmds.menuItem(l=voxel_output, p=self.voxel_output_option_menu)
+
+        cmds.separator(style="none", height=5, p=self.create_column)
+        self.merge_check_box = cmds.checkBox(l="Merge Faces", w=width, p=self.create_column)
+        self.color_check_box = cmds.checkBox(l="Use Texture", w=width, p=self.create_column, cc=self.toggle_color)
+
+        self.texture_import_row = cmds.rowLayout(nc=4, p=self.create_column, vis=False)
+        cmds.text("Texture Path: ", p=self.texture_import_row, w=width / 4.5, align='left')
+        self.import_path_text_field = cmds.textField(p=self.texture_import_row, w=width / 1.7)
+        cmds.button(l="Browse", c=self.select_import_texture, p=self.texture_import_row)
+        self.texture_filtering_row = cmds.rowLayout(nc=2, p=self.create_column, vis=False)
+        cmds.text("Filtering: ", p=self.texture_filtering_row, w=width / 4.5, align='left')
+        self.texture_filtering_option_menu = cmds.optionMenu(p=self.texture_filtering_row, w=width / 2)
+        for filtering in voxel_sampling.FILTERING_MODES:
+            cmds.menuItem(l=filtering, p=self.texture_filtering_option_menu)
+        self.color_output_row = cmds.rowLayout(nc=2, p=self.create_column, vis=False)
+        cmds.text("Output: ", p=self.color_output_row, w=width / 4.5, align='left')
+        self.color_output_option_menu = cmds.optionMenu(p=self.color_output_row, w=width / 2)
+        for color_output in voxel_mesh.COLOR_OUTPUTS:
+            cmds.menuItem(l=color_output, p=self.color_output_option_menu)
+
+        cmds.separator(style="none", height=10,p=self.create_column)
+
+        self.create_voxels_button = cmds.button(l="Create Voxels", c=self.store_values, p=self.create_column,
+                                                w=width)
+        self.job_progress_row = cmds.rowLayout(nc=2, p=self.create_column)
+        self.job_progress_bar = cmds.progressBar(p=self.job_progress_row, w=width / 2, maxValue=100)
+        self.job_status_text = cmds.text("", p=self.job_progress_row, w=width / 2, align='left')
+
+        cmds.separator(style="none", height=5, p=self.create_column)
+        self.frame_range_row = cmds.rowLayout(nc=3, p=self.create_column)
+        cmds.text("Frames: ", p=self.frame_range_row, w=width / 4)
+        self.start_frame_int_field = cmds.intField(p=self.frame_range_row, w=width / 3,
+                                                   v=cmds.playbackOptions(q=True, minTime=True))
+        self.end_frame_int_field = cmds.intField(p=self.frame_range_row, w=width / 3,
+                                                 v=cmds.playbackOptions(q=True, maxTime=True))
+        self.voxelize_frames_button = cmds.button(l="Voxelize Frames", c=self.voxelize_frames, p=self.create_column,
+                                                  w=width)
+        # CREATE COLUMN END
+
+        cmds.separator(style="none", height=5, p=self.layout)
+        cmds.separator(style="in", height=10, p=self.layout)
+        cmds.separator(style="none", height=5, p=self.layout)
+
+        # EXPORT COLUMN
+        self.export_column = cmds.columnLayout(p=self.layout, cal='center', en=False)
+        self.export_format_row = cmds.rowLayout(nc=2, p=self.export_column)
+        cmds.text("Export Format: ", p=self.export_format_row, w=width / 3, align='left')
+        self.export_format_option_menu = cmds.optionMenu(p=self.export_format_row, w=width / 2)
+        for file_format in voxel_export.EXPORT_FORMATS:
+            cmds.menuItem(l=file_format, p=self.export_format_option_menu)
+        cmds.separator(style="none", height=5, p=self.export_column)
+        self.export_voxels_button = cmds.button(l="Export Voxels", c=self.export_voxels, p=self.export_column,
+                                                w=width)
+        # EXPORT COLUMN END
+
+        cmds.separator(style="none", height=5, p=self.layout)
+        cmds.separator(style="in", height=10, p=self.layout)
+        cmds.separator(style="none", height=5, p=self.layout)
+
+
+        # TEXTURE COLUMN
+        self.texture_column = cmds.columnLayout(p=self.layout, vis=False)
+        cmds.separator(style="none", height=1, p=self.texture_column)
+
+        self.texture_export_row = cmds.rowLayout(nc=4, p=self.texture_column)
+        cmds.text("Export Path: ", p=self.texture_export_row, w=width / 4.5, align='left')
+        self.export_path_text_field = cmds.textField(p=self.texture_export_row, w=width/1.7)
+        cmds.button(l="Browse", c=self.select_export_folder, p=self.texture_export_row)
+
+        cmds.separator(style="none", height=5, p=self.texture_column)
+        self.texture_scale_row = cmds.rowLayout(nc=3, p=self.texture_column)
+        cmds.text("Texture Scale: ", p=self.texture_scale_row, w=width / 3, align='left')
+        self.texture_scale_int_field = cmds.intField(p=self.texture_scale_row, v=10, min=1, w=width / 3)
+
+        self.color_threshold_row = cmds.rowLayout(nc=3, p=self.texture_column)
+        cmds.text("Color Threshold: ", p=self.color_threshold_row, w=width / 3, align='left')
+        self.color_threshold_int_field = cmds.intField(p=self.color_threshold_row, v=5, min=0, max=255, w=width / 3)
+
+        self.palette_mode_row = cmds.rowLayout(nc=2, p=self.texture_column)
+        cmds.text("Palette Mode: ", p=self.palette_mode_row, w=width / 3, align='left')
+        self.palette_mode_option_menu = cmds.optionMenu(p=self.palette_mode_row, w=width / 2)
+        for mode in voxel_palette.PALETTE_MODES:
+            cmds.menuItem(l=mode, p=self.palette_mode_option_menu)
+
+        self.palette_size_row = cmds.rowLayout(nc=3, p=self.texture_column)
+        cmds.text("Palette Size: ", p=self.palette_size_row, w=width / 3, align='left')
+        self.palette_size_int_field = cmds.intField(p=self.palette_size_row, v=256, min=1, w=width / 3)
+
+        self.texture_layout_row = cmds.rowLayout(nc=2, p=self.texture_column)
+        cmds.text("Texture Layout: ", p=self.texture_layout_row, w=width / 3, align='left')
+        self.texture_layout_option_menu = cmds.optionMenu(p=self.texture_layout_row, w=width / 2)
+        for layout in voxel_texture.TEXTURE_LAYOUTS:
+            cmds.menuItem(l=layout, p=self.texture_layout_option_menu)
+
+        self.texture_format_row = cmds.rowLayout(nc=2, p=self.texture_column)
+        cmds.text("Texture Format: ", p=self.texture_format_row, w=width / 3, align='left')
+        self.texture_format_option_menu = cmds.optionMenu(p=self.texture_format_row, w=width / 2)
+        for file_format in voxel_texture.TEXTURE_FORMATS:
+            cmds.menuItem(l=file_format, p=self.texture_format_option_menu)
+
+        self.texture_padding_row = cmds.rowLayout(nc=3, p=self.texture_column)
+        cmds.text("Edge Padding: ", p=self.texture_padding_row, w=width / 3, align='left')
+        self.texture_padding_int_field = cmds.intField(p=self.texture_padding_row, v=0, min=0, w=width / 3)
+        cmds.separator(style="none", height=5, p=self.texture_column)
+        self.create_texture_button = cmds.button(l="Create Texture", c=self.create_texture, p=self.texture_column,
+                                                 w=width)
+        cmds.separator(style="none", height=10, p=self.texture_column)
+        self.move_UV_button = cmds.button(l="Move UV's", c=self.move_UV, p=self.texture_column, en=False, w=width)
+        cmds.separator(style="none", height=10, p=self.texture_column)
+        self.apply_texture_button = cmds.button(l="Apply Texture", c=self.apply_texture,
+                                                 p=self.texture_column, en=False, w=width)
+        # TEXTURE COLUMN END
+
+        cmds.showWindow(self.window)
+
+
+    def mesh_function_set(self, obj):
+        """
+        Gets the API function set of the mesh of the given object, for the calls that need to work on a whole mesh.
+        :param obj: object with a mesh
+        :return: om.MFnMesh
+        """
+        selection = om.MSelectionList()
+        selection.add(obj)
+        dag_path = selection.getDagPath(0)
+        dag_path.extendToShape()
+        return om.MFnMesh(dag_path)
+
+
+    def mesh_arrays(self, obj):
+        """
+        Reads the world space vertices and triangles of the given mesh in one go, so they can be passed to the engine.
+        :param obj: object to read the mesh from
+        :return: [vertices float array (V, 3), faces int array (T, 3)]
+        """
+        mesh = self.mesh_function_set(obj)
+        points = mesh.getPoints(om.MSpace.kWorld)
+        vertices = np.array([(p.x, p.y, p.z) for p in points], dtype=np.float64)
+        triangle_vertices = mesh.getTriangles()[1]
+        faces = np.array(triangle_vertices, dtype=np.int64).reshape(-1, 3)
+        return [vertices, faces]
+
+
+    def mesh_corner_uvs(self, obj):
+        """
+        Reads the UV of every corner of every triangle of the given mesh, in the same triangle order as mesh_arrays.
+        :param obj: object to read the UVs from
+        :return: float array (T, 3, 2), corners of faces without UVs get (0, 0)
+        """
+        mesh = self.mesh_function_set(obj)
+        polygon_counts, polygon_vertices = [np.array(x, dtype=np.int64) for x in mesh.getVertices()]
+        triangle_counts, triangle_vertices = [np.array(x, dtype=np.int64) for x in mesh.getTriangles()]
+        u_values, v_values = mesh.getUVs()
+        uv_counts, uv_ids = [np.array(x, dtype=np.int64) for x in mesh.getAssignedUVs()]
+
+        # UV index of every face vertex, faces without UVs don't show up in uv_ids at all
+        face_vertex_uvs = np.full(len(polygon_vertices), -1, dtype=np.int64)
+        face_vertex_uvs[np.repeat(uv_counts == polygon_counts, polygon_counts)] = uv_ids
+
+        # a triangle corner is the face vertex of its polygon with the same vertex index
+        vertex_count = mesh.numVertices
+        face_vertex_keys = np.repeat(np.arange(len(polygon_counts)), polygon_counts) * vertex_count + polygon_vertices
+        triangle_polygons = np.repeat(np.arange(len(triangle_counts)), triangle_counts * 3)
+        corner_keys = triangle_polygons * vertex_count + triangle_vertices
+        order = np.argsort(face_vertex_keys, kind='stable')
+        corners = order[np.searchsorted(face_vertex_keys[order], corner_keys)]
+
+        uvs = np.zeros((len(u_values) + 1, 2))
+        uvs[:-1, 0] = u_values
+        uvs[:-1, 1] = v_values
+        # -1 picks the extra (0, 0) at the end
+        return uvs[face_vertex_uvs[corners]].reshape(-1, 3, 2)
+
+
+    def clear(self, clear_all:bool):
+        """
+        Resets all variables and deletes any geometry previously created by the script.
+        :param clear_all: whether to also clear self.obj and self.voxel_grid or not
+        :return:
+        """
+        if cmds.objExists(self.preview_box):
+            cmds.delete(self.preview_box)
+        self.preview_box = ''
+        self.group_name = ''
+        if clear_all:
+            self.obj = ''
+            self.voxel_grid = None
+            self.face_voxels = []
+            self.face_color_ids = []
+            self.palette = None
+
+
+    def reset(self):
+        """
+        Resets all UI elements back to default.
+        :return:
+        """
+        cmds.columnLayout(self.create_column, e=True, en=True)
+        cmds.columnLayout(self.texture_column, e=True, vis=False)
+        cmds.columnLayout(self.export_column, e=True, en=False)
+        cmds.rowLayout(self.texture_import_row, e=True, vis=False)
+        cmds.rowLayout(self.texture_filtering_row, e=True, vis=False)
+        cmds.rowLayout(self.color_output_row, e=True, vis=False)
+        cmds.button(self.move_UV_button, e=True, en=False)
+        cmds.button(self.apply_texture_button, e=True, en=False)
+        cmds.checkBox(self.color_check_box, e=True, v=False)
+        cmds.checkBox(self.merge_check_box, e=True, v=False)
+        cmds.optionMenu(self.fill_option_menu, e=True, v='surface')
+        cmds.optionMenu(self.voxel_output_option_menu, e=True, v='mesh')
+        self.toggle_fill('surface')
+        cmds.textField(self.import_path_text_field, e=True, tx='')
+        cmds.textField(self.export_path_text_field, e=True, tx='')
+
+
+    def warning_window(self, window_title: str, error_message: str):
+        """
+        Creates a new, small window to inform the user that there is a mistake in the input.
+        :param window_title: the label of the window
+        :param error_message: the message the window will display
+        :return:
+        """
+        num_lines = error_message.count("\n")
+        warning_window_height = 75
+        if num_lines > 0:
+            warning_window_height += 12*num_lines
+        error_window = cmds.window(title=window_title, wh=(300, warning_window_height), s=False)
+        cmds.showWindow(error_window)
+        error_layout = cmds.rowColumnLayout(nc=1)
+        cmds.separator(style="none", height=10, p=error_layout)
+        cmds.text(label=error_message, p=error_layout, align="center", w=300)
+        cmds.separator(style="none", height=10, p=error_layout)
+        cmds.button(p=error_layout, l="OK", command="cmds.deleteUI('%s')" % error_window, align="center", w=300)
+
+
+    def checkProgressEscape(self):
+        """
+        Checks if the progress window has been cancelled.
+        :return: true if user cancelled the action, otherwise false
+        """
+        cancelled = cmds.progressWindow(query=True, isCancelled=True)
+        if cancelled:
+            cmds.progressWindow(endProgress=1)
+        return cancelled
+
+
+    def progress_reporter(self, title: str):
+        """
+        Opens a progress window that can be cancelled with escape.
+        :param title: title of the progress window
+        :return: voxel_profile.ProgressReporter that updates the window a few times per second
+        """
+        cmds.progressWindow(title=title, progress=0, status='', isInterruptable=True)
+
+        def update(done: int, total: int, status: str):
+            cmds.progressWindow(e=True, progress=int(100 * done / total) if total else 0,
+                                status=f'{done} of {total} {status}')
+        return voxel_profile.ProgressReporter(update, self.checkProgressEscape)
+
+
+    def start_profile(self):
+        """
+        Clears the profiler at the start of a button, and turns it on or off as set in the window.
+        :return:
+        """
+        mode = cmds.optionMenu(self.profiling_option_menu, q=True, v=True)
+        self.profiler.reset(enabled=mode != 'off', capture=mode == 'cprofile')
+
+
+    def save_profile(self, name: str):
+        """
+        Writes what the profiler measured during a button as a json file and a Chrome trace, and prints a summary.
+        :param name: file name of the profile, without extension
+        :return:
+        """
+        if not self.profiler.enabled:
+            return
+        folder = path.join(cmds.internalVar(userAppDir=True), 'voxelizer_profile')
+        makedirs(folder, exist_ok=True)
+        self.profiler.write_json(path.join(folder, f'{name}.json'))
+        self.profiler.write_chrome_trace(path.join(folder, f'{name}.trace.json'))
+        print(self.profiler.summary())
+        print(f"Profile written to {path.join(folder, name)}.json, open {name}.trace.json in chrome://tracing")
+
+
+    def toggle_fill(self, fill: str):
+        """
+        Only enables the shell thickness for hollow fills and the gap size for fills that find the inside of the mesh.
+        :param fill: selected fill mode
+        :return:
+        """
+        cmds.intField(self.shell_thickness_int_field, e=True, en=fill == 'hollow')
+        cmds.intField(self.gap_size_int_field, e=True, en=fill != 'surface')
+
+
+    def toggle_color(self, state: bool):
+        """
+        Hides or shows the texture import rows and decreases or increases the window height based on the color checkbox.
+        :param state: Whether the checkbox is set to True or False
+        :return:
+        """
+        cmds.rowLayout(self.texture_import_row, e=True, vis=state)
+        cmds.rowLayout(self.texture_filtering_row, e=True, vis=state)
+        cmds.rowLayout(self.color_output_row, e=True, vis=state)
+        old_height = cmds.window(self.window, q=True, h=True)
+        if state:
+            new_height = old_height + 75
+        else:
+            new_height = old_height - 75
+        cmds.window(self.window, e=True, h=new_height)
+
+
+    def select_object(self, ignore):
+        """
+        Stores the selected object and unlocks the first section of the UI.
+        :param ignore:
+        :return:
+        """
+        target = cmds.ls(sl=True)
+        amount_selected = len(target)
+        print(cmds.objectType(target))
+        if amount_selected == 1:
+            self.clear(True)
+            self.reset()
+            self.obj = str(cmds.ls(sl=True, long=True))[3:-2]
+            self.create_preview_box('ignore')
+            cmds.button(self.create_voxels_button, e=True, en=True)
+            cmds.columnLayout(self.create_column, e=True, en=True)
+            cmds.intField(self.voxel_density_int_field, e=True, en=True)
+        elif amount_selected == 0:
+            self.warning_window('Error', 'No object was selected!')
+        elif amount_selected > 1:
+            self.warning_window('Error', 'More than one object was selected!')
+
+
+    def load_voxels(self, ignore):
+        """
+        Loads voxels that were exported as a .vxg file and builds them the same way Create Voxels does, without the
+        mesh they were made of. The name of the file takes the place of the name of the object.
+        :param ignore:
+        :return:
+        """
+        result = cmds.fileDialog2(fileMode=1, dialogStyle=1, ff=f"Voxel File (*{voxel_file.FILE_EXTENSION})")
+        if not result:
+            return
+        self.start_profile()
+        try:
+            with self.profiler.stage('load'):
+                grid = voxel_file.read_voxel_file(result[0])
+        except (OSError, ValueError) as error:
+            self.warning_window("Error", f"Could not load the voxels:\n{error}")
+            return
+        self.clear(True)
+        self.reset()
+        self.obj = re.sub(r'\W', '_', path.splitext(path.basename(result[0]))[0])
+        self.voxel_grid = grid
+        self.voxel_size = grid.voxel_size
+        self.profiler.count('voxels kept', len(grid))
+        cmds.intField(self.voxel_density_int_field, e=True, v=max(grid.shape))
+        # voxels with more than one color get the texture steps, like a textured Create Voxels
+        colored = len(grid) > 0 and bool((grid.colors != grid.colors[0]).any())
+        cmds.checkBox(self.color_check_box, e=True, v=colored)
+        with self.profiler.stage('create voxels'):
+            self.create_voxels()
+        self.save_profile('load_voxels')
+
+
+    def select_import_texture(self, ignore):
+        """
+        Opens a file dialogue for the user to select the texture of the object. Filters for image files only. The
+        directory is saved inside the import path text field.
+        :param ignore:
+        :return:
+        """
+        image_filter = "Image Files (*.png *.jpg *.jpeg *.dds *.bmp *.tiff *.gif)"
+        temp_path = cmds.fileDialog2(fileMode=1, dialogStyle=1, ff=image_filter)[0]
+        cmds.textField(self.import_path_text_field,e=True, tx=temp_path)
+
+
+    def select_export_folder(self, ignore):
+        """
+        Opens a file dialogue for the user to select the folder to export the new texture to.. The directory is saved
+        inside the export path text field.
+        :param ignore:
+        :return:
+        """
+        temp_path = cmds.fileDialog2(fileMode=2, dialogStyle=1)[0]
+        cmds.textField(self.export_path_text_field,e=True, tx=temp_path)
+
+
+    def create_preview_box(self, ignore):
+        """
+        Shows the grid the voxels will be made in as a templated cube around the object, so its size can be checked
+        before voxelizing. The grid is fitted the same way the voxelizer fits it, so the cube changes with the density.
+        :param ignore:
+        :return:
+        """
+        self.clear(False)
+
+        bounding_box = cmds.exactWorldBoundingBox(self.obj)
+        resolution = cmds.intField(self.voxel_density_int_field, q=True, v=True)
+        origin, voxel_size, shape = voxel_engine.grid_for_bounds(bounding_box[:3], bounding_box[3:], resolution)
+        size = np.array(shape) * voxel_size
+        center = origin + size / 2
+
+        self.preview_box = cmds.polyCube(n=f"{self.obj.split('|')[-1]}_grid", w=size[0], h=size[1], d=size[2],
+                                         ch=False)[0]
+        cmds.move(center[0], center[1], center[2], self.preview_box, a=True)
+        cmds.setAttr(f'{self.preview_box}.template', True)
+
+        cmds.select(clear=True)
+
+
+    def store_values(self, ignore):
+        """
+        Stores the position and color values (if applicable) of each voxel in the list. Then it deletes the preview
+        box, and hides the object. The mesh is read right away, but the voxels are computed on a worker thread
+        so Maya stays usable, and the scene only changes once they are done. The button cancels while it runs.
+        :param ignore:
+        :return:
+        """
+        i = True
+        # check if user selected a texture if they wish to generate a texture
+        color_check_box = cmds.checkBox(self.color_check_box, q=True, v=True)
+        texture_path = cmds.textField(self.import_path_text_field, q=True, tx=True)
+        if color_check_box and len(texture_path) == 0:
+            result = cmds.confirmDialog(title="Warning", message="No texture selected. Continue?",
+                                       button=["Yes", "Cancel"], defaultButton="Yes",
+                                       cancelButton="Cancel", dismissString="Cancel")
+            if result != "Yes":
+                i = False
+        elif color_check_box and not path.exists(texture_path):
+            self.warning_window("Error", "Invalid texture path!")
+            i = False
+        fill = cmds.optionMenu(self.fill_option_menu, q=True, v=True)
+        chunked = cmds.intField(self.voxel_density_int_field, q=True, v=True) > voxel_chunks.CHUNKED_DENSITY
+        if i and chunked and fill != 'surface':
+            self.warning_window("Error", f"The {fill} fill needs a voxel density of at most "
+                                         f"{voxel_chunks.CHUNKED_DENSITY}!")
+            i = False
+        elif i and chunked and (cmds.checkBox(self.merge_check_box, q=True, v=True) or
+                                cmds.optionMenu(self.voxel_output_option_menu, q=True, v=True) == 'instances'):
+            self.warning_window("Error", f"Merge Faces and instances need a voxel density of at most "
+                                         f"{voxel_chunks.CHUNKED_DENSITY}!")
+            i = False
+
+        if i:
+            self.start_profile()
+            # the box only previews the size of the grid
+            if cmds.objExists(self.preview_box):
+                cmds.delete(self.preview_box)
+
+            # everything that needs Maya is read here, the worker only gets arrays and settings
+            obj = self.obj
+            resolution = cmds.intField(self.voxel_density_int_field, q=True, v=True)
+            transform = cmds.xform(obj, q=True, m=True, ws=True)
+            texture = texture_path if color_check_box else ''
+            filtering = cmds.optionMenu(self.texture_filtering_option_menu, q=True, v=True)
+            method = f'texture_{filtering}' if texture else 'surface'
+            thickness = cmds.intField(self.shell_thickness_int_field, q=True, v=True)
+            gap_size = cmds.intField(self.gap_size_int_field, q=True, v=True)
+            workers = cmds.intField(self.workers_int_field, q=True, v=True)
+            if fill != 'surface':
+                method = f'{method}_{fill}_{thickness}_{gap_size}'
+            # the worker measures into a profiler of its own, which is added to the one of the window once it is done
+            job_profiler = voxel_profile.Profiler(self.profiler.enabled, self.profiler.capture)
+            with self.profiler.stage('read mesh'):
+                vertices, faces = self.mesh_arrays(obj)
+                corner_uvs = self.mesh_corner_uvs(obj) if texture else None
+            # the same key without a density matches every density of the mesh
+            pyramid_key = voxel_cache.cache_key(vertices, faces, transform, 0, texture, method)
+            pyramid = self.voxel_pyramid if self.pyramid_key == pyramid_key else None
+
+            def compute(progress, emit):
+                # runs on the worker thread, so it must not touch Maya or the window
+                # a mesh that was already voxelized with the same density and texture is loaded instead of rebuilt
+                with job_profiler.stage('cache lookup'):
+                    cache_key = voxel_cache.cache_key(vertices, faces, transform, resolution, texture, method)
+                    grid = self.voxel_cache.load(cache_key)
+                emit('message', self.voxel_cache.report())
+                if grid is None and pyramid is not None and resolution <= pyramid.density:
+                    with job_profiler.stage('pyramid'):
+                        grid = pyramid.grid_for_density(resolution)
+                    emit('message', f"Derived density {resolution} from the density {pyramid.density} voxels")
+                if grid is not None:
+                    return [grid, None]
+
+                with job_profiler.stage('voxelize'):
+                    if chunked:
+                        # the chunks are colored and built into meshes a few at a time, the whole grid is never made
+                        grid = voxel_chunks.voxelize_chunked(vertices, faces, resolution, with_color=bool(texture),
+                                                             progress=progress)
+                    else:
+                        occupancy, origin, voxel_size = voxel_parallel.voxelize(vertices, faces, resolution,
+                                                                                workers=workers, progress=progress)
+                        progress.begin(0, 'filling')
+                        with job_profiler.stage('fill'):
+                            occupancy = voxel_engine.fill_cells(occupancy, fill, thickness, gap_size)
+                        grid = voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+                job_profiler.count('cells scanned', int(np.prod(grid.shape)))
+                emit('voxels', len(grid))
+
+                if texture:
+                    # the surface voxels take the texture color at the closest point on the mesh, the fill the color
+                    # of the surface around it
+                    with job_profiler.stage('color'):
+                        image = voxel_sampling.load_image(texture, self.voxel_cache.folder)
+                        if chunked:
+                            voxel_chunks.sample_colors(grid, voxel_sampling.mesh_color_sampler(
+                                vertices, faces, corner_uvs, image, filtering=filtering), progress)
+                        else:
+                            grid.colors = voxel_sampling.sample_mesh_colors(grid, vertices, faces, corner_uvs, image,
+                                                                            filtering=filtering, progress=progress,
+                                                                            workers=workers)
+                if chunked:
+                    # the cache and the pyramid keep whole grids
+                    return [grid, None]
+
+                progress.begin(0, 'storing')
+                with job_profiler.stage('cache store'):
+                    self.voxel_cache.store(cache_key, grid)
+                with job_profiler.stage('pyramid'):
+                    new_pyramid = voxel_pyramid.VoxelPyramid(grid, resolution,
+                                                             [vertices.min(axis=0), vertices.max(axis=0)])
+                return [grid, new_pyramid]
+
+            def commit(result):
+                # runs on the main thread once the worker is done, and is the only part that changes the scene
+                grid, new_pyramid = result
+                self.profiler.merge(job_profiler)
+                if not cmds.objExists(obj):
+                    raise RuntimeError(f"{obj} was deleted while it was being voxelized")
+                self.voxel_grid = grid
+                if new_pyramid is not None:
+                    self.voxel_pyramid = new_pyramid
+                    self.pyramid_key = pyramid_key
+                self.profiler.count('voxels kept', len(self.voxel_grid))
+                self.voxel_size = self.voxel_grid.voxel_size
+                cmds.hide(obj)
+                with self.profiler.stage('create voxels'):
+                    self.create_voxels()
+                self.save_profile('create_voxels')
+
+            cmds.button(self.create_voxels_button, e=True, l="Cancel", c=self.cancel_voxels)
+            cmds.button(self.select_object_button, e=True, en=False)
+            cmds.button(self.load_voxels_button, e=True, en=False)
+            cmds.button(self.voxelize_frames_button, e=True, en=False)
+            # the buttons below start profiles of their own and change the voxels the job replaces
+            cmds.columnLayout(self.export_column, e=True, en=False)
+            cmds.columnLayout(self.texture_column, e=True, en=False)
+            self.job = voxel_worker.BackgroundJob(compute, commit, maya.utils.executeDeferred, self.show_job_partial,
+                                                  self.job_finished).start()
+
+
+    def cancel_voxels(self, ignore):
+        """
+        Stops the running Create Voxels. The worker stops the next time it reports progress, and nothing in the scene
+        changes.
+        :param ignore:
+        :return:
+        """
+        if self.job is not None:
+            self.job.cancel()
+            cmds.text(self.job_status_text, e=True, l="Cancelling")
+
+
+    def show_job_partial(self, kind: str, value):
+        """
+        Shows what the worker of Create Voxels sent back while it runs.
+        :param kind: 'progress' with [done, total, status], 'voxels' with the amount of voxels before coloring, or
+        'message' with text to print
+        :param value: the partial result
+        :return:
+        """
+        if kind == 'progress':
+            done, total, status = value
+            cmds.progressBar(self.job_progress_bar, e=True, progress=int(100 * done / total) if total else 0)
+            cmds.text(self.job_status_text, e=True, l=f'{done} of {total} {status}' if total else status)
+        elif kind == 'voxels':
+            cmds.text(self.job_status_text, e=True, l=f'{value} voxels')
+        elif kind == 'message':
+            print(value)
+
+
+    def job_finished(self, job):
+        """
+        Puts the buttons back once the job of Create Voxels is done, cancelled or failed.
+        :param job: the voxel_worker.BackgroundJob that ended
+        :return:
+        """
+        cmds.button(self.create_voxels_button, e=True, l="Create Voxels", c=self.store_values)
+        cmds.button(self.select_object_button, e=True, en=True)
+        cmds.button(self.load_voxels_button, e=True, en=True)
+        cmds.button(self.voxelize_frames_button, e=True, en=True)
+        # only new voxels can be exported
+        cmds.columnLayout(self.export_column, e=True, en=job.state == 'done')
+        cmds.columnLayout(self.texture_column, e=True, en=True)
+        cmds.progressBar(self.job_progress_bar, e=True, progress=0)
+        cmds.text(self.job_status_text, e=True, l='')
+        if job.state == 'cancelled':
+            print(f"Voxelizing was cancelled, the worker stopped after {job.cancel_latency or 0.0:.2f} seconds")
+        elif job.state == 'failed':
+            print(job.traceback)
+            self.warning_window("Error", f"Voxelizing failed:\n{job.error}")
+
+
+    def create_voxels(self):
+        """
+        Creates a single mesh out of the voxels, leaving out every face that is hidden between two voxels, or an
+        instancer that draws every voxel with the same cube.
+        :return:
+        """
+        resolution = cmds.intField(self.voxel_density_int_field, q=True, v=True)
+        self.group_name = f"{self.obj}_{resolution}"
+
+        color = cmds.checkBox(self.color_check_box, q=True, v=True)
+        merge = cmds.checkBox(self.merge_check_box, q=True, v=True)
+        if isinstance(self.voxel_grid, voxel_chunks.ChunkedGrid):
+            # a palette texture would need every color at once, so chunked grids get vertex colors
+            self.build_chunk_meshes()
+        elif cmds.optionMenu(self.voxel_output_option_menu, q=True, v=True) == 'instances':
+            # the instances get their colors from the voxels directly, so there is no texture to make
+            self.create_instances(merge)
+        else:
+            vertex_colors = color and cmds.optionMenu(self.color_output_option_menu, q=True, v=True) == 'vertex'
+            if vertex_colors and merge:
+                # vertex colors keep the exact colors, merging only needs to know which voxels share one
+                self.palette, self.voxel_grid.color_ids = voxel_palette.exact_palette(self.voxel_grid.colors)
+            # textured voxels can only be merged once their color IDs are known, which happens in move_UV
+            self.build_voxel_mesh(merge and (not color or vertex_colors))
+
+            if vertex_colors:
+                self.apply_vertex_colors()
+            elif color:
+                cmds.columnLayout(self.texture_column, e=True, vis=True)
+        cmds.columnLayout(self.create_column, e=True, en=False)
+        cmds.columnLayout(self.export_column, e=True, en=True)
+
+        cmds.select(clear=True)
+
+
+    def voxelize_frames(self, ignore):
+        """
+        Voxelizes the object on every frame of the frame range into a sequence file, without building any geometry.
+        The current frame is put back afterwards, and the playback range is never touched.
+        :param ignore:
+        :return:
+        """
+        start = cmds.intField(self.start_frame_int_field, q=True, v=True)
+        end = cmds.intField(self.end_frame_int_field, q=True, v=True)
+        texture_path = cmds.textField(self.import_path_text_field, q=True, tx=True)
+        texture = texture_path if cmds.checkBox(self.color_check_box, q=True, v=True) else ''
+        if end < start:
+            self.warning_window("Error", "The end frame comes before the start frame!")
+            return
+        if texture and not path.exists(texture_path):
+            self.warning_window("Error", "Invalid texture path!")
+            return
+        if cmds.intField(self.voxel_density_int_field, q=True, v=True) > voxel_chunks.CHUNKED_DENSITY:
+            self.warning_window("Error", f"Voxelizing frames needs a voxel density of at most "
+                                         f"{voxel_chunks.CHUNKED_DENSITY}!")
+            return
+        result = cmds.fileDialog2(fileMode=0, dialogStyle=1,
+                                  ff=f"Voxel Sequence (*{voxel_animation.SEQUENCE_EXTENSION})")
+        if not result:
+            return
+        file_path = path.splitext(result[0])[0] + voxel_animation.SEQUENCE_EXTENSION
+
+        resolution = cmds.intField(self.voxel_density_int_field, q=True, v=True)
+        filtering = cmds.optionMenu(self.texture_filtering_option_menu, q=True, v=True)
+        current_frame = cmds.currentTime(q=True)
+        frames = range(start, end + 1)
+
+        def frame_vertices():
+            for frame in frames:
+                cmds.currentTime(frame, update=True)
+                yield self.mesh_arrays(self.obj)[0]
+
+        self.start_profile()
+        progress = self.progress_reporter("Voxelizing Frames")
+        try:
+            # every frame goes on the same grid, so it has to fit the mesh over the whole range
+            with self.profiler.stage('bounds'):
+                boxes = []
+                for frame in frames:
+                    cmds.currentTime(frame, update=True)
+                    boxes.append(cmds.exactWorldBoundingBox(self.obj))
+                boxes = np.array(boxes)
+                bounds = [boxes[:, :3].min(axis=0), boxes[:, 3:].max(axis=0)]
+
+            faces = self.mesh_arrays(self.obj)[1]
+            image = voxel_sampling.load_image(texture, self.voxel_cache.folder) if texture else None
+            corner_uvs = self.mesh_corner_uvs(self.obj) if texture else None
+            with self.profiler.stage('animation'):
+                stats = voxel_animation.voxelize_animation(frame_vertices(), faces, bounds, resolution, file_path,
+                                                           corner_uvs=corner_uvs, image=image, filtering=filtering,
+                                                           progress=progress, frame_count=len(frames))
+        except voxel_profile.ProgressCancelled:
+            self.warning_window("Cancelled", "Voxelizing frames was cancelled,\n"
+                                             "the sequence file only has the frames done so far.")
+            return
+        finally:
+            cmds.progressWindow(endProgress=1)
+            cmds.currentTime(current_frame, update=True)
+        self.profiler.count('frames', stats['frames'])
+        self.save_profile('voxelize_frames')
+
+        self.warning_window("Success", f"Voxelized {stats['frames']} frames at {stats['fps']:.1f} frames per "
+                                       f"second into {stats['bytes'] / 1024:.0f} KB")
+
+
+    def build_voxel_mesh(self, merge: bool):
+        """
+        (Re)creates the voxel mesh out of voxel_grid.
+        :param merge: whether to merge coplanar faces with the same color ID into bigger rectangles
+        :return:
+        """
+        if cmds.objExists(self.group_name):
+            cmds.delete(self.group_name)
+
+        with self.profiler.stage('mesh'):
+            if merge:
+                points, face_counts, face_connects, self.face_color_ids, report = \
+                    voxel_mesh.build_greedy_mesh(self.voxel_grid)
+                self.face_voxels = []
+                print(f"Merge Faces: {report[0]} triangles before merging, {report[1]} triangles after merging")
+            else:
+                workers = cmds.intField(self.workers_int_field, q=True, v=True)
+                points, face_counts, face_connects, self.face_voxels = voxel_parallel.build_mesh(self.voxel_grid,
+                                                                                                 workers)
+                self.face_color_ids = []
+        self.profiler.count('faces emitted', len(face_counts))
+        with self.profiler.stage('maya mesh'):
+            self.create_mesh(points, face_counts, face_connects, self.group_name)
+
+
+    def build_chunk_meshes(self):
+        """
+        (Re)creates the voxel mesh out of a chunked voxel_grid as a group of meshes that each hold a batch of chunks,
+        so the faces of the whole grid are never in memory at once. Colored grids get their colors on the vertices.
+        :return:
+        """
+        if cmds.objExists(self.group_name):
+            cmds.delete(self.group_name)
+
+        meshes = []
+        face_count = 0
+        with self.profiler.stage('maya mesh'):
+            for points, face_counts, face_connects, face_colors in voxel_chunks.iter_mesh_batches(self.voxel_grid):
+                mesh_name = self.create_mesh(points, face_counts, face_connects, f'{self.group_name}_{len(meshes)}')
+                if face_colors is not None:
+                    self.set_face_colors(mesh_name, face_colors)
+                meshes.append(mesh_name)
+                face_count += len(face_counts)
+        self.profiler.count('faces emitted', face_count)
+        if meshes:
+            cmds.group(meshes, n=self.group_name)
+        else:
+            cmds.group(em=True, n=self.group_name)
+
+
+    def create_instances(self, merge: bool):
+        """
+        Draws every visible voxel with a copy of a single cube through an instancer, driven by position, scale and
+        color arrays, so no geometry is made per voxel. The colors are stored as rgbPP for renderers that read the
+        attributes of each instance.
+        :param merge: whether to draw blocks of voxels with the same color as one bigger cube
+        :return:
+        """
+        if cmds.objExists(self.group_name):
+            cmds.delete(self.group_name)
+        positions, scales, colors = voxel_instances.instance_arrays(self.voxel_grid, merge_blocks=merge)
+        self.profiler.count('instances', len(positions))
+
+        cube = cmds.polyCube(n=f'{self.group_name}_cube', w=1, h=1, d=1, ch=False)[0]
+        instancer = cmds.createNode('instancer', n=f'{self.group_name}_instancer')
+        cmds.connectAttr(f'{cube}.matrix', f'{instancer}.inputHierarchy[0]')
+
+        # every array is handed to the instancer at once, the same way particles feed it. The arrays are converted
+        # from plain rows in one call each, instead of making an MVector for every instance
+        data = om.MFnArrayAttrsData()
+        points = data.create()
+        data.vectorArray('position').copy(om.MVectorArray(positions.tolist()))
+        data.vectorArray('scale').copy(om.MVectorArray(np.repeat(scales[:, None], 3, axis=1).tolist()))
+        data.vectorArray('rgbPP').copy(om.MVectorArray(colors.tolist()))
+        selection = om.MSelectionList()
+        selection.add(instancer)
+        om.MFnDependencyNode(selection.getDependNode(0)).findPlug('inputPoints', False).setMObject(points)
+
+        cmds.hide(cube)
+        cmds.group(cube, instancer, n=self.group_name)
+        print(f"{len(positions)} instances for {len(self.voxel_grid)} voxels")
+
+
+    def apply_vertex_colors(self):
+        """
+        Colors every face vertex of the voxel mesh with the color of its voxel in a single API call, instead of going
+        through a texture, UVs and a material.
+        :return:
+        """
+        face_voxels = self.face_voxels if len(self.face_voxels) else None
+        face_colors = voxel_export.face_colors(self.voxel_grid, face_voxels, self.face_color_ids, self.palette)
+        self.set_face_colors(self.group_name, face_colors)
+
+
+    def set_face_colors(self, mesh_name: str, face_colors):
+        """
+        Colors every face vertex of a mesh with the color of its face in a single API call.
+        :param mesh_name: name of the mesh
+        :param face_colors: uint8 array (F, 3) with the color of every face
+        :return:
+        """
+        mesh = self.mesh_function_set(mesh_name)
+        face_counts, face_connects = [np.array(x, dtype=np.int64) for x in mesh.getVertices()]
+        colors = voxel_mesh.face_vertex_colors(face_colors, face_counts)
+        face_ids = np.repeat(np.arange(len(face_counts)), face_counts)
+        mesh.setFaceVertexColors(om.MColorArray([om.MColor(c) for c in colors.tolist()]), face_ids.tolist(),
+                                 face_connects.tolist())
+        cmds.setAttr(f'{mesh.fullPathName()}.displayColors', True)
+
+
+    def create_mesh(self, points, face_counts, face_connects, name: str):
+        """
+        Creates a mesh from flat polygon arrays with a single API call.
+        :param points: float array (V, 3) of vertex positions
+        :param face_counts: amount of vertices per face
+        :param face_connects: vertex indices of all faces after each other
+        :param name: name of the new mesh
+        :return: name of the new mesh
+        """
+        vertices = om.MPointArray([om.MPoint(p) for p in points.tolist()])
+        mesh = om.MFnMesh()
+        transform = mesh.create(vertices, face_counts.tolist(), face_connects.tolist())
+        mesh_name = cmds.rename(om.MFnDependencyNode(transform).name(), name)
+        cmds.sets(mesh_name, e=True, forceElement='initialShadingGroup')
+        return mesh_name
+
+
+    def create_texture(self, ignore):
+        """
+        Generates a texture and saves it at the user specified location. Also stores the color id of each voxel
+        on the texture inside self.voxel_grid.color_ids.
+        :param ignore:
+        :return:
+        """
+        export_folder = cmds.textField(self.export_path_text_field, q=True, tx=True)
+
+        if path.exists(export_folder):
+            self.start_profile()
+            color_threshold = cmds.intField(self.color_threshold_int_field, q=True, v=True)
+            color_scale = cmds.intField(self.texture_scale_int_field, q=True, v=True)
+            palette_mode = cmds.optionMenu(self.palette_mode_option_menu, q=True, v=True)
+            palette_size = cmds.intField(self.palette_size_int_field, q=True, v=True)
+
+            with self.profiler.stage('palette'):
+                self.palette, self.voxel_grid.color_ids = voxel_palette.build_palette(
+                    self.voxel_grid.colors, color_threshold, palette_mode, palette_size)
+            self.profiler.count('palette size', len(self.palette))
+
+            # because having miniscule textures can cause issues in some software,
+            # we upscale each color tile by a user specified size
+            layout = cmds.optionMenu(self.texture_layout_option_menu, q=True, v=True)
+            file_format = cmds.optionMenu(self.texture_format_option_menu, q=True, v=True)
+            padding = cmds.intField(self.texture_padding_int_field, q=True, v=True)
+            with self.profiler.stage('atlas'):
+                image, self.uv_table = voxel_texture.build_atlas(self.palette, color_scale, layout, padding)
+
+            try:
+                with self.profiler.stage('write texture'):
+                    self.export_path = voxel_texture.write_texture(
+                        image, path.join(export_folder, f'{self.obj}_{color_threshold}'), file_format)
+            except ImportError:
+                self.warning_window("Error", f"Saving {file_format} textures requires the OpenEXR module!")
+                return
+            self.save_profile('create_texture')
+            self.warning_window("Success", "Texture saved successfully.")
+
+            cmds.button(self.move_UV_button, e=True, en=True)
+        else:
+            self.warning_window("Error", "Invalid export path!")
+
+
+    def export_voxels(self, ignore):
+        """
+        Writes the voxels straight to a .vox, .obj, .glb or .vxg file from the voxel arrays, without going through the
+        Maya mesh. Uses the palette and UVs of the texture if one was created.
+        :param ignore:
+        :return:
+        """
+        file_format = cmds.optionMenu(self.export_format_option_menu, q=True, v=True)
+        result = cmds.fileDialog2(fileMode=0, dialogStyle=1, ff=f"{file_format} (*.{file_format})")
+        if not result:
+            return
+        file_path = f"{path.splitext(result[0])[0]}.{file_format}"
+        if isinstance(self.voxel_grid, voxel_chunks.ChunkedGrid) and file_format != 'obj':
+            self.warning_window("Error", f"Voxels above a density of {voxel_chunks.CHUNKED_DENSITY} can only be "
+                                         f"exported as obj!")
+            return
+        self.start_profile()
+        merge = cmds.checkBox(self.merge_check_box, q=True, v=True)
+        uv_table = self.uv_table if self.palette is not None else None
+        color_output = cmds.optionMenu(self.color_output_option_menu, q=True, v=True) \
+            if cmds.checkBox(self.color_check_box, q=True, v=True) else 'texture'
+        with self.profiler.stage('export'):
+            voxel_export.export_voxels(file_path, self.voxel_grid, merge, self.palette, uv_table, self.export_path,
+                                       color_output)
+        self.save_profile('export_voxels')
+        self.warning_window("Success", f"Voxels exported to {file_path}")
+
+
+    def move_UV(self, ignore):
+        """
+        Moves the UVs of each face to the center of the tile on the texture that matches its color id. If Merge Faces is
+        on, the mesh is rebuilt with merged faces first, now that the color ids are known.
+        :param ignore:
+        :return:
+        """
+        self.start_profile()
+        if cmds.checkBox(self.merge_check_box, q=True, v=True):
+            self.build_voxel_mesh(True)
+            face_color_ids = self.face_color_ids
+        else:
+            face_color_ids = self.voxel_grid.color_ids[self.face_voxels]
+
+        # all UVs are calculated at once and set on the mesh with a single call
+        with self.profiler.stage('uv'):
+            mesh = self.mesh_function_set(self.group_name)
+            face_counts = list(mesh.getVertices()[0])
+            u_values, v_values, uv_ids = voxel_texture.face_uvs(face_color_ids, face_counts, self.uv_table)
+            mesh.setUVs(u_values.tolist(), v_values.tolist())
+            mesh.assignUVs(face_counts, uv_ids.tolist())
+        self.save_profile('move_UV')
+
+        cmds.button(self.apply_texture_button, e=True, en=True)
+
+
+    def apply_texture(self, ignore):
+        """
+        Creates a new material with a connected file node linking to the exported texture, and applies it to the voxels.
+        :param ignore:
+        :return:
+        """
+        # create new material
+        density = cmds.intField(self.voxel_density_int_field, q=True, v=True)
+        name = f"{self.obj}_tex_{density}"
+        node_type = "lambert"
+        material = cmds.shadingNode(node_type, name=name, asShader=True)
+        sg = cmds.sets(name="%sSG" % name, empty=True, renderable=True, noSurfaceShader=True)
+        cmds.connectAttr("%s.outColor" % material, "%s.surfaceShader" % sg)
+
+        # create file node
+        node_name = name + '_node'
+        cmds.createNode('file', n=node_name)
+        # select texture and store it in file
+        texture_path = self.export_path
+        cmds.setAttr(f'{node_name}.fileTextureName', texture_path, type='string')
+
+        # link node to material
+        cmds.defaultNavigation(ce=True, source=node_name, destination=f'{material}.color')
+
+        # apply material to the voxel mesh
+        cmds.select(self.group_name, r=True)
+        meshes = cmds.ls(selection=True, dag=True, type="mesh", noIntermediate=True)
+        cmds.sets(meshes, forceElement=sg)
+
+        cmds.select(clear=True)
+
+
+voxelizer = Voxelizer()
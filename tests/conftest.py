@@ -0,0 +1,5 @@
+# The voxelizer modules live in the root of the repository next to Voxelizer.py, so the tests import them from there.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+import voxel_animation
+import voxel_benchmark
+import voxel_engine
+
+FRAME_COUNT = 12
+
+
+@pytest.fixture(scope='module')
+def deforming_sphere():
+    vertices, faces, corner_uvs = voxel_benchmark.sphere_mesh(24)
+    frames = []
+    for frame in range(FRAME_COUNT):
+        # the top of the sphere waves sideways and the bottom stays where it is, so only some chunks get dirty
+        moved = vertices.copy()
+        top = vertices[:, 2] > 0.3
+        moved[top, 0] += 0.3 * np.sin(frame / 2) * (vertices[top, 2] - 0.3)
+        # and every few frames nothing moves at all
+        if frame % 4 == 3:
+            moved = frames[-1]
+        frames.append(moved)
+    everything = np.concatenate(frames)
+    bounds = [everything.min(axis=0), everything.max(axis=0)]
+    return frames, faces, bounds
+
+
+def fresh_keys(vertices, faces, origin, voxel_size, shape):
+    return np.flatnonzero(voxel_engine.voxelize_surface(vertices, faces, origin, voxel_size, shape))
+
+
+def test_voxelize_frame_matches_fresh_voxelization(deforming_sphere):
+    frames, faces, bounds = deforming_sphere
+    origin, voxel_size, shape = voxel_engine.grid_for_bounds(bounds[0], bounds[1], 40)
+    voxelizer = voxel_animation.AnimatedVoxelizer(faces, origin, voxel_size, shape, chunk_size=8)
+    chunk_count = np.prod(voxelizer.chunk_counts)
+    for index, vertices in enumerate(frames):
+        dirty = voxelizer.voxelize_frame(vertices)
+        assert np.array_equal(np.flatnonzero(voxelizer.occupancy), fresh_keys(vertices, faces, origin, voxel_size,
+                                                                                shape))
+        if index == 0:
+            continue
+        # only the chunks near the top are voxelized again, and none when nothing moved
+        assert len(dirty) < chunk_count
+        if index % 4 == 3:
+            assert len(dirty) == 0
+
+
+def test_voxelize_animation_matches_fresh_voxelization(deforming_sphere, tmp_path):
+    frames, faces, bounds = deforming_sphere
+    path = str(tmp_path / f'wave{voxel_animation.SEQUENCE_EXTENSION}')
+    stats = voxel_animation.voxelize_animation(iter(frames), faces, bounds, 40, path, keyframe_interval=5,
+                                               chunk_size=8)
+    assert stats['frames'] == FRAME_COUNT and 0 < stats['dirty_fraction'] < 1
+    origin, voxel_size, shape = voxel_engine.grid_for_bounds(bounds[0], bounds[1], 40)
+    reader = voxel_animation.SequenceReader(path)
+    assert reader.shape == tuple(shape) and np.allclose(reader.origin, origin)
+    for index, vertices in enumerate(frames):
+        keys, colors = reader.read_frame(index)
+        assert np.array_equal(keys, fresh_keys(vertices, faces, origin, voxel_size, shape))
+        assert (colors == 255).all()
+    reader.close()
+
+
+@pytest.fixture
+def random_sequence(tmp_path):
+    # frames that keep some voxels, drop some, add some and recolor some, with a keyframe every 4 frames
+    rng = np.random.default_rng(3)
+    shape = (16, 16, 16)
+    path = str(tmp_path / 'random.vxs')
+    writer = voxel_animation.SequenceWriter(path, shape, np.zeros(3), 0.5, keyframe_interval=4)
+    keys = np.zeros(0, dtype=np.int64)
+    colors = np.zeros((0, 3), dtype=np.uint8)
+    written = []
+    for _ in range(14):
+        keep = rng.random(len(keys)) < 0.8
+        added = rng.choice(np.prod(shape), 200, replace=False)
+        added = added[~np.isin(added, keys)]
+        keys = np.concatenate([keys[keep], added])
+        colors = np.concatenate([colors[keep], rng.integers(0, 256, (len(added), 3), dtype=np.uint8)])
+        recolor = rng.random(len(keys)) < 0.1
+        colors[recolor] = rng.integers(0, 256, (recolor.sum(), 3), dtype=np.uint8)
+        order = np.argsort(keys)
+        keys = keys[order]
+        colors = colors[order]
+        writer.write_frame(keys, colors)
+        written.append([keys, colors])
+    writer.close()
+    return [path, written]
+
+
+def test_sequential_reads_apply_one_delta_per_frame(random_sequence):
+    path, written = random_sequence
+    reader = voxel_animation.SequenceReader(path)
+    assert len(reader) == 14 and reader.keyframe_interval == 4
+    assert reader.kinds.tolist() == [voxel_animation.FRAME_KEY if frame % 4 == 0 else voxel_animation.FRAME_DELTA
+                                     for frame in range(14)]
+    read = []
+
+    def counting_read(frame):
+        read.append(frame)
+        return voxel_animation.SequenceReader._read(reader, frame)
+
+    reader._read = counting_read
+    for frame in range(len(reader)):
+        keys, colors = reader.read_frame(frame)
+        assert np.array_equal(keys, written[frame][0]) and np.array_equal(colors, written[frame][1])
+    assert read == list(range(14))
+    reader.close()
+
+
+@pytest.mark.parametrize('order', [
+    # just before, at and just after a keyframe
+    [7, 8, 9], [9, 8, 7], [3, 4, 5], [5, 4, 3],
+    # back to the start, past the last keyframe and the same frame twice
+    [13, 0, 12, 12, 1], [6, 2, 11, 10, 4],
+])
+def test_random_access_matches_sequential_reads(random_sequence, order):
+    path = random_sequence[0]
+    reader = voxel_animation.SequenceReader(path)
+    expected = [[keys.copy(), colors.copy()] for keys, colors in map(reader.read_frame, range(len(reader)))]
+    reader.close()
+
+    reader = voxel_animation.SequenceReader(path)
+    for frame in order:
+        keys, colors = reader.read_frame(frame)
+        assert np.array_equal(keys, expected[frame][0])
+        assert np.array_equal(colors, expected[frame][1])
+        grid = reader.read_grid(frame)
+        assert np.array_equal(grid.cell_keys(grid.cells), expected[frame][0])
+    with pytest.raises(IndexError):
+        reader.read_frame(len(reader))
+    reader.close()
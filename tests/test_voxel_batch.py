@@ -0,0 +1,118 @@
+import json
+import os
+import numpy as np
+import pytest
+import voxel_batch
+import voxel_benchmark
+import voxel_io
+
+
+@pytest.fixture
+def meshes(tmp_path):
+    # a plain sphere, a sphere with vertex colors and an obj that points at vertices it doesn't have
+    folder = tmp_path / 'meshes'
+    folder.mkdir()
+    vertices, faces = voxel_benchmark.sphere_mesh(8)[:2]
+    counts = np.full(len(faces), 3)
+    voxel_io.write_obj(str(folder / 'plain.obj'), vertices, counts, faces.ravel())
+    colors = np.rint((vertices + 1) * 127.5).astype(np.uint8)
+    voxel_io.write_obj(str(folder / 'colored.obj'), vertices, counts, faces.ravel(), vertex_colors=colors)
+    (folder / 'broken.obj').write_text('v 0 0 0\nf 1 2 3\n')
+    return voxel_batch.find_meshes([str(folder)])
+
+
+@pytest.fixture
+def settings():
+    settings = dict(voxel_batch.DEFAULT_SETTINGS)
+    settings['density'] = 12
+    return settings
+
+
+def run(files, output, settings, **arguments):
+    lines = []
+    manifest = voxel_batch.run_batch(files, output, settings, jobs=1, log=lines.append, **arguments)
+    return manifest, lines
+
+
+def test_manifest_contents(meshes, settings, tmp_path):
+    output = str(tmp_path / 'out')
+    manifest, lines = run(meshes, output, settings)
+    with open(os.path.join(output, voxel_batch.MANIFEST_NAME)) as file:
+        assert json.load(file) == manifest
+    assert manifest['version'] == voxel_batch.MANIFEST_VERSION and sorted(manifest['files']) == meshes
+    assert len(lines) == 3
+
+    broken, colored, plain = [manifest['files'][file_path] for file_path in meshes]
+    assert broken['status'] == 'failed' and broken['name'] == 'broken'
+    assert broken['error'] and 'Traceback' in broken['traceback']
+    for entry, file_path in [[colored, meshes[1]], [plain, meshes[2]]]:
+        assert entry['status'] == 'done'
+        assert entry['fingerprint'] == voxel_batch.fingerprint(file_path) and entry['settings'] == settings
+        assert set(entry['timings']) == set(voxel_batch.STAGES)
+        assert entry['seconds'] == pytest.approx(sum(entry['timings'].values()))
+        assert entry['voxels'] > 0 and entry['faces'] > 0
+        assert all(os.path.isfile(path) and os.path.dirname(path) == output for path in entry['outputs'])
+    # the colored sphere gets a palette texture and a material library, the plain one only an obj
+    assert colored['colors'] > 1 and len(colored['outputs']) == 3
+    assert plain['colors'] == 0 and [os.path.basename(path) for path in plain['outputs']] == ['plain.obj']
+    # and the obj holds the voxel faces
+    mesh = voxel_io.read_obj(plain['outputs'][0])
+    assert len(mesh.faces) == 2 * plain['faces']
+    assert 'failed' in voxel_batch.timing_summary(manifest, meshes)
+
+
+def test_resume_only_redoes_what_changed(meshes, settings, tmp_path):
+    output = str(tmp_path / 'out')
+    first = run(meshes, output, settings)[0]
+    manifest, lines = run(meshes, output, settings)
+    # the failed file is tried again, the others are skipped
+    assert lines[0] == 'Skipping 2 files that are already done' and len(lines) == 2
+    assert manifest['files'][meshes[1]] == first['files'][meshes[1]]
+    assert manifest['files'][meshes[2]] == first['files'][meshes[2]]
+
+    # a changed mesh and a missing output are done again
+    with open(meshes[2], 'a') as file:
+        file.write('# changed\n')
+    os.remove(first['files'][meshes[1]]['outputs'][0])
+    manifest, lines = run(meshes, output, settings)
+    assert len(lines) == 3 and not lines[0].startswith('Skipping')
+    assert manifest['files'][meshes[2]]['fingerprint'] == voxel_batch.fingerprint(meshes[2])
+    assert all(os.path.isfile(path) for path in manifest['files'][meshes[1]]['outputs'])
+
+    # other settings, or not resuming, do everything again
+    assert not run(meshes, output, dict(settings, density=10))[1][0].startswith('Skipping')
+    assert len(run(meshes, output, dict(settings, density=10), resume=False)[1]) == 3
+
+
+def test_broken_manifest_starts_over(meshes, settings, tmp_path):
+    output = tmp_path / 'out'
+    output.mkdir()
+    (output / voxel_batch.MANIFEST_NAME).write_text('{"version": 1, "files"')
+    manifest, lines = run(meshes[1:], str(output), settings)
+    assert len(lines) == 2 and all(entry['status'] == 'done' for entry in manifest['files'].values())
+
+
+def test_output_names_stay_unique(tmp_path):
+    files = [str(tmp_path / 'a' / 'rock.obj'), str(tmp_path / 'b' / 'Rock.obj'), str(tmp_path / 'rock.ply')]
+    assert list(voxel_batch.output_names(files).values()) == ['rock', 'Rock_1', 'rock_2']
+
+
+def test_main(meshes, tmp_path, capsys):
+    output = str(tmp_path / 'out')
+    # every format for the two good files, the broken one makes the exit code 1
+    code = voxel_batch.main([os.path.dirname(meshes[0]), '-o', output, '-d', '10', '-j', '1',
+                             '--formats', 'obj', 'vox', 'glb', 'vxg'])
+    assert code == 1
+    assert '2 of 3 files done' in capsys.readouterr().out
+    names = set(os.listdir(output))
+    assert {'plain.obj', 'plain.vox', 'plain.glb', 'plain.vxg', voxel_batch.MANIFEST_NAME} <= names
+    assert voxel_batch.main([meshes[2], '-o', output, '-d', '10', '-j', '1']) == 0
+
+
+def test_files_on_a_pool_of_processes(meshes, settings, tmp_path):
+    manifest = voxel_batch.run_batch(meshes, str(tmp_path / 'out'), settings, jobs=2, log=lambda line: None)
+    assert [manifest['files'][file_path]['status'] for file_path in meshes] == ['failed', 'done', 'done']
+    single = run(meshes, str(tmp_path / 'single'), settings)[0]
+    for file_path in meshes[1:]:
+        assert manifest['files'][file_path]['voxels'] == single['files'][file_path]['voxels']
+        assert manifest['files'][file_path]['faces'] == single['files'][file_path]['faces']
@@ -0,0 +1,191 @@
+import math
+import time
+import tracemalloc
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_bvh
+import voxel_engine
+
+
+def degenerate_mesh():
+    # a sphere with triangles that collapsed to a line or a point, and a stack of triangles on the same spot
+    vertices, faces, _ = voxel_benchmark.sphere_mesh(8)
+    faces = faces.copy()
+    faces[::7, 2] = faces[::7, 1]
+    faces[1::11, 1:] = faces[1::11, :1]
+    stack = np.repeat(faces[:1], 20, axis=0)
+    return vertices, np.concatenate([faces, stack])
+
+
+MESHES = {'sphere': lambda: voxel_benchmark.sphere_mesh(12)[:2],
+          'torus': lambda: voxel_benchmark.torus_mesh(12)[:2],
+          'thin shell': lambda: voxel_benchmark.thin_shell_mesh(8)[:2],
+          'noise blob': lambda: voxel_benchmark.noise_blob_mesh(12)[:2],
+          'degenerate': degenerate_mesh}
+
+
+@pytest.fixture(params=sorted(MESHES))
+def mesh(request):
+    return MESHES[request.param]()
+
+
+def query_points(vertices, count=300, seed=0):
+    # points around, inside and right on the surface of the mesh
+    random = np.random.default_rng(seed)
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    spread = high - low
+    around = random.uniform(low - spread / 4, high + spread / 4, (count, 3))
+    near = vertices[random.integers(0, len(vertices), count)] + random.normal(scale=0.01, size=(count, 3))
+    return np.concatenate([around, near, vertices[:20]])
+
+
+def brute_closest(vertices, faces, points):
+    corners = vertices[faces]
+    distances = np.empty(len(points))
+    for index, point in enumerate(points):
+        repeated = np.repeat(point[None], len(faces), axis=0)
+        weights = voxel_bvh.closest_barycentric(repeated, corners[:, 0], corners[:, 1], corners[:, 2])
+        closest = np.einsum('ij,ijk->ik', weights, corners)
+        distances[index] = np.sqrt(((closest - point) ** 2).sum(axis=1).min())
+    return distances
+
+
+def brute_rays(vertices, faces, origins, directions):
+    corners = vertices[faces]
+    distances = np.empty(len(origins))
+    for index in range(len(origins)):
+        distances[index] = voxel_bvh.ray_triangle_distance(
+            np.repeat(origins[index:index + 1], len(faces), axis=0),
+            np.repeat(directions[index:index + 1], len(faces), axis=0),
+            corners[:, 0], corners[:, 1], corners[:, 2]).min()
+    return distances
+
+
+def brute_boxes(vertices, faces, box_min, box_max, exact):
+    corners = vertices[faces]
+    pairs = []
+    for index in range(len(box_min)):
+        hit = ((corners.min(axis=1) <= box_max[index]) & (corners.max(axis=1) >= box_min[index])).all(axis=1)
+        if exact:
+            centers = np.repeat(((box_min[index] + box_max[index]) / 2)[None], len(faces), axis=0)
+            half_sizes = np.repeat(((box_max[index] - box_min[index]) / 2)[None], len(faces), axis=0)
+            hit &= voxel_engine.triangle_box_overlap(corners[:, 0], corners[:, 1], corners[:, 2], centers,
+                                                     half_sizes)
+        pairs.extend([index, triangle] for triangle in np.flatnonzero(hit))
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def test_closest_points_match_brute_force(mesh):
+    vertices, faces = mesh
+    points = query_points(vertices)
+    triangles, weights, distances = voxel_bvh.TriangleBVH(vertices, faces).closest_points(points)
+    assert np.allclose(distances, brute_closest(vertices, faces, points), rtol=0, atol=1e-9)
+    # the triangle and weights that come back have to give that distance as well
+    closest = np.einsum('ij,ijk->ik', weights, vertices[faces[triangles]])
+    assert np.allclose(np.linalg.norm(closest - points, axis=1), distances, rtol=0, atol=1e-9)
+
+
+def test_closest_points_within_max_distance(mesh):
+    vertices, faces = mesh
+    points = query_points(vertices)
+    max_distance = 0.05
+    triangles, _, distances = voxel_bvh.TriangleBVH(vertices, faces).closest_points(points, max_distance)
+    expected = brute_closest(vertices, faces, points)
+    # leave the points that are right at the cap out, which side they end up on is down to rounding
+    clear = np.abs(expected - max_distance) > 1e-9
+    within = expected < max_distance
+    assert np.allclose(distances[clear & within], expected[clear & within], rtol=0, atol=1e-9)
+    assert (triangles[clear & ~within] == -1).all() and np.isinf(distances[clear & ~within]).all()
+
+
+def test_ray_hits_match_brute_force(mesh):
+    vertices, faces = mesh
+    random = np.random.default_rng(1)
+    origins = query_points(vertices)
+    directions = random.normal(size=origins.shape)
+    triangles, distances = voxel_bvh.TriangleBVH(vertices, faces).ray_hits(origins, directions)
+    expected = brute_rays(vertices, faces, origins, directions)
+    assert np.array_equal(np.isinf(distances), np.isinf(expected))
+    hit = np.isfinite(expected)
+    assert np.allclose(distances[hit], expected[hit], rtol=0, atol=1e-9)
+    assert (triangles[~hit] == -1).all() and (triangles[hit] >= 0).all()
+
+
+@pytest.mark.parametrize('exact', [True, False])
+def test_box_overlap_matches_brute_force(mesh, exact):
+    vertices, faces = mesh
+    random = np.random.default_rng(2)
+    centers = query_points(vertices, 100)
+    half_sizes = random.uniform(0.01, 0.2, centers.shape)
+    box_min, box_max = centers - half_sizes, centers + half_sizes
+    queries, triangles = voxel_bvh.TriangleBVH(vertices, faces).box_overlap(box_min, box_max, exact)
+    assert np.array_equal(np.stack([queries, triangles], axis=1),
+                          brute_boxes(vertices, faces, box_min, box_max, exact))
+
+
+def test_empty_mesh():
+    bvh = voxel_bvh.TriangleBVH(np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64))
+    points = np.random.default_rng(3).normal(size=(10, 3))
+    assert len(bvh) == 0 and bvh.depth() == 0
+    triangles, _, distances = bvh.closest_points(points)
+    assert (triangles == -1).all() and np.isinf(distances).all()
+    triangles, distances = bvh.ray_hits(points, points)
+    assert (triangles == -1).all() and np.isinf(distances).all()
+    queries, triangles = bvh.box_overlap(points - 1, points + 1)
+    assert len(queries) == 0 and len(triangles) == 0
+
+
+@pytest.fixture(scope='module')
+def large_mesh():
+    # 102400 triangles
+    return voxel_benchmark.noise_blob_mesh(160)[:2]
+
+
+@pytest.fixture(scope='module')
+def large_bvh(large_mesh):
+    return voxel_bvh.TriangleBVH(*large_mesh)
+
+
+def test_build_time(large_mesh):
+    start = time.perf_counter()
+    voxel_bvh.TriangleBVH(*large_mesh)
+    # takes about 0.75 seconds, the bound leaves room for slow machines
+    assert time.perf_counter() - start < 5
+
+
+def test_build_memory(large_mesh):
+    vertices, faces = large_mesh
+    tracemalloc.start()
+    try:
+        bvh = voxel_bvh.TriangleBVH(vertices, faces)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # the tree itself takes about 31 bytes per triangle, building it about 300 at the peak
+    assert bvh.nbytes() / len(faces) < 48
+    assert peak / len(faces) < 600
+    # splitting at the median keeps the tree balanced
+    assert bvh.depth() <= math.ceil(math.log2(len(faces) / voxel_bvh.LEAF_SIZE)) + 2
+
+
+def test_query_throughput(large_mesh, large_bvh):
+    vertices, faces = large_mesh
+    random = np.random.default_rng(4)
+    points = query_points(vertices, 10000)
+    start = time.perf_counter()
+    large_bvh.closest_points(points, max_distance=0.02)
+    # about 85000 points a second
+    assert len(points) / (time.perf_counter() - start) > 10000
+    start = time.perf_counter()
+    large_bvh.ray_hits(points, random.normal(size=points.shape))
+    # about 45000 rays a second
+    assert len(points) / (time.perf_counter() - start) > 5000
+
+    # and a lot faster than testing every triangle
+    start = time.perf_counter()
+    brute_closest(vertices, faces, points[:20])
+    brute_time = (time.perf_counter() - start) / 20
+    start = time.perf_counter()
+    large_bvh.closest_points(points[:2000])
+    assert (time.perf_counter() - start) / 2000 < brute_time / 10
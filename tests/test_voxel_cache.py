@@ -0,0 +1,96 @@
+import os
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_cache
+import voxel_engine
+import voxel_grid
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    vertices, faces = voxel_benchmark.sphere_mesh(16)[:2]
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 24)
+    grid = voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+    grid.colors = np.random.default_rng(0).integers(0, 256, (len(grid), 3), dtype=np.uint8)
+    return vertices, faces, grid
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return voxel_cache.VoxelCache(str(tmp_path / 'cache'))
+
+
+def test_miss_then_hit(sphere, cache):
+    vertices, faces, grid = sphere
+    key = voxel_cache.cache_key(vertices, faces, np.eye(4).ravel(), 24)
+    assert cache.load(key) is None
+    cache.store(key, grid)
+    loaded = cache.load(key)
+    assert [cache.hits, cache.misses] == [1, 1]
+    assert loaded.shape == grid.shape and loaded.voxel_size == grid.voxel_size
+    assert np.array_equal(loaded.origin, grid.origin)
+    # the cells come back in x, y, z order with their colors
+    order = np.lexsort((grid.cells[:, 2], grid.cells[:, 1], grid.cells[:, 0]))
+    assert np.array_equal(loaded.cells, grid.cells[order])
+    assert np.array_equal(loaded.colors, grid.colors[order])
+    assert '1 hits, 1 misses' in cache.report()
+
+
+def test_broken_file_is_a_miss(sphere, cache):
+    key = voxel_cache.cache_key(*sphere[:2], np.eye(4).ravel(), 24)
+    with open(cache.file_path(key), 'wb') as file:
+        file.write(b'not a cached grid')
+    assert cache.load(key) is None and cache.misses == 1
+    # and storing replaces it
+    cache.store(key, sphere[2])
+    assert cache.load(key) is not None
+
+
+def test_key_changes_with_every_input(sphere, tmp_path):
+    vertices, faces = sphere[:2]
+    transform = np.eye(4).ravel()
+    texture = tmp_path / 'texture.png'
+    texture.write_bytes(b'red')
+    key = voxel_cache.cache_key(vertices, faces, transform, 24, str(texture))
+    assert voxel_cache.cache_key(vertices.copy(), faces.copy(), transform, 24, str(texture)) == key
+    moved = vertices.copy()
+    moved[0, 0] += 1e-9
+    moved_transform = transform.copy()
+    moved_transform[12] = 2.0
+    keys = {key,
+            voxel_cache.cache_key(moved, faces, transform, 24, str(texture)),
+            voxel_cache.cache_key(vertices, faces[:, ::-1], transform, 24, str(texture)),
+            voxel_cache.cache_key(vertices, faces, moved_transform, 24, str(texture)),
+            voxel_cache.cache_key(vertices, faces, transform, 25, str(texture)),
+            voxel_cache.cache_key(vertices, faces, transform, 24),
+            voxel_cache.cache_key(vertices, faces, transform, 24, str(texture), method='solid')}
+    assert len(keys) == 7
+    # a texture with other contents is another key, even with the same path
+    texture.write_bytes(b'blue')
+    assert voxel_cache.cache_key(vertices, faces, transform, 24, str(texture)) != key
+
+
+def test_least_recently_used_are_evicted(sphere, cache):
+    grid = sphere[2]
+    keys = [f'{index:040x}' for index in range(4)]
+    for key in keys[:3]:
+        cache.store(key, grid)
+    size = os.path.getsize(cache.file_path(keys[0]))
+    # stored in order a long time ago, then the first one is used again
+    for index, key in enumerate(keys[:3]):
+        os.utime(cache.file_path(key), (1000 + index, 1000 + index))
+    assert cache.load(keys[0]) is not None
+    # only room for three results, so storing a fourth removes the one that was used the longest time ago
+    cache.max_bytes = 3 * size
+    cache.store(keys[3], grid)
+    assert [os.path.isfile(cache.file_path(key)) for key in keys] == [True, False, True, True]
+    assert sum(entry[1] for entry in cache.entries()) <= cache.max_bytes
+    assert cache.entries()[0][0] == cache.file_path(keys[2])
+
+    # decoded textures in the folder count towards the size as well
+    np.save(os.path.join(cache.folder, 'image' + voxel_cache.IMAGE_EXTENSION), np.zeros(16, dtype=np.uint8))
+    assert cache.evict() == 1
+    assert not os.path.isfile(cache.file_path(keys[2]))
+    cache.clear()
+    assert cache.entries() == []
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_chunks
+import voxel_engine
+import voxel_grid
+import voxel_io
+import voxel_mesh
+import voxel_sampling
+
+
+@pytest.fixture(scope='module')
+def torus():
+    return voxel_benchmark.torus_mesh(24)
+
+
+def dense_grid(mesh, density):
+    vertices, faces, _ = mesh
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, density)
+    return voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+
+
+def face_set(points, face_counts, face_connects):
+    # every quad as the sorted corners it goes through, so meshes that number their points differently compare equal
+    corners = np.round(np.asarray(points)[np.asarray(face_connects)].reshape(len(face_counts), 4, 3), 6)
+    return sorted(tuple(sorted(map(tuple, quad.tolist()))) for quad in corners)
+
+
+@pytest.mark.parametrize('memory_budget', [voxel_chunks.MEMORY_BUDGET, 0])
+def test_voxelize_chunked_matches_dense(torus, memory_budget):
+    # a budget of 0 moves every chunk to the spill file straight away
+    chunked = voxel_chunks.voxelize_chunked(torus[0], torus[1], 48, chunk_size=16, memory_budget=memory_budget)
+    dense = dense_grid(torus, 48)
+    try:
+        assert chunked.shape == dense.shape
+        assert len(chunked) == len(dense)
+        cells = np.concatenate([voxel_chunks.chunk_cells(chunked, key) for key in chunked.chunk_keys()])
+        assert dense.is_occupied(cells).all()
+    finally:
+        chunked.close()
+
+
+def test_mesh_batches_match_dense_mesh(torus):
+    chunked = voxel_chunks.voxelize_chunked(torus[0], torus[1], 48, chunk_size=16)
+    points, face_counts, face_connects, _ = voxel_mesh.build_mesh(dense_grid(torus, 48))
+    batches = list(voxel_chunks.iter_mesh_batches(chunked, max_faces=2000))
+    assert len(batches) > 1
+    assert all(batch[3] is None for batch in batches)
+    streamed = sum((face_set(*batch[:3]) for batch in batches), [])
+    assert sorted(streamed) == face_set(points, face_counts, face_connects)
+
+
+def test_sample_colors_matches_dense(torus):
+    vertices, faces, corner_uvs = torus
+    image = voxel_benchmark.noise_texture(64, 8)
+    chunked = voxel_chunks.voxelize_chunked(vertices, faces, 40, chunk_size=16, with_color=True)
+    voxel_chunks.sample_colors(chunked, voxel_sampling.mesh_color_sampler(vertices, faces, corner_uvs, image))
+    dense = dense_grid(torus, 40)
+    dense.colors = voxel_sampling.sample_mesh_colors(dense, vertices, faces, corner_uvs, image)
+    for key in chunked.chunk_keys():
+        occupancy, colors = chunked.get_chunk(key)
+        cells = voxel_chunks.chunk_cells(chunked, key)
+        assert np.array_equal(colors[occupancy], dense.colors[dense.index_of(cells)])
+
+
+def test_write_obj_streams_batches(torus, tmp_path):
+    vertices, faces, corner_uvs = torus
+    chunked = voxel_chunks.voxelize_chunked(vertices, faces, 32, chunk_size=16, with_color=True)
+    voxel_chunks.sample_colors(chunked, voxel_sampling.mesh_color_sampler(
+        vertices, faces, vertex_colors=np.full((len(vertices), 3), 51, dtype=np.uint8)))
+    obj_path = str(tmp_path / 'torus.obj')
+    point_count, face_count = voxel_chunks.write_obj(chunked, obj_path)
+    lines = open(obj_path).read().splitlines()
+    point_lines = [line.split() for line in lines if line.startswith('v ')]
+    face_lines = [line.split()[1:] for line in lines if line.startswith('f ')]
+    assert len(point_lines) == point_count and len(face_lines) == face_count
+    assert {tuple(line[4:]) for line in point_lines} == {('0.2000',) * 3}
+    indices = np.array(face_lines, dtype=np.int64)
+    assert indices.min() == 1 and indices.max() == point_count
+    mesh = voxel_io.read_obj(obj_path)
+    assert len(mesh.faces) == 2 * face_count
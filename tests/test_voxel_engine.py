@@ -0,0 +1,199 @@
+import collections
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    return voxel_benchmark.sphere_mesh(48)[:2]
+
+
+def clip_to_box(polygon, low, high):
+    """
+    :return: the part of a convex polygon (N, 3) inside the box from low to high, clipped one plane at a time
+    """
+    for axis in range(3):
+        for bound, side in ((low[axis], 1), (high[axis], -1)):
+            clipped = []
+            for start, end in zip(polygon, np.roll(polygon, -1, axis=0)):
+                start_inside = (start[axis] - bound) * side >= 0
+                end_inside = (end[axis] - bound) * side >= 0
+                if start_inside:
+                    clipped.append(start)
+                if start_inside != end_inside:
+                    t = (bound - start[axis]) / (end[axis] - start[axis])
+                    clipped.append(start + t * (end - start))
+            if not clipped:
+                return np.zeros((0, 3))
+            polygon = np.array(clipped)
+    return polygon
+
+
+def touches(triangle, center, half_size):
+    return len(clip_to_box(triangle, center - half_size, center + half_size)) > 0
+
+
+def flood_from_border(open_cells):
+    # the exterior one cell at a time, to check the line by line flood against
+    reached = np.zeros_like(open_cells)
+    queue = collections.deque()
+    for cell in np.argwhere(open_cells):
+        if (cell == 0).any() or (cell == np.array(open_cells.shape) - 1).any():
+            reached[tuple(cell)] = True
+            queue.append(tuple(cell))
+    while queue:
+        cell = queue.popleft()
+        for axis in range(3):
+            for step in (-1, 1):
+                neighbour = list(cell)
+                neighbour[axis] += step
+                neighbour = tuple(neighbour)
+                if 0 <= neighbour[axis] < open_cells.shape[axis] and open_cells[neighbour] and not reached[neighbour]:
+                    reached[neighbour] = True
+                    queue.append(neighbour)
+    return reached
+
+
+def face_steps_within(mask, steps):
+    # every cell at most steps face steps away from the mask, one shifted copy at a time
+    grown = mask.copy()
+    for _ in range(steps):
+        padded = np.pad(grown, 1)
+        for axis in range(3):
+            for step in (-1, 1):
+                grown |= np.roll(padded, step, axis)[1:-1, 1:-1, 1:-1]
+    return grown
+
+
+def holed_sphere(sphere, cut):
+    # the sphere without the triangles of the cap above z = cut
+    vertices, faces = sphere
+    keep = ~(vertices[faces][:, :, 2] > cut).all(axis=1)
+    return voxel_engine.voxelize(vertices, faces[keep], 32)[0]
+
+
+def test_triangle_box_overlap_matches_clipping():
+    rng = np.random.default_rng(0)
+    count = 3000
+    # triangles of every size around unit boxes, from much smaller than the box to much bigger
+    scale = 10 ** rng.uniform(-1, 1, (count, 1, 1))
+    triangles = rng.uniform(-1, 1, (count, 3, 3)) * scale + rng.uniform(-1, 1, (count, 1, 3))
+    centers = rng.uniform(-0.2, 0.2, (count, 3))
+    overlap = voxel_engine.triangle_box_overlap(triangles[:, 0], triangles[:, 1], triangles[:, 2], centers, 0.5)
+    inside = [touches(triangle, center, 0.5) for triangle, center in zip(triangles, centers)]
+    # only pairs that barely touch may differ, triangle_box_overlap has a small tolerance
+    mismatch = overlap != np.array(inside)
+    assert 0.2 < np.mean(inside) < 0.8
+    assert all(touches(triangle, center, 0.501) and not touches(triangle, center, 0.499)
+               for triangle, center in zip(triangles[mismatch], centers[mismatch]))
+
+    # boxes of a different size along every axis
+    half_sizes = rng.uniform(0.1, 1, (count, 3))
+    overlap = voxel_engine.triangle_box_overlap(triangles[:, 0], triangles[:, 1], triangles[:, 2], centers, half_sizes)
+    inside = [touches(*pair) for pair in zip(triangles, centers, half_sizes)]
+    assert np.array_equal(overlap, inside)
+
+
+@pytest.mark.parametrize('mesh', ['sphere', 'torus', 'blob'])
+def test_voxelize_matches_every_cell_tested_against_every_triangle(mesh):
+    vertices, faces = {'sphere': lambda: voxel_benchmark.sphere_mesh(6),
+                       'torus': lambda: voxel_benchmark.torus_mesh(6),
+                       'blob': lambda: voxel_benchmark.noise_blob_mesh(6, 0.3, 1)}[mesh]()[:2]
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 10)
+    expected = np.zeros_like(occupancy)
+    for triangle in vertices[faces]:
+        # every cell the bounds of the triangle reach into, and one more on every side
+        low = np.maximum(np.floor((triangle.min(axis=0) - origin) / voxel_size).astype(int) - 1, 0)
+        high = np.minimum(np.floor((triangle.max(axis=0) - origin) / voxel_size).astype(int) + 2, occupancy.shape)
+        for cell in np.argwhere(np.ones(high - low, dtype=bool)) + low:
+            if not expected[tuple(cell)] and touches(triangle, origin + (cell + 0.5) * voxel_size, voxel_size / 2):
+                expected[tuple(cell)] = True
+    assert np.array_equal(occupancy, expected)
+
+
+def test_voxelize_in_regions_and_batches(monkeypatch):
+    vertices, faces = voxel_benchmark.torus_mesh(16)[:2]
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 24)
+    shape = occupancy.shape
+    # small batches and a grid voxelized in parts give the same cells
+    monkeypatch.setattr(voxel_engine, 'PAIR_BATCH_SIZE', 64)
+    assert np.array_equal(voxel_engine.voxelize_surface(vertices, faces, origin, voxel_size, shape), occupancy)
+    region = [np.array([3, 0, 5]), np.array([17, 9, shape[2]])]
+    part = voxel_engine.voxelize_surface(vertices, faces, origin, voxel_size, shape, region)
+    assert np.array_equal(part, occupancy[3:17, 0:9, 5:])
+
+
+def test_triangle_on_a_cell_border_does_not_fall_through():
+    # a square exactly on the border between layer 1 and 2 along z, which has to end up in one of them
+    vertices = np.array([[0.5, 0.5, 2.0], [3.5, 0.5, 2.0], [3.5, 3.5, 2.0], [0.5, 3.5, 2.0]])
+    faces = np.array([[0, 1, 2], [0, 2, 3]])
+    occupancy = voxel_engine.voxelize_surface(vertices, faces, np.zeros(3), 1.0, (4, 4, 4))
+    assert (occupancy[:, :, 1] | occupancy[:, :, 2]).all()
+    assert not occupancy[:, :, 0].any() and not occupancy[:, :, 3].any()
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_flood_exterior_matches_cell_by_cell_flood(seed):
+    open_cells = np.random.default_rng(seed).random((12, 9, 14)) < 0.6
+    assert np.array_equal(voxel_engine.flood_exterior(open_cells), flood_from_border(open_cells))
+
+
+def test_closed_mesh_is_surface_and_interior(sphere):
+    surface, origin, voxel_size = voxel_engine.voxelize(*sphere, 24)
+    labels = voxel_engine.classify_cells(surface)
+    interior = labels == voxel_engine.CELL_INTERIOR
+    assert np.array_equal(labels == voxel_engine.CELL_SURFACE, surface)
+    assert np.array_equal(labels == voxel_engine.CELL_EXTERIOR, flood_from_border(~surface))
+    assert interior.sum() > surface.sum()
+    # solid keeps the surface and everything inside it, and nothing else
+    solid = voxel_engine.fill_cells(surface, 'solid')
+    assert np.array_equal(solid, surface | interior)
+    assert np.array_equal(voxel_engine.fill_cells(surface, 'surface'), surface)
+    # every cell with its center in the sphere is solid, and no cell further out than the surface can reach
+    centers = origin + (np.argwhere(np.ones_like(surface)) + 0.5) * voxel_size
+    distance = np.linalg.norm(centers, axis=1).reshape(surface.shape)
+    assert solid[distance < 1].all()
+    assert not solid[distance > 1 + np.sqrt(3) / 2 * voxel_size].any()
+
+
+def test_holed_mesh_leaks_until_the_gap_size_seals_it(sphere):
+    # a hole about 3 voxels wide at the top of the sphere
+    surface = holed_sphere(sphere, 0.98)
+    closed = voxel_engine.classify_cells(voxel_engine.voxelize(*sphere, 32)[0]) == voxel_engine.CELL_INTERIOR
+    for gap_size in range(6):
+        labels = voxel_engine.classify_cells(surface, gap_size)
+        interior = labels == voxel_engine.CELL_INTERIOR
+        assert np.array_equal(labels == voxel_engine.CELL_SURFACE, surface)
+        if gap_size < 3:
+            # the outside leaks in, and at most a few cells of the grown rim are left inside
+            assert interior.sum() < 0.01 * closed.sum()
+        else:
+            # sealed, the inside is the inside of the closed sphere plus the cells of the hole
+            assert (interior | surface)[closed].all()
+            assert interior.sum() - closed.sum() < 0.01 * closed.sum()
+
+
+@pytest.mark.parametrize('thickness', [1, 2, 3])
+def test_hollow_keeps_layers_of_thickness(sphere, thickness):
+    surface = voxel_engine.voxelize(*sphere, 32)[0]
+    solid = voxel_engine.fill_cells(surface, 'solid')
+    hollow = voxel_engine.fill_cells(surface, 'hollow', thickness)
+    exterior = ~solid
+    assert np.array_equal(hollow, solid & face_steps_within(exterior, thickness))
+    # every extra layer only adds cells further inside, until the whole sphere is filled
+    thicker = voxel_engine.fill_cells(surface, 'hollow', thickness + 1)
+    assert (thicker | ~hollow).all() and thicker.sum() > hollow.sum()
+    assert np.array_equal(voxel_engine.fill_cells(surface, 'hollow', 100), solid)
+
+
+def test_hollow_thickness_of_zero_keeps_one_layer(sphere):
+    surface = voxel_engine.voxelize(*sphere, 16)[0]
+    assert np.array_equal(voxel_engine.fill_cells(surface, 'hollow', 0), voxel_engine.fill_cells(surface, 'hollow', 1))
+
+
+def test_unknown_fill_mode(sphere):
+    surface = voxel_engine.voxelize(*sphere, 8)[0]
+    with pytest.raises(ValueError, match='Unknown fill mode'):
+        voxel_engine.fill_cells(surface, 'inside')
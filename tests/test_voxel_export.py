@@ -0,0 +1,267 @@
+import json
+import struct
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+import voxel_export
+import voxel_grid
+import voxel_io
+import voxel_mesh
+import voxel_palette
+import voxel_texture
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    vertices, faces = voxel_benchmark.sphere_mesh(16)[:2]
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 20)
+    grid = voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+    # a few colors, in bands along y
+    bands = np.array([[200, 30, 30], [30, 200, 30], [30, 30, 200], [220, 220, 40]], dtype=np.uint8)
+    grid.colors = bands[grid.cells[:, 1] * len(bands) // grid.shape[1]]
+    palette, grid.color_ids = voxel_palette.build_palette(grid.colors)
+    return grid, palette
+
+
+def read_vox_dict(content, position):
+    """
+    :return: [dictionary of strings, position after it]
+    """
+    values = {}
+    count = struct.unpack_from('<i', content, position)[0]
+    position += 4
+    for _ in range(count):
+        texts = []
+        for _ in range(2):
+            length = struct.unpack_from('<i', content, position)[0]
+            texts.append(content[position + 4:position + 4 + length].decode())
+            position += 4 + length
+        values[texts[0]] = texts[1]
+    return [values, position]
+
+
+def read_vox(file_path):
+    """
+    :return: [list of [size, xyzi uint8 array (N, 4)] per model, translation of every model, rgba uint8 (256, 4)]
+    """
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    assert data[:4] == b'VOX ' and struct.unpack_from('<i', data, 4)[0] == voxel_export.VOX_VERSION
+    chunk_id, content_size, children_size = struct.unpack_from('<4sii', data, 8)
+    assert chunk_id == b'MAIN' and content_size == 0 and 20 + children_size == len(data)
+    models = []
+    translations = []
+    rgba = None
+    offset = 20
+    while offset < len(data):
+        chunk_id, content_size, children_size = struct.unpack_from('<4sii', data, offset)
+        content = data[offset + 12:offset + 12 + content_size]
+        if chunk_id == b'SIZE':
+            models.append([struct.unpack('<iii', content)])
+        elif chunk_id == b'XYZI':
+            count = struct.unpack_from('<i', content)[0]
+            assert len(content) == 4 + 4 * count
+            models[-1].append(np.frombuffer(content, dtype=np.uint8, offset=4).reshape(-1, 4))
+        elif chunk_id == b'nTRN':
+            # node id and attributes, then child, reserved and layer id, and the frames
+            position = read_vox_dict(content, 4)[1]
+            frame_count = struct.unpack_from('<i', content, position + 12)[0]
+            frame = read_vox_dict(content, position + 16)[0] if frame_count else {}
+            if '_t' in frame:
+                translations.append([int(x) for x in frame['_t'].split()])
+        elif chunk_id == b'RGBA':
+            rgba = np.frombuffer(content, dtype=np.uint8).reshape(256, 4)
+        offset += 12 + content_size + children_size
+    return [models, translations, rgba]
+
+
+def vox_voxels(file_path, shape):
+    """
+    :return: [cells in the grid int array (N, 3), colors uint8 array (N, 3)] of every voxel of a .vox file
+    """
+    models, translations, rgba = read_vox(file_path)
+    vox_shape = np.array([shape[0], shape[2], shape[1]])
+    if len(models) == 1:
+        offsets = [np.zeros(3, dtype=np.int64)]
+    else:
+        assert len(translations) == len(models)
+        offsets = [np.array(t) - np.array(size) // 2 + vox_shape // 2 for (size, _), t in zip(models, translations)]
+    cells = []
+    colors = []
+    for (size, xyzi), offset in zip(models, offsets):
+        assert max(size) <= voxel_export.VOX_MODEL_SIZE and (xyzi[:, :3] < size).all()
+        assert (xyzi[:, 3] > 0).all()
+        vox_cells = xyzi[:, :3].astype(np.int64) + offset
+        # back from z up to y up
+        cells.append(np.stack([vox_cells[:, 0], vox_cells[:, 2], shape[2] - 1 - vox_cells[:, 1]], axis=1))
+        colors.append(rgba[xyzi[:, 3] - 1, :3])
+    return [np.concatenate(cells), np.concatenate(colors)]
+
+
+def sorted_voxels(cells, colors):
+    order = np.lexsort(np.asarray(cells).T[::-1])
+    return [np.asarray(cells)[order], np.asarray(colors)[order]]
+
+
+def read_glb(file_path):
+    """
+    :return: [gltf json, dictionary of accessor index to array]
+    """
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    magic, version, length = struct.unpack_from('<4sII', data)
+    assert magic == b'glTF' and version == 2 and length == len(data)
+    json_length, chunk_type = struct.unpack_from('<I4s', data, 12)
+    assert chunk_type == b'JSON' and json_length % 4 == 0
+    gltf = json.loads(data[20:20 + json_length])
+    bin_length, chunk_type = struct.unpack_from('<I4s', data, 20 + json_length)
+    assert chunk_type == b'BIN\x00' and bin_length == gltf['buffers'][0]['byteLength']
+    binary = data[28 + json_length:]
+    assert len(binary) == bin_length
+    types = {voxel_export.GLB_FLOAT: np.float32, voxel_export.GLB_UNSIGNED_BYTE: np.uint8,
+             voxel_export.GLB_UNSIGNED_INT: np.uint32}
+    widths = {'SCALAR': 1, 'VEC3': 3, 'VEC4': 4}
+    arrays = {}
+    for index, accessor in enumerate(gltf['accessors']):
+        view = gltf['bufferViews'][accessor['bufferView']]
+        assert view['byteOffset'] % 4 == 0
+        values = np.frombuffer(binary, dtype=types[accessor['componentType']], offset=view['byteOffset'],
+                               count=accessor['count'] * widths[accessor['type']])
+        assert values.nbytes == view['byteLength']
+        arrays[index] = values.reshape(accessor['count'], -1)
+    return [gltf, arrays]
+
+
+def test_vox_round_trip(sphere, tmp_path):
+    grid, palette = sphere
+    path = str(tmp_path / 'sphere.vox')
+    assert voxel_export.write_vox(path, grid, palette) == 1
+    models, translations, rgba = read_vox(path)
+    # x, z, y sizes, and no scene for a single model
+    assert models[0][0] == (grid.shape[0], grid.shape[2], grid.shape[1]) and translations == []
+    assert (rgba[:len(palette), :3] == palette).all() and (rgba[:len(palette), 3] == 255).all()
+    cells, colors = vox_voxels(path, grid.shape)
+    expected = sorted_voxels(grid.cells, grid.colors)
+    for values, expected_values in zip(sorted_voxels(cells, colors), expected):
+        assert np.array_equal(values, expected_values)
+
+
+def test_vox_splits_big_grids_into_models(tmp_path):
+    # along x and y (z in the file) the grid needs two and three models, voxels in five of the six
+    shape = (300, 600, 20)
+    rng = np.random.default_rng(0)
+    cells = np.unique(rng.integers(0, shape, (4000, 3)), axis=0)
+    cells = cells[~((cells[:, 0] >= 256) & (cells[:, 1] >= 512))]
+    colors = rng.integers(0, 256, (len(cells), 3), dtype=np.uint8)
+    grid = voxel_grid.VoxelGrid(cells, np.zeros(3), 1.0, shape, colors)
+    path = str(tmp_path / 'big.vox')
+    assert voxel_export.write_vox(path, grid) == 5
+    models, translations, rgba = read_vox(path)
+    assert sorted(size for size, _ in models) == sorted([(256, 20, 256), (256, 20, 256), (256, 20, 88),
+                                                         (44, 20, 256), (44, 20, 256)])
+    vox_cells, vox_colors = vox_voxels(path, shape)
+    assert np.array_equal(sorted_voxels(vox_cells, vox_colors)[0], sorted_voxels(cells, colors)[0])
+    # too many colors for a .vox palette, so they are quantized into 255
+    palette, ids = voxel_export.vox_palette(grid)
+    assert len(palette) == 255
+    assert np.array_equal(sorted_voxels(vox_cells, vox_colors)[1], sorted_voxels(cells, palette[ids])[1])
+
+
+def test_empty_vox(tmp_path):
+    grid = voxel_grid.VoxelGrid(np.zeros((0, 3), dtype=np.int64), np.zeros(3), 1.0, (4, 4, 4),
+                                np.zeros((0, 3), dtype=np.uint8))
+    path = str(tmp_path / 'empty.vox')
+    assert voxel_export.write_vox(path, grid) == 1
+    models = read_vox(path)[0]
+    assert len(models) == 1 and len(models[0][1]) == 0
+
+
+@pytest.mark.parametrize('merge', [False, True])
+def test_glb_round_trip(sphere, tmp_path, merge):
+    grid, palette = sphere
+    path = str(tmp_path / 'sphere.glb')
+    voxel_export.export_voxels(path, grid, merge, palette)
+    gltf, arrays = read_glb(path)
+    attributes = gltf['meshes'][0]['primitives'][0]['attributes']
+    positions = arrays[attributes['POSITION']]
+    normals = arrays[attributes['NORMAL']]
+    colors = arrays[attributes['COLOR_0']]
+    triangles = arrays[gltf['meshes'][0]['primitives'][0]['indices']].reshape(-1, 3)
+    if merge:
+        points, face_counts, face_connects, face_color_ids, _ = voxel_mesh.build_greedy_mesh(grid)
+        face_colors = palette[face_color_ids]
+    else:
+        points, face_counts, face_connects, face_voxels = voxel_mesh.build_mesh(grid)
+        face_colors = grid.colors[face_voxels]
+    # every face has its own 4 corners and 2 triangles
+    assert len(positions) == len(face_connects) and len(triangles) == 2 * len(face_counts)
+    assert np.allclose(positions, points[face_connects], atol=1e-5)
+    assert np.allclose(gltf['accessors'][attributes['POSITION']]['min'], points.min(axis=0))
+    assert np.array_equal(colors[:, :3], np.repeat(face_colors, 4, axis=0)) and (colors[:, 3] == 255).all()
+    # the normals point out of the voxels, the same way as the winding of the triangles
+    assert np.allclose(np.abs(normals).sum(axis=1), 1)
+    corners = positions[triangles].astype(np.float64)
+    winding = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    assert (np.einsum('ij,ij->i', winding, normals[triangles[:, 0]]) > 0).all()
+    assert np.array_equal(triangles[:, 0] // 4, np.arange(len(triangles)) // 2)
+
+
+def test_glb_in_blocks(sphere, tmp_path, monkeypatch):
+    grid = sphere[0]
+    whole = str(tmp_path / 'whole.glb')
+    voxel_export.export_voxels(whole, grid)
+    monkeypatch.setattr(voxel_export, 'GLB_BLOCK_SIZE', 7)
+    blocks = str(tmp_path / 'blocks.glb')
+    voxel_export.export_voxels(blocks, grid)
+    whole_gltf, whole_arrays = read_glb(whole)
+    blocks_gltf, blocks_arrays = read_glb(blocks)
+    blocks_gltf['nodes'][0]['name'] = 'whole'
+    assert blocks_gltf == whole_gltf
+    assert all(np.array_equal(blocks_arrays[index], whole_arrays[index]) for index in whole_arrays)
+
+
+def test_obj_with_palette_texture(sphere, tmp_path):
+    grid, palette = sphere
+    image, uv_table = voxel_texture.build_atlas(palette, 4)
+    texture_path = voxel_texture.write_texture(image, str(tmp_path / 'sphere'))
+    path = str(tmp_path / 'sphere.obj')
+    voxel_export.export_voxels(path, grid, palette=palette, uv_table=uv_table, texture_path=texture_path)
+    mesh = voxel_io.read_obj(path)
+    points, face_counts, face_connects, face_voxels = voxel_mesh.build_mesh(grid)
+    assert np.allclose(mesh.vertices, points, atol=1e-6)
+    # quads come back as two triangles, with the UV of the color of their voxel on every corner
+    assert len(mesh.faces) == 2 * len(face_counts)
+    assert mesh.texture_path == texture_path
+    face_color_ids = np.repeat(grid.color_ids[face_voxels], 2)
+    assert np.allclose(mesh.corner_uvs, uv_table[face_color_ids][:, None, :], atol=1e-6)
+
+
+@pytest.mark.parametrize('merge', [False, True])
+def test_obj_with_vertex_colors(sphere, tmp_path, merge):
+    grid, palette = sphere
+    path = str(tmp_path / 'sphere.obj')
+    voxel_export.export_voxels(path, grid, merge, palette, color_output='vertex')
+    mesh = voxel_io.read_obj(path)
+    face_count = voxel_mesh.build_greedy_mesh(grid)[4][1] // 2 if merge else len(voxel_mesh.build_mesh(grid)[1])
+    assert len(mesh.faces) == 2 * face_count and len(mesh.vertices) == 4 * face_count
+    # every triangle has the color of its voxel on all of its corners
+    corner_colors = mesh.vertex_colors[mesh.faces]
+    assert (corner_colors == corner_colors[:, :1]).all()
+    centers = mesh.vertices[mesh.faces].mean(axis=1)
+    # a point just inside the triangle belongs to the voxel behind it
+    normals = np.cross(*(mesh.vertices[mesh.faces[:, 1:]] - mesh.vertices[mesh.faces[:, :1]]).transpose(1, 0, 2))
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    cells = np.floor((centers - normals * grid.voxel_size / 4 - grid.origin) / grid.voxel_size).astype(np.int64)
+    index = grid.index_of(cells)
+    assert (index >= 0).all()
+    if not merge:
+        assert np.array_equal(corner_colors[:, 0], grid.colors[index])
+    else:
+        # merged faces can span voxels of the same color only
+        assert np.array_equal(corner_colors[:, 0], palette[grid.color_ids[index]])
+
+
+def test_unknown_export_format(sphere, tmp_path):
+    with pytest.raises(ValueError, match='Unknown export format'):
+        voxel_export.export_voxels(str(tmp_path / 'sphere.fbx'), sphere[0])
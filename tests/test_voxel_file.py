@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+import voxel_file
+import voxel_grid
+import voxel_palette
+import voxel_sampling
+
+# bytes per voxel of writing out every voxel as it is: a float32 position and an rgb color
+NAIVE_VOXEL_BYTES = 15
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    vertices, faces, corner_uvs = voxel_benchmark.sphere_mesh(48)
+    # 16 colors, about what a palette of a textured model comes down to
+    return vertices, faces, corner_uvs, voxel_benchmark.noise_texture(256, 4)
+
+
+def textured_grid(sphere, density, fill):
+    vertices, faces, corner_uvs, image = sphere
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, density)
+    grid = voxel_grid.VoxelGrid.from_occupancy(voxel_engine.fill_cells(occupancy, fill), origin, voxel_size)
+    grid.colors = voxel_sampling.sample_mesh_colors(grid, vertices, faces, corner_uvs, image)
+    return grid
+
+
+def sorted_voxels(cells, colors):
+    # voxels in the order of their cells, files store them brick after brick
+    cells = np.asarray(cells, dtype=np.int64)
+    order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+    return [cells[order], np.asarray(colors)[order]]
+
+
+def assert_same_voxels(grid, cells, colors):
+    expected_cells, expected_colors = sorted_voxels(grid.cells, grid.colors)
+    cells, colors = sorted_voxels(cells, colors)
+    assert np.array_equal(cells, expected_cells)
+    assert np.array_equal(colors, expected_colors)
+
+
+@pytest.mark.parametrize('fill', ['surface', 'solid'])
+def test_round_trip(sphere, tmp_path, fill):
+    grid = textured_grid(sphere, 48, fill)
+    path = str(tmp_path / f'sphere{voxel_file.FILE_EXTENSION}')
+    voxel_file.write_voxel_file(path, grid)
+    loaded = voxel_file.read_voxel_file(path)
+    assert loaded.shape == grid.shape and loaded.voxel_size == grid.voxel_size
+    assert np.array_equal(loaded.origin, grid.origin)
+    assert_same_voxels(grid, loaded.cells, loaded.colors)
+    # the indices point into the palette of the file
+    voxel = voxel_file.VoxelFile(path)
+    assert voxel.raw_colors is None and len(voxel.palette) == len(np.unique(grid.colors, axis=0))
+    assert np.array_equal(np.asarray(voxel.palette)[loaded.color_ids], loaded.colors)
+    voxel.close()
+
+
+def test_round_trip_with_palette_and_raw_colors(sphere, tmp_path):
+    grid = textured_grid(sphere, 32, 'surface')
+    # a palette that only approximates the colors
+    palette, grid.color_ids = voxel_palette.build_palette(grid.colors, 64)
+    path = str(tmp_path / 'palette.vxg')
+    voxel_file.write_voxel_file(path, grid, palette, raw_colors=True)
+    voxel = voxel_file.VoxelFile(path)
+    assert voxel.flags & voxel_file.FLAG_RAW_COLORS
+    cells = voxel.read_cells()[0]
+    colors, indices = voxel.read_colors()
+    assert_same_voxels(grid, cells, colors)
+    expected_cells, expected_ids = sorted_voxels(grid.cells, grid.color_ids)
+    assert np.array_equal(sorted_voxels(cells, indices)[1], expected_ids)
+    assert np.array_equal(np.asarray(voxel.palette), np.asarray(palette, dtype=np.uint8))
+    voxel.close()
+
+
+def test_noisy_colors_fall_back_to_raw_colors(tmp_path):
+    cells = np.stack(np.meshgrid(*[np.arange(16)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    colors = np.random.default_rng(0).integers(0, 256, (len(cells), 3), dtype=np.uint8)
+    grid = voxel_grid.VoxelGrid(cells, np.zeros(3), 0.1, (16, 16, 16), colors)
+    path = str(tmp_path / 'noise.vxg')
+    voxel_file.write_voxel_file(path, grid)
+    voxel = voxel_file.VoxelFile(path)
+    # a palette would be as big as the colors, so there is none
+    assert voxel.flags & voxel_file.FLAG_RAW_COLORS
+    assert len(voxel.palette) == 0 and voxel.index_bits == 0
+    voxel.close()
+    loaded = voxel_file.read_voxel_file(path)
+    assert_same_voxels(grid, loaded.cells, loaded.colors)
+
+
+@pytest.mark.parametrize('maximum', [3, 255, 65535])
+def test_split_runs(maximum):
+    runs = np.array([0, 1, 7, maximum, maximum + 1, 3 * maximum + 2, 0, 2], dtype=np.int64)
+    split = voxel_file.split_runs(runs, maximum)
+    assert split.max() <= maximum
+    # the runs still alternate, so the empty and filled places add up the same
+    assert split[0::2].sum() == runs[0::2].sum() and split[1::2].sum() == runs[1::2].sum()
+
+    def expand(lengths):
+        return np.repeat(np.arange(len(lengths)) % 2, lengths)
+
+    assert np.array_equal(expand(split), expand(runs))
+    # runs that fit are left alone
+    short = np.minimum(runs, maximum)
+    assert np.array_equal(voxel_file.split_runs(short, maximum), short)
+
+
+def test_long_runs_round_trip(tmp_path):
+    # voxels far apart in a big grid give empty runs that don't fit in 1 or 2 bytes
+    cells = np.array([[0, 0, 0], [1, 1, 1], [600, 3, 5], [1023, 1023, 1023], [1022, 1023, 1023]])
+    colors = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255], [9, 9, 9], [9, 9, 9]], dtype=np.uint8)
+    grid = voxel_grid.VoxelGrid(cells, np.zeros(3), 1.0, (1024, 1024, 1024), colors)
+    path = str(tmp_path / 'sparse.vxg')
+    voxel_file.write_voxel_file(path, grid)
+    loaded = voxel_file.read_voxel_file(path)
+    assert_same_voxels(grid, loaded.cells, loaded.colors)
+
+
+@pytest.mark.parametrize('bits', voxel_file.INDEX_BITS)
+def test_pack_indices(bits):
+    count = 1001
+    top = 1 << min(bits, 31)
+    indices = np.random.default_rng(bits).integers(0, top, count) if bits else np.zeros(count, dtype=np.int64)
+    data = voxel_file.pack_indices(indices, bits)
+    assert len(data) == (count * bits + 7) // 8
+    unpacked = voxel_file.unpack_indices(data, bits, count)
+    assert unpacked.dtype == np.uint32 and np.array_equal(unpacked, indices)
+    # ranges that start and end in the middle of a byte
+    for start, length in [(1, 5), (3, 100), (999, 2), (0, 0)]:
+        assert np.array_equal(voxel_file.unpack_indices(data, bits, length, start), indices[start:start + length])
+
+
+@pytest.mark.parametrize('slab_size', [1, 3, 16, 1000])
+def test_iter_slabs(sphere, tmp_path, slab_size):
+    grid = textured_grid(sphere, 40, 'solid')
+    path = str(tmp_path / 'slabs.vxg')
+    voxel_file.write_voxel_file(path, grid)
+    voxel = voxel_file.VoxelFile(path)
+    slabs = list(voxel.iter_slabs(slab_size))
+    for x, cells, _ in slabs:
+        assert x % slab_size == 0
+        assert ((cells[:, 0] >= x) & (cells[:, 0] < x + slab_size)).all()
+    assert_same_voxels(grid, np.concatenate([cells for _, cells, _ in slabs]),
+                       np.concatenate([colors for _, _, colors in slabs]))
+    voxel.close()
+
+
+def test_to_chunked(sphere, tmp_path):
+    grid = textured_grid(sphere, 40, 'solid')
+    path = str(tmp_path / 'chunked.vxg')
+    voxel_file.write_voxel_file(path, grid)
+    voxel = voxel_file.VoxelFile(path)
+    chunked = voxel.to_chunked(chunk_size=16, memory_budget=0)
+    voxel.close()
+    assert chunked.voxel_count() == len(grid)
+    cells = []
+    colors = []
+    for key in chunked.chunk_keys():
+        occupancy, chunk_colors = chunked.get_chunk(key)
+        cells.append(np.argwhere(occupancy) + np.asarray(key) * 16)
+        colors.append(chunk_colors[occupancy])
+    chunked.close()
+    assert_same_voxels(grid, np.concatenate(cells), np.concatenate(colors))
+
+
+@pytest.mark.parametrize('fill', ['surface', 'solid'])
+def test_ten_times_smaller_than_naive(sphere, tmp_path, fill):
+    grid = textured_grid(sphere, 128, fill)
+    size = voxel_file.write_voxel_file(str(tmp_path / 'size.vxg'), grid)
+    # about 16 times for the surface and 23 times for the solid sphere
+    assert len(grid) * NAIVE_VOXEL_BYTES / size >= 10
+
+
+def test_not_a_voxel_file(tmp_path):
+    path = tmp_path / 'other.vxg'
+    path.write_bytes(b'not a voxel file' * 20)
+    with pytest.raises(ValueError):
+        voxel_file.VoxelFile(str(path))
@@ -0,0 +1,38 @@
+import tracemalloc
+import numpy as np
+import voxel_grid
+
+
+def solid_sphere_cells(density):
+    center = np.indices((density,) * 3).transpose(1, 2, 3, 0) + 0.5 - density / 2
+    return np.argwhere((center ** 2).sum(axis=-1) <= (density / 2) ** 2)
+
+
+def test_bytes_per_voxel():
+    # the solid sphere at density 200 from the VoxelGrid docstring
+    density = 200
+    cells = solid_sphere_cells(density)
+    tracemalloc.start()
+    try:
+        grid = voxel_grid.VoxelGrid(cells, np.zeros(3), 1.0, (density,) * 3)
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    voxels = len(grid)
+    assert voxels == len(cells)
+    # 6 bytes for the int16 cell, 3 for the color and 4 for the palette index per voxel, plus one bit, a uint8 count
+    # per 8 cells and a uint32 count per 64 cells for every cell of the grid
+    cell_count = density ** 3
+    expected = voxels * (6 + 3 + 4) + cell_count // 8 * 2 + cell_count // 64 * 4
+    assert grid.nbytes() == expected
+    assert 13.5 < grid.nbytes() / voxels < 13.65
+    # the arrays are all the grid keeps alive, nothing else from building it stays around
+    assert retained < grid.nbytes() * 1.01
+
+
+def test_index_of_matches_cells():
+    cells = solid_sphere_cells(24)
+    grid = voxel_grid.VoxelGrid(cells[::-1], [1, 2, 3], 0.5, (24, 24, 24))
+    assert np.array_equal(grid.index_of(grid.cells), np.arange(len(grid)))
+    assert np.array_equal(grid.index_of([[0, 0, 0], [-1, 5, 5], [24, 0, 0]]), [-1, -1, -1])
+    assert np.array_equal(grid.occupancy(), np.isin(np.arange(24 ** 3), grid.cell_keys(cells)).reshape(24, 24, 24))
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import voxel_grid
+import voxel_instances
+
+
+def box_grid(size, colors=None, voxel_size=0.5):
+    cells = np.stack(np.meshgrid(*[np.arange(size)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    return voxel_grid.VoxelGrid(cells, np.array([1.0, 2.0, 3.0]), voxel_size, (size, size, size), colors)
+
+
+def covered_cells(grid, positions, scales):
+    # the voxel cells inside every instance, as [instance index, cell]
+    pairs = []
+    for index, (position, scale) in enumerate(zip(positions, scales)):
+        low = np.rint((position - scale / 2 - grid.origin) / grid.voxel_size).astype(np.int64)
+        width = int(round(scale / grid.voxel_size))
+        offsets = np.stack(np.meshgrid(*[np.arange(width)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+        pairs += [[index, tuple(cell)] for cell in (low + offsets).tolist()]
+    return pairs
+
+
+def test_visible_only_leaves_out_hidden_voxels():
+    grid = box_grid(4)
+    positions, scales, colors = voxel_instances.instance_arrays(grid)
+    # the 2 x 2 x 2 voxels in the middle have a neighbour on every side
+    assert len(positions) == 64 - 8
+    hidden = ((grid.cells >= 1) & (grid.cells <= 2)).all(axis=1)
+    assert np.array_equal(positions, grid.positions()[~hidden])
+    assert (scales == grid.voxel_size).all()
+    assert np.allclose(colors, 1.0)
+
+    positions, _, _ = voxel_instances.instance_arrays(grid, visible_only=False)
+    assert np.array_equal(positions, grid.positions())
+
+
+@pytest.mark.parametrize('visible_only', [False, True])
+def test_merge_blocks_covers_every_voxel_once(visible_only):
+    # an 8 x 8 x 8 box where one corner block has a different color, and one voxel is missing
+    grid = box_grid(8)
+    colors = np.full((len(grid), 3), 200, dtype=np.uint8)
+    colors[(grid.cells < 2).all(axis=1)] = [10, 20, 30]
+    keep = ~(grid.cells == [7, 7, 7]).all(axis=1)
+    grid = voxel_grid.VoxelGrid(grid.cells[keep], grid.origin, grid.voxel_size, grid.shape, colors[keep])
+
+    positions, scales, instance_colors = voxel_instances.instance_arrays(grid, visible_only, merge_blocks=True)
+    assert len(positions) < len(grid)
+    assert set(np.round(scales / grid.voxel_size).astype(int).tolist()) <= {1, 2, 4}
+    pairs = covered_cells(grid, positions, scales)
+    cells = [cell for _, cell in pairs]
+    # no voxel is drawn twice, and every instance only covers voxels
+    assert len(cells) == len(set(cells))
+    index = grid.index_of(np.array(cells))
+    assert (index >= 0).all()
+    # and every instance has the color of all of its voxels
+    instances = np.array([instance for instance, _ in pairs])
+    assert np.allclose(instance_colors[instances], grid.colors[index] / 255.0)
+    if visible_only:
+        # the hidden voxels can be left out, the visible ones never
+        visible = voxel_instances.visible_voxels(grid)
+        assert visible[index].sum() == visible.sum()
+    else:
+        assert len(cells) == len(grid)
+
+
+@pytest.mark.parametrize('merge_blocks', [False, True])
+def test_empty_grid(merge_blocks):
+    grid = voxel_grid.VoxelGrid(np.zeros((0, 3), dtype=np.int64), np.zeros(3), 1.0, (4, 4, 4))
+    positions, scales, colors = voxel_instances.instance_arrays(grid, merge_blocks=merge_blocks)
+    assert positions.shape == (0, 3) and scales.shape == (0,) and colors.shape == (0, 3)
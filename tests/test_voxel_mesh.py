@@ -0,0 +1,119 @@
+import collections
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+import voxel_grid
+import voxel_mesh
+
+
+def box_grid(size, color_ids=None):
+    cells = np.stack(np.meshgrid(*[np.arange(size)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    grid = voxel_grid.VoxelGrid(cells, np.array([-1.0, 0.5, 2.0]), 0.25, (size, size, size))
+    grid.color_ids = np.zeros(len(grid), dtype=np.uint32) if color_ids is None else color_ids(grid.cells)
+    return grid
+
+
+def sphere_grid(fill, color_count):
+    vertices, faces = voxel_benchmark.sphere_mesh(24)[:2]
+    surface, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 20)
+    grid = voxel_grid.VoxelGrid.from_occupancy(voxel_engine.fill_cells(surface, fill), origin, voxel_size)
+    grid.color_ids = np.random.default_rng(color_count).integers(0, color_count, len(grid)).astype(np.uint32)
+    return grid
+
+
+def unit_faces(grid, points, face_counts, face_connects, face_color_ids):
+    """
+    :return: Counter of (direction, cell, color id) of every voxel face the quads cover
+    """
+    assert (np.asarray(face_counts) == 4).all()
+    lattice = np.rint((points - grid.origin) / grid.voxel_size).astype(np.int64)
+    covered = collections.Counter()
+    for quad, color_id in zip(lattice[np.asarray(face_connects).reshape(-1, 4)], face_color_ids):
+        # the winding gives the direction the quad faces
+        normal = np.cross(quad[1] - quad[0], quad[2] - quad[0])
+        normal = normal // np.abs(normal).max()
+        direction = int(np.flatnonzero((voxel_mesh.FACE_NORMALS == normal).all(axis=1))[0])
+        axis = int(np.flatnonzero(normal)[0])
+        low = quad.min(axis=0)
+        high = quad.max(axis=0)
+        assert low[axis] == high[axis]
+        # the face of a cell pointing up its axis lies on the far side of the cell
+        layer = low[axis] - 1 if normal[axis] > 0 else low[axis]
+        ranges = [range(layer, layer + 1) if a == axis else range(low[a], high[a]) for a in range(3)]
+        for cell in np.stack(np.meshgrid(*ranges, indexing='ij'), axis=-1).reshape(-1, 3).tolist():
+            covered[(direction, tuple(cell), int(color_id))] += 1
+    return covered
+
+
+def exposed_unit_faces(grid):
+    face_cells, face_directions, face_voxels = voxel_mesh.exposed_faces(grid)
+    return collections.Counter((int(direction), tuple(cell), int(grid.color_ids[voxel]))
+                               for cell, direction, voxel in zip(face_cells.tolist(), face_directions, face_voxels))
+
+
+@pytest.mark.parametrize('size', [1, 2, 6])
+def test_exposed_faces_of_solid_cube(size):
+    grid = box_grid(size)
+    face_cells, face_directions, face_voxels = voxel_mesh.exposed_faces(grid)
+    # only the outside of the cube is left, 6 n^2 of the 6 n^3 faces a cube per voxel had, n times fewer
+    assert len(face_cells) == 6 * size ** 2
+    assert 6 * len(grid) / len(face_cells) == size
+    assert np.bincount(face_directions, minlength=6).tolist() == [size ** 2] * 6
+    assert np.array_equal(face_cells, grid.cells[face_voxels])
+    assert not grid.is_occupied(face_cells + voxel_mesh.FACE_NORMALS[face_directions]).any()
+    # the faces of a voxel are next to each other
+    assert (np.diff(face_voxels) >= 0).all()
+    points, face_counts, face_connects, mesh_voxels = voxel_mesh.build_mesh(grid)
+    # the lattice points on the outside of the cube, each shared by the faces around it
+    assert len(points) == (size + 1) ** 3 - max(size - 1, 0) ** 3
+    assert len(face_counts) == 6 * size ** 2 and len(face_connects) == 4 * len(face_counts)
+    assert np.array_equal(mesh_voxels, face_voxels)
+
+
+def test_exposed_faces_around_a_hole():
+    # a 6 x 6 x 6 cube without its center voxel also shows the 6 faces around the hole
+    grid = box_grid(6)
+    keep = ~(grid.cells == [3, 3, 3]).all(axis=1)
+    grid = voxel_grid.VoxelGrid(grid.cells[keep], grid.origin, grid.voxel_size, grid.shape)
+    face_cells, face_directions, _ = voxel_mesh.exposed_faces(grid)
+    assert len(face_cells) == 6 * 36 + 6
+    inner = (face_cells + voxel_mesh.FACE_NORMALS[face_directions] == [3, 3, 3]).all(axis=1)
+    assert inner.sum() == 6
+
+
+@pytest.mark.parametrize('grid', [
+    box_grid(4),
+    box_grid(6, lambda cells: (cells[:, 2] // 2).astype(np.uint32)),
+    box_grid(5, lambda cells: (cells.sum(axis=1) % 2).astype(np.uint32)),
+    sphere_grid('surface', 1),
+    sphere_grid('solid', 3),
+    sphere_grid('surface', 64),
+], ids=['box', 'layers', 'checkers', 'sphere', 'solid sphere', 'noisy sphere'])
+def test_greedy_mesh_covers_the_same_faces(grid):
+    points, face_counts, face_connects, face_color_ids, report = voxel_mesh.build_greedy_mesh(grid)
+    expected = exposed_unit_faces(grid)
+    # every exposed voxel face is covered exactly once, facing the same way and with the color of its voxel
+    assert unit_faces(grid, points, face_counts, face_connects, face_color_ids) == expected
+    assert report == [2 * len(voxel_mesh.build_mesh(grid)[1]), 2 * len(face_counts)]
+    assert report[0] == 2 * sum(expected.values()) and report[1] <= report[0]
+
+
+def test_greedy_mesh_merges_whole_sides():
+    # one color, so each side of the box is a single quad
+    report = voxel_mesh.build_greedy_mesh(box_grid(4))[4]
+    assert report == [6 * 16 * 2, 6 * 2]
+    # a layer of a different color every 2 cells along z splits the 4 sides along z into 3 quads each
+    report = voxel_mesh.build_greedy_mesh(box_grid(6, lambda cells: (cells[:, 2] // 2).astype(np.uint32)))[4]
+    assert report == [6 * 36 * 2, (2 + 4 * 3) * 2]
+    # with every neighbour a different color there is nothing to merge
+    report = voxel_mesh.build_greedy_mesh(box_grid(5, lambda cells: (cells.sum(axis=1) % 2).astype(np.uint32)))[4]
+    assert report[0] == report[1]
+
+
+def test_greedy_mesh_of_empty_grid():
+    grid = voxel_grid.VoxelGrid(np.zeros((0, 3), dtype=np.int64), np.zeros(3), 1.0, (4, 4, 4))
+    grid.color_ids = np.zeros(0, dtype=np.uint32)
+    points, face_counts, face_connects, face_color_ids, report = voxel_mesh.build_greedy_mesh(grid)
+    assert len(points) == len(face_counts) == len(face_connects) == len(face_color_ids) == 0
+    assert report == [0, 0]
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import voxel_palette
+
+
+def test_exact_palette_keeps_every_color():
+    colors = np.random.default_rng(0).integers(0, 4, (500, 3), dtype=np.uint8) * 60
+    palette, ids = voxel_palette.exact_palette(colors)
+    assert palette.dtype == np.uint8 and ids.dtype == np.uint32
+    assert len(palette) == len(np.unique(colors, axis=0))
+    assert np.array_equal(palette[ids], colors)
+    # in the order the colors first appear in
+    assert ids[0] == 0 and (np.maximum.accumulate(ids)[1:] - np.maximum.accumulate(ids)[:-1] <= 1).all()
+
+
+def test_exact_palette_of_no_colors():
+    palette, ids = voxel_palette.exact_palette(np.zeros((0, 3), dtype=np.uint8))
+    assert palette.shape == (0, 3) and palette.dtype == np.uint8
+    assert ids.shape == (0,) and ids.dtype == np.uint32
+
+
+def first_match_palette(rgb, threshold):
+    # the original create_texture loop, every color against every palette color until the first close one
+    palette = []
+    ids = []
+    for r, g, b in rgb.tolist():
+        for index, (pr, pg, pb) in enumerate(palette):
+            if abs(pr - r) < threshold and abs(pg - g) < threshold and abs(pb - b) < threshold:
+                ids.append(index)
+                break
+        else:
+            ids.append(len(palette))
+            palette.append((r, g, b))
+    return [np.array(palette, dtype=np.int64).reshape(-1, 3), np.array(ids, dtype=np.uint32)]
+
+
+@pytest.mark.parametrize('threshold', [1, 5, 20, 64, 300])
+@pytest.mark.parametrize('dtype', [np.int64, np.uint8])
+def test_threshold_palette_matches_first_match_loop(threshold, dtype):
+    rng = np.random.default_rng(threshold)
+    # clusters of similar colors, plus colors on the edges of the color cube
+    centers = rng.integers(0, 256, (12, 3))
+    rgb = np.clip(centers[rng.integers(0, 12, 3000)] + rng.integers(-40, 41, (3000, 3)), 0, 255)
+    rgb[:100] = rng.choice([0, 1, 254, 255], (100, 3))
+    palette, ids = voxel_palette.threshold_palette(rgb.astype(dtype), threshold)
+    expected_palette, expected_ids = first_match_palette(rgb, threshold)
+    assert np.array_equal(palette, expected_palette)
+    assert np.array_equal(ids, expected_ids) and ids.dtype == np.uint32
+
+
+def test_threshold_of_zero_keeps_every_voxel():
+    rgb = np.array([[1, 2, 3], [1, 2, 3], [9, 9, 9]], dtype=np.uint8)
+    palette, ids = voxel_palette.threshold_palette(rgb, 0)
+    assert palette.tolist() == rgb.tolist() and ids.tolist() == [0, 1, 2]
+
+
+@pytest.mark.parametrize('mode', voxel_palette.PALETTE_MODES)
+def test_build_palette_dtypes(mode):
+    colors = np.random.default_rng(1).random((400, 3))
+    palette, ids = voxel_palette.build_palette(colors, 30, mode, 16)
+    assert palette.dtype == np.uint8 and ids.dtype == np.uint32
+    assert len(ids) == len(colors) and ids.max() < len(palette)
+    # the same as with the 0 to 255 colors
+    palette_8, ids_8 = voxel_palette.build_palette(voxel_palette.to_rgb8(colors).astype(np.uint8), 30, mode, 16)
+    assert np.array_equal(palette, palette_8) and np.array_equal(ids, ids_8)
+
+
+def test_unknown_palette_mode():
+    with pytest.raises(ValueError, match='Unknown palette mode'):
+        voxel_palette.build_palette(np.zeros((2, 3)), mode='octree')
@@ -0,0 +1,114 @@
+import pickle
+import time
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+import voxel_grid
+import voxel_mesh
+import voxel_parallel
+import voxel_profile
+import voxel_sampling
+
+
+@pytest.fixture(scope='module')
+def blob():
+    return voxel_benchmark.noise_blob_mesh(24)
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    # the test meshes are small, so the thresholds have to go for them to reach the pool at all
+    for name in ('PARALLEL_MIN_CELLS', 'PARALLEL_MIN_VOXELS', 'PARALLEL_MIN_SAMPLES'):
+        monkeypatch.setattr(voxel_parallel, name, 0)
+    # and the colors are split into more than one task
+    monkeypatch.setattr(voxel_parallel, 'SAMPLE_TASK_SIZE', 256)
+    yield
+    voxel_parallel.shutdown_pool()
+
+
+def test_voxelize_matches_serial(blob, always_parallel):
+    vertices, faces, _ = blob
+    occupancy, origin, voxel_size = voxel_parallel.voxelize(vertices, faces, 40, workers=2)
+    serial_occupancy, serial_origin, serial_voxel_size = voxel_engine.voxelize(vertices, faces, 40)
+    assert np.array_equal(occupancy, serial_occupancy)
+    assert np.array_equal(origin, serial_origin) and voxel_size == serial_voxel_size
+
+
+def test_build_mesh_matches_serial(blob, always_parallel):
+    occupancy, origin, voxel_size = voxel_engine.voxelize(blob[0], blob[1], 40)
+    grid = voxel_grid.VoxelGrid.from_occupancy(voxel_engine.fill_cells(occupancy, 'solid'), origin, voxel_size)
+    parallel = voxel_parallel.build_mesh(grid, workers=2)
+    serial = voxel_mesh.build_mesh(grid)
+    for parallel_array, serial_array in zip(parallel, serial):
+        assert np.array_equal(parallel_array, serial_array)
+
+
+def test_sample_colors_matches_serial(blob, always_parallel):
+    vertices, faces, corner_uvs = blob
+    image = voxel_benchmark.noise_texture(64, 8)
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 40)
+    grid = voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+    parallel = voxel_sampling.sample_mesh_colors(grid, vertices, faces, corner_uvs, image, workers=2)
+    serial = voxel_sampling.sample_mesh_colors(grid, vertices, faces, corner_uvs, image, workers=1)
+    assert np.array_equal(parallel, serial)
+    assert len(np.unique(serial, axis=0)) > 1
+
+
+def test_pool_is_reused(always_parallel):
+    pool = voxel_parallel.get_pool(2)
+    assert voxel_parallel.get_pool(2) is pool
+    assert voxel_parallel.get_pool(3) is not pool
+
+
+def test_small_work_stays_serial(blob):
+    voxel_parallel.shutdown_pool()
+    occupancy, origin, voxel_size = voxel_parallel.voxelize(blob[0], blob[1], 16, workers=4)
+    grid = voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+    voxel_parallel.build_mesh(grid, workers=4)
+    voxel_parallel.sample_colors(grid.positions(), lambda positions, progress=None: positions.astype(np.uint8), 4)
+    # nothing was small enough to be worth starting processes for
+    assert voxel_parallel._pool is None
+
+
+class SlowSampler(object):
+    # takes about as long as sampling a mesh, without needing one
+    def __init__(self, seconds_per_position):
+        self.seconds_per_position = seconds_per_position
+        self.color = np.array([10, 20, 30], dtype=np.uint8)
+
+    def __call__(self, positions, progress=None):
+        time.sleep(len(positions) * self.seconds_per_position)
+        return np.repeat(self.color[None], len(positions), axis=0)
+
+
+def test_shared_sampler_matches_sampler(blob):
+    vertices, faces, corner_uvs = blob
+    sampler = voxel_sampling.mesh_color_sampler(vertices, faces, corner_uvs, voxel_benchmark.noise_texture(64, 8),
+                                                alpha=True)
+    shared = voxel_parallel.SharedObject(sampler)
+    try:
+        # only the names of the shared arrays go along with the tasks, not the BVH or the texture
+        assert len(pickle.dumps(shared.spec())) < 4096
+        copy, arrays = voxel_parallel.SharedObject.attach(shared.spec())
+        positions = np.random.default_rng(0).uniform(vertices.min(axis=0), vertices.max(axis=0), (500, 3))
+        assert type(copy.bvh) is type(sampler.bvh) and copy.channels == 4
+        assert np.array_equal(copy(positions), sampler(positions))
+        del copy
+        for array in arrays:
+            array.close()
+    finally:
+        shared.close()
+
+
+def test_cancel_while_sampling(always_parallel):
+    positions = np.zeros((1 << 17, 3))
+    # start the processes first, so only the sampling is measured
+    voxel_parallel.sample_colors(positions[:512], SlowSampler(0.0), workers=2)
+    cancel_at = time.perf_counter() + 0.3
+    progress = voxel_profile.ProgressReporter(cancelled=lambda: time.perf_counter() > cancel_at, interval=0.01)
+    with pytest.raises(voxel_profile.ProgressCancelled):
+        # every task of 256 positions takes 0.05 seconds, and all of them together 6.5 seconds
+        voxel_parallel.sample_colors(positions, SlowSampler(2e-4), workers=2, progress=progress)
+    # only the running tasks are waited for
+    assert time.perf_counter() - cancel_at < 0.5
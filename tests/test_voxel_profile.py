@@ -0,0 +1,81 @@
+import threading
+import time
+import voxel_profile
+
+
+def test_depth_is_counted_per_thread():
+    profiler = voxel_profile.Profiler()
+    inside = threading.Barrier(2)
+
+    def work(name):
+        with profiler.stage(name):
+            # both threads are in their outer stage at the same time
+            inside.wait()
+            with profiler.stage(f'{name} inner'):
+                inside.wait()
+
+    threads = [threading.Thread(target=work, args=[name]) for name in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    depths = {name: depth for name, _, _, depth, _ in profiler.events}
+    assert depths == {'a': 0, 'b': 0, 'a inner': 1, 'b inner': 1}
+    assert len({thread for _, _, _, _, thread in profiler.events}) == 2
+
+
+def test_counts_from_many_threads_add_up():
+    profiler = voxel_profile.Profiler()
+
+    def work():
+        for _ in range(1000):
+            profiler.count('items')
+            with profiler.stage('step'):
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiler.counters['items'] == 4000
+    assert profiler.stages['step'][0] == 4000 and len(profiler.events) == 4000
+
+
+def test_merge_keeps_the_events_in_place():
+    window = voxel_profile.Profiler()
+    job = voxel_profile.Profiler()
+    with job.stage('voxelize'):
+        job.count('cells scanned', 8)
+    time.sleep(0.01)
+    window.reset()
+    with window.stage('create voxels'):
+        window.count('cells scanned', 2)
+    window.merge(job)
+
+    assert window.counters == {'cells scanned': 10}
+    assert set(window.stages) == {'create voxels', 'voxelize'}
+    events = {name: start for name, start, _, _, _ in window.events}
+    # the job started before the window was reset, so its event comes first and none of them start before zero
+    assert 0 <= events['voxelize'] < events['create voxels']
+    assert events['create voxels'] >= 0.01
+
+
+def test_merge_captures():
+    window = voxel_profile.Profiler(capture=True)
+    job = voxel_profile.Profiler(capture=True)
+
+    def color(profiler):
+        with profiler.stage('color'):
+            sum(range(1000))
+
+    thread = threading.Thread(target=color, args=[job])
+    thread.start()
+    thread.join()
+    color(job)
+    color(job)
+    color(window)
+    window.merge(job)
+    # every thread captures into its own cProfile, and all of them are summed up per stage
+    assert len(window.profiles['color']) == 3
+    assert 'color' in window.to_dict()['profiles']
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+import voxel_grid
+import voxel_pyramid
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    vertices, faces = voxel_benchmark.sphere_mesh(24)[:2]
+    occupancy, origin, voxel_size = voxel_engine.voxelize(vertices, faces, 40)
+    grid = voxel_grid.VoxelGrid.from_occupancy(voxel_engine.fill_cells(occupancy, 'solid'), origin, voxel_size)
+    grid.colors = np.random.default_rng(0).integers(0, 256, (len(grid), 3), dtype=np.uint8)
+    return grid, [vertices.min(axis=0), vertices.max(axis=0)]
+
+
+def assert_same_grid(grid, expected):
+    assert grid.shape == expected.shape and grid.voxel_size == expected.voxel_size
+    assert np.array_equal(grid.origin, expected.origin)
+    assert np.array_equal(grid.cells, expected.cells)
+    assert np.array_equal(grid.colors, expected.colors)
+
+
+def block_average(grid, factor):
+    """
+    :return: [occupancy, average color, amount of voxels] of every factor x factor x factor block, from dense arrays
+    """
+    shape = [-(-s // factor) * factor for s in grid.shape]
+    counts = np.zeros(shape)
+    sums = np.zeros(shape + [3])
+    counts[tuple(grid.cells.T)] = 1
+    sums[tuple(grid.cells.T)] = grid.colors
+
+    def blocks(values):
+        values = values.reshape(shape[0] // factor, factor, shape[1] // factor, factor, shape[2] // factor, factor,
+                                *values.shape[3:])
+        return values.sum(axis=(1, 3, 5))
+
+    counts = blocks(counts)
+    averages = blocks(sums) / np.maximum(counts, 1)[..., None]
+    return [counts > 0, np.rint(averages).astype(np.uint8), counts]
+
+
+@pytest.mark.parametrize('rule', voxel_pyramid.DOWNSAMPLE_RULES)
+def test_levels_equal_direct_resample(sphere, rule):
+    grid, bounds = sphere
+    pyramid = voxel_pyramid.VoxelPyramid(grid, 40, bounds, rule=rule)
+    assert_same_grid(pyramid.levels[0], grid)
+    assert max(pyramid.levels[-1].shape) == 1
+    for level in range(1, len(pyramid.levels)):
+        factor = 2 ** level
+        shape = [-(-s // factor) for s in grid.shape]
+        expected = voxel_pyramid.resample(grid, grid.origin, grid.voxel_size * factor, shape, rule)
+        assert_same_grid(pyramid.levels[level], expected)
+        # which is every block of the grid with voxels in it, with their average color
+        occupancy, colors, counts = block_average(grid, factor)
+        if rule == 'majority':
+            occupancy = counts > factor ** 3 / 2
+        coarse = pyramid.levels[level]
+        assert np.array_equal(coarse.cells, np.argwhere(occupancy))
+        assert np.array_equal(coarse.colors, colors[occupancy])
+
+
+def test_grid_for_density_resamples_the_closest_finer_level(sphere):
+    grid, bounds = sphere
+    pyramid = voxel_pyramid.VoxelPyramid(grid, 40, bounds)
+    assert pyramid.grid_for_density(40) is grid and pyramid.grid_for_density(80) is grid
+    for density in [39, 25, 20, 13, 10, 7, 3, 1]:
+        level = pyramid.level_for_density(density)
+        # the coarsest level that is still at least as fine as the density
+        assert 40 / 2 ** level >= density and (level == len(pyramid.levels) - 1 or 40 / 2 ** (level + 1) < density)
+        origin, voxel_size, shape = voxel_engine.grid_for_bounds(bounds[0], bounds[1], density)
+        derived = pyramid.grid_for_density(density)
+        assert_same_grid(derived, voxel_pyramid.resample(pyramid.levels[level], origin, voxel_size, shape))
+        # placed like a grid voxelized at that density
+        assert derived.shape == tuple(shape) and np.allclose(derived.origin, origin)
+
+
+def test_unknown_rule(sphere):
+    with pytest.raises(ValueError, match='Unknown downsample rule'):
+        voxel_pyramid.downsample(sphere[0], 2, 'median')
+
+
+def test_octree_round_trip(sphere):
+    grid = sphere[0]
+    # one color, so the inside of the sphere collapses into big leaves
+    grid = voxel_grid.VoxelGrid(grid.cells, grid.origin, grid.voxel_size, grid.shape,
+                                np.full((len(grid), 3), 90, dtype=np.uint8))
+    octree = voxel_pyramid.SparseOctree(grid)
+    assert len(octree) < len(grid) / 4
+    expanded = octree.to_grid()
+    order = np.lexsort(expanded.cells.T[::-1])
+    assert np.array_equal(expanded.cells[order], grid.cells)
+    assert (expanded.colors == 90).all()
+    # with a color per voxel nothing can collapse
+    octree = voxel_pyramid.SparseOctree(sphere[0])
+    assert len(octree) == len(grid) and len(octree.levels) == 1
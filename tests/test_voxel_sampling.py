@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import voxel_benchmark
+import voxel_engine
+import voxel_grid
+import voxel_sampling
+
+
+@pytest.fixture(scope='module')
+def sphere():
+    vertices, faces, corner_uvs = voxel_benchmark.sphere_mesh(24)
+    # no white in the texture, so a voxel left white stands out
+    image = voxel_benchmark.noise_texture(64, 8) // 2
+    return vertices, faces, corner_uvs, image
+
+
+def filled_grid(vertices, faces, density, fill):
+    surface, origin, voxel_size = voxel_engine.voxelize(vertices, faces, density)
+    grid = voxel_grid.VoxelGrid.from_occupancy(voxel_engine.fill_cells(surface, fill), origin, voxel_size)
+    touched = surface[tuple(grid.cells.T)]
+    return grid, touched
+
+
+def test_solid_fill_has_no_white_voxels(sphere):
+    vertices, faces, corner_uvs, image = sphere
+    grid, touched = filled_grid(vertices, faces, 24, 'solid')
+    assert (~touched).sum() > 1000
+    colors = voxel_sampling.sample_mesh_colors(grid, vertices, faces, corner_uvs, image)
+    assert not (colors == 255).all(axis=1).any()
+
+    # the surface takes the color of the closest point on the mesh, the same as without a limit on the distance
+    closest = voxel_sampling.mesh_color_sampler(vertices, faces, corner_uvs, image)(grid.positions()[touched])
+    assert np.array_equal(colors[touched], closest)
+    # and the inside takes after the surface
+    surface_colors = {tuple(color) for color in colors[touched]}
+    assert all(tuple(color) in surface_colors for color in colors[~touched])
+
+
+def test_inside_takes_after_nearby_surface():
+    # a solid box that only knows its outer layer
+    cells = np.stack(np.meshgrid(*[np.arange(8)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    grid = voxel_grid.VoxelGrid(cells, np.zeros(3), 1.0, (8, 8, 8))
+    known = ((grid.cells == 0) | (grid.cells == 7)).any(axis=1)
+    sources = voxel_sampling.spread_sources(grid, known)
+    assert (sources >= 0).all() and known[sources].all()
+    assert np.array_equal(sources[known], np.flatnonzero(known))
+    # every voxel takes after a surface voxel as few steps away as the closest one
+    steps = np.abs(grid.cells - grid.cells[sources]).sum(axis=1)
+    depth = np.minimum(grid.cells, 7 - grid.cells).min(axis=1)
+    assert np.array_equal(steps, depth)
+
+
+def test_unreachable_voxels_stay_unknown():
+    grid = voxel_grid.VoxelGrid(np.array([[0, 0, 0], [1, 0, 0], [5, 5, 5]]), np.zeros(3), 1.0, (8, 8, 8))
+    sources = voxel_sampling.spread_sources(grid, np.array([True, False, False]))
+    assert sources.tolist() == [0, 0, -1]
+
+
+def test_closest_surface_points_of_solid_fill(sphere):
+    vertices, faces = sphere[:2]
+    grid, touched = filled_grid(vertices, faces, 24, 'solid')
+    triangles, weights = voxel_sampling.closest_surface_points(grid, vertices, faces)
+    assert (triangles >= 0).all()
+    assert np.allclose(weights.sum(axis=1), 1)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import voxel_texture
+
+
+def sample_atlas(image, uvs):
+    # looks up the pixel under each UV the way a renderer does, with v going up
+    height, width = image.shape[:2]
+    x = np.floor(uvs[:, 0] * width).astype(np.int64)
+    y = np.floor((1 - uvs[:, 1]) * height).astype(np.int64)
+    return image[y, x]
+
+
+def test_tile_uvs_square():
+    uvs = voxel_texture.tile_uvs(2, 2, 4)
+    assert np.allclose(uvs, [[0.25, 0.75], [0.75, 0.75], [0.25, 0.25], [0.75, 0.25]])
+
+
+def test_tile_uvs_non_square():
+    # 4 columns and 2 rows: tiles are 1/4 wide and 1/2 high
+    uvs = voxel_texture.tile_uvs(4, 2, 6)
+    assert np.allclose(uvs[:, 0], [0.125, 0.375, 0.625, 0.875, 0.125, 0.375])
+    assert np.allclose(uvs[:, 1], [0.75, 0.75, 0.75, 0.75, 0.25, 0.25])
+
+
+def test_tile_uvs_one_tile():
+    assert np.allclose(voxel_texture.tile_uvs(1, 1, 1), [[0.5, 0.5]])
+
+
+@pytest.mark.parametrize('layout', voxel_texture.TEXTURE_LAYOUTS)
+@pytest.mark.parametrize('color_count', [1, 2, 3, 5, 7, 17, 40])
+@pytest.mark.parametrize('padding', [0, 2])
+def test_uvs_land_at_tile_centers(layout, color_count, padding):
+    palette = np.random.default_rng(color_count).integers(0, 256, (color_count, 3), dtype=np.uint8)
+    tile_size = 4
+    image, uv_table = voxel_texture.build_atlas(palette, tile_size, layout, padding)
+    columns, rows = voxel_texture.atlas_layout(color_count, layout)
+    height, width = image.shape[:2]
+    assert height % rows == 0 and width % columns == 0
+    pitch_y = height // rows
+    pitch_x = width // columns
+    # the center of the tile in pixels, which sits in the middle of a pixel for odd pitches and between two for even
+    ids = np.arange(color_count)
+    assert np.allclose(uv_table[:, 0] * width, (ids % columns) * pitch_x + pitch_x / 2)
+    assert np.allclose((1 - uv_table[:, 1]) * height, (ids // columns) * pitch_y + pitch_y / 2)
+    assert np.array_equal(sample_atlas(image, uv_table), palette)
+
+
+def test_one_tile_palette():
+    image, uv_table = voxel_texture.build_atlas([[10, 20, 30]], 8)
+    assert image.shape == (8, 8, 3)
+    assert np.allclose(uv_table, [[0.5, 0.5]])
+    assert np.array_equal(sample_atlas(image, uv_table), [[10, 20, 30]])
+
+
+def test_non_square_atlas():
+    # the compact layout of 5 colors is 3 columns by 2 rows
+    palette = np.arange(15, dtype=np.uint8).reshape(5, 3) * 10
+    image, uv_table = voxel_texture.build_atlas(palette, 2, 'compact')
+    assert image.shape == (4, 6, 3)
+    assert np.allclose(uv_table, [[1 / 6, 0.75], [0.5, 0.75], [5 / 6, 0.75], [1 / 6, 0.25], [0.5, 0.25]])
+    assert np.array_equal(sample_atlas(image, uv_table), palette)
+
+
+def test_face_uvs():
+    uv_table = voxel_texture.tile_uvs(3, 2, 5)
+    face_color_ids = np.array([4, 0, 2])
+    face_counts = np.array([4, 3, 4])
+    u, v, uv_ids = voxel_texture.face_uvs(face_color_ids, face_counts, uv_table)
+    assert np.array_equal(u, uv_table[:, 0]) and np.array_equal(v, uv_table[:, 1])
+    assert np.array_equal(uv_ids, [4, 4, 4, 4, 0, 0, 0, 2, 2, 2, 2])
+    # every face vertex lands at the center of the tile of its face color
+    corners = np.stack([u[uv_ids], v[uv_ids]], axis=1)
+    assert np.allclose(corners, np.repeat(uv_table[face_color_ids], face_counts, axis=0))
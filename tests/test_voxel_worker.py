@@ -0,0 +1,196 @@
+import threading
+import time
+import pytest
+import voxel_worker
+
+
+class Recorder(object):
+    # keeps what the main thread callbacks of a job got, in the order they got it
+    def __init__(self):
+        self.committed = []
+        self.partials = []
+        self.finished = []
+
+    def commit(self, result):
+        self.committed.append(result)
+
+    def partial(self, kind, value):
+        self.partials.append([kind, value])
+
+    def finish(self, job):
+        self.finished.append(job.state)
+
+
+def start_job(compute, recorder, commit=None):
+    executor = voxel_worker.ManualExecutor()
+    job = voxel_worker.BackgroundJob(compute, commit or recorder.commit, executor, recorder.partial, recorder.finish,
+                                     interval=0.01)
+    return job.start(), executor
+
+
+def run_until_over(job, executor, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while job.active and time.perf_counter() < end:
+        job.wait(0.01)
+        executor.run_pending()
+    assert not job.active
+
+
+def test_result_gets_committed():
+    recorder = Recorder()
+
+    def compute(progress, emit):
+        emit('voxels', 8)
+        return 'grid'
+
+    job, executor = start_job(compute, recorder)
+    run_until_over(job, executor)
+    assert job.state == 'done'
+    assert recorder.committed == ['grid']
+    assert recorder.partials == [['voxels', 8]]
+    assert recorder.finished == ['done']
+
+
+def test_cancel_while_computing():
+    recorder = Recorder()
+    started = threading.Event()
+
+    def compute(progress, emit):
+        progress.begin(10 ** 6, 'items')
+        started.set()
+        for _ in range(10 ** 6):
+            time.sleep(0.001)
+            progress.advance()
+        return 'grid'
+
+    job, executor = start_job(compute, recorder)
+    assert started.wait(5)
+    job.cancel()
+    run_until_over(job, executor)
+    assert job.state == 'cancelled'
+    # the worker stops at its next report, the interval plus one step later
+    assert job.cancel_latency is not None and job.cancel_latency < 0.5
+    assert recorder.committed == []
+    assert recorder.finished == ['cancelled']
+
+
+def test_cancelled_result_never_gets_committed():
+    recorder = Recorder()
+    job, executor = start_job(lambda progress, emit: 'grid', recorder)
+    assert job.wait(5)
+    # the worker is done and its commit is queued, but the main thread hasn't run it yet
+    assert len(executor) == 1
+    job.cancel()
+    executor.run_pending()
+    assert job.state == 'cancelled'
+    assert recorder.committed == []
+    assert recorder.finished == ['cancelled']
+
+
+def test_compute_error_fails_the_job():
+    recorder = Recorder()
+
+    def compute(progress, emit):
+        raise ValueError('no triangles')
+
+    job, executor = start_job(compute, recorder)
+    run_until_over(job, executor)
+    assert job.state == 'failed'
+    assert isinstance(job.error, ValueError)
+    assert 'ValueError: no triangles' in job.traceback
+    assert recorder.committed == []
+    assert recorder.finished == ['failed']
+
+
+def test_commit_error_fails_the_job():
+    recorder = Recorder()
+
+    def commit(result):
+        raise RuntimeError(f'{result} was deleted')
+
+    job, executor = start_job(lambda progress, emit: 'grid', recorder, commit)
+    run_until_over(job, executor)
+    assert job.state == 'failed'
+    assert isinstance(job.error, RuntimeError)
+    assert 'RuntimeError: grid was deleted' in job.traceback
+    assert recorder.finished == ['failed']
+
+
+def test_partial_results_dropped_after_cancel():
+    recorder = Recorder()
+    emitted = threading.Event()
+    release = threading.Event()
+
+    def compute(progress, emit):
+        emit('voxels', 8)
+        emit('message', 'cache miss')
+        emitted.set()
+        release.wait(5)
+        return 'grid'
+
+    job, executor = start_job(compute, recorder)
+    assert emitted.wait(5)
+    # both partial results are queued for the main thread, and the job gets cancelled before they run
+    assert len(executor) == 2
+    job.cancel()
+    release.set()
+    run_until_over(job, executor)
+    assert recorder.partials == []
+    assert recorder.committed == []
+    assert recorder.finished == ['cancelled']
+
+
+def test_no_partial_results_sent_after_cancel():
+    recorder = Recorder()
+    cancelled = threading.Event()
+
+    def compute(progress, emit):
+        cancelled.wait(5)
+        emit('voxels', 8)
+        return 'grid'
+
+    job, executor = start_job(compute, recorder)
+    job.cancel()
+    cancelled.set()
+    assert job.wait(5)
+    # only the finishing call is queued
+    assert len(executor) == 1
+    run_until_over(job, executor)
+    assert recorder.partials == []
+
+
+@pytest.mark.parametrize('outcome', ['done', 'failed', 'cancelled'])
+def test_finished_called_once(outcome):
+    recorder = Recorder()
+
+    def compute(progress, emit):
+        if outcome == 'failed':
+            raise ValueError(outcome)
+        return outcome
+
+    job, executor = start_job(compute, recorder)
+    if outcome == 'cancelled':
+        job.wait(5)
+        job.cancel()
+    run_until_over(job, executor)
+    # cancelling again once it is over, and running the executor again, change nothing
+    job.cancel()
+    executor.run_pending()
+    assert job.state == outcome
+    assert recorder.finished == [outcome]
+    assert job.cancel_latency is None or outcome == 'cancelled'
+
+
+def test_manual_executor_runs_in_order():
+    executor = voxel_worker.ManualExecutor()
+    calls = []
+    for index in range(3):
+        executor(calls.append, index)
+    assert executor.run_pending(limit=2) == 2
+    assert calls == [0, 1] and len(executor) == 1
+    # calls queued while running wait for the next time
+    executor(lambda: executor(calls.append, 'later'))
+    assert executor.run_pending() == 2
+    assert calls == [0, 1, 2] and len(executor) == 1
+    executor.run_pending()
+    assert calls == [0, 1, 2, 'later']
@@ -0,0 +1,404 @@
+# Voxelizes deforming meshes over a range of frames and stores them as a sequence file. Only the chunks that moving
+# triangles pass through are voxelized again every frame, and every frame is stored as the voxels that were added,
+# removed or changed color since the frame before, with a full keyframe every so often to seek to. Only requires
+# numpy.
+import math
+import os
+import struct
+import time
+import zlib
+import numpy as np
+import voxel_engine
+import voxel_grid
+import voxel_sampling
+
+
+SEQUENCE_MAGIC = b'VXSQ'
+SEQUENCE_VERSION = 1
+SEQUENCE_EXTENSION = '.vxs'
+# every this many frames the whole frame is stored, so seeking never has to apply more deltas than this
+KEYFRAME_INTERVAL = 24
+# amount of cells along each side of the chunks that get voxelized again when a triangle in them moves
+ANIMATION_CHUNK_SIZE = 16
+
+FRAME_KEY = 0
+FRAME_DELTA = 1
+
+# magic, version, shape, origin, voxel size, keyframe interval
+_HEADER = struct.Struct('<4sI3I3ddI')
+# kind, size of the compressed frame
+_FRAME = struct.Struct('<BI')
+# index offset, amount of frames, magic
+_TRAILER = struct.Struct('<QI4s')
+
+
+def _pack_keys(keys):
+    """
+    :param keys: sorted int64 array of flat cell indices
+    :return: bytes with the amount of keys and the gaps between them, which compress a lot better than the keys
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    return struct.pack('<Q', len(keys)) + np.diff(keys, prepend=0).astype('<i8').tobytes()
+
+
+def _unpack_keys(data, offset: int):
+    """
+    :param data: bytes written by _pack_keys
+    :param offset: position of the keys in data
+    :return: [sorted int64 array of flat cell indices, position after the keys]
+    """
+    count = struct.unpack_from('<Q', data, offset)[0]
+    offset += 8
+    keys = np.cumsum(np.frombuffer(data, dtype='<i8', count=count, offset=offset)).astype(np.int64)
+    return [keys, offset + 8 * count]
+
+
+def _unpack_colors(data, offset: int, count: int):
+    """
+    :return: [uint8 array (count, 3), position after the colors]
+    """
+    colors = np.frombuffer(data, dtype=np.uint8, count=count * 3, offset=offset).reshape(-1, 3)
+    return [colors, offset + count * 3]
+
+
+def frame_delta(keys, colors, new_keys, new_colors):
+    """
+    Compares two frames.
+    :param keys: sorted int64 array of the flat cell indices of the voxels of the previous frame
+    :param colors: uint8 array (N, 3) of the previous frame
+    :param new_keys: sorted int64 array of the flat cell indices of the voxels of the new frame
+    :param new_colors: uint8 array (M, 3) of the new frame
+    :return: [removed keys, added keys, colors of the added voxels, recolored keys, new colors of the recolored voxels]
+    """
+    position = np.minimum(np.searchsorted(keys, new_keys), max(len(keys) - 1, 0))
+    kept = (keys[position] == new_keys) if len(keys) else np.zeros(len(new_keys), dtype=bool)
+    recolored = kept.copy()
+    recolored[kept] = (colors[position[kept]] != new_colors[kept]).any(axis=1)
+    removed = np.ones(len(keys), dtype=bool)
+    removed[position[kept]] = False
+    return [keys[removed], new_keys[~kept], new_colors[~kept], new_keys[recolored], new_colors[recolored]]
+
+
+def apply_delta(keys, colors, removed, added, added_colors, recolored, recolors):
+    """
+    Applies the result of frame_delta to the previous frame.
+    :return: [sorted keys, colors] of the new frame
+    """
+    keep = ~np.isin(keys, removed, assume_unique=True)
+    keys = np.concatenate([keys[keep], added])
+    colors = np.concatenate([colors[keep], added_colors])
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    colors = colors[order]
+    colors[np.searchsorted(keys, recolored)] = recolors
+    return [keys, colors]
+
+
+class SequenceWriter(object):
+    def __init__(self, file_path: str, shape, origin, voxel_size: float, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        Writes the frames of a voxel sequence one after the other.
+        :param file_path: path of the sequence file
+        :param shape: amount of cells along x, y and z, the same for every frame
+        :param origin: world position of the corner of cell (0, 0, 0)
+        :param voxel_size: edge length of a single voxel
+        :param keyframe_interval: amount of frames from one full frame to the next
+        """
+        self.shape = tuple(int(s) for s in shape)
+        self.keyframe_interval = max(int(keyframe_interval), 1)
+        self.file = open(file_path, 'wb')
+        self.file.write(_HEADER.pack(SEQUENCE_MAGIC, SEQUENCE_VERSION, *self.shape,
+                                     *np.asarray(origin, dtype=np.float64).reshape(3).tolist(), float(voxel_size),
+                                     self.keyframe_interval))
+        self.offsets = []
+        self.kinds = []
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+
+    def write_frame(self, keys, colors):
+        """
+        :param keys: sorted int64 array of the flat cell indices of the voxels, see voxel_grid.VoxelGrid.cell_keys
+        :param colors: uint8 array (N, 3)
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        if len(self.offsets) % self.keyframe_interval == 0:
+            kind = FRAME_KEY
+            data = _pack_keys(keys) + colors.tobytes()
+        else:
+            kind = FRAME_DELTA
+            removed, added, added_colors, recolored, recolors = frame_delta(self.keys, self.colors, keys, colors)
+            data = (_pack_keys(removed) + _pack_keys(added) + added_colors.tobytes() + _pack_keys(recolored) +
+                    recolors.tobytes())
+        data = zlib.compress(data, 6)
+        self.offsets.append(self.file.tell())
+        self.kinds.append(kind)
+        self.file.write(_FRAME.pack(kind, len(data)))
+        self.file.write(data)
+        self.keys = keys
+        self.colors = colors
+
+    def nbytes(self):
+        """
+        :return: amount of bytes written so far
+        """
+        return self.file.tell()
+
+    def close(self):
+        """
+        Writes the index of the frames and closes the file.
+        """
+        if self.file is None:
+            return
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.offsets, dtype='<u8').tobytes())
+        self.file.write(np.array(self.kinds, dtype=np.uint8).tobytes())
+        self.file.write(_TRAILER.pack(index_offset, len(self.offsets), SEQUENCE_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class SequenceReader(object):
+    def __init__(self, file_path: str):
+        """
+        Reads the frames of a voxel sequence in any order. Reading the frames in order only applies one delta per frame,
+        any other frame starts from the closest keyframe before it.
+        :param file_path: path of the sequence file
+        """
+        self.file = open(file_path, 'rb')
+        header = self.file.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:4] != SEQUENCE_MAGIC:
+            self.file.close()
+            raise ValueError(f"'{file_path}' is not a voxel sequence")
+        values = _HEADER.unpack(header)
+        if values[1] > SEQUENCE_VERSION:
+            self.file.close()
+            raise ValueError(f"'{file_path}' was written by a newer version, version {values[1]}")
+        self.shape = tuple(values[2:5])
+        self.origin = np.array(values[5:8], dtype=np.float64)
+        self.voxel_size = values[8]
+        self.keyframe_interval = values[9]
+
+        self.file.seek(-_TRAILER.size, os.SEEK_END)
+        index_offset, frame_count, magic = _TRAILER.unpack(self.file.read(_TRAILER.size))
+        if magic != SEQUENCE_MAGIC:
+            self.file.close()
+            raise ValueError(f"'{file_path}' was not closed properly")
+        self.file.seek(index_offset)
+        self.offsets = np.frombuffer(self.file.read(8 * frame_count), dtype='<u8').astype(np.int64)
+        self.kinds = np.frombuffer(self.file.read(frame_count), dtype=np.uint8)
+        self.frame = -1
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def close(self):
+        self.file.close()
+
+    def _read(self, frame: int):
+        """
+        :return: [kind, uncompressed data] of the frame
+        """
+        self.file.seek(int(self.offsets[frame]))
+        kind, size = _FRAME.unpack(self.file.read(_FRAME.size))
+        return [kind, zlib.decompress(self.file.read(size))]
+
+    def read_frame(self, frame: int):
+        """
+        :param frame: index of the frame, from 0 to len(self) - 1
+        :return: [sorted int64 array of the flat cell indices of the voxels, uint8 array (N, 3) of their colors]
+        """
+        if not 0 <= frame < len(self):
+            raise IndexError(f"Frame {frame} is outside of the {len(self)} frames of the sequence")
+        start = self.frame + 1
+        # start from the closest keyframe, unless the frame we are at is closer
+        keyframe = int(np.flatnonzero(self.kinds[:frame + 1] == FRAME_KEY)[-1])
+        if not keyframe <= self.frame < frame:
+            start = keyframe
+        for current in range(start, frame + 1):
+            kind, data = self._read(current)
+            if kind == FRAME_KEY:
+                self.keys, offset = _unpack_keys(data, 0)
+                self.colors = _unpack_colors(data, offset, len(self.keys))[0].copy()
+            else:
+                removed, offset = _unpack_keys(data, 0)
+                added, offset = _unpack_keys(data, offset)
+                added_colors, offset = _unpack_colors(data, offset, len(added))
+                recolored, offset = _unpack_keys(data, offset)
+                recolors = _unpack_colors(data, offset, len(recolored))[0]
+                self.keys, self.colors = apply_delta(self.keys, self.colors, removed, added, added_colors, recolored,
+                                                     recolors)
+        self.frame = frame
+        return [self.keys, self.colors]
+
+    def read_grid(self, frame: int):
+        """
+        :param frame: index of the frame
+        :return: VoxelGrid of the frame
+        """
+        keys, colors = self.read_frame(frame)
+        cells = np.stack(np.unravel_index(keys, self.shape), axis=1)
+        return voxel_grid.VoxelGrid(cells, self.origin, self.voxel_size, self.shape, colors)
+
+
+class AnimatedVoxelizer(object):
+    def __init__(self, faces, origin, voxel_size: float, shape, chunk_size=ANIMATION_CHUNK_SIZE):
+        """
+        Voxelizes the frames of a deforming mesh on a grid that stays the same over all frames. Between frames only the
+        chunks that moved triangles were in or are in now get voxelized again.
+        :param faces: int array (T, 3) of vertex indices per triangle, the same for every frame
+        :param origin: world position of the corner of cell (0, 0, 0)
+        :param voxel_size: edge length of a single voxel
+        :param shape: amount of cells along x, y and z
+        :param chunk_size: amount of cells along each side of a chunk
+        """
+        self.faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(3)
+        self.voxel_size = float(voxel_size)
+        self.shape = tuple(int(s) for s in shape)
+        self.chunk_size = int(chunk_size)
+        self.chunk_counts = np.array([-(-s // self.chunk_size) for s in self.shape], dtype=np.int64)
+        self.occupancy = np.zeros(self.shape, dtype=bool)
+        self.triangles = None
+        self.previous_triangles = None
+        self.moved = np.zeros(0, dtype=bool)
+        self.nearby = np.zeros(0, dtype=np.int64)
+
+    def _chunk_ranges(self, triangles):
+        """
+        :param triangles: float array (T, 3, 3) of triangle corners
+        :return: [lowest chunk, highest chunk] each triangle touches. Triangles are grown by a cell on every side, so
+        the voxels whose closest point is on a moved triangle are always in a chunk that gets updated
+        """
+        cells = (triangles - self.origin) / self.voxel_size
+        limit = self.chunk_counts - 1
+        low = np.clip(np.floor(cells.min(axis=1) - 1).astype(np.int64) // self.chunk_size, 0, limit)
+        high = np.clip(np.floor(cells.max(axis=1) + 1).astype(np.int64) // self.chunk_size, 0, limit)
+        return [low, high]
+
+    def _flat_chunks(self, chunk_keys):
+        return (chunk_keys[:, 0] * self.chunk_counts[1] + chunk_keys[:, 1]) * self.chunk_counts[2] + chunk_keys[:, 2]
+
+    def voxelize_frame(self, vertices):
+        """
+        Updates the occupancy to the given frame.
+        :param vertices: float array (V, 3) of the world space vertex positions of the frame
+        :return: sorted int64 array of the flat indices of the chunks that were voxelized again
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        triangles = vertices[self.faces]
+        if self.triangles is None:
+            moved = np.ones(len(triangles), dtype=bool)
+            ranges = [self._chunk_ranges(triangles)]
+        else:
+            moved = (triangles != self.triangles).any(axis=(1, 2))
+            ranges = [self._chunk_ranges(self.triangles[moved]), self._chunk_ranges(triangles[moved])]
+        dirty = np.unique(np.concatenate([self._flat_chunks(voxel_engine._candidate_pairs(low, high)[1])
+                                          for low, high in ranges]))
+
+        # only the triangles near the dirty chunks can add voxels to them, and every voxel they add outside of the
+        # dirty chunks belongs to a triangle that didn't move and is already there
+        tri_index, chunk_keys = voxel_engine._candidate_pairs(*self._chunk_ranges(triangles))
+        self.nearby = np.unique(tri_index[np.isin(self._flat_chunks(chunk_keys), dirty)])
+        for chunk in dirty.tolist():
+            low = np.array(np.unravel_index(chunk, tuple(self.chunk_counts))) * self.chunk_size
+            self.occupancy[tuple(slice(l, l + self.chunk_size) for l in low.tolist())] = False
+        region = [np.zeros(3, dtype=np.int64), np.array(self.shape, dtype=np.int64)]
+        for _, hit_cells in voxel_engine._surface_hits(vertices, self.faces[self.nearby], self.origin,
+                                                       self.voxel_size, self.shape, region):
+            hit_cells = hit_cells[np.isin(self._flat_chunks(hit_cells // self.chunk_size), dirty)]
+            self.occupancy[hit_cells[:, 0], hit_cells[:, 1], hit_cells[:, 2]] = True
+        self.previous_triangles = self.triangles
+        self.moved = moved
+        self.triangles = triangles
+        return dirty
+
+    def near_moved(self, keys):
+        """
+        :param keys: int64 array of flat cell indices
+        :return: bool array that is True for the cells whose center is within half a voxel diagonal of a triangle that
+        moved in the last frame, at its old or its new position. Only those voxels can have a different closest point
+        than before
+        """
+        reach = math.sqrt(3) / 2
+        near = np.zeros(int(np.prod(self.shape)), dtype=bool)
+        for triangles in (self.previous_triangles, self.triangles):
+            if triangles is None:
+                continue
+            # cells with their center in the bounds of the triangle grown by the reach
+            cells = (triangles[self.moved] - self.origin) / self.voxel_size - 0.5
+            low = np.clip(np.ceil(cells.min(axis=1) - reach).astype(np.int64), 0, np.array(self.shape) - 1)
+            high = np.clip(np.floor(cells.max(axis=1) + reach).astype(np.int64), 0, np.array(self.shape) - 1)
+            cells = voxel_engine._candidate_pairs(low, np.maximum(high, low))[1]
+            near[(cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]] = True
+        return near[keys]
+
+
+def voxelize_animation(frames, faces, bounds, density: int, file_path: str, padding=1.1, corner_uvs=None, image=None,
+                       vertex_colors=None, filtering='nearest', keyframe_interval=KEYFRAME_INTERVAL,
+                       chunk_size=ANIMATION_CHUNK_SIZE, progress=None, frame_count=0):
+    """
+    Voxelizes every frame of a deforming mesh into a sequence file.
+    :param frames: iterable of float arrays (V, 3) with the world space vertex positions of every frame
+    :param faces: int array (T, 3) of vertex indices per triangle, the same for every frame
+    :param bounds: [bbox_min, bbox_max] of the mesh over all frames, so every frame fits on the same grid
+    :param density: amount of voxels along the longest side of the bounds
+    :param file_path: path of the sequence file
+    :param padding: how much bigger the grid is than the bounds
+    :param corner_uvs: float array (T, 3, 2) with the UV of every corner of every triangle, used with image
+    :param image: uint8 array (H, W, 3) of the texture, or None
+    :param vertex_colors: uint8 array (V, 3), used when there is no texture
+    :param filtering: one of voxel_sampling.FILTERING_MODES
+    :param keyframe_interval: amount of frames from one full frame to the next
+    :param chunk_size: amount of cells along each side of the chunks that get voxelized again
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every frame, or None
+    :param frame_count: amount of frames, only used to show the progress
+    :return: dictionary with the amount of frames, seconds, frames per second, file size in bytes, and the average
+    fraction of chunks voxelized per frame
+    """
+    origin, voxel_size, shape = voxel_engine.grid_for_bounds(bounds[0], bounds[1], density, padding)
+    voxelizer = AnimatedVoxelizer(faces, origin, voxel_size, shape, chunk_size)
+    writer = SequenceWriter(file_path, shape, origin, voxel_size, keyframe_interval)
+    colored = image is not None or vertex_colors is not None
+    keys = np.zeros(0, dtype=np.int64)
+    colors = np.zeros((0, 3), dtype=np.uint8)
+    dirty_fraction = 0.0
+    start = time.perf_counter()
+    if progress is not None:
+        progress.begin(frame_count, 'frames')
+    try:
+        for vertices in frames:
+            dirty = voxelizer.voxelize_frame(vertices)
+            dirty_fraction += len(dirty) / np.prod(voxelizer.chunk_counts)
+            new_keys = np.flatnonzero(voxelizer.occupancy)
+
+            # voxels away from the moved triangles keep their color, new voxels and the ones near them are sampled
+            # again, from the triangles near the dirty chunks only
+            new_colors = np.full((len(new_keys), 3), 255, dtype=np.uint8)
+            if colored:
+                position = np.minimum(np.searchsorted(keys, new_keys), max(len(keys) - 1, 0))
+                kept = (keys[position] == new_keys) if len(keys) else np.zeros(len(new_keys), dtype=bool)
+                new_colors[kept] = colors[position[kept]]
+                update = ~kept | voxelizer.near_moved(new_keys)
+                if update.any():
+                    cells = np.stack(np.unravel_index(new_keys[update], shape), axis=1)
+                    grid = voxel_grid.VoxelGrid(cells, origin, voxel_size, shape)
+                    nearby = voxelizer.nearby
+                    new_colors[update] = voxel_sampling.sample_mesh_colors(
+                        grid, vertices, voxelizer.faces[nearby], None if corner_uvs is None else corner_uvs[nearby],
+                        image, vertex_colors, filtering)
+            writer.write_frame(new_keys, new_colors)
+            keys = new_keys
+            colors = new_colors
+            if progress is not None:
+                progress.advance()
+        if progress is not None:
+            progress.finish()
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - start
+    frame_count = len(writer.offsets)
+    return {'frames': frame_count, 'seconds': seconds, 'fps': frame_count / seconds if seconds else 0.0,
+            'bytes': os.path.getsize(file_path), 'dirty_fraction': dirty_fraction / max(frame_count, 1)}
@@ -0,0 +1,493 @@
+# Voxelizes obj and ply files from the command line, without Maya. Requires numpy, and Pillow for textures.
+#
+#   python voxel_batch.py props/ -o voxels/ -d 64 --merge -j 8
+#
+# Every mesh goes through the same steps as in the Maya script: voxelize, mesh, palette and UVs. The results are
+# written as obj files with their palette textures, or with vertex colors and no texture at all with
+# --color-output vertex, or as .vox, .glb and .vxg files with --formats. A manifest.json in the
+# output folder records every file, so running the same command again only voxelizes the files that failed, changed
+# or weren't done yet.
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import voxel_chunks
+import voxel_engine
+import voxel_export
+import voxel_file
+import voxel_grid
+import voxel_io
+import voxel_mesh
+import voxel_palette
+import voxel_parallel
+import voxel_sampling
+import voxel_texture
+
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+STAGES = ('read', 'voxelize', 'color', 'palette', 'mesh', 'uv', 'write')
+
+# same defaults as the Maya window
+DEFAULT_SETTINGS = {'density': 50, 'padding': 1.1, 'merge': False, 'texture_scale': 10, 'threshold': 5,
+                    'palette_mode': 'threshold', 'palette_size': 256, 'texture_layout': 'square',
+                    'texture_format': 'png', 'edge_padding': 0, 'formats': ['obj'], 'texture_filtering': 'nearest',
+                    'fill': 'surface', 'shell_thickness': 1, 'gap_size': 0, 'color_output': 'texture'}
+
+
+def find_meshes(inputs):
+    """
+    Collects the mesh files to voxelize. Folders are searched recursively.
+    :param inputs: list of file and folder paths
+    :return: sorted list of absolute paths of obj and ply files
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for folder, _, names in os.walk(item):
+                for name in names:
+                    if os.path.splitext(name)[1].lower() in voxel_io.MESH_EXTENSIONS:
+                        files.add(os.path.abspath(os.path.join(folder, name)))
+        elif os.path.splitext(item)[1].lower() in voxel_io.MESH_EXTENSIONS:
+            files.add(os.path.abspath(item))
+    return sorted(files)
+
+
+def output_names(files):
+    """
+    Names the results after their mesh files. Meshes from different folders with the same name get a number added.
+    :param files: list of mesh paths
+    :return: dictionary of mesh path to result name
+    """
+    names = {}
+    used = set()
+    for file_path in files:
+        base = os.path.splitext(os.path.basename(file_path))[0]
+        name = base
+        number = 1
+        while name.lower() in used:
+            name = f'{base}_{number}'
+            number += 1
+        used.add(name.lower())
+        names[file_path] = name
+    return names
+
+
+def fingerprint(file_path: str):
+    """
+    :param file_path: path of a file
+    :return: [modification time, size] of the file, to tell whether it changed since the last run
+    """
+    stats = os.stat(file_path)
+    return [stats.st_mtime_ns, stats.st_size]
+
+
+def has_colors(mesh):
+    """
+    :param mesh: voxel_io.Mesh
+    :return: whether the mesh has a texture or vertex colors to color the voxels with
+    """
+    textured = mesh.corner_uvs is not None and bool(mesh.texture_path) and os.path.isfile(mesh.texture_path)
+    return textured or mesh.vertex_colors is not None
+
+
+def mesh_texture(mesh):
+    """
+    :param mesh: voxel_io.Mesh
+    :return: uint8 array (H, W, 3) of the texture of the mesh, or None if it has no UVs or texture on disk
+    """
+    if mesh.corner_uvs is not None and mesh.texture_path and os.path.isfile(mesh.texture_path):
+        return voxel_sampling.load_image(mesh.texture_path)
+    return None
+
+
+def mesh_colors(mesh, grid, filtering='nearest', workers=1):
+    """
+    Colors the voxels from the texture or the vertex colors of the closest point on the mesh, and the fill from the
+    surface voxels around it.
+    :param mesh: voxel_io.Mesh
+    :param grid: VoxelGrid the mesh was voxelized into
+    :param filtering: one of voxel_sampling.FILTERING_MODES
+    :param workers: amount of processes to sample on, 1 runs in this process
+    :return: uint8 array (N, 3), or None if the mesh has no colors
+    """
+    if not has_colors(mesh):
+        return None
+    return voxel_sampling.sample_mesh_colors(grid, mesh.vertices, mesh.faces, mesh.corner_uvs, mesh_texture(mesh),
+                                             mesh.vertex_colors, filtering, workers=workers)
+
+
+def write_dense(mesh, output_folder: str, name: str, settings, lap, workers=1):
+    """
+    Voxelizes a mesh into a dense grid, and writes the results.
+    :param mesh: voxel_io.Mesh
+    :param output_folder: folder to write the results to
+    :param name: file name of the results, without extension
+    :param settings: dictionary with the keys of DEFAULT_SETTINGS
+    :param lap: function(stage) that records the time and memory of a stage once it is done
+    :param workers: amount of processes for voxelizing, coloring and finding the faces, 1 runs in this process
+    :return: [paths of the written files, amount of voxels, amount of faces, amount of palette colors]
+    """
+    occupancy, origin, voxel_size = voxel_parallel.voxelize(mesh.vertices, mesh.faces, settings['density'],
+                                                            settings['padding'], workers)
+    occupancy = voxel_engine.fill_cells(occupancy, settings['fill'], settings['shell_thickness'],
+                                        settings['gap_size'])
+    grid = voxel_grid.VoxelGrid.from_occupancy(occupancy, origin, voxel_size)
+    lap('voxelize')
+
+    colors = mesh_colors(mesh, grid, settings['texture_filtering'], workers)
+    if colors is not None:
+        grid.colors = colors
+    lap('color')
+
+    vertex_output = settings['color_output'] == 'vertex'
+    palette = None
+    if colors is not None and not vertex_output:
+        palette, grid.color_ids = voxel_palette.build_palette(grid.colors, settings['threshold'],
+                                                              settings['palette_mode'], settings['palette_size'])
+    elif colors is not None and settings['merge']:
+        # vertex colors keep the exact colors, merging only needs to know which voxels share one
+        palette, grid.color_ids = voxel_palette.exact_palette(grid.colors)
+    lap('palette')
+
+    if settings['merge']:
+        points, face_counts, face_connects, face_color_ids, _ = voxel_mesh.build_greedy_mesh(grid)
+        face_voxels = None
+    else:
+        points, face_counts, face_connects, face_voxels = voxel_parallel.build_mesh(grid, workers)
+        face_color_ids = grid.color_ids[face_voxels]
+    lap('mesh')
+
+    uvs = None
+    uv_ids = None
+    image = None
+    vertex_colors = None
+    obj_points = points
+    obj_connects = face_connects
+    if colors is not None and vertex_output:
+        # the colors go on the vertices instead of a texture, obj files store colors per point so every face vertex
+        # gets its own point
+        if 'obj' in settings['formats']:
+            obj_points, obj_connects = voxel_mesh.unshare_points(points, face_connects)
+            vertex_colors = np.repeat(voxel_export.face_colors(grid, face_voxels, face_color_ids, palette),
+                                      face_counts, axis=0)
+    elif palette is not None:
+        image, uv_table = voxel_texture.build_atlas(palette, settings['texture_scale'], settings['texture_layout'],
+                                                    settings['edge_padding'])
+        u, v, uv_ids = voxel_texture.face_uvs(face_color_ids, face_counts, uv_table)
+        uvs = np.stack([u, v], axis=1)
+    lap('uv')
+
+    outputs = []
+    texture_name = ''
+    if image is not None and 'obj' in settings['formats']:
+        texture_path = voxel_texture.write_texture(image, os.path.join(output_folder, name),
+                                                   settings['texture_format'])
+        texture_name = os.path.basename(texture_path)
+        outputs.append(texture_path)
+    if 'obj' in settings['formats']:
+        obj_path = os.path.join(output_folder, f'{name}.obj')
+        voxel_io.write_obj(obj_path, obj_points, face_counts, obj_connects, uvs, uv_ids, texture_name, vertex_colors)
+        outputs.append(obj_path)
+        if texture_name:
+            outputs.append(os.path.join(output_folder, f'{name}.mtl'))
+    if 'glb' in settings['formats']:
+        glb_path = os.path.join(output_folder, f'{name}.glb')
+        voxel_export.write_glb(glb_path, points, face_counts, face_connects,
+                               voxel_export.face_colors(grid, face_voxels, face_color_ids, palette))
+        outputs.append(glb_path)
+    if 'vox' in settings['formats']:
+        vox_path = os.path.join(output_folder, f'{name}.vox')
+        voxel_export.write_vox(vox_path, grid, palette)
+        outputs.append(vox_path)
+    if 'vxg' in settings['formats']:
+        vxg_path = os.path.join(output_folder, f'{name}{voxel_file.FILE_EXTENSION}')
+        voxel_file.write_voxel_file(vxg_path, grid, palette)
+        outputs.append(vxg_path)
+    lap('write')
+
+    return [outputs, len(grid), len(face_counts), 0 if palette is None else len(palette)]
+
+
+def write_chunked(mesh, output_folder: str, name: str, settings, lap):
+    """
+    Voxelizes a mesh above voxel_chunks.CHUNKED_DENSITY one chunk at a time, colors it one chunk at a time and
+    streams the faces into an obj file a batch of chunks at a time, so neither the whole grid nor the whole mesh is
+    ever in memory. The colors go on the vertices, a palette would need every color at once.
+    :param mesh: voxel_io.Mesh
+    :param output_folder: folder to write the results to
+    :param name: file name of the results, without extension
+    :param settings: dictionary with the keys of DEFAULT_SETTINGS
+    :param lap: function(stage) that records the time and memory of a stage once it is done
+    :return: [paths of the written files, amount of voxels, amount of faces, amount of palette colors]
+    """
+    if settings['fill'] != 'surface':
+        raise ValueError(f"The {settings['fill']} fill needs a density of at most {voxel_chunks.CHUNKED_DENSITY}")
+    if settings['merge']:
+        raise ValueError(f"Merging faces needs a density of at most {voxel_chunks.CHUNKED_DENSITY}")
+    unsupported = [file_format for file_format in settings['formats'] if file_format != 'obj']
+    if unsupported:
+        raise ValueError(f"The {unsupported[0]} format needs a density of at most {voxel_chunks.CHUNKED_DENSITY}")
+    colored = has_colors(mesh)
+    grid = voxel_chunks.voxelize_chunked(mesh.vertices, mesh.faces, settings['density'], settings['padding'],
+                                         with_color=colored)
+    try:
+        lap('voxelize')
+        if colored:
+            voxel_chunks.sample_colors(grid, voxel_sampling.mesh_color_sampler(
+                mesh.vertices, mesh.faces, mesh.corner_uvs, mesh_texture(mesh), mesh.vertex_colors,
+                settings['texture_filtering']))
+        lap('color')
+        # there is no palette or UVs, and the faces are built while they are written so they count as writing
+        lap('palette')
+        lap('mesh')
+        lap('uv')
+        outputs = []
+        face_count = 0
+        if 'obj' in settings['formats']:
+            obj_path = os.path.join(output_folder, f'{name}.obj')
+            face_count = voxel_chunks.write_obj(grid, obj_path)[1]
+            outputs.append(obj_path)
+        voxel_count = grid.voxel_count()
+        lap('write')
+    finally:
+        grid.close()
+    return [outputs, voxel_count, face_count, 0]
+
+
+def voxelize_file(file_path: str, output_folder: str, name: str, settings, workers=1):
+    """
+    Runs the whole pipeline on one mesh file and writes the results.
+    :param file_path: path of an obj or ply file
+    :param output_folder: folder to write the results to
+    :param name: file name of the results, without extension
+    :param settings: dictionary with the keys of DEFAULT_SETTINGS
+    :param workers: amount of processes the stages of this one file are split over, 1 runs in this process
+    :return: manifest entry of the file, with the peak memory of every stage when tracemalloc is tracing
+    """
+    timings = {}
+    memory = {}
+    start = time.perf_counter()
+
+    def lap(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = now - start
+        if tracemalloc.is_tracing():
+            memory[stage] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+
+    mesh = voxel_io.read_mesh(file_path)
+    lap('read')
+
+    if settings['density'] > voxel_chunks.CHUNKED_DENSITY:
+        outputs, voxel_count, face_count, color_count = write_chunked(mesh, output_folder, name, settings, lap)
+    else:
+        outputs, voxel_count, face_count, color_count = write_dense(mesh, output_folder, name, settings, lap,
+                                                                    workers)
+
+    entry = {'status': 'done', 'name': name, 'fingerprint': fingerprint(file_path), 'settings': settings,
+             'outputs': outputs, 'voxels': voxel_count, 'faces': face_count, 'colors': color_count, 'timings': timings,
+             'seconds': sum(timings.values())}
+    if memory:
+        entry['memory'] = memory
+    return entry
+
+
+def _voxelize_job(file_path: str, output_folder: str, name: str, settings, workers=1):
+    """
+    Runs voxelize_file on a worker, turning errors into a failed entry so one broken file doesn't stop the batch.
+    :return: [file path, manifest entry]
+    """
+    started = time.perf_counter()
+    try:
+        return [file_path, voxelize_file(file_path, output_folder, name, settings, workers)]
+    except Exception as error:
+        return [file_path, {'status': 'failed', 'name': name, 'fingerprint': fingerprint(file_path),
+                            'settings': settings, 'error': f'{type(error).__name__}: {error}',
+                            'traceback': traceback.format_exc(), 'seconds': time.perf_counter() - started}]
+
+
+def load_manifest(output_folder: str):
+    """
+    :param output_folder: folder the results are written to
+    :return: manifest of an earlier run, or an empty one
+    """
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    if os.path.isfile(manifest_path):
+        try:
+            with open(manifest_path, 'r') as file:
+                manifest = json.load(file)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except ValueError:
+            pass
+    return {'version': MANIFEST_VERSION, 'files': {}}
+
+
+def save_manifest(output_folder: str, manifest):
+    """
+    Writes the manifest to a temporary file first, so it is never left half written if the batch gets killed.
+    :param output_folder: folder the results are written to
+    :param manifest: manifest to save
+    """
+    manifest_path = os.path.join(output_folder, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def is_done(entry, file_path: str, settings):
+    """
+    :param entry: manifest entry of an earlier run, or None
+    :param file_path: path of the mesh file
+    :param settings: settings of this run
+    :return: whether the file was already voxelized with the same settings and hasn't changed since
+    """
+    return (entry is not None and entry.get('status') == 'done' and entry.get('settings') == settings and
+            entry.get('fingerprint') == fingerprint(file_path) and
+            all(os.path.isfile(output) for output in entry.get('outputs', [])))
+
+
+def timing_summary(manifest, files):
+    """
+    :param manifest: manifest after the run
+    :param files: mesh paths of this run
+    :return: table with the time each stage took per file, and the totals
+    """
+    name_width = max([len(manifest['files'][file_path]['name']) for file_path in files] + [5])
+    lines = [f"{'file':<{name_width}} " + ' '.join(f'{stage:>8}' for stage in STAGES) + f" {'total':>8}"]
+    totals = dict.fromkeys(STAGES, 0.0)
+    for file_path in files:
+        entry = manifest['files'][file_path]
+        if entry['status'] != 'done':
+            lines.append(f"{entry['name']:<{name_width}} failed: {entry['error']}")
+            continue
+        for stage in STAGES:
+            totals[stage] += entry['timings'][stage]
+        lines.append(f"{entry['name']:<{name_width}} " +
+                     ' '.join(f"{entry['timings'][stage]:8.3f}" for stage in STAGES) + f" {entry['seconds']:8.3f}")
+    lines.append(f"{'total':<{name_width}} " + ' '.join(f'{totals[stage]:8.3f}' for stage in STAGES) +
+                 f' {sum(totals.values()):8.3f}')
+    return '\n'.join(lines)
+
+
+def run_batch(files, output_folder: str, settings, jobs=None, resume=True, log=print):
+    """
+    Voxelizes mesh files on a pool of processes. The manifest is saved after every finished file, so an interrupted
+    batch can be resumed.
+    :param files: list of mesh paths
+    :param output_folder: folder to write the results to
+    :param settings: dictionary with the keys of DEFAULT_SETTINGS
+    :param jobs: amount of files voxelized at the same time, defaults to the amount of cores
+    :param resume: whether to skip files that were already done with the same settings
+    :param log: function that prints progress
+    :return: manifest
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = load_manifest(output_folder)
+    names = output_names(files)
+    todo = [file_path for file_path in files
+            if not (resume and is_done(manifest['files'].get(file_path), file_path, settings))]
+    if len(todo) < len(files):
+        log(f"Skipping {len(files) - len(todo)} files that are already done")
+
+    jobs = jobs or voxel_parallel.default_workers()
+    tasks = [[file_path, output_folder, names[file_path], settings] for file_path in todo]
+    if jobs <= 1 or len(tasks) <= 1:
+        # a single file gets the jobs for its own stages instead
+        results = (_voxelize_job(*task, workers=jobs) for task in tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs, mp_context=voxel_parallel.pool_context())
+        results = (future.result() for future in as_completed([pool.submit(_voxelize_job, *task)
+                                                               for task in tasks]))
+    try:
+        for count, (file_path, entry) in enumerate(results, 1):
+            manifest['files'][file_path] = entry
+            save_manifest(output_folder, manifest)
+            if entry['status'] == 'done':
+                log(f"[{count}/{len(tasks)}] {entry['name']}: {entry['voxels']} voxels in {entry['seconds']:.2f}s")
+            else:
+                log(f"[{count}/{len(tasks)}] {entry['name']}: {entry['error']}")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return manifest
+
+
+def parse_arguments(argv=None):
+    """
+    :param argv: command line arguments, defaults to sys.argv
+    :return: argparse namespace
+    """
+    parser = argparse.ArgumentParser(description="Voxelizes obj and ply files without Maya.")
+    parser.add_argument('inputs', nargs='+', help="mesh files, or folders to search for obj and ply files")
+    parser.add_argument('-o', '--output', required=True, help="folder to write the results and manifest to")
+    parser.add_argument('-d', '--density', type=int, default=DEFAULT_SETTINGS['density'],
+                        help="amount of voxels along the longest side of each mesh")
+    parser.add_argument('--fill', choices=voxel_engine.FILL_MODES, default=DEFAULT_SETTINGS['fill'],
+                        help="keep only the cells touched by the mesh, fill the inside, or keep a hollow shell")
+    parser.add_argument('--shell-thickness', type=int, default=DEFAULT_SETTINGS['shell_thickness'],
+                        help="amount of voxel layers the hollow fill keeps")
+    parser.add_argument('--gap-size', type=int, default=DEFAULT_SETTINGS['gap_size'],
+                        help="holes in the mesh up to this many voxels wide are closed before filling")
+    parser.add_argument('--merge', action='store_true', help="merge coplanar faces with the same color")
+    parser.add_argument('--color-output', choices=voxel_mesh.COLOR_OUTPUTS, default=DEFAULT_SETTINGS['color_output'],
+                        help="put the colors on a palette texture, or on the vertices without a texture")
+    parser.add_argument('--texture-scale', type=int, default=DEFAULT_SETTINGS['texture_scale'],
+                        help="pixel size of each color on the palette texture")
+    parser.add_argument('--threshold', type=int, default=DEFAULT_SETTINGS['threshold'],
+                        help="color threshold of the threshold and grid palette modes")
+    parser.add_argument('--palette-mode', choices=voxel_palette.PALETTE_MODES,
+                        default=DEFAULT_SETTINGS['palette_mode'])
+    parser.add_argument('--palette-size', type=int, default=DEFAULT_SETTINGS['palette_size'],
+                        help="maximum amount of colors of the median_cut and kmeans palette modes")
+    parser.add_argument('--texture-layout', choices=voxel_texture.TEXTURE_LAYOUTS,
+                        default=DEFAULT_SETTINGS['texture_layout'])
+    parser.add_argument('--texture-format', choices=voxel_texture.TEXTURE_FORMATS,
+                        default=DEFAULT_SETTINGS['texture_format'])
+    parser.add_argument('--edge-padding', type=int, default=DEFAULT_SETTINGS['edge_padding'],
+                        help="extra pixels around each color of the palette texture")
+    parser.add_argument('--formats', nargs='+', choices=voxel_export.EXPORT_FORMATS,
+                        default=DEFAULT_SETTINGS['formats'], help="file formats to write every result in")
+    parser.add_argument('--texture-filtering', choices=voxel_sampling.FILTERING_MODES,
+                        default=DEFAULT_SETTINGS['texture_filtering'], help="how the mesh texture is sampled")
+    parser.add_argument('-j', '--jobs', type=int, default=voxel_parallel.default_workers(),
+                        help="amount of files voxelized at the same time, or of processes for a single file")
+    parser.add_argument('--no-resume', action='store_true', help="voxelize every file again, even if it was done")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    :param argv: command line arguments, defaults to sys.argv
+    :return: exit code, 1 if any file failed
+    """
+    arguments = parse_arguments(argv)
+    files = find_meshes(arguments.inputs)
+    if not files:
+        print("No obj or ply files found")
+        return 1
+    settings = dict(DEFAULT_SETTINGS)
+    for key in settings:
+        if hasattr(arguments, key):
+            settings[key] = getattr(arguments, key)
+
+    started = time.perf_counter()
+    manifest = run_batch(files, arguments.output, settings, arguments.jobs, not arguments.no_resume)
+    print(timing_summary(manifest, files))
+    failed = [file_path for file_path in files if manifest['files'][file_path]['status'] != 'done']
+    print(f"{len(files) - len(failed)} of {len(files)} files done in {time.perf_counter() - started:.2f}s, "
+          f"manifest written to {os.path.join(arguments.output, MANIFEST_NAME)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
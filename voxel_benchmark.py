@@ -0,0 +1,353 @@
+# Times the voxelizer on generated meshes at a sweep of densities, without Maya, so slowdowns show up before anyone
+# has to wait on them. Requires numpy, and Pillow for textures.
+#
+#   python voxel_benchmark.py -o results.json
+#   python voxel_benchmark.py -o new.json --compare results.json --threshold 0.25
+#
+# Every case runs twice: once through the same steps as voxel_batch, which times every stage of the pipeline, and
+# once through the methods of the Maya window with voxel_standin in place of Maya, which times every method and counts
+# every call they make to maya.cmds and OpenMaya. The peak memory of every stage is measured with tracemalloc in a
+# separate run, since tracing makes the stages slower. With --compare the run fails when a stage got slower or hungrier
+# than the given fraction.
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import voxel_batch
+import voxel_io
+import voxel_standin
+import voxel_texture
+
+
+RESULTS_VERSION = 1
+MESH_KINDS = ('sphere', 'torus', 'thin_shell', 'noise_blob')
+# amount of rows of triangles of every kind of mesh, the noise blob is the high poly one
+MESH_DETAIL = {'sphere': 64, 'torus': 64, 'thin_shell': 64, 'noise_blob': 256}
+DENSITIES = (32, 64, 128)
+TEXTURE_SIZE = 256
+# Voxelizer methods that get timed, store_values includes voxelizing, sampling the colors and create_voxels
+MAYA_METHODS = ('store_values', 'mesh_arrays', 'mesh_corner_uvs', 'create_voxels', 'build_voxel_mesh', 'create_mesh',
+                'create_texture', 'move_UV', 'export_voxels')
+# differences smaller than these are noise, not regressions
+MIN_SECONDS = 0.05
+MIN_BYTES = 1 << 20
+MESH_NAME = 'benchmark_mesh'
+
+
+def _parametric_mesh(function, rows: int, columns: int, wrap_rows=False):
+    """
+    Triangulates a grid of points that wraps around along the columns, like the sides of a cylinder.
+    :param function: takes arrays of u and v from 0 to 1 and returns the float array (N, 3) of their positions
+    :param rows: amount of rows of quads
+    :param columns: amount of quads in every row
+    :param wrap_rows: also wrap around along the rows, like a torus
+    :return: [vertices float array (V, 3), faces int array (T, 3), corner UVs float array (T, 3, 2)]
+    """
+    point_rows = rows if wrap_rows else rows + 1
+    u, v = np.meshgrid(np.arange(columns) / columns, np.arange(point_rows) / rows)
+    vertices = function(u.ravel(), v.ravel())
+
+    row = np.repeat(np.arange(rows), columns)
+    column = np.tile(np.arange(columns), rows)
+    next_row = (row + 1) % point_rows
+    next_column = (column + 1) % columns
+    a = row * columns + column
+    b = row * columns + next_column
+    c = next_row * columns + column
+    d = next_row * columns + next_column
+    faces = np.concatenate([np.stack([a, b, d], axis=1), np.stack([a, d, c], axis=1)])
+
+    # the UVs don't wrap, so the last column stretches to 1 instead of jumping back to 0
+    u0, u1 = column / columns, (column + 1) / columns
+    v0, v1 = row / rows, (row + 1) / rows
+    uv_a, uv_b = np.stack([u0, v0], axis=1), np.stack([u1, v0], axis=1)
+    uv_c, uv_d = np.stack([u0, v1], axis=1), np.stack([u1, v1], axis=1)
+    corner_uvs = np.concatenate([np.stack([uv_a, uv_b, uv_d], axis=1), np.stack([uv_a, uv_d, uv_c], axis=1)])
+    return [vertices, faces, corner_uvs]
+
+
+def _sphere_points(radius=1.0):
+    def function(u, v):
+        phi = 2 * np.pi * u
+        theta = np.pi * v
+        return radius * np.stack([np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)], axis=1)
+    return function
+
+
+def sphere_mesh(detail: int):
+    """
+    :param detail: amount of rows of triangles
+    :return: [vertices, faces, corner UVs] of a unit sphere
+    """
+    return _parametric_mesh(_sphere_points(), detail, detail * 2)
+
+
+def torus_mesh(detail: int, radius=1.0, tube_radius=0.35):
+    """
+    :param detail: amount of rows of triangles around the tube
+    :return: [vertices, faces, corner UVs] of a torus around the z axis
+    """
+    def function(u, v):
+        phi = 2 * np.pi * u
+        theta = 2 * np.pi * v
+        ring = radius + tube_radius * np.cos(theta)
+        return np.stack([ring * np.cos(phi), ring * np.sin(phi), tube_radius * np.sin(theta)], axis=1)
+    return _parametric_mesh(function, detail, detail * 2, wrap_rows=True)
+
+
+def thin_shell_mesh(detail: int, thickness=0.02):
+    """
+    :param detail: amount of rows of triangles of each side
+    :param thickness: distance between the outer and the inner side
+    :return: [vertices, faces, corner UVs] of a hollow sphere with a wall thinner than most voxels
+    """
+    outer = _parametric_mesh(_sphere_points(), detail, detail * 2)
+    inner = _parametric_mesh(_sphere_points(1.0 - thickness), detail, detail * 2)
+    # the inner side faces inwards
+    faces = np.concatenate([outer[1], inner[1][:, ::-1] + len(outer[0])])
+    return [np.concatenate([outer[0], inner[0]]), faces, np.concatenate([outer[2], inner[2][:, ::-1]])]
+
+
+def noise_blob_mesh(detail: int, roughness=0.25, seed=0):
+    """
+    :param detail: amount of rows of triangles
+    :param roughness: how far the surface moves in and out
+    :param seed: seed of the noise
+    :return: [vertices, faces, corner UVs] of a lumpy sphere
+    """
+    random = np.random.default_rng(seed)
+    directions = random.normal(size=(12, 3))
+    frequencies = random.uniform(2, 12, 12)
+    phases = random.uniform(0, 2 * np.pi, 12)
+
+    def function(u, v):
+        points = _sphere_points()(u, v)
+        noise = np.sin(points @ directions.T * frequencies + phases) / frequencies * 2
+        return points * (1 + roughness * noise.mean(axis=1))[:, None]
+    return _parametric_mesh(function, detail, detail * 2)
+
+
+MESH_FUNCTIONS = {'sphere': sphere_mesh, 'torus': torus_mesh, 'thin_shell': thin_shell_mesh,
+                  'noise_blob': noise_blob_mesh}
+
+
+def noise_texture(size=TEXTURE_SIZE, tiles=16, seed=0):
+    """
+    :return: uint8 array (size, size, 3) of tiles x tiles blocks of random colors
+    """
+    colors = np.random.default_rng(seed).integers(0, 256, (tiles, tiles, 3), dtype=np.uint8)
+    return np.repeat(np.repeat(colors, -(-size // tiles), axis=0), -(-size // tiles), axis=1)[:size, :size]
+
+
+def _time_methods(window, names, timings, memory):
+    """
+    Replaces the methods of the window with ones that add up their seconds and peak memory, calls between methods of
+    the window go through the timed ones as well.
+    """
+    for name in names:
+        method = getattr(window, name)
+
+        def timed(*args, _method=method, _name=name):
+            start = time.perf_counter()
+            try:
+                return _method(*args)
+            finally:
+                timings[_name] = timings.get(_name, 0.0) + time.perf_counter() - start
+                if tracemalloc.is_tracing():
+                    memory[_name] = max(memory.get(_name, 0), tracemalloc.get_traced_memory()[1])
+
+        setattr(window, name, timed)
+
+
+def run_pipeline(obj_path: str, density: int, folder: str):
+    """
+    Runs the voxel_batch pipeline on a mesh file.
+    :return: manifest entry of voxel_batch.voxelize_file
+    """
+    settings = dict(voxel_batch.DEFAULT_SETTINGS, density=density)
+    return voxel_batch.voxelize_file(obj_path, folder, f'pipeline_{density}', settings)
+
+
+def run_maya(stand_in, mesh, texture_path: str, density: int, folder: str):
+    """
+    Runs the buttons of the Maya window one after the other on a mesh in the stand-in scene: Create Voxels with a
+    texture, Create Texture, Move UVs and Export Voxels.
+    :param stand_in: voxel_standin.MayaStandIn that is installed
+    :param mesh: [vertices, faces, corner UVs]
+    :return: [seconds per method, peak memory per method, calls made to Maya]
+    """
+    stand_in.meshes = {}
+    stand_in.add_mesh(MESH_NAME, *mesh)
+    stand_in.user_app_dir = folder
+    with contextlib.redirect_stdout(io.StringIO()):
+        window = importlib.import_module('Voxelizer').Voxelizer()
+    cmds = stand_in.cmds
+    window.obj = MESH_NAME
+    cmds.intField(window.voxel_density_int_field, e=True, v=density)
+    cmds.checkBox(window.color_check_box, e=True, v=True)
+    cmds.textField(window.import_path_text_field, e=True, tx=texture_path)
+    cmds.textField(window.export_path_text_field, e=True, tx=folder)
+    stand_in.file_dialog = [os.path.join(folder, f'maya_{density}.obj')]
+
+    store_values = window.store_values
+
+    def create_voxels_button(ignore):
+        # Create Voxels computes on a worker thread, the button is only done once its result is committed
+        store_values(ignore)
+        stand_in.run_deferred(window.job)
+
+    window.store_values = create_voxels_button
+    timings = {}
+    memory = {}
+    _time_methods(window, MAYA_METHODS, timings, memory)
+    stand_in.log.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for step in (window.store_values, window.create_texture, window.move_UV, window.export_voxels):
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            step(None)
+    return [timings, memory, stand_in.log.summary()]
+
+
+def run_benchmark(kinds=MESH_KINDS, densities=DENSITIES, detail_scale=1.0, maya=True, memory=True, log=print):
+    """
+    Runs every mesh kind at every density.
+    :param kinds: kinds of meshes out of MESH_KINDS
+    :param densities: densities to voxelize every mesh at
+    :param detail_scale: multiplies the amount of triangles of every mesh along each side
+    :param maya: also run the methods of the Maya window through voxel_standin
+    :param memory: also measure the peak memory of every stage, in a second run because tracing slows stages down
+    :param log: function to report progress with
+    :return: results dictionary
+    """
+    results = {'version': RESULTS_VERSION, 'python': platform.python_version(), 'numpy': np.__version__,
+               'machine': platform.machine(), 'cpus': os.cpu_count(), 'cases': {}}
+    folder = tempfile.mkdtemp(prefix='voxel_benchmark_')
+    stand_in = None
+    if maya:
+        stand_in = voxel_standin.MayaStandIn()
+        stand_in.install()
+    try:
+        texture_path = voxel_texture.write_texture(noise_texture(), os.path.join(folder, 'texture'))
+        for kind in kinds:
+            mesh = MESH_FUNCTIONS[kind](max(int(MESH_DETAIL[kind] * detail_scale), 4))
+            vertices, faces, corner_uvs = mesh
+            obj_path = os.path.join(folder, f'{kind}.obj')
+            voxel_io.write_obj(obj_path, vertices, np.full(len(faces), 3), faces.ravel(), corner_uvs.reshape(-1, 2),
+                               np.arange(faces.size), os.path.basename(texture_path))
+            for density in densities:
+                name = f'{kind}_{density}'
+                case_folder = os.path.join(folder, name)
+                os.makedirs(case_folder)
+                entry = run_pipeline(obj_path, density, case_folder)
+                case = {'mesh': kind, 'density': density, 'triangles': len(faces), 'voxels': entry['voxels'],
+                        'faces': entry['faces'], 'colors': entry['colors'], 'stages': entry['timings']}
+                if maya:
+                    case['maya'], _, case['calls'] = run_maya(stand_in, mesh, texture_path, density, case_folder)
+                if memory:
+                    # a folder of its own, so the Maya window can't load its voxels from the cache of the first run
+                    memory_folder = os.path.join(case_folder, 'memory')
+                    os.makedirs(memory_folder)
+                    tracemalloc.start()
+                    try:
+                        case['memory'] = run_pipeline(obj_path, density, memory_folder)['memory']
+                        if maya:
+                            case['maya_memory'] = run_maya(stand_in, mesh, texture_path, density, memory_folder)[1]
+                    finally:
+                        tracemalloc.stop()
+                results['cases'][name] = case
+                log(f"{name}: {len(faces)} triangles, {case['voxels']} voxels, "
+                    f"{sum(case['stages'].values()):.2f}s pipeline" +
+                    (f", {case['maya']['store_values']:.2f}s Create Voxels in Maya" if maya else ''))
+                shutil.rmtree(case_folder, ignore_errors=True)
+    finally:
+        if stand_in is not None:
+            stand_in.uninstall()
+            sys.modules.pop('Voxelizer', None)
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def compare(baseline, results, threshold=0.25, min_seconds=MIN_SECONDS, min_bytes=MIN_BYTES):
+    """
+    Finds the stages that got slower or use more memory than in the baseline. Cases and stages that only one of the
+    two has are skipped.
+    :param baseline: results dictionary of an earlier run
+    :param results: results dictionary of this run
+    :param threshold: fraction a stage may grow before it counts as a regression
+    :param min_seconds: time differences smaller than this never count
+    :param min_bytes: memory differences smaller than this never count
+    :return: list of messages, one per regression
+    """
+    regressions = []
+    for name, case in results['cases'].items():
+        old_case = baseline['cases'].get(name)
+        if old_case is None:
+            continue
+        for group, minimum, unit in (('stages', min_seconds, 's'), ('maya', min_seconds, 's'),
+                                     ('memory', min_bytes, 'B'), ('maya_memory', min_bytes, 'B')):
+            for stage, value in case.get(group, {}).items():
+                old_value = old_case.get(group, {}).get(stage)
+                if old_value is None:
+                    continue
+                if value > old_value * (1 + threshold) and value - old_value > minimum:
+                    regressions.append(f"{name} {group}.{stage}: {old_value:.3g}{unit} -> {value:.3g}{unit} "
+                                       f"(+{(value / max(old_value, 1e-12) - 1) * 100:.0f}%)")
+    return regressions
+
+
+def parse_arguments(argv=None):
+    """
+    :param argv: command line arguments, defaults to sys.argv
+    :return: argparse namespace
+    """
+    parser = argparse.ArgumentParser(description="Times the voxelizer on generated meshes without Maya.")
+    parser.add_argument('-o', '--output', required=True, help="json file to write the results to")
+    parser.add_argument('--meshes', nargs='+', choices=MESH_KINDS, default=list(MESH_KINDS),
+                        help="kinds of meshes to generate")
+    parser.add_argument('-d', '--densities', nargs='+', type=int, default=list(DENSITIES),
+                        help="densities to voxelize every mesh at")
+    parser.add_argument('--detail-scale', type=float, default=1.0,
+                        help="multiplies the amount of triangles of every mesh along each side")
+    parser.add_argument('--no-maya', action='store_true', help="skip the methods of the Maya window")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="don't measure memory, which runs every case a second time")
+    parser.add_argument('--compare', help="results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="fraction a stage may get slower or use more memory before the comparison fails")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    :param argv: command line arguments, defaults to sys.argv
+    :return: exit code, 1 if the comparison found regressions
+    """
+    arguments = parse_arguments(argv)
+    results = run_benchmark(arguments.meshes, arguments.densities, arguments.detail_scale, not arguments.no_maya,
+                            not arguments.no_memory)
+    with open(arguments.output, 'w') as file:
+        json.dump(results, file, indent=1)
+    print(f"Results written to {arguments.output}")
+    if not arguments.compare:
+        return 0
+    with open(arguments.compare) as file:
+        baseline = json.load(file)
+    regressions = compare(baseline, results, arguments.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    print(f"{len(regressions)} regressions against {arguments.compare}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,418 @@
+# Bounding volume hierarchy over the triangles of a mesh, for "which triangles touch this box", "closest point on the
+# mesh" and ray queries. The tree is stored as flat arrays and every query is answered for a whole batch of boxes,
+# points or rays at once. Only requires numpy.
+import numpy as np
+import voxel_engine
+
+
+# maximum amount of triangles in a leaf
+LEAF_SIZE = 8
+# amount of queries traversed at the same time, keeps the amount of (query, node) pairs in check. Small batches stay
+# in the CPU cache, and keep the time between two progress reports short
+QUERY_BATCH_SIZE = 1 << 13
+
+
+def closest_barycentric(points, a, b, c):
+    """
+    Finds the closest point on each triangle to each point, vectorized over pairs of a point and a triangle.
+    :param points: float array (P, 3)
+    :param a: float array (P, 3), first corner of each triangle
+    :param b: float array (P, 3), second corner of each triangle
+    :param c: float array (P, 3), third corner of each triangle
+    :return: float array (P, 3) of barycentric weights of the closest points
+    """
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+    d1 = np.einsum('ij,ij->i', ab, ap)
+    d2 = np.einsum('ij,ij->i', ac, ap)
+    d3 = np.einsum('ij,ij->i', ab, bp)
+    d4 = np.einsum('ij,ij->i', ac, bp)
+    d5 = np.einsum('ij,ij->i', ab, cp)
+    d6 = np.einsum('ij,ij->i', ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    def ratio(top, bottom):
+        # triangles without area divide by zero, those are handled separately below
+        return np.divide(top, bottom, out=np.zeros_like(top), where=bottom != 0)
+
+    # inside the triangle
+    denominator = va + vb + vc
+    v = ratio(vb, denominator)
+    w = ratio(vc, denominator)
+    weights = np.stack([1 - v - w, v, w], axis=1)
+
+    # the edges and corners, from the least to the most important so the later cases overwrite the earlier ones
+    zeros = np.zeros_like(d1)
+    ones = np.ones_like(d1)
+    edge = ratio(d4 - d3, (d4 - d3) + (d5 - d6))
+    cases = [[(va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0), [zeros, 1 - edge, edge]],
+             [(vb <= 0) & (d2 >= 0) & (d6 <= 0), [1 - ratio(d2, d2 - d6), zeros, ratio(d2, d2 - d6)]],
+             [(d6 >= 0) & (d5 <= d6), [zeros, zeros, ones]],
+             [(vc <= 0) & (d1 >= 0) & (d3 <= 0), [1 - ratio(d1, d1 - d3), ratio(d1, d1 - d3), zeros]],
+             [(d3 >= 0) & (d4 <= d3), [zeros, ones, zeros]],
+             [(d1 <= 0) & (d2 <= 0), [ones, zeros, zeros]]]
+    for condition, case_weights in cases:
+        weights[condition] = np.stack(case_weights, axis=1)[condition]
+
+    # triangles without area are lines or points, where the cases above don't hold, so those take the closest point
+    # on any of their edges
+    flat = np.flatnonzero((np.cross(ab, ac) ** 2).sum(axis=1) <= 1e-24 * np.maximum((ab ** 2).sum(axis=1),
+                                                                                    (ac ** 2).sum(axis=1)) ** 2)
+    if len(flat):
+        best = np.full(len(flat), np.inf)
+        corners = [a[flat], b[flat], c[flat]]
+        for start, end in ((0, 1), (1, 2), (2, 0)):
+            direction = corners[end] - corners[start]
+            length = (direction ** 2).sum(axis=1)
+            t = np.clip(ratio(np.einsum('ij,ij->i', points[flat] - corners[start], direction), length), 0, 1)
+            distance = ((corners[start] + t[:, None] * direction - points[flat]) ** 2).sum(axis=1)
+            closer = distance < best
+            best[closer] = distance[closer]
+            edge_weights = np.zeros((len(flat), 3))
+            edge_weights[:, start] = 1 - t
+            edge_weights[:, end] = t
+            weights[flat[closer]] = edge_weights[closer]
+    return weights
+
+
+def ray_triangle_distance(origins, directions, a, b, c):
+    """
+    Moller-Trumbore intersection, vectorized over pairs of a ray and a triangle.
+    :param origins: float array (P, 3)
+    :param directions: float array (P, 3)
+    :param a: float array (P, 3), first corner of each triangle
+    :param b: float array (P, 3), second corner of each triangle
+    :param c: float array (P, 3), third corner of each triangle
+    :return: float array (P,) with the distance along the direction to the hit, inf where the ray misses
+    """
+    ab = b - a
+    ac = c - a
+    p = np.cross(directions, ac)
+    determinant = np.einsum('ij,ij->i', ab, p)
+    # rays parallel to the triangle never hit it
+    valid = np.abs(determinant) > 1e-12
+    inverse = np.divide(1.0, determinant, out=np.zeros_like(determinant), where=valid)
+    s = origins - a
+    u = np.einsum('ij,ij->i', s, p) * inverse
+    q = np.cross(s, ab)
+    v = np.einsum('ij,ij->i', directions, q) * inverse
+    t = np.einsum('ij,ij->i', ac, q) * inverse
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+def _segment_bounds(lows, highs, starts, counts):
+    """
+    :param lows: float array (T, 3)
+    :param highs: float array (T, 3)
+    :param starts: int array (S,) of the first row of every segment
+    :param counts: int array (S,) of the amount of rows of every segment, at least 1
+    :return: [minimum of lows (S, 3), maximum of highs (S, 3)] of every segment
+    """
+    # every segment is reduced from its start up to its end, the reductions from an end to the next start are thrown
+    # away. The extra row makes an end at the last row a valid index
+    indices = np.stack([starts, starts + counts], axis=1).ravel()
+    lows = np.concatenate([lows, lows[:1]])
+    highs = np.concatenate([highs, highs[:1]])
+    return [np.minimum.reduceat(lows, indices)[::2], np.maximum.reduceat(highs, indices)[::2]]
+
+
+def _closest_per_query(queries, distances):
+    """
+    :param queries: int array (P,) of query indices
+    :param distances: float array (P,)
+    :return: int array with the pair with the smallest distance of every query that shows up, the first of them on a tie
+    """
+    # a stable sort on the integer queries alone is a lot cheaper than sorting on the distances too
+    order = np.argsort(queries, kind='stable')
+    queries = queries[order]
+    distances = distances[order]
+    starts = np.flatnonzero(np.r_[True, queries[1:] != queries[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(queries)]))
+    closest = np.flatnonzero(distances == np.minimum.reduceat(distances, starts)[group])
+    return order[closest[np.r_[True, group[closest][1:] != group[closest][:-1]]]]
+
+
+def _batches(count: int):
+    """
+    :param count: amount of queries
+    :return: generator of int arrays with the query indices of every batch
+    """
+    for start in range(0, count, QUERY_BATCH_SIZE):
+        yield np.arange(start, min(start + QUERY_BATCH_SIZE, count))
+
+
+class TriangleBVH(object):
+    """
+    Binary tree of axis aligned boxes over the triangles of a mesh, split at the median along the longest axis.
+
+    Node n has the bounds node_min[n] to node_max[n] and holds triangles order[node_start[n]:node_start[n] +
+    node_count[n]]. Its children are node_child[n] and node_child[n] + 1, or node_child[n] is -1 for a leaf.
+    """
+
+    def __init__(self, vertices, faces, leaf_size=LEAF_SIZE):
+        """
+        :param vertices: float array (V, 3) of vertex positions
+        :param faces: int array (T, 3) of vertex indices per triangle
+        :param leaf_size: maximum amount of triangles in a leaf
+        """
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.leaf_size = max(int(leaf_size), 1)
+        corners = self.vertices[self.faces]
+        tri_min = corners.min(axis=1)
+        tri_max = corners.max(axis=1)
+        centroids = (tri_min + tri_max) / 2
+        self.order = np.arange(len(self.faces), dtype=np.int64)
+
+        levels = []
+        starts = np.zeros(1 if len(self.faces) else 0, dtype=np.int64)
+        counts = np.full(len(starts), len(self.faces), dtype=np.int64)
+        node_total = 0
+        # the tree is built a whole level at a time
+        while len(starts):
+            node_min, node_max = _segment_bounds(tri_min[self.order], tri_max[self.order], starts, counts)
+            split = counts > self.leaf_size
+            node_total += len(starts)
+            children = np.full(len(starts), -1, dtype=np.int64)
+            children[split] = node_total + 2 * np.arange(np.count_nonzero(split))
+            levels.append([node_min, node_max, children, starts, counts])
+
+            # sort the triangles of every node that gets split along the longest axis of their centroids
+            starts = starts[split]
+            counts = counts[split]
+            centroid_min, centroid_max = _segment_bounds(centroids[self.order], centroids[self.order], starts, counts)
+            axes = np.argmax(centroid_max - centroid_min, axis=1)
+            segment = np.repeat(np.arange(len(starts)), counts)
+            positions = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            keys = centroids[self.order[positions], axes[segment]]
+            self.order[positions] = self.order[positions[np.lexsort((keys, segment))]]
+            halves = counts // 2
+            starts = np.stack([starts, starts + halves], axis=1).ravel()
+            counts = np.stack([halves, counts - halves], axis=1).ravel()
+
+        if levels:
+            self.node_min, self.node_max, self.node_child, self.node_start, self.node_count = [
+                np.concatenate(arrays) for arrays in zip(*levels)]
+        else:
+            self.node_min = np.zeros((0, 3))
+            self.node_max = np.zeros((0, 3))
+            self.node_child, self.node_start, self.node_count = [np.zeros(0, dtype=np.int64) for _ in range(3)]
+
+    def __len__(self):
+        return len(self.node_child)
+
+    def nbytes(self):
+        """
+        :return: amount of bytes used by the tree, without the mesh itself
+        """
+        return sum(array.nbytes for array in [self.node_min, self.node_max, self.node_child, self.node_start,
+                                              self.node_count, self.order])
+
+    def depth(self):
+        """
+        :return: amount of levels of the tree
+        """
+        depth = 0
+        nodes = np.zeros(min(len(self), 1), dtype=np.int64)
+        while len(nodes):
+            depth += 1
+            children = self.node_child[nodes]
+            children = children[children >= 0]
+            nodes = np.concatenate([children, children + 1])
+        return depth
+
+    def _leaf_pairs(self, queries, leaves):
+        """
+        :param queries: int array (P,) of query indices
+        :param leaves: int array (P,) of the leaf each query reached
+        :return: [query index per pair, triangle index per pair] of every triangle in the leaves
+        """
+        counts = self.node_count[leaves]
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return [np.repeat(queries, counts), self.order[np.repeat(self.node_start[leaves], counts) + local]]
+
+    def _expand(self, queries, nodes):
+        """
+        :param queries: int array (P,) of query indices
+        :param nodes: int array (P,) of inner nodes
+        :return: [queries, nodes] with every pair replaced by the pairs of the two children
+        """
+        children = self.node_child[nodes]
+        return [np.concatenate([queries, queries]), np.concatenate([children, children + 1])]
+
+    def box_overlap(self, box_min, box_max, exact=True):
+        """
+        Finds the triangles that touch each box.
+        :param box_min: float array (Q, 3) of the lowest corner of every box
+        :param box_max: float array (Q, 3) of the highest corner of every box
+        :param exact: test the triangles themselves against the boxes, otherwise only their bounds are tested
+        :return: [query index per pair, triangle index per pair], sorted by query
+        """
+        box_min = np.asarray(box_min, dtype=np.float64).reshape(-1, 3)
+        box_max = np.asarray(box_max, dtype=np.float64).reshape(-1, 3)
+        all_queries = []
+        all_triangles = []
+        for batch in _batches(len(box_min) if len(self) else 0):
+            queries = batch
+            nodes = np.zeros(len(batch), dtype=np.int64)
+            while len(queries):
+                touch = ((self.node_min[nodes] <= box_max[queries]) &
+                         (self.node_max[nodes] >= box_min[queries])).all(axis=1)
+                queries = queries[touch]
+                nodes = nodes[touch]
+                leaf = self.node_child[nodes] < 0
+                pair_queries, triangles = self._leaf_pairs(queries[leaf], nodes[leaf])
+                corners = self.vertices[self.faces[triangles]]
+                hit = ((corners.min(axis=1) <= box_max[pair_queries]) &
+                       (corners.max(axis=1) >= box_min[pair_queries])).all(axis=1)
+                if exact:
+                    centers = (box_min[pair_queries] + box_max[pair_queries]) / 2
+                    half_sizes = (box_max[pair_queries] - box_min[pair_queries]) / 2
+                    hit &= voxel_engine.triangle_box_overlap(corners[:, 0], corners[:, 1], corners[:, 2], centers,
+                                                             half_sizes)
+                all_queries.append(pair_queries[hit])
+                all_triangles.append(triangles[hit])
+                queries, nodes = self._expand(queries[~leaf], nodes[~leaf])
+        if not all_queries:
+            return [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)]
+        queries = np.concatenate(all_queries)
+        triangles = np.concatenate(all_triangles)
+        order = np.lexsort((triangles, queries))
+        return [queries[order], triangles[order]]
+
+    def _box_distance(self, points, nodes):
+        """
+        :param points: float array (P, 3)
+        :param nodes: int array (P,)
+        :return: float array (P,) of squared distances from every point to the bounds of its node
+        """
+        offset = np.maximum(np.maximum(self.node_min[nodes] - points, points - self.node_max[nodes]), 0)
+        return (offset ** 2).sum(axis=1)
+
+    def _center_distance(self, points, nodes):
+        """
+        :param points: float array (P, 3)
+        :param nodes: int array (P,)
+        :return: float array (P,) of squared distances from every point to the center of its node
+        """
+        return ((points - (self.node_min[nodes] + self.node_max[nodes]) / 2) ** 2).sum(axis=1)
+
+    def _closest_in_leaves(self, points, queries, leaves, best):
+        """
+        Tests the points against every triangle of the given leaves and keeps the closer results.
+        :param points: float array (Q, 3) of all query points
+        :param queries: int array (P,) of query indices
+        :param leaves: int array (P,) of leaves
+        :param best: [squared distance, triangle, weights] of every query so far, updated in place
+        """
+        queries, triangles = self._leaf_pairs(queries, leaves)
+        if not len(queries):
+            return
+        corners = self.vertices[self.faces[triangles]]
+        weights = closest_barycentric(points[queries], corners[:, 0], corners[:, 1], corners[:, 2])
+        closest = np.einsum('ij,ijk->ik', weights, corners)
+        distance = ((points[queries] - closest) ** 2).sum(axis=1)
+        first = _closest_per_query(queries, distance)
+        first = first[distance[first] < best[0][queries[first]]]
+        best[0][queries[first]] = distance[first]
+        best[1][queries[first]] = triangles[first]
+        best[2][queries[first]] = weights[first]
+
+    def closest_points(self, points, max_distance=np.inf, progress=None):
+        """
+        Finds the closest point on the mesh to each point.
+        :param points: float array (Q, 3)
+        :param max_distance: only look this far from every point, makes the search a lot faster when it is known
+        :param progress: voxel_profile.ProgressReporter that gets advanced after every batch of points, or None
+        :return: [triangle of every closest point int64 array (Q,), -1 where no triangle is within max_distance,
+        barycentric weights of every closest point float array (Q, 3), distance to every closest point float array
+        (Q,), inf where there is none]
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        best = [np.full(len(points), float(max_distance) ** 2), np.full(len(points), -1, dtype=np.int64),
+                np.zeros((len(points), 3))]
+        if progress is not None:
+            progress.begin(len(points), 'points')
+        for batch in _batches(len(points) if len(self) else 0):
+            # first walk every point down to the leaf closest to it, which gives a good bound to skip most of the
+            # tree with below
+            nodes = np.zeros(len(batch), dtype=np.int64)
+            inner = np.flatnonzero(self.node_child[nodes] >= 0)
+            while len(inner):
+                left = self.node_child[nodes[inner]]
+                left_distance = self._box_distance(points[batch[inner]], left)
+                right_distance = self._box_distance(points[batch[inner]], left + 1)
+                # a point inside both boxes goes to the box with the closer center
+                tie = left_distance == right_distance
+                left_distance[tie] = self._center_distance(points[batch[inner[tie]]], left[tie])
+                right_distance[tie] = self._center_distance(points[batch[inner[tie]]], left[tie] + 1)
+                nodes[inner] = left + (right_distance < left_distance)
+                inner = inner[self.node_child[nodes[inner]] >= 0]
+            self._closest_in_leaves(points, batch, nodes, best)
+            first_leaves = nodes
+
+            # then visit every node that could still hold a closer point
+            queries = batch
+            nodes = np.zeros(len(batch), dtype=np.int64)
+            while len(queries):
+                near = self._box_distance(points[queries], nodes) < best[0][queries]
+                queries = queries[near]
+                nodes = nodes[near]
+                leaf = self.node_child[nodes] < 0
+                visit = leaf & (nodes != first_leaves[queries - batch[0]])
+                self._closest_in_leaves(points, queries[visit], nodes[visit], best)
+                queries, nodes = self._expand(queries[~leaf], nodes[~leaf])
+            if progress is not None:
+                progress.advance(len(batch))
+        if progress is not None:
+            progress.finish()
+
+        distances = np.where(best[1] >= 0, np.sqrt(best[0]), np.inf)
+        return [best[1], best[2], distances]
+
+    def ray_hits(self, origins, directions, max_distance=np.inf):
+        """
+        Finds the first triangle hit by each ray.
+        :param origins: float array (Q, 3) of ray starts
+        :param directions: float array (Q, 3) of ray directions, distances are measured in lengths of the direction
+        :param max_distance: ignore hits further along the ray than this
+        :return: [triangle hit by every ray int64 array (Q,), -1 where the ray hits nothing, distance along every ray
+        to the hit float array (Q,), inf where the ray hits nothing]
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        best_distance = np.full(len(origins), float(max_distance))
+        best_triangle = np.full(len(origins), -1, dtype=np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / directions
+        for batch in _batches(len(origins) if len(self) else 0):
+            queries = batch
+            nodes = np.zeros(len(batch), dtype=np.int64)
+            while len(queries):
+                # slab test, fmin and fmax skip the nan of a ray that lies exactly in the plane of a slab
+                with np.errstate(invalid='ignore'):
+                    t0 = (self.node_min[nodes] - origins[queries]) * inverse[queries]
+                    t1 = (self.node_max[nodes] - origins[queries]) * inverse[queries]
+                near = np.fmax(np.fmin(t0, t1).max(axis=1), 0)
+                far = np.fmin(np.fmax(t0, t1).min(axis=1), best_distance[queries])
+                hit = near <= far
+                queries = queries[hit]
+                nodes = nodes[hit]
+                leaf = self.node_child[nodes] < 0
+                pair_queries, triangles = self._leaf_pairs(queries[leaf], nodes[leaf])
+                if len(pair_queries):
+                    corners = self.vertices[self.faces[triangles]]
+                    distance = ray_triangle_distance(origins[pair_queries], directions[pair_queries],
+                                                     corners[:, 0], corners[:, 1], corners[:, 2])
+                    first = _closest_per_query(pair_queries, distance)
+                    first = first[distance[first] < best_distance[pair_queries[first]]]
+                    best_distance[pair_queries[first]] = distance[first]
+                    best_triangle[pair_queries[first]] = triangles[first]
+                queries, nodes = self._expand(queries[~leaf], nodes[~leaf])
+        return [best_triangle, np.where(best_triangle >= 0, best_distance, np.inf)]
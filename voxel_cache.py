@@ -0,0 +1,183 @@
+# Keeps voxelization results on disk, so a mesh that was already voxelized at the same density doesn't have to be
+# voxelized or simulated again. Only requires numpy.
+import hashlib
+import os
+import tempfile
+import numpy as np
+import voxel_grid
+
+
+# maximum size of all cached results together, the least recently used results are removed above this
+CACHE_SIZE = 1 << 30
+CACHE_EXTENSION = '.npz'
+# extension of the decoded textures of voxel_sampling
+IMAGE_EXTENSION = '.npy'
+
+# digests of texture files, so unchanged textures don't have to be read again every time
+_file_digests = {}
+
+
+def file_digest(file_path: str):
+    """
+    Hashes the contents of a file. The hash is remembered until the modification time or size of the file changes.
+    :param file_path: path of the file
+    :return: hex digest, empty if the file doesn't exist
+    """
+    if not file_path or not os.path.isfile(file_path):
+        return ''
+    stats = os.stat(file_path)
+    lookup = (os.path.abspath(file_path), stats.st_mtime_ns, stats.st_size)
+    if lookup not in _file_digests:
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        _file_digests[lookup] = digest.hexdigest()
+    return _file_digests[lookup]
+
+
+def cache_key(vertices, faces, transform, density: int, texture_path='', method='surface'):
+    """
+    Creates the key a voxelization result is stored under. Any change to the mesh, its placement, the density or the
+    texture gives a different key.
+    :param vertices: float array (V, 3) of vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param transform: 16 floats of the world matrix of the object
+    :param density: amount of voxels along the longest side of the mesh
+    :param texture_path: path of the texture the colors come from, empty for untextured results
+    :param method: how the result was made, results of different methods never share a key
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    digest.update(method.encode())
+    digest.update(np.ascontiguousarray(vertices, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(faces, dtype=np.int64).tobytes())
+    digest.update(np.asarray(transform, dtype=np.float64).tobytes())
+    digest.update(str(int(density)).encode())
+    if texture_path:
+        stats = os.stat(texture_path) if os.path.isfile(texture_path) else None
+        digest.update(file_digest(texture_path).encode())
+        digest.update(str(stats.st_mtime_ns if stats else 0).encode())
+    return digest.hexdigest()
+
+
+def default_folder():
+    """
+    :return: folder the cache is kept in when no other folder is given
+    """
+    return os.path.join(tempfile.gettempdir(), 'voxelizer_cache')
+
+
+def cells_from_bits(occupancy_bits, shape):
+    """
+    Finds the cells of all set bits in an occupancy bitmask. Only the bytes that have a bit set are unpacked, so this
+    doesn't need a dense grid.
+    :param occupancy_bits: uint8 array of packed bits, one per cell in x, y, z order
+    :param shape: amount of cells along x, y and z
+    :return: int64 array (N, 3) sorted by x, then y, then z
+    """
+    occupancy_bits = np.asarray(occupancy_bits, dtype=np.uint8)
+    filled = np.flatnonzero(occupancy_bits)
+    bits = np.unpackbits(occupancy_bits[filled]).reshape(-1, 8)
+    rows, columns = np.nonzero(bits)
+    keys = filled[rows].astype(np.int64) * 8 + columns
+    return np.stack(np.unravel_index(keys, shape), axis=1).astype(np.int64)
+
+
+class VoxelCache(object):
+    def __init__(self, folder=None, max_bytes=CACHE_SIZE):
+        """
+        Stores the occupancy bitmask and colors of voxel grids as compressed files, one per key. Files are touched
+        when they are loaded, so their modification time tells which result was used least recently.
+        :param folder: folder to keep the files in, defaults to default_folder()
+        :param max_bytes: maximum size of all files together
+        """
+        self.folder = folder or default_folder()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.folder, exist_ok=True)
+
+    def file_path(self, key: str):
+        """
+        :param key: result of cache_key
+        :return: path of the file the result is stored in
+        """
+        return os.path.join(self.folder, key + CACHE_EXTENSION)
+
+    def load(self, key: str):
+        """
+        Loads a cached result.
+        :param key: result of cache_key
+        :return: VoxelGrid, None if nothing is cached under the key
+        """
+        file_path = self.file_path(key)
+        try:
+            with np.load(file_path) as data:
+                shape = tuple(int(s) for s in data['shape'])
+                cells = cells_from_bits(data['occupancy_bits'], shape)
+                grid = voxel_grid.VoxelGrid(cells, data['origin'], float(data['voxel_size']), shape, data['colors'])
+        except (OSError, KeyError, ValueError):
+            # missing or unreadable files count as a miss, a broken file gets replaced the next time it is stored
+            self.misses += 1
+            return None
+        os.utime(file_path)
+        self.hits += 1
+        return grid
+
+    def store(self, key: str, grid):
+        """
+        Saves a result and removes the least recently used results if the cache got too big.
+        :param key: result of cache_key
+        :param grid: VoxelGrid
+        """
+        file_path = self.file_path(key)
+        # written to a temporary file first, so an interrupted save never leaves a broken file under the key
+        temporary_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            np.savez_compressed(file, occupancy_bits=grid.occupancy_bits, colors=grid.colors, origin=grid.origin,
+                                voxel_size=grid.voxel_size, shape=np.array(grid.shape, dtype=np.int64))
+        os.replace(temporary_path, file_path)
+        self.evict()
+
+    def entries(self):
+        """
+        :return: list of [path, size, modification time] of every cached result, least recently used first. Decoded
+        textures voxel_sampling keeps in the same folder count as results too
+        """
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(CACHE_EXTENSION) or name.endswith(IMAGE_EXTENSION):
+                stats = os.stat(os.path.join(self.folder, name))
+                entries.append([os.path.join(self.folder, name), stats.st_size, stats.st_mtime])
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """
+        Removes the least recently used results until all files together fit in max_bytes.
+        :return: amount of removed results
+        """
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        removed = 0
+        for file_path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(file_path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """
+        Removes every cached result.
+        """
+        for file_path, _, _ in self.entries():
+            os.remove(file_path)
+
+    def report(self):
+        """
+        :return: text with the amount of hits and misses so far
+        """
+        size = sum(entry[1] for entry in self.entries())
+        return f"Voxel cache: {self.hits} hits, {self.misses} misses, {size / (1 << 20):.1f} MB on disk"
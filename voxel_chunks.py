@@ -0,0 +1,392 @@
+# Chunked voxel grids for densities where a dense grid no longer fits in memory. Only requires numpy.
+import math
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import voxel_engine
+import voxel_io
+import voxel_mesh
+
+
+CHUNK_SIZE = 32
+# default amount of chunk memory kept in RAM before chunks get moved to disk
+MEMORY_BUDGET = 256 * 1024 * 1024
+# above this density meshes are voxelized in chunks, so the dense grid never has to fit in memory
+CHUNKED_DENSITY = 256
+# most faces put together into one mesh when the chunks are streamed out
+MESH_BATCH_FACES = 1 << 18
+
+
+class ChunkedGrid(object):
+    """
+    A voxel grid split into cubic chunks, where only chunks with at least one voxel are stored. Chunks are kept as
+    packed bits (4 KB for a 32^3 chunk) plus optional uint8 colors. When the chunks in memory go over the memory
+    budget, the least recently used ones are written to a memory mapped file and read back from it when needed.
+    """
+
+    def __init__(self, shape, origin, voxel_size: float, chunk_size=CHUNK_SIZE, memory_budget=MEMORY_BUDGET,
+                 spill_path=None, with_color=False):
+        """
+        :param shape: amount of cells along x, y and z
+        :param origin: world position of the corner of cell (0, 0, 0)
+        :param voxel_size: edge length of a single voxel
+        :param chunk_size: amount of cells along each side of a chunk
+        :param memory_budget: maximum amount of bytes of chunk data kept in memory
+        :param spill_path: file the chunks are moved to, a temporary file is used if None
+        :param with_color: whether every chunk also stores a color per cell
+        """
+        self.shape = tuple(int(s) for s in shape)
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(3)
+        self.voxel_size = float(voxel_size)
+        self.chunk_size = chunk_size
+        self.memory_budget = memory_budget
+        self.with_color = with_color
+        self.chunk_counts = tuple(math.ceil(s / chunk_size) for s in self.shape)
+
+        cells = chunk_size ** 3
+        self.bits_size = cells // 8
+        self.record_size = self.bits_size + (cells * 3 if with_color else 0)
+
+        # chunk key -> record bytes, ordered from least to most recently used
+        self.memory = OrderedDict()
+        # chunk key -> slot in the spill file
+        self.spilled = {}
+        self.spill_path = spill_path
+        # temporary spill files are deleted again when the grid is closed
+        self.temporary_spill = spill_path is None
+        self.spill_file = None
+        self.spill_slots = 0
+        self.next_slot = 0
+        self.free_slots = []
+
+    def __del__(self):
+        self.close()
+
+    def __len__(self):
+        # goes over every chunk, the count isn't kept up to date while chunks get set
+        return self.voxel_count()
+
+    def close(self):
+        """
+        Releases the spill file, and deletes it if it was a temporary one.
+        """
+        if self.spill_file is not None:
+            del self.spill_file
+            self.spill_file = None
+            if self.temporary_spill:
+                os.remove(self.spill_path)
+
+    def chunk_keys(self):
+        """
+        :return: sorted list of the keys of all non-empty chunks
+        """
+        return sorted(list(self.memory.keys()) + list(self.spilled.keys()))
+
+    def memory_usage(self):
+        """
+        :return: amount of bytes of chunk data currently kept in memory
+        """
+        return len(self.memory) * self.record_size
+
+    def chunk_shape(self, key):
+        """
+        Chunks at the far edges of the grid can be smaller than the chunk size.
+        :param key: [chunk x, chunk y, chunk z]
+        :return: amount of cells of the chunk along x, y and z
+        """
+        return tuple(min(self.chunk_size, self.shape[a] - key[a] * self.chunk_size) for a in range(3))
+
+    def set_chunk(self, key, occupancy, colors=None):
+        """
+        Stores a chunk. Empty chunks are not stored at all.
+        :param key: [chunk x, chunk y, chunk z]
+        :param occupancy: bool array with the shape of the chunk
+        :param colors: uint8 array with the shape of the chunk + (3,)
+        """
+        key = tuple(int(k) for k in key)
+        if key in self.spilled:
+            # the copy on disk is outdated now
+            self.free_slots.append(self.spilled.pop(key))
+        if not occupancy.any():
+            self.memory.pop(key, None)
+            return
+        size = self.chunk_size
+        full = np.zeros((size, size, size), dtype=bool)
+        full[tuple(slice(0, s) for s in occupancy.shape)] = occupancy
+        record = np.zeros(self.record_size, dtype=np.uint8)
+        record[:self.bits_size] = np.packbits(full.ravel())
+        if self.with_color and colors is not None:
+            full_colors = np.zeros((size, size, size, 3), dtype=np.uint8)
+            full_colors[tuple(slice(0, s) for s in occupancy.shape)] = colors
+            record[self.bits_size:] = full_colors.ravel()
+        self.memory[key] = record
+        self.memory.move_to_end(key)
+        self._enforce_budget()
+
+    def get_chunk(self, key):
+        """
+        Loads a chunk, from disk if it was moved there.
+        :param key: [chunk x, chunk y, chunk z]
+        :return: [occupancy bool array, colors uint8 array or None], or [None, None] for an empty chunk
+        """
+        key = tuple(int(k) for k in key)
+        if key in self.memory:
+            record = self.memory[key]
+            self.memory.move_to_end(key)
+        elif key in self.spilled:
+            record = self.spill_file[self.spilled[key]]
+        else:
+            return [None, None]
+        size = self.chunk_size
+        region = tuple(slice(0, s) for s in self.chunk_shape(key))
+        occupancy = np.unpackbits(record[:self.bits_size]).astype(bool).reshape(size, size, size)[region]
+        colors = None
+        if self.with_color:
+            colors = np.asarray(record[self.bits_size:]).reshape(size, size, size, 3)[region]
+        return [occupancy, colors]
+
+    def _enforce_budget(self):
+        """
+        Moves the least recently used chunks to the spill file until the memory budget is met again.
+        """
+        while self.memory and self.memory_usage() > self.memory_budget:
+            key, record = self.memory.popitem(last=False)
+            slot = self._spill_slot()
+            self.spill_file[slot] = record
+            self.spilled[key] = slot
+
+    def _spill_slot(self):
+        """
+        Finds a free record in the spill file, doubling the file when it is full.
+        :return: index of the record
+        """
+        if self.free_slots:
+            return self.free_slots.pop()
+        if self.next_slot >= self.spill_slots:
+            if self.spill_path is None:
+                handle, self.spill_path = tempfile.mkstemp(suffix='.chunks')
+                os.close(handle)
+            if self.spill_file is not None:
+                self.spill_file.flush()
+                del self.spill_file
+            self.spill_slots = max(64, self.spill_slots * 2)
+            # grow the file before mapping it again
+            with open(self.spill_path, 'ab') as spill:
+                spill.truncate(self.spill_slots * self.record_size)
+            self.spill_file = np.memmap(self.spill_path, dtype=np.uint8, mode='r+',
+                                        shape=(self.spill_slots, self.record_size))
+        self.next_slot += 1
+        return self.next_slot - 1
+
+    def padded_chunk(self, key):
+        """
+        Loads a chunk with one extra layer of cells from the neighbouring chunks on every side, so faces on the
+        border of the chunk can be checked against the voxels next to them.
+        :param key: [chunk x, chunk y, chunk z]
+        :return: bool array with the shape of the chunk + 2 on every axis
+        """
+        shape = self.chunk_shape(key)
+        padded = np.zeros(tuple(s + 2 for s in shape), dtype=bool)
+        padded[1:-1, 1:-1, 1:-1] = self.get_chunk(key)[0]
+        for axis in range(3):
+            for side in (-1, 1):
+                neighbour_key = list(key)
+                neighbour_key[axis] += side
+                if not 0 <= neighbour_key[axis] < self.chunk_counts[axis]:
+                    continue
+                neighbour = self.get_chunk(neighbour_key)[0]
+                if neighbour is None:
+                    continue
+                # the layer of the neighbour that touches this chunk
+                layer = np.take(neighbour, 0 if side == 1 else neighbour.shape[axis] - 1, axis=axis)
+                target = [slice(1, -1)] * 3
+                target[axis] = shape[axis] + 1 if side == 1 else 0
+                padded[tuple(target)] = layer
+        return padded
+
+    def voxel_count(self):
+        """
+        :return: total amount of voxels over all chunks
+        """
+        return sum(int(self.get_chunk(key)[0].sum()) for key in self.chunk_keys())
+
+
+def voxelize_chunked(vertices, faces, density: int, padding=1.1, chunk_size=CHUNK_SIZE, memory_budget=MEMORY_BUDGET,
+                     spill_path=None, with_color=False, progress=None):
+    """
+    Voxelizes a triangle mesh one chunk at a time, so only a single dense chunk is ever in memory.
+    :param vertices: float array (V, 3) of world space vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param density: amount of voxels along the longest side of the mesh
+    :param padding: how much bigger the grid is than the bounding box of the mesh
+    :param chunk_size: amount of cells along each side of a chunk
+    :param memory_budget: maximum amount of bytes of chunk data kept in memory
+    :param spill_path: file the chunks are moved to when over budget
+    :param with_color: whether the chunks get room for a color per cell, for sample_colors
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every chunk, or None
+    :return: ChunkedGrid
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    origin, voxel_size, shape = voxel_engine.grid_for_bounds(vertices.min(axis=0), vertices.max(axis=0), density,
+                                                             padding)
+    grid = ChunkedGrid(shape, origin, voxel_size, chunk_size, memory_budget, spill_path, with_color)
+    if len(faces) == 0:
+        return grid
+
+    # find which chunks each triangle touches, in chunk space
+    triangles = (vertices[faces] - origin) / (voxel_size * chunk_size)
+    limit = np.array(grid.chunk_counts) - 1
+    low = np.clip(np.floor(triangles.min(axis=1)).astype(np.int64), 0, limit)
+    high = np.clip(np.floor(triangles.max(axis=1)).astype(np.int64), 0, limit)
+    tri_index, chunk_keys = voxel_engine._candidate_pairs(low, high)
+    flat_keys = (chunk_keys[:, 0] * grid.chunk_counts[1] + chunk_keys[:, 1]) * grid.chunk_counts[2] + chunk_keys[:, 2]
+    order = np.argsort(flat_keys, kind='stable')
+    flat_keys = flat_keys[order]
+    tri_index = tri_index[order]
+    chunk_keys = chunk_keys[order]
+    starts = np.flatnonzero(np.r_[True, flat_keys[1:] != flat_keys[:-1]])
+    ends = np.r_[starts[1:], len(flat_keys)]
+
+    if progress is not None:
+        progress.begin(len(starts), 'chunks')
+    for start, end in zip(starts, ends):
+        key = chunk_keys[start]
+        region = [key * chunk_size, key * chunk_size + grid.chunk_shape(key)]
+        occupancy = voxel_engine.voxelize_surface(vertices, faces[tri_index[start:end]], origin, voxel_size, shape,
+                                                  region)
+        grid.set_chunk(key, occupancy)
+        if progress is not None:
+            progress.advance()
+    if progress is not None:
+        progress.finish()
+    return grid
+
+
+def chunk_cells(grid, key):
+    """
+    :param grid: ChunkedGrid
+    :param key: [chunk x, chunk y, chunk z]
+    :return: int array (N, 3) of the global cells of the voxels in the chunk, in x, y, z order
+    """
+    occupancy = grid.get_chunk(key)[0]
+    return np.argwhere(occupancy) + np.asarray(key) * grid.chunk_size
+
+
+def iter_chunk_faces(grid):
+    """
+    Goes over the exposed voxel faces one chunk at a time.
+    :param grid: ChunkedGrid
+    :return: generator of [chunk key, face cells int array (F, 3), face directions int array (F,)]
+    """
+    for key in grid.chunk_keys():
+        padded = grid.padded_chunk(key)
+        inner = padded[1:-1, 1:-1, 1:-1]
+        offset = np.asarray(key) * grid.chunk_size
+        face_cells = []
+        face_directions = []
+        for direction in range(6):
+            normal = voxel_mesh.FACE_NORMALS[direction]
+            neighbour = padded[tuple(slice(1 + n, padded.shape[a] - 1 + n) for a, n in enumerate(normal))]
+            found = np.argwhere(inner & ~neighbour)
+            face_cells.append(found + offset)
+            face_directions.append(np.full(len(found), direction, dtype=np.int64))
+        yield [key, np.concatenate(face_cells), np.concatenate(face_directions)]
+
+
+def iter_chunk_meshes(grid):
+    """
+    Builds the exposed faces of each chunk into their own polygon arrays. Vertices are only shared within a chunk,
+    so any number of chunks can be written out without holding the whole mesh in memory.
+    :param grid: ChunkedGrid
+    :return: generator of [chunk key, points, face counts, face connects, uint8 color of every face (F, 3) or None
+    when the grid has no colors]
+    """
+    for key, face_cells, face_directions in iter_chunk_faces(grid):
+        corners = face_cells[:, None, :] + voxel_mesh.FACE_CORNERS[face_directions]
+        points, face_counts, face_connects = voxel_mesh.quad_arrays(corners, grid.origin, grid.voxel_size,
+                                                                    grid.shape)
+        face_colors = None
+        if grid.with_color:
+            inner = face_cells - np.asarray(key) * grid.chunk_size
+            face_colors = grid.get_chunk(key)[1][inner[:, 0], inner[:, 1], inner[:, 2]]
+        yield [key, points, face_counts, face_connects, face_colors]
+
+
+def iter_mesh_batches(grid, max_faces=MESH_BATCH_FACES):
+    """
+    Puts the meshes of neighbouring chunks together until they reach max_faces, so streaming a big grid out doesn't
+    take a separate mesh or write for every chunk.
+    :param grid: ChunkedGrid
+    :param max_faces: most faces per batch, unless a single chunk has more
+    :return: generator of [points, face counts, face connects, uint8 color of every face (F, 3) or None]
+    """
+    batch = []
+    batch_faces = 0
+    for _, points, face_counts, face_connects, face_colors in iter_chunk_meshes(grid):
+        if batch and batch_faces + len(face_counts) > max_faces:
+            yield _join_meshes(batch)
+            batch = []
+            batch_faces = 0
+        batch.append([points, face_counts, face_connects, face_colors])
+        batch_faces += len(face_counts)
+    if batch:
+        yield _join_meshes(batch)
+
+
+def _join_meshes(meshes):
+    """
+    :param meshes: list of [points, face counts, face connects, face colors or None]
+    :return: [points, face counts, face connects, face colors or None] of all of them as one mesh
+    """
+    offsets = np.cumsum([0] + [len(mesh[0]) for mesh in meshes[:-1]])
+    points = np.concatenate([mesh[0] for mesh in meshes])
+    face_counts = np.concatenate([mesh[1] for mesh in meshes])
+    face_connects = np.concatenate([mesh[2] + offset for mesh, offset in zip(meshes, offsets)])
+    face_colors = None if meshes[0][3] is None else np.concatenate([mesh[3] for mesh in meshes])
+    return [points, face_counts, face_connects, face_colors]
+
+
+def sample_colors(grid, sampler, progress=None):
+    """
+    Colors the voxels one chunk at a time.
+    :param grid: ChunkedGrid created with with_color=True
+    :param sampler: function that takes a float array (N, 3) of voxel centers and returns uint8 colors (N, 3), like
+    the one of voxel_sampling.mesh_color_sampler
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every chunk, or None
+    """
+    keys = grid.chunk_keys()
+    if progress is not None:
+        progress.begin(len(keys), 'chunks colored')
+    for key in keys:
+        occupancy, colors = grid.get_chunk(key)
+        cells = np.argwhere(occupancy)
+        positions = grid.origin + (cells + np.asarray(key) * grid.chunk_size + 0.5) * grid.voxel_size
+        colors = colors.copy()
+        colors[occupancy] = sampler(positions)
+        grid.set_chunk(key, occupancy, colors)
+        if progress is not None:
+            progress.advance()
+    if progress is not None:
+        progress.finish()
+
+
+def write_obj(grid, file_path: str):
+    """
+    Streams the exposed faces of the grid into an obj file a batch of chunks at a time, with the voxel colors on the
+    vertices if the grid has colors. A palette texture would need every color at once, so there is none.
+    :param grid: ChunkedGrid
+    :param file_path: path of the obj file
+    :return: [amount of points, amount of faces] written
+    """
+    def batches():
+        for points, face_counts, face_connects, face_colors in iter_mesh_batches(grid):
+            vertex_colors = None
+            if face_colors is not None:
+                # obj files store colors per point, so every face vertex gets its own point
+                points, face_connects = voxel_mesh.unshare_points(points, face_connects)
+                vertex_colors = np.repeat(face_colors, face_counts, axis=0)
+            yield [points, face_counts, face_connects, vertex_colors]
+
+    return voxel_io.write_obj_batches(file_path, batches())
@@ -0,0 +1,337 @@
+# Maya independent voxelization engine. Only requires numpy, so it can be run and tested outside of Maya.
+import math
+import numpy as np
+
+
+# maximum amount of (triangle, cell) pairs that get tested at the same time, keeps memory usage in check. Small
+# batches stay in the CPU cache, and keep the time between two progress reports short
+PAIR_BATCH_SIZE = 1 << 16
+
+# labels of classify_cells
+CELL_EXTERIOR = 0
+CELL_SURFACE = 1
+CELL_INTERIOR = 2
+
+# 'surface' keeps the cells touched by the mesh, 'solid' fills the inside as well and 'hollow' only keeps the outer
+# layers of the solid
+FILL_MODES = ('surface', 'solid', 'hollow')
+
+
+def grid_for_bounds(bbox_min, bbox_max, density: int, padding=1.1):
+    """
+    Calculates the grid that encapsulates the given bounding box. Like the fluid container the old voxelizer used, the
+    box is scaled up by the padding and the density is the amount of voxels along the longest side.
+    :param bbox_min: [x_min, y_min, z_min]
+    :param bbox_max: [x_max, y_max, z_max]
+    :param density: amount of voxels along the longest side of the box
+    :param padding: how much bigger the grid is than the box
+    :return: [origin, voxel_size, shape] where origin is the world position of the corner of cell (0, 0, 0)
+    """
+    bbox_min = np.asarray(bbox_min, dtype=np.float64)
+    bbox_max = np.asarray(bbox_max, dtype=np.float64)
+    size = (bbox_max - bbox_min) * padding
+    voxel_size = float(size.max()) / density
+    if voxel_size <= 0.0:
+        # flat or empty mesh, fall back to a single unit voxel
+        voxel_size = 1.0
+    shape = tuple(max(1, int(math.ceil(s / voxel_size - 1e-9))) for s in size)
+    center = (bbox_min + bbox_max) / 2
+    origin = center - np.array(shape) * voxel_size / 2
+    return [origin, voxel_size, shape]
+
+
+def _candidate_pairs(tri_lo, tri_hi):
+    """
+    Expands the cell range of each triangle into a flat list of (triangle, cell) pairs.
+    :param tri_lo: int array (T, 3) of the lowest cell index each triangle touches
+    :param tri_hi: int array (T, 3) of the highest cell index each triangle touches
+    :return: [triangle index per pair, cell index per pair (P, 3)]
+    """
+    extent = tri_hi - tri_lo + 1
+    counts = extent.prod(axis=1)
+    tri_index = np.repeat(np.arange(len(counts)), counts)
+    # local index of each pair inside the box of its triangle
+    starts = np.cumsum(counts) - counts
+    local = np.arange(counts.sum()) - np.repeat(starts, counts)
+    ext = extent[tri_index]
+    iz = local % ext[:, 2]
+    iy = (local // ext[:, 2]) % ext[:, 1]
+    ix = local // (ext[:, 2] * ext[:, 1])
+    cells = tri_lo[tri_index] + np.stack([ix, iy, iz], axis=1)
+    return [tri_index, cells]
+
+
+def triangle_box_overlap(v0, v1, v2, centers, half_size):
+    """
+    Separating axis test between triangles and axis aligned boxes, vectorized over pairs. Every row of the inputs is
+    one pair of a triangle and a box.
+    :param v0: float array (P, 3), first vertex of each triangle
+    :param v1: float array (P, 3), second vertex of each triangle
+    :param v2: float array (P, 3), third vertex of each triangle
+    :param centers: float array (P, 3), center of each box
+    :param half_size: half the edge length of the boxes, or float array (P, 3) with the half size of every box along
+    x, y and z
+    :return: bool array (P,) that is True where the triangle touches the box
+    """
+    # a small tolerance so triangles lying exactly on a cell border don't fall through the grid
+    h = np.asarray(half_size, dtype=np.float64) * (1.0 + 1e-6)
+
+    def radius(vectors):
+        # half the length of the boxes projected on every vector, the single size case is kept separate as it is faster
+        if h.ndim:
+            return (h * np.abs(vectors)).sum(axis=1)
+        return h * np.abs(vectors).sum(axis=1)
+
+    a = v0 - centers
+    b = v1 - centers
+    c = v2 - centers
+
+    # box normals
+    overlap = np.ones(len(centers), dtype=bool)
+    for axis in range(3):
+        lo = np.minimum(np.minimum(a[:, axis], b[:, axis]), c[:, axis])
+        hi = np.maximum(np.maximum(a[:, axis], b[:, axis]), c[:, axis])
+        h_axis = h[:, axis] if h.ndim else h
+        overlap &= (lo <= h_axis) & (hi >= -h_axis)
+
+    # triangle normal
+    e0 = b - a
+    e1 = c - b
+    e2 = a - c
+    normal = np.cross(e0, e1)
+    distance = np.einsum('ij,ij->i', normal, a)
+    overlap &= np.abs(distance) <= radius(normal)
+
+    # cross products of the box axes with the triangle edges
+    for edge in (e0, e1, e2):
+        for axis in range(3):
+            # cross(unit axis, edge) written out, so we don't build the full axis arrays
+            u = (axis + 1) % 3
+            w = (axis + 2) % 3
+            axis_vector = np.zeros_like(edge)
+            axis_vector[:, u] = -edge[:, w]
+            axis_vector[:, w] = edge[:, u]
+            pa = np.einsum('ij,ij->i', axis_vector, a)
+            pb = np.einsum('ij,ij->i', axis_vector, b)
+            pc = np.einsum('ij,ij->i', axis_vector, c)
+            axis_radius = radius(axis_vector)
+            lo = np.minimum(np.minimum(pa, pb), pc)
+            hi = np.maximum(np.maximum(pa, pb), pc)
+            overlap &= (lo <= axis_radius) & (hi >= -axis_radius)
+    return overlap
+
+
+def voxelize_surface(vertices, faces, origin, voxel_size: float, shape, region=None, progress=None):
+    """
+    Marks every cell of the grid that is touched by at least one triangle.
+    :param vertices: float array (V, 3) of vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param origin: world position of the corner of cell (0, 0, 0)
+    :param voxel_size: edge length of a single cell
+    :param shape: amount of cells along x, y and z
+    :param region: [lowest cell, highest cell + 1] of the part of the grid to voxelize, or None for the whole grid.
+    Cells are still tested in the coordinates of the whole grid, so voxelizing a grid in parts gives exactly the same
+    result as voxelizing it at once
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every triangle tested, or None
+    :return: bool array with the shape of the region, indexed [x, y, z]
+    """
+    if region is None:
+        region = [np.zeros(3, dtype=np.int64), np.array(shape, dtype=np.int64)]
+    region_lo = np.asarray(region[0], dtype=np.int64)
+    region_hi = np.asarray(region[1], dtype=np.int64)
+    occupancy = np.zeros(tuple(region_hi - region_lo), dtype=bool)
+    for _, hit_cells in _surface_hits(vertices, faces, origin, voxel_size, shape, region, progress):
+        hit_cells = hit_cells - region_lo
+        occupancy[hit_cells[:, 0], hit_cells[:, 1], hit_cells[:, 2]] = True
+    return occupancy
+
+
+def _surface_hits(vertices, faces, origin, voxel_size: float, shape, region, progress=None):
+    """
+    Tests the triangles against the cells they could touch, in batches so the amount of pairs stays below
+    PAIR_BATCH_SIZE.
+    :param vertices: float array (V, 3) of vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param origin: world position of the corner of cell (0, 0, 0)
+    :param voxel_size: edge length of a single cell
+    :param shape: amount of cells along x, y and z
+    :param region: [lowest cell, highest cell + 1] of the part of the grid to test
+    :param progress: voxel_profile.ProgressReporter that gets advanced after every batch, or None
+    :return: generator of [triangle index per hit, cell per hit (H, 3)], triangle indices point into faces
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    origin = np.asarray(origin, dtype=np.float64)
+    region_lo = np.asarray(region[0], dtype=np.int64)
+    region_hi = np.asarray(region[1], dtype=np.int64)
+    if len(faces) == 0:
+        return
+
+    # work in grid space, where every cell is 1 unit wide
+    grid_vertices = (vertices - origin) / voxel_size
+    tri = grid_vertices[faces]
+    limit = np.array(shape) - 1
+    tri_lo = np.clip(np.floor(tri.min(axis=1)).astype(np.int64), 0, limit)
+    tri_hi = np.clip(np.floor(tri.max(axis=1)).astype(np.int64), 0, limit)
+
+    # only keep the triangles that reach into the region, and only test the cells inside of it
+    inside = ((tri_hi >= region_lo) & (tri_lo < region_hi)).all(axis=1)
+    triangle_ids = np.flatnonzero(inside)
+    tri = tri[inside]
+    tri_lo = np.maximum(tri_lo[inside], region_lo)
+    tri_hi = np.minimum(tri_hi[inside], region_hi - 1)
+
+    # split the triangles into batches so the amount of pairs stays below the batch size
+    counts = (tri_hi - tri_lo + 1).prod(axis=1)
+    cumulative = np.cumsum(counts)
+    if progress is not None:
+        progress.begin(len(tri), 'triangles')
+    start = 0
+    while start < len(tri):
+        offset = cumulative[start] - counts[start]
+        end = int(np.searchsorted(cumulative, offset + PAIR_BATCH_SIZE, side='right'))
+        # a single huge triangle can be bigger than a batch, so every batch holds at least one triangle
+        end = max(end, start + 1)
+        tri_index, cells = _candidate_pairs(tri_lo[start:end], tri_hi[start:end])
+        tri_index += start
+        hit = triangle_box_overlap(tri[tri_index, 0], tri[tri_index, 1], tri[tri_index, 2], cells + 0.5, 0.5)
+        yield [triangle_ids[tri_index[hit]], cells[hit]]
+        if progress is not None:
+            progress.advance(end - start)
+        start = end
+    if progress is not None:
+        progress.finish()
+
+
+def voxelize(vertices, faces, density: int, padding=1.1, progress=None):
+    """
+    Voxelizes a triangle mesh. The grid is fitted around the mesh the same way the fluid container used to be.
+    :param vertices: float array (V, 3) of world space vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param density: amount of voxels along the longest side of the mesh
+    :param padding: how much bigger the grid is than the bounding box of the mesh
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every triangle tested, or None
+    :return: [occupancy, origin, voxel_size]
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    origin, voxel_size, shape = grid_for_bounds(vertices.min(axis=0), vertices.max(axis=0), density, padding)
+    occupancy = voxelize_surface(vertices, faces, origin, voxel_size, shape, progress=progress)
+    return [occupancy, origin, voxel_size]
+
+
+def _grow_axis(mask, axis: int):
+    """
+    :param mask: bool array
+    :param axis: axis to grow along
+    :return: copy of the mask grown by one cell in both directions along the axis
+    """
+    grown = mask.copy()
+    view = np.moveaxis(grown, axis, 0)
+    source = np.moveaxis(mask, axis, 0)
+    view[1:] |= source[:-1]
+    view[:-1] |= source[1:]
+    return grown
+
+
+def grow(mask, steps: int, diagonal=False):
+    """
+    Grows a mask by the given amount of cells.
+    :param mask: bool array indexed [x, y, z]
+    :param steps: amount of cells to grow by
+    :param diagonal: grow into all 26 surrounding cells every step, instead of only the 6 that share a face
+    :return: bool array
+    """
+    grown = np.asarray(mask, dtype=bool)
+    for _ in range(steps):
+        if diagonal:
+            # growing along each axis in turn covers the whole 3 x 3 x 3 block
+            for axis in range(3):
+                grown = _grow_axis(grown, axis)
+        else:
+            grown = _grow_axis(grown, 0) | _grow_axis(grown, 1) | _grow_axis(grown, 2)
+    return grown
+
+
+def _spread_along(open_cells, reached, axis: int):
+    """
+    Spreads the reached cells along straight lines through the open cells.
+    :param open_cells: bool array of the cells that can be passed through
+    :param reached: bool array of the cells that were reached so far, all open
+    :param axis: axis the lines run along
+    :return: bool array of every open cell that is in the same unbroken line of open cells as a reached cell
+    """
+    open_lines = np.moveaxis(open_cells, axis, -1)
+    lines = open_lines.shape[:-1]
+    length = open_lines.shape[-1]
+    # every run of open cells along a line gets its own id, the closed cells in between bump the id
+    runs = np.cumsum(~open_lines, axis=-1, dtype=np.int64)
+    runs += np.arange(math.prod(lines), dtype=np.int64).reshape(lines + (1,)) * (length + 1)
+    reached_runs = np.zeros(math.prod(lines) * (length + 1), dtype=bool)
+    reached_runs[runs[np.moveaxis(reached, axis, -1)]] = True
+    return np.moveaxis(open_lines & reached_runs[runs], -1, axis)
+
+
+def flood_exterior(open_cells):
+    """
+    Finds the open cells that can be reached from the border of the grid by stepping between cells that share a face.
+    Instead of visiting one cell at a time, every pass spreads along whole lines of open cells along x, y and z.
+    :param open_cells: bool array indexed [x, y, z] of the cells that can be passed through
+    :return: bool array
+    """
+    reached = np.zeros_like(open_cells)
+    for axis in range(3):
+        border = [slice(None)] * 3
+        for side in (0, -1):
+            border[axis] = side
+            reached[tuple(border)] = open_cells[tuple(border)]
+    count = -1
+    while count != np.count_nonzero(reached):
+        count = np.count_nonzero(reached)
+        for axis in range(3):
+            reached = _spread_along(open_cells, reached, axis)
+    return reached
+
+
+def classify_cells(surface, gap_size=0):
+    """
+    Labels every cell as outside the mesh, on its surface or inside of it. The outside is everything that can be
+    reached from the border of the grid without crossing the surface.
+    :param surface: bool array indexed [x, y, z] of the cells touched by the mesh
+    :param gap_size: holes in the mesh up to this many cells wide are closed first, so the outside doesn't leak in
+    :return: uint8 array of CELL_EXTERIOR, CELL_SURFACE and CELL_INTERIOR
+    """
+    surface = np.asarray(surface, dtype=bool)
+    if gap_size > 0:
+        # close the holes by growing the surface, the extra border keeps the outside of the grid open
+        steps = -(-int(gap_size) // 2)
+        padded = np.pad(surface, steps + 1)
+        exterior = flood_exterior(~grow(padded, steps, diagonal=True))
+        # then give the outside back the cells the grown surface took from it, which doesn't go through closed holes
+        exterior = grow(exterior, steps, diagonal=True) & ~padded
+        exterior = exterior[tuple(slice(steps + 1, -steps - 1) for _ in range(3))]
+    else:
+        exterior = flood_exterior(~surface)
+    labels = np.full(surface.shape, CELL_INTERIOR, dtype=np.uint8)
+    labels[exterior] = CELL_EXTERIOR
+    labels[surface] = CELL_SURFACE
+    return labels
+
+
+def fill_cells(surface, fill='surface', thickness=1, gap_size=0):
+    """
+    Turns the cells touched by the mesh into the cells to keep.
+    :param surface: bool array indexed [x, y, z] of the cells touched by the mesh
+    :param fill: one of FILL_MODES
+    :param thickness: amount of cell layers 'hollow' keeps, counted inwards from the outside
+    :param gap_size: see classify_cells
+    :return: bool array indexed [x, y, z]
+    """
+    if fill not in FILL_MODES:
+        raise ValueError(f"Unknown fill mode '{fill}', expected one of {FILL_MODES}")
+    if fill == 'surface':
+        return np.asarray(surface, dtype=bool)
+    exterior = classify_cells(surface, gap_size) == CELL_EXTERIOR
+    if fill == 'solid':
+        return ~exterior
+    # the cells that are at most thickness face steps away from the outside
+    return ~exterior & grow(exterior, max(int(thickness), 1))
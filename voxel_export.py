@@ -0,0 +1,293 @@
+# Writes voxels straight to files from their arrays, without building any Maya geometry. Only requires numpy.
+import json
+import os
+import struct
+import numpy as np
+import voxel_chunks
+import voxel_file
+import voxel_io
+import voxel_mesh
+import voxel_palette
+import voxel_texture
+
+
+EXPORT_FORMATS = ('vox', 'obj', 'glb', 'vxg')
+
+# MagicaVoxel models can't be bigger than this along any side, bigger grids are split into several models
+VOX_MODEL_SIZE = 256
+VOX_VERSION = 150
+# amount of faces written to a glb file at a time
+GLB_BLOCK_SIZE = 1 << 18
+
+GLB_FLOAT = 5126
+GLB_UNSIGNED_BYTE = 5121
+GLB_UNSIGNED_INT = 5125
+
+
+def vox_palette(grid, palette=None):
+    """
+    Gets the palette of a .vox file, which can hold at most 255 colors.
+    :param grid: VoxelGrid
+    :param palette: uint8 array (P, 3) from create_texture that grid.color_ids point into, or None
+    :return: [palette uint8 array (P, 3) with P <= 255, palette index of every voxel uint32 array (N,)]
+    """
+    if palette is not None and len(palette) <= VOX_MODEL_SIZE - 1:
+        return [np.asarray(palette, dtype=np.uint8).reshape(-1, 3), grid.color_ids]
+    # too many colors, or no palette yet, so the voxel colors are quantized into one that fits
+    return voxel_palette.build_palette(grid.colors, mode='median_cut', palette_size=VOX_MODEL_SIZE - 1)
+
+
+def _vox_chunk(chunk_id: bytes, content: bytes, children_size=0):
+    """
+    :return: header and content of a .vox chunk, its children have to be written after it
+    """
+    return chunk_id + struct.pack('<ii', len(content), children_size) + content
+
+
+def _vox_dict(values):
+    """
+    :param values: dictionary of strings
+    :return: a dictionary the way .vox files store them
+    """
+    data = struct.pack('<i', len(values))
+    for key, value in values.items():
+        for text in (key.encode(), value.encode()):
+            data += struct.pack('<i', len(text)) + text
+    return data
+
+
+def _vox_scene(model_offsets, model_sizes, vox_shape):
+    """
+    Builds the scene graph that puts every model in its place: a root transform, a group, and a transform with a
+    shape for every model.
+    :return: bytes of all scene chunks
+    """
+    nodes = [_vox_chunk(b'nTRN', struct.pack('<i', 0) + _vox_dict({}) + struct.pack('<iiii', 1, -1, -1, 1) +
+                        _vox_dict({})),
+             _vox_chunk(b'nGRP', struct.pack('<i', 1) + _vox_dict({}) + struct.pack('<i', len(model_offsets)) +
+                        struct.pack(f'<{len(model_offsets)}i', *[2 + 2 * x for x in range(len(model_offsets))]))]
+    for model in range(len(model_offsets)):
+        # models are placed by the center voxel, and the whole grid is centered on the origin
+        translation = model_offsets[model] + model_sizes[model] // 2 - vox_shape // 2
+        frame = _vox_dict({'_t': ' '.join(str(int(x)) for x in translation)})
+        nodes.append(_vox_chunk(b'nTRN', struct.pack('<i', 2 + 2 * model) + _vox_dict({}) +
+                                struct.pack('<iiii', 3 + 2 * model, -1, 0, 1) + frame))
+        nodes.append(_vox_chunk(b'nSHP', struct.pack('<i', 3 + 2 * model) + _vox_dict({}) +
+                                struct.pack('<ii', 1, model) + _vox_dict({})))
+    return b''.join(nodes)
+
+
+def write_vox(file_path: str, grid, palette=None):
+    """
+    Writes the voxels as a MagicaVoxel .vox file. Grids bigger than 256 voxels along a side are split into several
+    models that are placed next to each other.
+    :param file_path: path of the .vox file
+    :param grid: VoxelGrid
+    :param palette: uint8 array (P, 3) from create_texture that grid.color_ids point into, or None to quantize the
+    voxel colors
+    :return: amount of models in the file
+    """
+    palette, color_ids = vox_palette(grid, palette)
+    # MagicaVoxel has z pointing up where Maya has y, so y and z swap and the new y is flipped to stay right handed
+    cells = grid.cells.astype(np.int64)
+    vox_cells = np.stack([cells[:, 0], grid.shape[2] - 1 - cells[:, 2], cells[:, 1]], axis=1)
+    vox_shape = np.array([grid.shape[0], grid.shape[2], grid.shape[1]], dtype=np.int64)
+
+    model_grid = -(-vox_shape // VOX_MODEL_SIZE)
+    model_cells = vox_cells // VOX_MODEL_SIZE
+    model_keys = (model_cells[:, 0] * model_grid[1] + model_cells[:, 1]) * model_grid[2] + model_cells[:, 2]
+    order = np.argsort(model_keys, kind='stable')
+    model_keys = model_keys[order]
+    used_keys, starts = np.unique(model_keys, return_index=True)
+    ends = np.r_[starts[1:], len(model_keys)]
+    if len(used_keys) == 0:
+        # an empty model, since a .vox file needs at least one
+        used_keys, starts, ends = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(1, np.int64)
+    model_offsets = np.stack(np.unravel_index(used_keys, model_grid), axis=1) * VOX_MODEL_SIZE
+    model_sizes = np.minimum(vox_shape - model_offsets, VOX_MODEL_SIZE)
+
+    rgba = np.zeros((256, 4), dtype=np.uint8)
+    # color index 0 means empty, so voxels use their palette index + 1, and entry x of the RGBA chunk is color x + 1
+    rgba[:len(palette), :3] = palette
+    rgba[:len(palette), 3] = 255
+    scene = _vox_scene(model_offsets, model_sizes, vox_shape) if len(used_keys) > 1 else b''
+    children_size = (sum(24 + 16 + 4 * int(end - start) for start, end in zip(starts, ends)) + len(scene) +
+                     12 + rgba.nbytes)
+
+    with open(file_path, 'wb') as file:
+        file.write(b'VOX ' + struct.pack('<i', VOX_VERSION))
+        file.write(_vox_chunk(b'MAIN', b'', children_size))
+        for model in range(len(used_keys)):
+            voxels = order[starts[model]:ends[model]]
+            xyzi = np.empty((len(voxels), 4), dtype=np.uint8)
+            xyzi[:, :3] = vox_cells[voxels] - model_offsets[model]
+            xyzi[:, 3] = color_ids[voxels] + 1
+            file.write(_vox_chunk(b'SIZE', struct.pack('<iii', *[int(s) for s in model_sizes[model]])))
+            file.write(b'XYZI' + struct.pack('<iii', 4 + xyzi.nbytes, 0, len(voxels)))
+            file.write(memoryview(xyzi))
+        file.write(scene)
+        file.write(b'RGBA' + struct.pack('<ii', rgba.nbytes, 0))
+        file.write(memoryview(rgba))
+    return len(used_keys)
+
+
+def face_colors(grid, face_voxels=None, face_color_ids=None, palette=None):
+    """
+    Gets the color of every face of a voxel mesh.
+    :param grid: VoxelGrid
+    :param face_voxels: voxel index of every face, as returned by voxel_mesh.build_mesh
+    :param face_color_ids: palette index of every face, as returned by voxel_mesh.build_greedy_mesh
+    :param palette: uint8 array (P, 3) the color ids point into
+    :return: uint8 array (F, 3)
+    """
+    if face_voxels is not None:
+        return grid.colors[face_voxels]
+    if palette is not None:
+        return np.asarray(palette, dtype=np.uint8)[face_color_ids]
+    return np.full((len(face_color_ids), 3), 255, dtype=np.uint8)
+
+
+def _glb_view(views, accessors, offset: int, size: int, accessor, target=None):
+    """
+    Adds a buffer view and its accessor to the glTF json, aligned to 4 bytes.
+    :return: offset of the next view
+    """
+    view = {'buffer': 0, 'byteOffset': offset, 'byteLength': size}
+    if target:
+        view['target'] = target
+    accessor['bufferView'] = len(views)
+    views.append(view)
+    accessors.append(accessor)
+    return offset + (size + 3) // 4 * 4
+
+
+def write_glb(file_path: str, points, face_counts, face_connects, colors):
+    """
+    Writes a polygon mesh as a binary glTF file. Every face gets its own vertices so it has a single flat color and
+    normal. The vertex data is written in blocks straight from the arrays, without building the whole buffer in memory.
+    :param file_path: path of the .glb file
+    :param points: float array (P, 3)
+    :param face_counts: amount of vertices of every face
+    :param face_connects: vertex index of every face vertex
+    :param colors: uint8 array (F, 3) with the color of every face
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    face_connects = np.asarray(face_connects, dtype=np.int64)
+    colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+    starts = np.cumsum(face_counts) - face_counts
+    corner_count = len(face_connects)
+    triangle_count = int((face_counts - 2).sum())
+
+    views = []
+    accessors = []
+    offset = 0
+    lowest = points.min(axis=0) if len(points) else np.zeros(3)
+    highest = points.max(axis=0) if len(points) else np.zeros(3)
+    offset = _glb_view(views, accessors, offset, corner_count * 12,
+                       {'componentType': GLB_FLOAT, 'count': corner_count, 'type': 'VEC3',
+                        'min': lowest.tolist(), 'max': highest.tolist()}, 34962)
+    offset = _glb_view(views, accessors, offset, corner_count * 12,
+                       {'componentType': GLB_FLOAT, 'count': corner_count, 'type': 'VEC3'}, 34962)
+    offset = _glb_view(views, accessors, offset, corner_count * 4,
+                       {'componentType': GLB_UNSIGNED_BYTE, 'normalized': True, 'count': corner_count,
+                        'type': 'VEC4'}, 34962)
+    buffer_size = _glb_view(views, accessors, offset, triangle_count * 12,
+                            {'componentType': GLB_UNSIGNED_INT, 'count': triangle_count * 3, 'type': 'SCALAR'},
+                            34963)
+    gltf = {'asset': {'version': '2.0', 'generator': 'Voxelizer'}, 'scene': 0, 'scenes': [{'nodes': [0]}],
+            'nodes': [{'mesh': 0, 'name': os.path.splitext(os.path.basename(file_path))[0]}],
+            'meshes': [{'primitives': [{'attributes': {'POSITION': 0, 'NORMAL': 1, 'COLOR_0': 2}, 'indices': 3,
+                                        'material': 0}]}],
+            'materials': [{'pbrMetallicRoughness': {'metallicFactor': 0.0, 'roughnessFactor': 1.0}}],
+            'buffers': [{'byteLength': buffer_size}], 'bufferViews': views, 'accessors': accessors}
+    header = json.dumps(gltf, separators=(',', ':')).encode()
+    header += b' ' * (-len(header) % 4)
+
+    blocks = [[start, min(start + GLB_BLOCK_SIZE, len(face_counts))]
+              for start in range(0, len(face_counts), GLB_BLOCK_SIZE)]
+
+    with open(file_path, 'wb') as file:
+        file.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(header) + 8 + buffer_size))
+        file.write(struct.pack('<I4s', len(header), b'JSON') + header)
+        file.write(struct.pack('<I4s', buffer_size, b'BIN\x00'))
+        # positions
+        for start, end in blocks:
+            corners = face_connects[starts[start]:starts[end - 1] + face_counts[end - 1]]
+            file.write(memoryview(points[corners].astype(np.float32)))
+        # normals, from the first three corners of each face
+        for start, end in blocks:
+            corners = points[face_connects[starts[start:end, None] + np.arange(3)]]
+            normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 1])
+            normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+            file.write(memoryview(np.repeat(normals, face_counts[start:end], axis=0).astype(np.float32)))
+        # colors
+        for start, end in blocks:
+            rgba = np.full((end - start, 4), 255, dtype=np.uint8)
+            rgba[:, :3] = colors[start:end]
+            file.write(memoryview(np.repeat(rgba, face_counts[start:end], axis=0)))
+        # triangles, fanned out from the first corner of each face
+        for start, end in blocks:
+            counts = face_counts[start:end] - 2
+            face = np.repeat(np.arange(start, end), counts)
+            step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            first = starts[face]
+            triangles = np.stack([first, first + step + 1, first + step + 2], axis=1).astype(np.uint32)
+            file.write(memoryview(triangles))
+
+
+def export_voxels(file_path: str, grid, merge=False, palette=None, uv_table=None, texture_path='',
+                  color_output='texture'):
+    """
+    Writes the voxels to a file, the format is picked by the extension of the path.
+    :param file_path: path ending in one of EXPORT_FORMATS
+    :param grid: VoxelGrid, or a voxel_chunks.ChunkedGrid which can only be streamed into an obj file with vertex
+    colors
+    :param merge: whether to merge coplanar faces with the same color id, for obj and glb files
+    :param palette: uint8 array (P, 3) that grid.color_ids point into, or None if there is no palette yet
+    :param uv_table: UV lookup table from voxel_texture.build_atlas, obj files get UVs on the palette texture with it
+    :param texture_path: path of the palette texture, referenced by the material of obj files
+    :param color_output: 'vertex' gives obj files vertex colors instead of UVs, one of voxel_mesh.COLOR_OUTPUTS
+    :return: path of the written file
+    """
+    file_format = os.path.splitext(file_path)[1][1:].lower()
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}', expected one of {EXPORT_FORMATS}")
+    if isinstance(grid, voxel_chunks.ChunkedGrid):
+        if file_format != 'obj':
+            raise ValueError(f"Chunked grids can only be exported as obj, not {file_format}")
+        voxel_chunks.write_obj(grid, file_path)
+        return file_path
+    if file_format == 'vox':
+        write_vox(file_path, grid, palette)
+        return file_path
+    if file_format == 'vxg':
+        voxel_file.write_voxel_file(file_path, grid, palette)
+        return file_path
+
+    face_voxels = None
+    if merge and palette is None and len(grid) and (grid.colors == grid.colors[0]).all():
+        # voxels without a texture all share one color, so they can be merged without a palette
+        palette = grid.colors[:1]
+    if merge and palette is not None:
+        points, face_counts, face_connects, face_color_ids, _ = voxel_mesh.build_greedy_mesh(grid)
+    else:
+        points, face_counts, face_connects, face_voxels = voxel_mesh.build_mesh(grid)
+        face_color_ids = grid.color_ids[face_voxels]
+
+    if file_format == 'glb':
+        write_glb(file_path, points, face_counts, face_connects,
+                  face_colors(grid, face_voxels, face_color_ids, palette))
+    elif color_output == 'vertex':
+        points, face_connects = voxel_mesh.unshare_points(points, face_connects)
+        voxel_io.write_obj(file_path, points, face_counts, face_connects, vertex_colors=np.repeat(
+            face_colors(grid, face_voxels, face_color_ids, palette), face_counts, axis=0))
+    elif uv_table is not None:
+        u, v, uv_ids = voxel_texture.face_uvs(face_color_ids, face_counts, uv_table)
+        texture_name = os.path.relpath(texture_path, os.path.dirname(os.path.abspath(file_path))) \
+            if texture_path else ''
+        voxel_io.write_obj(file_path, points, face_counts, face_connects, np.stack([u, v], axis=1), uv_ids,
+                           texture_name)
+    else:
+        voxel_io.write_obj(file_path, points, face_counts, face_connects)
+    return file_path
@@ -0,0 +1,374 @@
+# Saves voxel grids in a compact binary file, so they can be loaded again in another session or on another machine
+# without voxelizing the mesh again. The grid is split into bricks of 2x2x2 cells: the bricks with voxels are stored as
+# the lengths of the runs of empty and filled bricks, plus one byte per filled brick with a bit for each of its cells.
+# The colors are stored as a palette with a bit packed palette index per voxel, plus the exact colors when asked for.
+# Every part of the file is aligned, so files are opened with a memory map and only the parts that are used get read
+# from disk. Only requires numpy.
+import math
+import os
+import struct
+import numpy as np
+import voxel_chunks
+import voxel_grid
+import voxel_palette
+
+
+FILE_MAGIC = b'VXGR'
+FILE_VERSION = 1
+FILE_EXTENSION = '.vxg'
+
+# the file holds the exact color of every voxel next to the palette indices
+FLAG_RAW_COLORS = 1
+
+# amount of cells along each side of a brick, a brick mask fits in one byte
+BRICK_SIZE = 2
+# cell offset within the brick of every bit of a brick mask, from the highest bit to the lowest
+BRICK_OFFSETS = np.array([[x, y, z] for x in range(2) for y in range(2) for z in range(2)], dtype=np.int64)
+
+# amount of bytes a run length can take, the smallest one that gives the smallest file is picked
+RUN_WIDTHS = (1, 2, 4)
+RUN_TYPES = {1: '<u1', 2: '<u2', 4: '<u4'}
+# amount of bits a palette index can take
+INDEX_BITS = (0, 1, 2, 4, 8, 16, 32)
+INDEX_TYPES = {8: '<u1', 16: '<u2', 32: '<u4'}
+# every part of the file starts at a multiple of this, so it can be viewed in place
+ALIGNMENT = 8
+
+# magic, version, flags, shape, origin, voxel size, amount of voxels, amount of runs, amount of filled bricks, run
+# width, palette size, index bits, offsets of the runs, brick masks, palette, indices and colors
+_HEADER = struct.Struct('<4sII3I3ddQQQIII5Q')
+
+
+def _aligned(offset: int):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _expand_ranges(starts, ends):
+    """
+    :param starts: int64 array of the first value of every range
+    :param ends: int64 array of the value after the last value of every range
+    :return: int64 array with all values of all ranges after each other
+    """
+    lengths = ends - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+
+
+def occupancy_runs(keys):
+    """
+    Turns sorted flat indices into run lengths, starting with a run of empty places and then alternating between
+    filled and empty. The empty places after the last index are left out.
+    :param keys: sorted int64 array of unique flat indices
+    :return: int64 array of run lengths
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(keys) != 1) + 1
+    starts = keys[np.concatenate([[0], breaks])]
+    ends = keys[np.concatenate([breaks - 1, [len(keys) - 1]])] + 1
+    runs = np.empty(2 * len(starts), dtype=np.int64)
+    runs[0::2] = starts - np.concatenate([[0], ends[:-1]])
+    runs[1::2] = ends - starts
+    return runs
+
+
+def split_runs(runs, maximum: int):
+    """
+    Splits runs that don't fit in the run width into pieces of at most maximum, with runs of length 0 of the other
+    kind in between, so the runs still alternate between empty and filled.
+    :param runs: int64 array of run lengths
+    :param maximum: longest run that fits
+    :return: int64 array of run lengths
+    """
+    pieces = np.maximum(1, -(-runs // maximum))
+    if (pieces == 1).all():
+        return runs
+    sizes = 2 * pieces - 1
+    last = np.cumsum(sizes) - 1
+    split = np.zeros(int(sizes.sum()), dtype=np.int64)
+    split[last] = runs - (pieces - 1) * maximum
+    first = last - sizes + 1
+    long_runs = pieces > 1
+    positions = _expand_ranges(first[long_runs], last[long_runs])
+    before = positions - np.repeat(first[long_runs], sizes[long_runs] - 1)
+    split[positions] = np.where(before % 2 == 0, maximum, 0)
+    return split
+
+
+def brick_grid_shape(shape):
+    """
+    :param shape: amount of cells along x, y and z
+    :return: amount of bricks along x, y and z
+    """
+    return tuple(-(-int(s) // BRICK_SIZE) for s in shape)
+
+
+def _index_bits(palette_size: int):
+    """
+    :return: smallest amount of bits per palette index in INDEX_BITS that fits every index
+    """
+    needed = math.ceil(math.log2(palette_size)) if palette_size > 1 else 0
+    return next(bits for bits in INDEX_BITS if bits >= needed)
+
+
+def pack_indices(indices, bits: int):
+    """
+    :param indices: int array (N,) of palette indices
+    :param bits: one of INDEX_BITS
+    :return: uint8 array with the indices packed into bits each, the first index in the highest bits
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if bits == 0:
+        return np.zeros(0, dtype=np.uint8)
+    if bits >= 8:
+        return np.frombuffer(indices.astype(INDEX_TYPES[bits]).tobytes(), dtype=np.uint8)
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.int64)
+    return np.packbits(((indices[:, None] >> shifts) & 1).astype(np.uint8).ravel())
+
+
+def unpack_indices(data, bits: int, count: int, start=0):
+    """
+    :param data: uint8 array written by pack_indices
+    :param bits: one of INDEX_BITS
+    :param count: amount of indices to unpack
+    :param start: index of the first index to unpack
+    :return: uint32 array (count,)
+    """
+    if bits == 0:
+        return np.zeros(count, dtype=np.uint32)
+    if bits >= 8:
+        width = bits // 8
+        return data[start * width:(start + count) * width].view(INDEX_TYPES[bits]).astype(np.uint32)
+    per_byte = 8 // bits
+    first = start // per_byte
+    end = (start + count + per_byte - 1) // per_byte
+    unpacked = np.unpackbits(data[first:end]).reshape(-1, bits)
+    offset = start - first * per_byte
+    weights = (1 << np.arange(bits - 1, -1, -1)).astype(np.uint32)
+    return unpacked[offset:offset + count].astype(np.uint32) @ weights
+
+
+def write_voxel_file(file_path: str, grid, palette=None, raw_colors=False):
+    """
+    Writes a voxel grid to a file.
+    :param file_path: path of the file, usually ending in FILE_EXTENSION
+    :param grid: VoxelGrid
+    :param palette: uint8 array (P, 3) that grid.color_ids point into, or None to store the unique colors of the voxels
+    as the palette
+    :param raw_colors: also store the exact color of every voxel, for a palette that only approximates the colors.
+    Colors are always stored exactly when a palette would take more room than the colors themselves
+    :return: amount of bytes written
+    """
+    count = len(grid)
+    if palette is None:
+        palette, indices = voxel_palette.exact_palette(grid.colors)
+    else:
+        indices = grid.color_ids
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+    bits = _index_bits(len(palette))
+    if len(palette) * 3 + count * bits // 8 >= count * 3 and len(palette) > 1:
+        # noisy colors, the palette would be as big as the colors
+        palette = np.zeros((0, 3), dtype=np.uint8)
+        bits = 0
+        raw_colors = True
+
+    # the voxels are stored brick after brick, and within a brick in the order of BRICK_OFFSETS
+    cells = grid.cells.astype(np.int64)
+    brick_shape = brick_grid_shape(grid.shape)
+    bricks = cells // BRICK_SIZE
+    brick_keys = (bricks[:, 0] * brick_shape[1] + bricks[:, 1]) * brick_shape[2] + bricks[:, 2]
+    local = cells - bricks * BRICK_SIZE
+    cell_bits = (local[:, 0] * 2 + local[:, 1]) * 2 + local[:, 2]
+    order = np.lexsort((cell_bits, brick_keys))
+    filled, first = np.unique(brick_keys[order], return_index=True)
+    masks = np.bitwise_or.reduceat((128 >> cell_bits[order]).astype(np.uint8), first) if len(first) else \
+        np.zeros(0, dtype=np.uint8)
+
+    # the run width that needs the least bytes, runs that don't fit are split
+    runs = occupancy_runs(filled)
+    sizes = []
+    for width in RUN_WIDTHS:
+        pieces = np.maximum(1, -(-runs // (256 ** width - 1)))
+        sizes.append([width * int(2 * pieces.sum() - len(runs)), width])
+    width = min(sizes)[1]
+    runs = split_runs(runs, 256 ** width - 1).astype(RUN_TYPES[width])
+
+    parts = [runs.tobytes(), masks.tobytes(), palette.tobytes(),
+             pack_indices(np.asarray(indices)[order], bits).tobytes(),
+             np.ascontiguousarray(grid.colors[order]).tobytes() if raw_colors else b'']
+    offsets = []
+    offset = _aligned(_HEADER.size)
+    for part in parts:
+        offsets.append(offset)
+        offset = _aligned(offset + len(part))
+
+    # written to a temporary file first, so an interrupted save never leaves a broken file behind
+    temporary_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, FLAG_RAW_COLORS if raw_colors else 0, *grid.shape,
+                                *grid.origin.tolist(), grid.voxel_size, count, len(runs), len(masks), width,
+                                len(palette), bits, *offsets))
+        for part, part_offset in zip(parts, offsets):
+            file.write(b'\0' * (part_offset - file.tell()))
+            file.write(part)
+        size = file.tell()
+    os.replace(temporary_path, file_path)
+    return size
+
+
+class VoxelFile(object):
+    def __init__(self, file_path: str):
+        """
+        Opens a voxel file with a memory map. Opening only reads the header, the bricks, indices and colors are read
+        from disk when they are used.
+        :param file_path: path of a file written by write_voxel_file
+        """
+        self.file_path = file_path
+        if os.path.getsize(file_path) < _HEADER.size:
+            raise ValueError(f"'{file_path}' is not a voxel file")
+        self.data = np.memmap(file_path, dtype=np.uint8, mode='r')
+        values = _HEADER.unpack(self.data[:_HEADER.size].tobytes())
+        if values[0] != FILE_MAGIC:
+            raise ValueError(f"'{file_path}' is not a voxel file")
+        if values[1] > FILE_VERSION:
+            raise ValueError(f"'{file_path}' was written by a newer version, version {values[1]}")
+        self.flags = values[2]
+        self.shape = tuple(values[3:6])
+        self.origin = np.array(values[6:9], dtype=np.float64)
+        self.voxel_size = values[9]
+        self.voxel_count = values[10]
+        run_count, brick_count, run_width, palette_size, self.index_bits = values[11:16]
+        runs_offset, masks_offset, palette_offset, indices_offset, colors_offset = values[16:21]
+
+        self.brick_shape = brick_grid_shape(self.shape)
+        self.runs = self.data[runs_offset:runs_offset + run_count * run_width].view(RUN_TYPES[run_width])
+        self.masks = self.data[masks_offset:masks_offset + brick_count]
+        self.palette = self.data[palette_offset:palette_offset + palette_size * 3].reshape(-1, 3)
+        self.indices = self.data[indices_offset:indices_offset + (self.voxel_count * self.index_bits + 7) // 8]
+        self.raw_colors = None
+        if self.flags & FLAG_RAW_COLORS:
+            self.raw_colors = self.data[colors_offset:colors_offset + self.voxel_count * 3].reshape(-1, 3)
+        # flat index of every filled brick and index of its first voxel, worked out the first time they are needed
+        self._bricks = None
+
+    def __len__(self):
+        return self.voxel_count
+
+    def close(self):
+        """
+        Lets go of the memory map. Arrays read from the file stay valid.
+        """
+        self.runs = self.masks = self.palette = self.indices = self.raw_colors = self.data = None
+
+    def _filled_bricks(self):
+        """
+        :return: [int64 array of the flat index of every filled brick, int64 array of the index of its first voxel
+        with the voxel count at the end]
+        """
+        if self._bricks is None:
+            ends = np.cumsum(self.runs, dtype=np.int64)
+            starts = ends - self.runs
+            keys = _expand_ranges(starts[1::2], ends[1::2])
+            counts = voxel_grid.BYTE_POPCOUNT[self.masks].astype(np.int64)
+            self._bricks = [keys, np.concatenate([[0], np.cumsum(counts)])]
+        return self._bricks
+
+    def read_cells(self, first_brick=0, end_brick=None):
+        """
+        Reads the cells of a range of the filled bricks, in the order the voxels are stored in.
+        :param first_brick: index of the first filled brick
+        :param end_brick: index after the last filled brick, all of them when None
+        :return: [int64 array (N, 3) of cells, index of the first of these voxels]
+        """
+        keys, first_voxels = self._filled_bricks()
+        end_brick = len(keys) if end_brick is None else end_brick
+        bits = np.unpackbits(np.asarray(self.masks[first_brick:end_brick])).reshape(-1, 8)
+        rows, columns = np.nonzero(bits)
+        bricks = np.stack(np.unravel_index(keys[first_brick:end_brick][rows], self.brick_shape), axis=1)
+        return [bricks * BRICK_SIZE + BRICK_OFFSETS[columns], int(first_voxels[first_brick])]
+
+    def read_colors(self, start=0, count=None):
+        """
+        :param start: index of the first voxel
+        :param count: amount of voxels, all voxels from start when None
+        :return: [uint8 array (count, 3) of colors, uint32 array (count,) of palette indices]
+        """
+        count = self.voxel_count - start if count is None else count
+        indices = unpack_indices(self.indices, self.index_bits, count, start)
+        if self.raw_colors is not None:
+            colors = np.array(self.raw_colors[start:start + count])
+        elif len(self.palette):
+            colors = np.asarray(self.palette)[indices]
+        else:
+            colors = np.full((count, 3), 255, dtype=np.uint8)
+        return [colors, indices]
+
+    def read_grid(self):
+        """
+        :return: VoxelGrid with the colors and palette indices of the file
+        """
+        cells = self.read_cells()[0]
+        colors, indices = self.read_colors()
+        return voxel_grid.VoxelGrid(cells, self.origin, self.voxel_size, self.shape, colors, indices)
+
+    def iter_slabs(self, slab_size: int):
+        """
+        Goes over the voxels one slab of the grid along x at a time, without ever reading the whole file.
+        :param slab_size: amount of cells along x of every slab
+        :return: generator of [first x of the slab, int64 array (N, 3) of cells, uint8 array (N, 3) of colors]
+        """
+        keys, first_voxels = self._filled_bricks()
+        bricks_per_x = self.brick_shape[1] * self.brick_shape[2]
+        for x in range(0, self.shape[0], slab_size):
+            end = min(x + slab_size, self.shape[0])
+            low, high = np.searchsorted(keys, [x // BRICK_SIZE * bricks_per_x,
+                                               -(-end // BRICK_SIZE) * bricks_per_x])
+            if low == high:
+                continue
+            cells, first = self.read_cells(low, high)
+            colors = self.read_colors(first, len(cells))[0]
+            # bricks at the edges of the slab can stick out of it
+            inside = (cells[:, 0] >= x) & (cells[:, 0] < end)
+            if inside.any():
+                yield [x, cells[inside], colors[inside]]
+
+    def to_chunked(self, chunk_size=voxel_chunks.CHUNK_SIZE, memory_budget=voxel_chunks.MEMORY_BUDGET,
+                   spill_path=None):
+        """
+        Streams the voxels into a chunked grid one slab of chunks at a time, so grids that don't fit in memory as a
+        whole can be loaded and built into meshes with voxel_chunks.iter_chunk_meshes.
+        :param chunk_size: amount of cells along each side of a chunk
+        :param memory_budget: maximum amount of bytes of chunk data the chunked grid keeps in memory
+        :param spill_path: file the chunked grid moves chunks to, a temporary file is used if None
+        :return: voxel_chunks.ChunkedGrid with colors
+        """
+        grid = voxel_chunks.ChunkedGrid(self.shape, self.origin, self.voxel_size, chunk_size, memory_budget,
+                                        spill_path, with_color=True)
+        for x, cells, colors in self.iter_slabs(chunk_size):
+            chunk_keys = cells // chunk_size
+            order = np.lexsort((chunk_keys[:, 2], chunk_keys[:, 1]))
+            cells, chunk_keys, colors = cells[order], chunk_keys[order], colors[order]
+            breaks = np.flatnonzero((np.diff(chunk_keys, axis=0) != 0).any(axis=1)) + 1
+            for start, end in zip(np.concatenate([[0], breaks]), np.concatenate([breaks, [len(cells)]])):
+                key = chunk_keys[start]
+                shape = grid.chunk_shape(key)
+                occupancy = np.zeros(shape, dtype=bool)
+                chunk_colors = np.zeros(shape + (3,), dtype=np.uint8)
+                inside = cells[start:end] - key * chunk_size
+                occupancy[inside[:, 0], inside[:, 1], inside[:, 2]] = True
+                chunk_colors[inside[:, 0], inside[:, 1], inside[:, 2]] = colors[start:end]
+                grid.set_chunk(key, occupancy, chunk_colors)
+        return grid
+
+
+def read_voxel_file(file_path: str):
+    """
+    Loads a voxel file as a whole.
+    :param file_path: path of a file written by write_voxel_file
+    :return: VoxelGrid
+    """
+    voxel_file = VoxelFile(file_path)
+    grid = voxel_file.read_grid()
+    voxel_file.close()
+    return grid
@@ -0,0 +1,165 @@
+# Compact storage for voxels. Only requires numpy.
+import numpy as np
+
+
+# amount of set bits in every possible byte
+BYTE_POPCOUNT = np.array([bin(x).count('1') for x in range(256)], dtype=np.uint8)
+
+# amount of cells covered by one entry of the block prefix
+BLOCK_CELLS = 64
+
+
+def bits_occupied(occupancy_bits, shape, cells):
+    """
+    Looks up cells in an occupancy bitmask. Cells outside the grid count as empty.
+    :param occupancy_bits: uint8 array of packed bits, one per cell in x, y, z order
+    :param shape: amount of cells along x, y and z
+    :param cells: int array (N, 3)
+    :return: bool array (N,)
+    """
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    inside = ((cells >= 0) & (cells < np.array(shape))).all(axis=1)
+    inner = cells[inside]
+    keys = (inner[:, 0] * shape[1] + inner[:, 1]) * shape[2] + inner[:, 2]
+    occupied = np.zeros(len(cells), dtype=bool)
+    occupied[inside] = (occupancy_bits[keys // 8] >> (7 - keys % 8)) & 1 == 1
+    return occupied
+
+
+class VoxelGrid(object):
+    """
+    Stores voxels in contiguous arrays instead of a python list per voxel:
+
+    - cells: int16 (int32 for grids over 32767 cells wide) [x, y, z] grid coordinates, sorted by x, then y, then z
+    - colors: uint8 rgb colors
+    - color_ids: uint32 palette indices
+    - an occupancy bitmask with one bit per grid cell
+
+    The bitmask comes with a running count of set bits per byte and per 64 cells, so the index of the voxel in any
+    cell can be found in O(1) by counting the bits before it, without a dense index grid.
+
+    Measured on a solid sphere at density 200 (4.1 million voxels in an 8 million cell grid), this takes 13.6 bytes
+    per voxel: 6 for the cell, 3 for the color, 4 for the palette index and the rest for the bitmask and its counts.
+    The voxel_list this replaces took several hundred bytes per voxel in python lists, tuples and floats.
+    """
+
+    def __init__(self, cells, origin, voxel_size: float, shape, colors=None, color_ids=None):
+        """
+        :param cells: int array (N, 3) of [x, y, z] grid coordinates, each cell may only appear once
+        :param origin: world position of the corner of cell (0, 0, 0)
+        :param voxel_size: edge length of a single voxel
+        :param shape: amount of cells along x, y and z
+        :param colors: uint8 array (N, 3), defaults to white
+        :param color_ids: uint32 array (N,), defaults to 0
+        """
+        self.origin = np.asarray(origin, dtype=np.float64).reshape(3)
+        self.voxel_size = float(voxel_size)
+        self.shape = tuple(int(s) for s in shape)
+        cell_type = np.int16 if max(self.shape) <= np.iinfo(np.int16).max else np.int32
+
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        keys = self.cell_keys(cells)
+        order = np.argsort(keys, kind='stable')
+        self.cells = cells[order].astype(cell_type)
+
+        if colors is None:
+            self.colors = np.full((len(cells), 3), 255, dtype=np.uint8)
+        else:
+            self.colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)[order]
+        if color_ids is None:
+            self.color_ids = np.zeros(len(cells), dtype=np.uint32)
+        else:
+            self.color_ids = np.asarray(color_ids, dtype=np.uint32)[order]
+
+        self.occupancy_bits = np.zeros((int(np.prod(self.shape)) + 7) // 8, dtype=np.uint8)
+        np.bitwise_or.at(self.occupancy_bits, keys // 8, (128 >> (keys % 8)).astype(np.uint8))
+        self._build_rank()
+
+    def _build_rank(self):
+        """
+        Counts the set bits before every byte of the bitmask. The counts are stored per 64 cells as uint32 and within
+        those as uint8, which is cheaper than a uint32 per byte.
+        """
+        counts = BYTE_POPCOUNT[self.occupancy_bits].astype(np.uint32)
+        # cumsum widens to uint64 unless told otherwise
+        before = np.cumsum(counts, dtype=np.uint32) - counts
+        bytes_per_block = BLOCK_CELLS // 8
+        self.block_rank = before[::bytes_per_block].copy()
+        block_start = np.repeat(self.block_rank, bytes_per_block)[:len(before)]
+        self.byte_rank = (before - block_start).astype(np.uint8)
+
+    @classmethod
+    def from_occupancy(cls, occupancy, origin, voxel_size: float, colors=None):
+        """
+        Creates a grid from a dense occupancy array.
+        :param occupancy: bool array indexed [x, y, z]
+        :param origin: world position of the corner of cell (0, 0, 0)
+        :param voxel_size: edge length of a single voxel
+        :param colors: uint8 array (N, 3) in the order np.argwhere goes over the occupied cells
+        :return: VoxelGrid
+        """
+        return cls(np.argwhere(occupancy), origin, voxel_size, occupancy.shape, colors)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def cell_keys(self, cells):
+        """
+        Flattens [x, y, z] cells into their position in the bitmask.
+        :param cells: int array (N, 3)
+        :return: int64 array (N,)
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        return (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]
+
+    def is_occupied(self, cells):
+        """
+        Looks up whether there is a voxel in each of the given cells. Cells outside the grid count as empty.
+        :param cells: int array (N, 3)
+        :return: bool array (N,)
+        """
+        return bits_occupied(self.occupancy_bits, self.shape, cells)
+
+    def index_of(self, cells):
+        """
+        Looks up the index of the voxel in each of the given cells.
+        :param cells: int array (N, 3)
+        :return: int64 array (N,), -1 where the cell is empty
+        """
+        occupied = self.is_occupied(cells)
+        keys = self.cell_keys(np.asarray(cells)[occupied])
+        byte = keys // 8
+        # count the bits of the same byte that come before the cell
+        partial = BYTE_POPCOUNT[self.occupancy_bits[byte] >> (8 - keys % 8)]
+        index = np.full(len(occupied), -1, dtype=np.int64)
+        index[occupied] = (self.block_rank[byte // (BLOCK_CELLS // 8)].astype(np.int64) + self.byte_rank[byte] +
+                           partial)
+        return index
+
+    def neighbours(self, offset):
+        """
+        Looks up the neighbour of every voxel at the same time.
+        :param offset: [x, y, z] offset of the neighbour, for example [1, 0, 0]
+        :return: int64 array (N,) of neighbour indices, -1 where there is no neighbour
+        """
+        return self.index_of(self.cells.astype(np.int64) + np.asarray(offset, dtype=np.int64))
+
+    def positions(self):
+        """
+        :return: float array (N, 3) of the world position of every voxel center
+        """
+        return self.origin + (self.cells + 0.5) * self.voxel_size
+
+    def occupancy(self):
+        """
+        :return: dense bool array indexed [x, y, z]
+        """
+        bits = np.unpackbits(self.occupancy_bits)[:int(np.prod(self.shape))]
+        return bits.astype(bool).reshape(self.shape)
+
+    def nbytes(self):
+        """
+        :return: amount of bytes used by all arrays of the grid
+        """
+        arrays = (self.cells, self.colors, self.color_ids, self.occupancy_bits, self.block_rank, self.byte_rank)
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,56 @@
+# Turns voxel grids into the arrays an instancer needs to draw every voxel with a copy of a single cube, instead of
+# building real geometry. Only requires numpy.
+import numpy as np
+import voxel_mesh
+import voxel_pyramid
+
+
+# 'mesh' builds real faces for the voxels, 'instances' draws every voxel with a copy of one cube
+VOXEL_OUTPUTS = ('mesh', 'instances')
+
+
+def visible_voxels(grid):
+    """
+    :param grid: VoxelGrid
+    :return: bool array (N,) that is True for every voxel with at least one face that isn't hidden by a neighbor
+    """
+    visible = np.zeros(len(grid), dtype=bool)
+    visible[voxel_mesh.exposed_faces(grid)[2]] = True
+    return visible
+
+
+def instance_arrays(grid, visible_only=True, merge_blocks=False):
+    """
+    Gets the position, scale and color of every instance, for a cube that is 1 unit wide and centered on its origin.
+    :param grid: VoxelGrid
+    :param visible_only: leave out the voxels that are completely surrounded by other voxels
+    :param merge_blocks: draw every block of 2 x 2 x 2, 4 x 4 x 4 and so on voxels with the same color as one bigger
+    cube, like the leaves of voxel_pyramid.SparseOctree
+    :return: [positions float array (I, 3), scales float array (I,), colors float array (I, 3) from 0 to 1]
+    """
+    if merge_blocks:
+        octree = voxel_pyramid.SparseOctree(grid)
+        positions = []
+        scales = []
+        colors = []
+        for level in range(len(octree.levels)):
+            cells, level_colors = octree.levels[level]
+            size = grid.voxel_size * 2 ** level
+            positions.append(grid.origin + (cells + 0.5) * size)
+            scales.append(np.full(len(cells), size))
+            colors.append(level_colors)
+        if not positions:
+            return [np.zeros((0, 3)), np.zeros(0), np.zeros((0, 3))]
+        positions = np.concatenate(positions)
+        scales = np.concatenate(scales)
+        colors = np.concatenate(colors)
+        if visible_only:
+            # merged blocks are always kept, only the single voxels are checked for neighbors on every side
+            keep = scales > grid.voxel_size
+            keep[scales == grid.voxel_size] = visible_voxels(grid)[
+                grid.index_of(octree.levels[0][0].astype(np.int64))]
+            positions, scales, colors = positions[keep], scales[keep], colors[keep]
+        return [positions, scales, colors / 255.0]
+
+    keep = visible_voxels(grid) if visible_only else np.ones(len(grid), dtype=bool)
+    return [grid.positions()[keep], np.full(np.count_nonzero(keep), grid.voxel_size), grid.colors[keep] / 255.0]
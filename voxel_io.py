@@ -0,0 +1,360 @@
+# Reads and writes meshes as files, so meshes can be voxelized without Maya. Only requires numpy.
+import os
+import numpy as np
+
+
+MESH_EXTENSIONS = ('.obj', '.ply')
+# amount of lines written to an obj file at a time
+OBJ_BLOCK_SIZE = 65536
+
+# numpy types of the ply property types
+PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1', 'short': 'i2', 'int16': 'i2',
+             'ushort': 'u2', 'uint16': 'u2', 'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+             'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+
+class Mesh(object):
+    def __init__(self, vertices, faces, corner_uvs=None, vertex_colors=None, texture_path=''):
+        """
+        A triangle mesh read from a file.
+        :param vertices: float array (V, 3) of vertex positions
+        :param faces: int array (T, 3) of vertex indices per triangle
+        :param corner_uvs: float array (T, 3, 2) with the UV of every corner of every triangle, or None
+        :param vertex_colors: uint8 array (V, 3), or None
+        :param texture_path: path of the color texture, empty if the mesh has none
+        """
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.corner_uvs = corner_uvs
+        self.vertex_colors = vertex_colors
+        self.texture_path = texture_path
+
+
+def _fan(polygon):
+    """
+    :param polygon: list of corners of a polygon
+    :return: list of triangles of the polygon, fanned out from the first corner
+    """
+    return [[polygon[0], polygon[x], polygon[x + 1]] for x in range(1, len(polygon) - 1)]
+
+
+def _obj_index(index: str, count: int):
+    """
+    :param index: 1 based index from an obj file, negative indices count back from the last element
+    :param count: amount of elements read so far
+    :return: 0 based index
+    """
+    index = int(index)
+    return index - 1 if index > 0 else count + index
+
+
+def _mtl_texture(mtl_path: str):
+    """
+    :param mtl_path: path of a material library
+    :return: path of the diffuse texture of the first material that has one, empty if there is none
+    """
+    if not os.path.isfile(mtl_path):
+        return ''
+    with open(mtl_path, 'r', errors='replace') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) > 1 and parts[0] == 'map_Kd':
+                # options like -s come before the file name, which is always last
+                return os.path.join(os.path.dirname(mtl_path), parts[-1])
+    return ''
+
+
+def read_obj(file_path: str):
+    """
+    Reads a wavefront obj file. Polygons are split into triangles, the texture comes from the map_Kd of the material
+    library, and vertex colors from the r g b values after the positions.
+    :param file_path: path of the obj file
+    :return: Mesh
+    """
+    vertices = []
+    colors = []
+    uvs = []
+    faces = []
+    uv_faces = []
+    texture_path = ''
+    with open(file_path, 'r', errors='replace') as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == 'v':
+                vertices.append([float(x) for x in parts[1:4]])
+                if len(parts) >= 7:
+                    colors.append([float(x) for x in parts[4:7]])
+            elif parts[0] == 'vt':
+                uvs.append([float(x) for x in parts[1:3]])
+            elif parts[0] == 'f':
+                corners = [corner.split('/') for corner in parts[1:]]
+                polygon = [_obj_index(corner[0], len(vertices)) for corner in corners]
+                faces.extend(_fan(polygon))
+                if all(len(corner) > 1 and corner[1] for corner in corners):
+                    uv_faces.extend(_fan([_obj_index(corner[1], len(uvs)) for corner in corners]))
+                else:
+                    uv_faces.extend(_fan([-1] * len(corners)))
+            elif parts[0] == 'mtllib' and not texture_path:
+                texture_path = _mtl_texture(os.path.join(os.path.dirname(file_path), ' '.join(parts[1:])))
+
+    corner_uvs = None
+    uv_faces = np.array(uv_faces, dtype=np.int64).reshape(-1, 3)
+    if uvs and len(uv_faces) and (uv_faces >= 0).all():
+        corner_uvs = np.array(uvs, dtype=np.float64)[uv_faces]
+    vertex_colors = None
+    if colors and len(colors) == len(vertices):
+        vertex_colors = np.clip(np.rint(np.array(colors) * 255), 0, 255).astype(np.uint8)
+    return Mesh(np.array(vertices, dtype=np.float64), np.array(faces, dtype=np.int64), corner_uvs, vertex_colors,
+                texture_path)
+
+
+def _ply_header(file):
+    """
+    Reads the header of a ply file.
+    :param file: ply file opened in binary mode
+    :return: [format, list of [element name, count, list of [property name, type, list count type or None]],
+    texture file named in the comments]
+    """
+    if file.readline().strip() != b'ply':
+        raise ValueError(f"'{file.name}' is not a ply file")
+    file_format = ''
+    elements = []
+    texture = ''
+    while True:
+        line = file.readline()
+        if not line:
+            raise ValueError(f"'{file.name}' ends before its header does")
+        parts = line.decode('ascii', errors='replace').split()
+        if not parts:
+            continue
+        if parts[0] == 'end_header':
+            break
+        if parts[0] == 'format':
+            file_format = parts[1]
+        elif parts[0] == 'comment' and len(parts) > 2 and parts[1] == 'TextureFile':
+            texture = ' '.join(parts[2:])
+        elif parts[0] == 'element':
+            elements.append([parts[1], int(parts[2]), []])
+        elif parts[0] == 'property':
+            if parts[1] == 'list':
+                elements[-1][2].append([parts[4], PLY_TYPES[parts[3]], PLY_TYPES[parts[2]]])
+            else:
+                elements[-1][2].append([parts[2], PLY_TYPES[parts[1]], None])
+    return [file_format, elements, texture]
+
+
+def _read_ply_element(file, file_format: str, count: int, properties, ascii_lines):
+    """
+    Reads the rows of one element.
+    :param file: ply file opened in binary mode, right after the previous element
+    :param file_format: 'ascii', 'binary_little_endian' or 'binary_big_endian'
+    :param count: amount of rows
+    :param properties: list of [property name, type, list count type or None]
+    :param ascii_lines: generator of the remaining lines for ascii files
+    :return: dictionary of property name to array, list properties become a list of arrays
+    """
+    if file_format == 'ascii':
+        rows = [next(ascii_lines).split() for _ in range(count)]
+        values = {}
+        for name, _, _ in properties:
+            values[name] = []
+        for row in rows:
+            position = 0
+            for name, value_type, count_type in properties:
+                if count_type is None:
+                    values[name].append(float(row[position]))
+                    position += 1
+                else:
+                    length = int(row[position])
+                    values[name].append(np.array(row[position + 1:position + 1 + length], dtype=np.float64))
+                    position += 1 + length
+        return {name: values[name] if count_type else np.array(values[name]) for name, _, count_type in properties}
+
+    endian = '<' if file_format == 'binary_little_endian' else '>'
+    if all(count_type is None for _, _, count_type in properties):
+        dtype = np.dtype([(name, endian + value_type) for name, value_type, _ in properties])
+        data = np.frombuffer(file.read(dtype.itemsize * count), dtype=dtype, count=count)
+        return {name: data[name] for name, _, _ in properties}
+
+    # faces usually are all triangles, which can be read in one go when the list is the only property
+    if len(properties) == 1 and count:
+        name, value_type, count_type = properties[0]
+        start = file.tell()
+        triangle = np.dtype([('count', endian + count_type), ('values', endian + value_type, 3)])
+        raw = file.read(triangle.itemsize * count)
+        if len(raw) == triangle.itemsize * count:
+            data = np.frombuffer(raw, dtype=triangle)
+            if (data['count'] == 3).all():
+                return {name: data['values']}
+        file.seek(start)
+
+    values = {name: [] for name, _, _ in properties}
+    for _ in range(count):
+        for name, value_type, count_type in properties:
+            if count_type is None:
+                values[name].append(np.frombuffer(file.read(np.dtype(value_type).itemsize), endian + value_type)[0])
+            else:
+                length = int(np.frombuffer(file.read(np.dtype(count_type).itemsize), endian + count_type)[0])
+                item_size = np.dtype(value_type).itemsize
+                values[name].append(np.frombuffer(file.read(item_size * length), endian + value_type))
+    return {name: values[name] if count_type else np.array(values[name]) for name, _, count_type in properties}
+
+
+def read_ply(file_path: str):
+    """
+    Reads a ply file, ascii or binary. Vertex colors and vertex UVs (s/t, u/v or texture_u/texture_v) are read when
+    they are there, and the texture comes from a 'comment TextureFile' line.
+    :param file_path: path of the ply file
+    :return: Mesh
+    """
+    with open(file_path, 'rb') as file:
+        file_format, elements, texture = _ply_header(file)
+        ascii_lines = None
+        if file_format == 'ascii':
+            ascii_lines = (line for line in file.read().decode('ascii', errors='replace').splitlines()
+                           if line.strip())
+        data = {}
+        for name, count, properties in elements:
+            data[name] = _read_ply_element(file, file_format, count, properties, ascii_lines)
+
+    vertex = data['vertex']
+    vertices = np.stack([vertex['x'], vertex['y'], vertex['z']], axis=1).astype(np.float64)
+    face = data.get('face', {})
+    polygons = face.get('vertex_indices', face.get('vertex_index', []))
+    if isinstance(polygons, np.ndarray):
+        faces = polygons.astype(np.int64).reshape(-1, 3)
+    else:
+        faces = np.array([triangle for polygon in polygons for triangle in _fan([int(x) for x in polygon])],
+                         dtype=np.int64).reshape(-1, 3)
+
+    vertex_colors = None
+    if all(channel in vertex for channel in ('red', 'green', 'blue')):
+        vertex_colors = np.stack([vertex['red'], vertex['green'], vertex['blue']], axis=1)
+        if vertex_colors.dtype.kind == 'f' and vertex_colors.max() <= 1.0:
+            vertex_colors = vertex_colors * 255
+        vertex_colors = np.clip(np.rint(vertex_colors), 0, 255).astype(np.uint8)
+
+    corner_uvs = None
+    for u, v in (('s', 't'), ('u', 'v'), ('texture_u', 'texture_v')):
+        if u in vertex and v in vertex:
+            corner_uvs = np.stack([vertex[u], vertex[v]], axis=1).astype(np.float64)[faces]
+            break
+
+    if texture:
+        texture = os.path.join(os.path.dirname(file_path), texture)
+    return Mesh(vertices, faces, corner_uvs, vertex_colors, texture)
+
+
+def read_mesh(file_path: str):
+    """
+    Reads a mesh file based on its extension.
+    :param file_path: path of an obj or ply file
+    :return: Mesh
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.obj':
+        return read_obj(file_path)
+    if extension == '.ply':
+        return read_ply(file_path)
+    raise ValueError(f"Unknown mesh format '{extension}', expected one of {MESH_EXTENSIONS}")
+
+
+def _write_rows(file, row_format: str, rows):
+    """
+    Writes an array as text, one formatted line per row, a block of rows at a time so neither the whole text nor a
+    string per row has to be kept around.
+    :param file: file opened for writing text
+    :param row_format: %-format of a single row, ending in a newline
+    :param rows: array (R, C)
+    """
+    for start in range(0, len(rows), OBJ_BLOCK_SIZE):
+        block = rows[start:start + OBJ_BLOCK_SIZE]
+        file.write((row_format * len(block)) % tuple(block.ravel().tolist()))
+
+
+def write_obj(file_path: str, points, face_counts, face_connects, uvs=None, uv_ids=None, texture_name='',
+              vertex_colors=None):
+    """
+    Writes a polygon mesh as a wavefront obj file, with a material library next to it if there is a texture. The file
+    is streamed to disk in blocks.
+    :param file_path: path of the obj file
+    :param points: float array (P, 3)
+    :param face_counts: amount of vertices of every face
+    :param face_connects: vertex index of every face vertex
+    :param uvs: float array (U, 2), or None
+    :param uv_ids: UV index of every face vertex, or None
+    :param texture_name: file name of the texture, relative to the obj file
+    :param vertex_colors: uint8 array (P, 3) with the color of every point, written after the position like most
+    programs read them, or None
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    face_counts = np.asarray(face_counts, dtype=np.int64)
+    # obj indices start at 1
+    corners = np.asarray(face_connects, dtype=np.int64)[:, None] + 1
+    corner_format = '%d'
+    if uvs is not None:
+        corners = np.concatenate([corners, np.asarray(uv_ids, dtype=np.int64)[:, None] + 1], axis=1)
+        corner_format = '%d/%d'
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    with open(file_path, 'w') as file:
+        if texture_name:
+            file.write(f'mtllib {name}.mtl\nusemtl {name}\n')
+        if vertex_colors is not None:
+            colors = np.asarray(vertex_colors, dtype=np.float64).reshape(-1, 3) / 255
+            _write_rows(file, 'v %.6f %.6f %.6f %.4f %.4f %.4f\n', np.concatenate([points, colors], axis=1))
+        else:
+            _write_rows(file, 'v %.6f %.6f %.6f\n', points)
+        if uvs is not None:
+            _write_rows(file, 'vt %.6f %.6f\n', np.asarray(uvs, dtype=np.float64).reshape(-1, 2))
+        _write_faces(file, face_counts, corners, corner_format)
+    if texture_name:
+        with open(os.path.join(os.path.dirname(file_path), f'{name}.mtl'), 'w') as file:
+            file.write(f'newmtl {name}\nKd 1 1 1\nmap_Kd {texture_name}\n')
+
+
+def _write_faces(file, face_counts, corners, corner_format: str):
+    """
+    Writes the face lines of an obj file.
+    :param file: file opened for writing text
+    :param face_counts: int array of the amount of vertices of every face
+    :param corners: int array (C, K) with the K obj indices of every face vertex
+    :param corner_format: %-format of the K indices of a single face vertex
+    """
+    if len(face_counts) and (face_counts == face_counts[0]).all():
+        # faces with the same amount of corners, like the quads of voxel meshes, are written a block at a time
+        count = int(face_counts[0])
+        _write_rows(file, 'f ' + ' '.join([corner_format] * count) + '\n', corners.reshape(len(face_counts), -1))
+    else:
+        starts = np.cumsum(face_counts) - face_counts
+        for start, count in zip(starts.tolist(), face_counts.tolist()):
+            _write_rows(file, 'f ' + ' '.join([corner_format] * count) + '\n',
+                        corners[start:start + count].reshape(1, -1))
+
+
+def write_obj_batches(file_path: str, batches):
+    """
+    Writes meshes that come one batch at a time into a single obj file, so only one batch is ever in memory. Every
+    batch has its own points, its faces are written right after them.
+    :param file_path: path of the obj file
+    :param batches: iterable of [points float array (P, 3), face counts, face connects into the points of the batch,
+    uint8 array (P, 3) with the color of every point or None]
+    :return: [amount of points, amount of faces] written
+    """
+    point_count = 0
+    face_count = 0
+    with open(file_path, 'w') as file:
+        for points, face_counts, face_connects, vertex_colors in batches:
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+            if vertex_colors is not None:
+                colors = np.asarray(vertex_colors, dtype=np.float64).reshape(-1, 3) / 255
+                _write_rows(file, 'v %.6f %.6f %.6f %.4f %.4f %.4f\n', np.concatenate([points, colors], axis=1))
+            else:
+                _write_rows(file, 'v %.6f %.6f %.6f\n', points)
+            # obj indices start at 1 and go on over all points written before
+            corners = np.asarray(face_connects, dtype=np.int64)[:, None] + point_count + 1
+            _write_faces(file, np.asarray(face_counts, dtype=np.int64), corners, '%d')
+            point_count += len(points)
+            face_count += len(face_counts)
+    return [point_count, face_count]
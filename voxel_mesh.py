@@ -0,0 +1,175 @@
+# Builds voxel geometry as flat arrays that can be turned into a single mesh with one API call. Only requires numpy.
+import numpy as np
+
+
+# how the voxel colors end up on the mesh, as UVs on a palette texture or as colors on the vertices of every face
+COLOR_OUTPUTS = ('texture', 'vertex')
+
+# the six directions a voxel face can point in, in the order +x, -x, +y, -y, +z, -z
+FACE_NORMALS = np.array([[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]], dtype=np.int64)
+
+# corners of each face relative to the cell, counter clockwise when looking at the face from outside the voxel
+FACE_CORNERS = np.array([
+    [[1, 0, 0], [1, 1, 0], [1, 1, 1], [1, 0, 1]],
+    [[0, 0, 0], [0, 0, 1], [0, 1, 1], [0, 1, 0]],
+    [[0, 1, 0], [0, 1, 1], [1, 1, 1], [1, 1, 0]],
+    [[0, 0, 0], [1, 0, 0], [1, 0, 1], [0, 0, 1]],
+    [[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]],
+    [[0, 0, 0], [0, 1, 0], [1, 1, 0], [1, 0, 0]],
+], dtype=np.int64)
+
+
+def exposed_faces(grid):
+    """
+    Finds every voxel face that is not covered by a neighbouring voxel.
+    :param grid: VoxelGrid
+    :return: [face cells int array (F, 3), face directions int array (F,), face voxel indices int array (F,)]
+    """
+    cells = grid.cells.astype(np.int64)
+    face_voxels = []
+    face_directions = []
+    for direction in range(6):
+        # a face is exposed when the neighbour in its direction is empty
+        exposed = np.nonzero(~grid.is_occupied(cells + FACE_NORMALS[direction]))[0]
+        face_voxels.append(exposed)
+        face_directions.append(np.full(len(exposed), direction, dtype=np.int64))
+    face_voxels = np.concatenate(face_voxels)
+    face_directions = np.concatenate(face_directions)
+
+    # keep the faces of each voxel next to each other
+    order = np.argsort(face_voxels, kind='stable')
+    face_voxels = face_voxels[order]
+    return [cells[face_voxels], face_directions[order], face_voxels]
+
+
+def quad_arrays(corners, origin, voxel_size: float, shape):
+    """
+    Turns the lattice corners of quads into deduplicated vertex positions and polygon arrays.
+    :param corners: int array (F, 4, 3) of lattice corners per quad
+    :param origin: world position of the corner of cell (0, 0, 0)
+    :param voxel_size: edge length of a single voxel
+    :param shape: amount of cells along x, y and z
+    :return: [points float array (V, 3), face counts int array (F,), face connects int array (F * 4,)]
+    """
+    corners = np.asarray(corners, dtype=np.int64).reshape(-1, 3)
+    # every lattice point gets a unique key, so shared corners collapse into one vertex
+    size_y = shape[1] + 1
+    size_z = shape[2] + 1
+    keys = (corners[:, 0] * size_y + corners[:, 1]) * size_z + corners[:, 2]
+    unique_keys, face_connects = np.unique(keys, return_inverse=True)
+    lattice = np.stack([unique_keys // (size_y * size_z), (unique_keys // size_z) % size_y, unique_keys % size_z],
+                       axis=1)
+    points = np.asarray(origin, dtype=np.float64) + lattice * voxel_size
+    face_counts = np.full(len(corners) // 4, 4, dtype=np.int64)
+    return [points, face_counts, face_connects.ravel().astype(np.int64)]
+
+
+def build_mesh(grid):
+    """
+    Builds a single mesh out of all voxels, leaving out every face that is hidden between two voxels.
+    :param grid: VoxelGrid
+    :return: [points, face counts, face connects, face voxel indices]
+    """
+    return mesh_from_faces(grid, exposed_faces(grid))
+
+
+def mesh_from_faces(grid, faces):
+    """
+    Turns the faces found by exposed_faces into polygon arrays.
+    :param grid: VoxelGrid
+    :param faces: [face cells, face directions, face voxel indices]
+    :return: [points, face counts, face connects, face voxel indices]
+    """
+    face_cells, face_directions, face_voxels = faces
+    corners = face_cells[:, None, :] + FACE_CORNERS[face_directions]
+    points, face_counts, face_connects = quad_arrays(corners, grid.origin, grid.voxel_size, grid.shape)
+    return [points, face_counts, face_connects, face_voxels]
+
+
+def face_vertex_colors(face_colors, face_counts):
+    """
+    Spreads the color of every face over its face vertices, in the same order as the face connects.
+    :param face_colors: uint8 array (F, 3)
+    :param face_counts: amount of vertices of every face
+    :return: float array (sum of face_counts, 4) of RGBA colors from 0 to 1
+    """
+    colors = np.ones((int(np.sum(face_counts)), 4))
+    colors[:, :3] = np.repeat(np.asarray(face_colors, dtype=np.float64).reshape(-1, 3), face_counts, axis=0) / 255
+    return colors
+
+
+def unshare_points(points, face_connects):
+    """
+    Gives every face vertex its own point, for formats that can only store colors per point.
+    :param points: float array (P, 3)
+    :param face_connects: vertex index of every face vertex
+    :return: [points (C, 3) with one point per face vertex, face connects 0 to C - 1]
+    """
+    face_connects = np.asarray(face_connects, dtype=np.int64)
+    return [np.asarray(points)[face_connects], np.arange(len(face_connects), dtype=np.int64)]
+
+
+def _greedy_rectangles(layers, u, v, labels):
+    """
+    Merges the faces of one direction that lie in the same layer and have the same label into rectangles. The faces
+    are first joined into runs as long as possible along u, and then runs that start and end at the same u in
+    neighbouring rows along v are stacked on top of each other. Both steps only sort and compare the face arrays, so
+    no plane of labels is ever allocated.
+    :param layers: int array (F,) of the cell along the normal of every face
+    :param u: int array (F,) of the cell along the first axis of the plane
+    :param v: int array (F,) of the cell along the second axis of the plane
+    :param labels: int array (F,) of the label of every face, faces only merge with faces of the same label
+    :return: [layers, u, v, widths, heights, labels] int arrays (R,) with the lowest cell and size of every rectangle
+    """
+    # a face starts a new run unless the face before it in its row is its neighbour with the same label
+    order = np.lexsort((u, v, layers))
+    layers, u, v, labels = layers[order], u[order], v[order], labels[order]
+    start = np.ones(len(u), dtype=bool)
+    start[1:] = ((layers[1:] != layers[:-1]) | (v[1:] != v[:-1]) | (u[1:] != u[:-1] + 1) |
+                 (labels[1:] != labels[:-1]))
+    first = np.flatnonzero(start)
+    widths = np.diff(np.append(first, len(u)))
+    layers, u, v, labels = layers[first], u[first], v[first], labels[first]
+
+    # the same for the runs, which stack along v when the run in the row before has the same start, width and label
+    order = np.lexsort((v, labels, widths, u, layers))
+    layers, u, v, widths, labels = layers[order], u[order], v[order], widths[order], labels[order]
+    start = np.ones(len(u), dtype=bool)
+    start[1:] = ((layers[1:] != layers[:-1]) | (u[1:] != u[:-1]) | (widths[1:] != widths[:-1]) |
+                 (labels[1:] != labels[:-1]) | (v[1:] != v[:-1] + 1))
+    first = np.flatnonzero(start)
+    heights = np.diff(np.append(first, len(u)))
+    return [layers[first], u[first], v[first], widths[first], heights, labels[first]]
+
+
+def build_greedy_mesh(grid):
+    """
+    Builds a single mesh out of all voxels like build_mesh, but also merges neighbouring faces that lie in the same
+    plane and share the same color id into bigger rectangles. Since a whole rectangle has one color, its UVs all sit
+    in the center of that color on the palette texture and stay correct.
+    :param grid: VoxelGrid, the palette index of each voxel is taken from grid.color_ids
+    :return: [points, face counts, face connects, face color ids, [triangles before, triangles after]]
+    """
+    face_cells, face_directions, face_voxels = exposed_faces(grid)
+    color_ids = grid.color_ids.astype(np.int64)
+    corners = []
+    face_color_ids = []
+    for direction in range(6):
+        axis = int(np.nonzero(FACE_NORMALS[direction])[0][0])
+        u_axis, v_axis = [a for a in range(3) if a != axis]
+        found = face_directions == direction
+        cells = face_cells[found]
+        layers, u, v, widths, heights, labels = _greedy_rectangles(cells[:, axis], cells[:, u_axis], cells[:, v_axis],
+                                                                   color_ids[face_voxels[found]])
+        low = np.zeros((len(layers), 3), dtype=np.int64)
+        low[:, axis], low[:, u_axis], low[:, v_axis] = layers, u, v
+        high = low.copy()
+        high[:, u_axis] += widths - 1
+        high[:, v_axis] += heights - 1
+        # every corner of the single face is moved to the matching corner of the rectangle
+        corners.append(np.where(FACE_CORNERS[direction] == 0, low[:, None, :], high[:, None, :] + 1))
+        face_color_ids.append(labels)
+    corners = np.concatenate(corners)
+    points, face_counts, face_connects = quad_arrays(corners, grid.origin, grid.voxel_size, grid.shape)
+    report = [len(face_cells) * 2, len(corners) * 2]
+    return [points, face_counts, face_connects, np.concatenate(face_color_ids), report]
@@ -0,0 +1,213 @@
+# Builds the color palette of the voxel texture. Only requires numpy, so it can be used outside of Maya as well.
+import numpy as np
+
+
+PALETTE_MODES = ('threshold', 'grid', 'median_cut', 'kmeans')
+
+
+def to_rgb8(colors):
+    """
+    Converts 0 to 1 float colors to the 0 to 255 color system pillow uses.
+    :param colors: float array (N, 3)
+    :return: int array (N, 3)
+    """
+    return np.clip(np.rint(np.asarray(colors, dtype=np.float64).reshape(-1, 3) * 255), 0, 255).astype(np.int64)
+
+
+def unique_colors(rgb):
+    """
+    Finds the unique colors in the order they first appear in, so palettes stay in the same order as before.
+    :param rgb: int array (N, 3)
+    :return: [unique colors (U, 3), index of the unique color of every input color (N,), amount of each color (U,)]
+    """
+    unique, first, inverse, counts = np.unique(rgb, axis=0, return_index=True, return_inverse=True,
+                                               return_counts=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return [unique[order], rank[inverse.ravel()], counts[order]]
+
+
+def threshold_palette(rgb, threshold: int):
+    """
+    Gives every color the first palette color that is closer than the threshold on every channel, and adds it to the
+    palette if there is none. This is the behaviour of the original create_texture loop, but palette colors are
+    stored in a grid of threshold sized cells, so only the 27 surrounding cells have to be checked instead of the
+    whole palette.
+    :param rgb: int array (N, 3) of 0 to 255 colors
+    :param threshold: maximum difference on each channel for two colors to be considered the same
+    :return: [palette int array (P, 3), palette index of every color (N,)]
+    """
+    # signed, so the neighbouring cells of cell 0 and the channel differences don't wrap around
+    rgb = np.asarray(rgb, dtype=np.int64).reshape(-1, 3)
+    if threshold <= 0:
+        # nothing is closer than 0, so the old loop gave every single voxel its own palette color
+        return [rgb.copy(), np.arange(len(rgb), dtype=np.uint32)]
+
+    unique, inverse = unique_colors(rgb)[:2]
+    cells = unique // threshold
+    grid = {}
+    palette = []
+    unique_ids = np.empty(len(unique), dtype=np.uint32)
+    neighbours = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+    for color in range(len(unique)):
+        r, g, b = unique[color]
+        cell = cells[color]
+        # every palette color closer than the threshold lies in one of the surrounding cells, the lowest index
+        # among them is the one the old loop would have found first
+        match = -1
+        for x, y, z in neighbours:
+            for index in grid.get((cell[0] + x, cell[1] + y, cell[2] + z), ()):
+                if match != -1 and index > match:
+                    continue
+                p = palette[index]
+                if abs(p[0] - r) < threshold and abs(p[1] - g) < threshold and abs(p[2] - b) < threshold:
+                    match = index
+        if match == -1:
+            match = len(palette)
+            palette.append((r, g, b))
+            grid.setdefault((cell[0], cell[1], cell[2]), []).append(match)
+        unique_ids[color] = match
+    return [np.array(palette, dtype=np.int64).reshape(-1, 3), unique_ids[inverse]]
+
+
+def grid_palette(rgb, threshold: int):
+    """
+    Snaps every color to a grid of threshold sized cells and uses the average color of each cell. Fully vectorized,
+    but unlike threshold_palette two colors can end up in different cells even if they are closer than the threshold.
+    :param rgb: int array (N, 3) of 0 to 255 colors
+    :param threshold: size of the grid cells
+    :return: [palette int array (P, 3), palette index of every color (N,)]
+    """
+    cells = rgb // max(threshold, 1)
+    unique_cells, ids = unique_colors(cells)[:2]
+    sums = np.zeros((len(unique_cells), 3), dtype=np.float64)
+    np.add.at(sums, ids, rgb)
+    counts = np.bincount(ids, minlength=len(unique_cells))[:, None]
+    palette = np.rint(sums / counts).astype(np.int64)
+    return [palette, ids.astype(np.uint32)]
+
+
+def median_cut_palette(rgb, palette_size: int):
+    """
+    Creates a palette with at most palette_size colors by repeatedly splitting the box of colors with the widest
+    channel range at its median.
+    :param rgb: int array (N, 3) of 0 to 255 colors
+    :param palette_size: maximum amount of colors in the palette
+    :return: [palette int array (P, 3), palette index of every color (N,)]
+    """
+    unique, inverse, counts = unique_colors(rgb)
+    boxes = [np.arange(len(unique))]
+    # channel range of every box, so they don't have to be recalculated after every split
+    ranges = [np.ptp(unique, axis=0)]
+    while len(boxes) < palette_size:
+        # split the box with the widest range on any channel
+        widest = int(np.argmax([box_range.max() for box_range in ranges]))
+        if ranges[widest].max() <= 0:
+            break
+        box = boxes.pop(widest)
+        channel = int(np.argmax(ranges.pop(widest)))
+        box = box[np.argsort(unique[box, channel], kind='stable')]
+        # the median is weighted by how often each color appears
+        cumulative = np.cumsum(counts[box])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        split = min(max(split, 1), len(box) - 1)
+        for half in (box[:split], box[split:]):
+            boxes.append(half)
+            ranges.append(np.ptp(unique[half], axis=0))
+
+    palette = np.zeros((len(boxes), 3), dtype=np.int64)
+    unique_ids = np.empty(len(unique), dtype=np.uint32)
+    for index in range(len(boxes)):
+        box = boxes[index]
+        palette[index] = np.rint(np.average(unique[box], axis=0, weights=counts[box]))
+        unique_ids[box] = index
+    return [palette, unique_ids[inverse]]
+
+
+def nearest_palette_color(colors, palette, batch_size=65536):
+    """
+    Finds the closest palette color of every color.
+    :param colors: int array (N, 3)
+    :param palette: int array (P, 3)
+    :param batch_size: amount of colors compared at the same time, keeps memory usage in check
+    :return: uint32 array (N,)
+    """
+    palette = np.asarray(palette, dtype=np.float64)
+    palette_lengths = (palette ** 2).sum(axis=1)
+    ids = np.empty(len(colors), dtype=np.uint32)
+    for start in range(0, len(colors), batch_size):
+        batch = np.asarray(colors[start:start + batch_size], dtype=np.float64)
+        # |a - b|^2 = |a|^2 - 2ab + |b|^2, and |a|^2 is the same for every palette color so it can be left out
+        distances = palette_lengths[None, :] - 2 * batch @ palette.T
+        ids[start:start + batch_size] = distances.argmin(axis=1)
+    return ids
+
+
+def kmeans_palette(rgb, palette_size: int, iterations=10):
+    """
+    Creates a palette with at most palette_size colors using k-means, starting from the median cut palette.
+    :param rgb: int array (N, 3) of 0 to 255 colors
+    :param palette_size: maximum amount of colors in the palette
+    :param iterations: amount of k-means refinement steps
+    :return: [palette int array (P, 3), palette index of every color (N,)]
+    """
+    unique, inverse, counts = unique_colors(rgb)
+    palette = median_cut_palette(unique, palette_size)[0].astype(np.float64)
+    weights = counts.astype(np.float64)
+    for _ in range(iterations):
+        unique_ids = nearest_palette_color(unique, palette)
+        sums = np.zeros_like(palette)
+        np.add.at(sums, unique_ids, unique * weights[:, None])
+        totals = np.bincount(unique_ids, weights=weights, minlength=len(palette))
+        used = totals > 0
+        new_palette = palette.copy()
+        new_palette[used] = sums[used] / totals[used, None]
+        if np.allclose(new_palette, palette):
+            break
+        palette = new_palette
+    palette = np.rint(palette).astype(np.int64)
+    unique_ids = nearest_palette_color(unique, palette)
+    # drop palette colors that no voxel ended up using
+    used, unique_ids = np.unique(unique_ids, return_inverse=True)
+    return [palette[used], unique_ids.astype(np.uint32)[inverse]]
+
+
+def build_palette(colors, threshold=5, mode='threshold', palette_size=256):
+    """
+    Quantizes the voxel colors into a palette.
+    :param colors: float array (N, 3) of 0 to 1 voxel colors, or uint8 array (N, 3) of 0 to 255 colors
+    :param threshold: maximum difference on each channel for the 'threshold' and 'grid' modes
+    :param mode: 'threshold' gives the same result as the original create_texture loop, 'grid' snaps colors to a
+    grid, 'median_cut' and 'kmeans' create a palette of a fixed size
+    :param palette_size: maximum amount of colors for the 'median_cut' and 'kmeans' modes
+    :return: [palette uint8 array (P, 3), palette index of every voxel uint32 array (N,)]
+    """
+    colors = np.asarray(colors)
+    if colors.dtype == np.uint8:
+        rgb = colors.reshape(-1, 3).astype(np.int64)
+    else:
+        rgb = to_rgb8(colors)
+    if len(rgb) == 0:
+        return [np.zeros((0, 3), dtype=np.uint8), np.zeros(0, dtype=np.uint32)]
+    if mode == 'threshold':
+        palette, ids = threshold_palette(rgb, threshold)
+    elif mode == 'grid':
+        palette, ids = grid_palette(rgb, threshold)
+    elif mode == 'median_cut':
+        palette, ids = median_cut_palette(rgb, palette_size)
+    elif mode == 'kmeans':
+        palette, ids = kmeans_palette(rgb, palette_size)
+    else:
+        raise ValueError(f"Unknown palette mode '{mode}', expected one of {PALETTE_MODES}")
+    return [np.clip(palette, 0, 255).astype(np.uint8), ids.astype(np.uint32)]
+
+
+def exact_palette(colors):
+    """
+    Gives every distinct color its own palette color, for vertex colors and files that keep the exact colors.
+    :param colors: uint8 array (N, 3) of 0 to 255 voxel colors
+    :return: [palette uint8 array (P, 3), palette index of every voxel uint32 array (N,)], like build_palette
+    """
+    palette, ids = unique_colors(np.asarray(colors, dtype=np.uint8).reshape(-1, 3))[:2]
+    return [palette, ids.astype(np.uint32)]
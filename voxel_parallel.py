@@ -0,0 +1,403 @@
+# Runs the Maya independent stages on a pool of processes. The grid is split into slabs or ranges of voxels, and
+# every worker writes its part of the result straight into shared memory, so nothing big has to be sent back.
+import atexit
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+import voxel_engine
+import voxel_grid
+import voxel_mesh
+
+
+# amount of pieces of work per worker, more pieces balance the load better when some slabs hold more triangles
+TASKS_PER_WORKER = 4
+# below these sizes the work is done in this process, since sending it to the pool would take longer than doing it
+PARALLEL_MIN_CELLS = 1 << 18
+PARALLEL_MIN_VOXELS = 1 << 16
+PARALLEL_MIN_SAMPLES = 1 << 14
+# amount of positions colored by one task, small enough that a cancelled task is done within a fraction of a second
+SAMPLE_TASK_SIZE = 1 << 13
+
+# the pool is started once and kept for every following call, starting the processes takes longer than most stages
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    """
+    :return: amount of cores on this machine
+    """
+    return os.cpu_count() or 1
+
+
+def pool_context():
+    """
+    Gets the multiprocessing context for the pool. Workers are always spawned instead of forked, since forking a
+    running Maya is not safe, and inside Maya they have to be started with mayapy instead of the Maya executable.
+    :return: multiprocessing context
+    """
+    context = multiprocessing.get_context('spawn')
+    executable = os.path.basename(sys.executable).lower()
+    if executable.startswith('maya') and not executable.startswith('mayapy'):
+        mayapy = os.path.join(os.path.dirname(sys.executable), 'mayapy.exe' if os.name == 'nt' else 'mayapy')
+        context.set_executable(mayapy)
+    return context
+
+
+def get_pool(workers: int):
+    """
+    Gets the process pool, and only starts a new one the first time or when the amount of workers changed.
+    :param workers: amount of processes
+    :return: ProcessPoolExecutor
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    """
+    Stops the processes of the pool. The next call that needs them starts a new pool.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_pool)
+
+
+def worker_count(workers, size: int, minimum: int):
+    """
+    :param workers: amount of processes asked for, None for the amount of cores
+    :param size: amount of work, in the unit of minimum
+    :param minimum: least amount of work that is worth sending to the pool
+    :return: amount of processes to use, 1 runs in this process
+    """
+    workers = workers or default_workers()
+    return 1 if size < minimum else workers
+
+
+class SharedArray(object):
+    def __init__(self, shape, dtype, name=None):
+        """
+        A numpy array in shared memory, that worker processes can attach to by name.
+        :param shape: shape of the array
+        :param dtype: numpy data type
+        :param name: name of existing shared memory to attach to, new shared memory is created if None
+        """
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.owner = name is None
+        # spawned workers share the resource tracker of the process that started them, so attaching in a worker
+        # doesn't cause the memory to be freed when that worker exits
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        """
+        Copies an array into new shared memory.
+        :param array: numpy array
+        :return: SharedArray
+        """
+        array = np.ascontiguousarray(array)
+        shared = cls(array.shape, array.dtype)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        :param spec: result of spec() in the process that created the array
+        :return: SharedArray
+        """
+        return cls(spec[1], spec[2], spec[0])
+
+    def spec(self):
+        """
+        :return: everything a worker needs to attach to the array, small enough to send along with each task
+        """
+        return [self.memory.name, self.shape, self.dtype.str]
+
+    def close(self):
+        """
+        Detaches from the shared memory, and frees it if this process created it.
+        """
+        self.array = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedObject(object):
+    # values that are sent as they are, even though they have a __dict__
+    PLAIN_TYPES = (type, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.ModuleType)
+
+    def __init__(self, target):
+        """
+        Copies the numpy arrays of an object, and of the objects it holds, into shared memory, so a worker can rebuild
+        the object without the arrays being sent along with every task.
+        :param target: object to share, like a voxel_sampling.MeshColorSampler
+        """
+        self.arrays = []
+        self.state = self._share(target)
+
+    def _share(self, value):
+        if isinstance(value, np.ndarray):
+            shared = SharedArray.from_array(value)
+            self.arrays.append(shared)
+            return ['array', shared.spec()]
+        if hasattr(value, '__dict__') and not isinstance(value, self.PLAIN_TYPES):
+            return ['object', type(value), {name: self._share(item) for name, item in vars(value).items()}]
+        return ['value', value]
+
+    def spec(self):
+        """
+        :return: everything a worker needs to rebuild the object, small enough to send along with each task
+        """
+        return self.state
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Rebuilds the object in a worker. Its arrays point into the shared memory, so the object has to be let go of
+        before the returned arrays are closed.
+        :param spec: result of spec() in the process that shared the object
+        :return: [object, list of SharedArray]
+        """
+        arrays = []
+
+        def rebuild(state):
+            kind, value = state[0], state[1]
+            if kind == 'array':
+                arrays.append(SharedArray.attach(value))
+                return arrays[-1].array
+            if kind == 'object':
+                target = value.__new__(value)
+                target.__dict__.update({name: rebuild(item) for name, item in state[2].items()})
+                return target
+            return value
+
+        return [rebuild(spec), arrays]
+
+    def close(self):
+        """
+        Frees the shared memory of the arrays.
+        """
+        for shared in self.arrays:
+            shared.close()
+        self.arrays = []
+
+
+def _split(count: int, pieces: int):
+    """
+    Splits a range into about equal parts.
+    :param count: length of the range
+    :param pieces: amount of parts
+    :return: list of [start, end]
+    """
+    bounds = np.linspace(0, count, max(1, min(pieces, count)) + 1).astype(np.int64)
+    return [[int(bounds[x]), int(bounds[x + 1])] for x in range(len(bounds) - 1) if bounds[x] < bounds[x + 1]]
+
+
+def _run(function, tasks, workers: int, progress=None):
+    """
+    Runs the tasks on the process pool and waits for all of them, passing on the first error. When the progress gets
+    cancelled the tasks that haven't started yet are dropped, and only the running ones are waited for, so the
+    shared memory they write to can be freed afterwards.
+    :param function: module level function, so it can be sent to the workers
+    :param tasks: list of argument lists
+    :param workers: amount of processes
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every finished task, and checked for
+    cancelling while the tasks run, or None
+    """
+    futures = [get_pool(workers).submit(function, *task) for task in tasks]
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, None if progress is None else progress.interval, FIRST_COMPLETED)
+            for future in done:
+                future.result()
+            if progress is not None:
+                # also runs when no task finished in time, so cancelling doesn't wait for the next task to finish
+                progress.advance(len(done))
+    except BrokenProcessPool:
+        # a worker died, the next call starts a new pool
+        shutdown_pool()
+        raise
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+
+
+def _voxelize_slab(vertices_spec, faces_spec, output_spec, origin, voxel_size, shape, x_range):
+    vertices = SharedArray.attach(vertices_spec)
+    faces = SharedArray.attach(faces_spec)
+    output = SharedArray.attach(output_spec)
+    region = [[x_range[0], 0, 0], [x_range[1], shape[1], shape[2]]]
+    output.array[x_range[0]:x_range[1]] = voxel_engine.voxelize_surface(vertices.array, faces.array, origin,
+                                                                        voxel_size, shape, region)
+    for shared in (vertices, faces, output):
+        shared.close()
+
+
+def voxelize(vertices, faces, density: int, padding=1.1, workers=None, progress=None):
+    """
+    Same as voxel_engine.voxelize, but the grid is split into slabs along x that are voxelized on separate processes.
+    Every slab is tested in the coordinates of the whole grid, so the result is identical to voxel_engine.voxelize.
+    :param vertices: float array (V, 3) of world space vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param density: amount of voxels along the longest side of the mesh
+    :param padding: how much bigger the grid is than the bounding box of the mesh
+    :param workers: amount of processes, defaults to the amount of cores. 1, or a grid of less than
+    PARALLEL_MIN_CELLS cells, runs in this process
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every slab, or for every triangle when
+    running in this process, or None
+    :return: [occupancy, origin, voxel_size]
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    origin, voxel_size, shape = voxel_engine.grid_for_bounds(vertices.min(axis=0), vertices.max(axis=0), density,
+                                                             padding)
+    workers = worker_count(workers, int(np.prod(shape)), PARALLEL_MIN_CELLS)
+    if workers <= 1:
+        return voxel_engine.voxelize(vertices, faces, density, padding, progress)
+
+    shared_vertices = SharedArray.from_array(vertices)
+    shared_faces = SharedArray.from_array(faces)
+    output = SharedArray(shape, bool)
+    try:
+        tasks = [[shared_vertices.spec(), shared_faces.spec(), output.spec(), origin, voxel_size, shape, x_range]
+                 for x_range in _split(shape[0], workers * TASKS_PER_WORKER)]
+        if progress is not None:
+            progress.begin(len(tasks), 'slabs')
+        _run(_voxelize_slab, tasks, workers, progress)
+        if progress is not None:
+            progress.finish()
+        occupancy = output.array.copy()
+    finally:
+        for shared in (shared_vertices, shared_faces, output):
+            shared.close()
+    return [occupancy, origin, voxel_size]
+
+
+def _exposed_range(cells_spec, bits_spec, output_spec, shape, voxel_range):
+    cells = SharedArray.attach(cells_spec)
+    bits = SharedArray.attach(bits_spec)
+    output = SharedArray.attach(output_spec)
+    start, end = voxel_range
+    part = cells.array[start:end].astype(np.int64)
+    for direction in range(6):
+        neighbours = part + voxel_mesh.FACE_NORMALS[direction]
+        output.array[start:end, direction] = ~voxel_grid.bits_occupied(bits.array, shape, neighbours)
+    for shared in (cells, bits, output):
+        shared.close()
+
+
+def exposed_faces(grid, workers=None):
+    """
+    Same as voxel_mesh.exposed_faces, but the voxels are split into ranges that are checked on separate processes.
+    :param grid: VoxelGrid
+    :param workers: amount of processes, defaults to the amount of cores. 1, or less than PARALLEL_MIN_VOXELS
+    voxels, runs in this process
+    :return: [face cells int array (F, 3), face directions int array (F,), face voxel indices int array (F,)]
+    """
+    workers = worker_count(workers, len(grid), PARALLEL_MIN_VOXELS)
+    if workers <= 1:
+        return voxel_mesh.exposed_faces(grid)
+
+    shared_cells = SharedArray.from_array(grid.cells)
+    shared_bits = SharedArray.from_array(grid.occupancy_bits)
+    output = SharedArray((len(grid), 6), bool)
+    try:
+        tasks = [[shared_cells.spec(), shared_bits.spec(), output.spec(), grid.shape, voxel_range]
+                 for voxel_range in _split(len(grid), workers * TASKS_PER_WORKER)]
+        _run(_exposed_range, tasks, workers)
+        # going over the mask row by row gives the faces per voxel with their directions in order, the same order
+        # voxel_mesh.exposed_faces returns them in
+        face_voxels, face_directions = np.nonzero(output.array)
+    finally:
+        for shared in (shared_cells, shared_bits, output):
+            shared.close()
+    return [grid.cells[face_voxels].astype(np.int64), face_directions.astype(np.int64), face_voxels.astype(np.int64)]
+
+
+def build_mesh(grid, workers=None):
+    """
+    Same as voxel_mesh.build_mesh, with the exposed faces found on separate processes.
+    :param grid: VoxelGrid
+    :param workers: amount of processes, defaults to the amount of cores. 1, or less than PARALLEL_MIN_VOXELS
+    voxels, runs in this process
+    :return: [points, face counts, face connects, face voxel indices]
+    """
+    return voxel_mesh.mesh_from_faces(grid, exposed_faces(grid, workers))
+
+
+def _sample_range(positions_spec, output_spec, sampler_spec, position_range):
+    positions = SharedArray.attach(positions_spec)
+    output = SharedArray.attach(output_spec)
+    sampler, sampler_arrays = SharedObject.attach(sampler_spec)
+    start, end = position_range
+    output.array[start:end] = sampler(positions.array[start:end])
+    # the arrays of the sampler point into shared memory that can only be closed once nothing uses it
+    del sampler
+    for shared in [positions, output] + sampler_arrays:
+        shared.close()
+
+
+def sample_colors(positions, sampler, workers=None, progress=None):
+    """
+    Runs a color sampler over ranges of voxel positions on separate processes.
+    :param positions: float array (N, 3) of voxel centers
+    :param sampler: function or object that takes a float array (N, 3) and an optional progress, and returns uint8
+    colors (N, 3), like voxel_sampling.MeshColorSampler. Its numpy arrays are put in shared memory and the rest is
+    sent to every worker, so that has to be picklable. A sampler with a channels attribute returns that many channels
+    instead of 3
+    :param workers: amount of processes, defaults to the amount of cores. 1, or less than PARALLEL_MIN_SAMPLES
+    positions, runs in this process
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every SAMPLE_TASK_SIZE positions, or for
+    every position when running in this process, or None
+    :return: uint8 array (N, 3), or (N, channels)
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    workers = worker_count(workers, len(positions), PARALLEL_MIN_SAMPLES)
+    if workers <= 1:
+        return np.asarray(sampler(positions, progress), dtype=np.uint8)
+
+    shared_positions = SharedArray.from_array(positions)
+    output = SharedArray((len(positions), getattr(sampler, 'channels', 3)), np.uint8)
+    shared_sampler = SharedObject(sampler)
+    try:
+        # many small tasks, so a cancel only waits for the ones that are running
+        tasks = [[shared_positions.spec(), output.spec(), shared_sampler.spec(), position_range]
+                 for position_range in _split(len(positions), -(-len(positions) // SAMPLE_TASK_SIZE))]
+        if progress is not None:
+            progress.begin(len(tasks), 'color ranges')
+        _run(_sample_range, tasks, workers, progress)
+        if progress is not None:
+            progress.finish()
+        colors = output.array.copy()
+    finally:
+        shared_positions.close()
+        output.close()
+        shared_sampler.close()
+    return colors
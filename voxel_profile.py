@@ -0,0 +1,274 @@
+# Measures where the time of the voxelizer goes. A Profiler times named stages, adds up counters like the amount of
+# voxels kept or faces made, can capture a cProfile of every stage, and writes it all to a json file or to a trace
+# that chrome://tracing and Perfetto can open. Stages can run on several threads at once. A ProgressReporter updates
+# progress bars and checks for cancelling at most a few times per second, however many items go through it. Only
+# requires the standard library.
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+
+
+PROFILE_MODES = ('off', 'stages', 'cprofile')
+TRACE_VERSION = 1
+# amount of functions kept of every cProfile capture, the slowest first
+PROFILE_FUNCTIONS = 25
+# seconds between two progress updates
+PROGRESS_INTERVAL = 0.1
+
+
+class Profiler(object):
+    def __init__(self, enabled=True, capture=False):
+        """
+        :param enabled: when False stages and counters do nothing, so the hooks can stay in place
+        :param capture: also run cProfile during the outermost stages of every thread
+        """
+        self.enabled = enabled
+        self.capture = capture
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, enabled=None, capture=None):
+        """
+        Forgets everything measured so far.
+        :param enabled: new value of enabled, unchanged when None
+        :param capture: new value of capture, unchanged when None
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if capture is not None:
+            self.capture = capture
+        with self.lock:
+            self.started = time.perf_counter()
+            # stage name to [calls, seconds]
+            self.stages = {}
+            self.counters = {}
+            # every stage that ran as [name, start, seconds, depth, thread id], in the order they ended
+            self.events = []
+            # stage name to list of cProfile.Profile, one for every thread that captured it
+            self.profiles = {}
+            # how deep the stages of every thread are nested
+            self.local = threading.local()
+
+    @contextlib.contextmanager
+    def _stage(self, name: str):
+        local = self.local
+        depth = getattr(local, 'depth', 0)
+        profile = None
+        if self.capture and depth == 0:
+            # cProfile can't run inside another one, so only the outermost stages capture, every thread into its own
+            if not hasattr(local, 'profiles'):
+                local.profiles = {}
+            profile = local.profiles.get(name) or cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # from Python 3.12 only one cProfile can run at a time, even on different threads
+                profile = None
+        local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            local.depth = depth
+            if profile is not None:
+                profile.disable()
+            with self.lock:
+                entry = self.stages.get(name)
+                if entry is None:
+                    self.stages[name] = [1, seconds]
+                else:
+                    entry[0] += 1
+                    entry[1] += seconds
+                self.events.append([name, start - self.started, seconds, depth, threading.get_ident()])
+                if profile is not None and name not in local.profiles:
+                    local.profiles[name] = profile
+                    self.profiles.setdefault(name, []).append(profile)
+
+    def stage(self, name: str):
+        """
+        Times everything that runs inside the with block as the named stage. Stages can be nested.
+        :param name: name of the stage
+        :return: context manager
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._stage(name)
+
+    def count(self, name: str, amount=1):
+        """
+        Adds to a counter.
+        :param name: name of the counter
+        :param amount: how much to add
+        """
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other):
+        """
+        Adds everything another profiler measured to this one, like the profiler of a worker thread once it is done.
+        The events of both keep their place in time.
+        :param other: Profiler that isn't measuring anymore
+        """
+        with self.lock:
+            started = min(self.started, other.started)
+            for event in self.events:
+                event[1] += self.started - started
+            self.started = started
+            for name, (calls, seconds) in other.stages.items():
+                entry = self.stages.setdefault(name, [0, 0.0])
+                entry[0] += calls
+                entry[1] += seconds
+            for name, value in other.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            self.events += [[name, start + other.started - started, seconds, depth, thread]
+                            for name, start, seconds, depth, thread in other.events]
+            for name, profiles in other.profiles.items():
+                self.profiles.setdefault(name, []).extend(profiles)
+
+    def _profile_functions(self, profiles):
+        """
+        :return: list of [function, calls, own seconds, total seconds] of the slowest functions of cProfile captures
+        """
+        stats = pstats.Stats(*profiles).stats
+        functions = [[f'{os.path.basename(file_name)}:{line}({function})', calls, own_time, total_time]
+                     for (file_name, line, function), (_, calls, own_time, total_time, _) in stats.items()]
+        functions.sort(key=lambda function: -function[3])
+        return functions[:PROFILE_FUNCTIONS]
+
+    def to_dict(self):
+        """
+        :return: dictionary with the stages, counters, events and cProfile captures, ready for json
+        """
+        return {'version': TRACE_VERSION,
+                'stages': {name: {'calls': calls, 'seconds': seconds}
+                           for name, (calls, seconds) in self.stages.items()},
+                'counters': dict(self.counters),
+                'events': [{'name': name, 'start': start, 'seconds': seconds, 'depth': depth, 'thread': thread}
+                           for name, start, seconds, depth, thread in self.events],
+                'profiles': {name: self._profile_functions(profiles) for name, profiles in self.profiles.items()}}
+
+    def write_json(self, file_path: str):
+        """
+        Writes to_dict as a json file.
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=1)
+
+    def write_chrome_trace(self, file_path: str):
+        """
+        Writes the stages as a trace in the Chrome trace event format, with the counters at their final values at the
+        end of the trace.
+        """
+        process = os.getpid()
+        events = [{'name': name, 'cat': 'stage', 'ph': 'X', 'ts': start * 1e6, 'dur': seconds * 1e6, 'pid': process,
+                   'tid': thread} for name, start, seconds, _, thread in self.events]
+        end = max([start + seconds for _, start, seconds, _, _ in self.events], default=0.0)
+        events += [{'name': name, 'cat': 'counter', 'ph': 'C', 'ts': end * 1e6, 'pid': process, 'tid': 0,
+                    'args': {name: value}} for name, value in self.counters.items()]
+        with open(file_path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def summary(self):
+        """
+        :return: text with the total seconds of every stage, slowest first, and every counter
+        """
+        lines = [f"{name:<24}{seconds:9.3f}s {calls:6d}x" for name, (calls, seconds) in
+                 sorted(self.stages.items(), key=lambda item: -item[1][1])]
+        lines += [f"{name:<24}{value:>10}" for name, value in self.counters.items()]
+        return '\n'.join(lines)
+
+
+class CountedModule(object):
+    def __init__(self, module, name: str, profiler=None):
+        """
+        Passes everything through to the module, and counts the calls to its functions while the profiler is enabled,
+        both in total as '<name> calls' and per function as '<name>.<function>'.
+        :param module: module to count the calls to, like maya.cmds
+        :param name: name the counters start with
+        :param profiler: Profiler to count with, can be set later
+        """
+        self._module = module
+        self._name = name
+        self.profiler = profiler
+
+    def __getattr__(self, attribute: str):
+        value = getattr(self._module, attribute)
+        profiler = self.profiler
+        if profiler is None or not profiler.enabled or not callable(value):
+            return value
+        total_name = f'{self._name} calls'
+        function_name = f'{self._name}.{attribute}'
+
+        def counted(*args, **kwargs):
+            profiler.count(total_name)
+            profiler.count(function_name)
+            return value(*args, **kwargs)
+        return counted
+
+
+class ProgressCancelled(Exception):
+    """
+    Raised by ProgressReporter.advance when the user cancelled.
+    """
+
+
+class ProgressReporter(object):
+    def __init__(self, update=None, cancelled=None, interval=PROGRESS_INTERVAL):
+        """
+        Reports progress of loops over many items without slowing them down, by only updating and checking for
+        cancelling once every interval instead of for every item.
+        :param update: function(done, total, status) that shows the progress, or None
+        :param cancelled: function that returns True when the user wants to stop, or None
+        :param interval: minimum amount of seconds between two updates
+        """
+        self.update = update
+        self.cancelled = cancelled
+        self.interval = interval
+        self.total = 0
+        self.done = 0
+        self.status = ''
+        self.updates = 0
+        self.next_update = 0.0
+
+    def begin(self, total: int, status=''):
+        """
+        Starts a new loop.
+        :param total: amount of items, 0 when unknown
+        :param status: text to show with the progress
+        """
+        self.total = total
+        self.done = 0
+        self.status = status
+        self.next_update = 0.0
+        self.advance(0)
+
+    def advance(self, amount=1):
+        """
+        Marks items as done. Updates the progress and checks for cancelling when the interval has passed.
+        :param amount: amount of items that are done
+        :raises ProgressCancelled: when the user cancelled
+        """
+        self.done += amount
+        now = time.perf_counter()
+        if now < self.next_update:
+            return
+        self.next_update = now + self.interval
+        self.updates += 1
+        if self.update is not None:
+            self.update(self.done, self.total, self.status)
+        if self.cancelled is not None and self.cancelled():
+            raise ProgressCancelled(f"Cancelled after {self.done} of {self.total} {self.status}")
+
+    def finish(self):
+        """
+        Shows the final progress, however long ago the last update was.
+        """
+        if self.update is not None:
+            self.updates += 1
+            self.update(self.done, self.total, self.status)
@@ -0,0 +1,166 @@
+# Derives coarser voxel grids from a finer one, so lower densities don't have to be voxelized again. Only requires
+# numpy.
+import numpy as np
+import voxel_engine
+import voxel_grid
+
+
+DOWNSAMPLE_RULES = ('any', 'majority')
+
+
+def resample(grid, origin, voxel_size: float, shape, rule='any'):
+    """
+    Resamples a grid onto a coarser grid. Every voxel is put in the coarse cell its center falls in, and the color of
+    a coarse voxel is the average color of the voxels in it.
+    :param grid: VoxelGrid
+    :param origin: world position of the corner of cell (0, 0, 0) of the coarse grid
+    :param voxel_size: edge length of a coarse voxel
+    :param shape: amount of coarse cells along x, y and z
+    :param rule: 'any' keeps every coarse cell with a voxel in it, 'majority' only keeps coarse cells that are more
+    than half filled
+    :return: VoxelGrid
+    """
+    if rule not in DOWNSAMPLE_RULES:
+        raise ValueError(f"Unknown downsample rule '{rule}', expected one of {DOWNSAMPLE_RULES}")
+    shape = tuple(int(s) for s in shape)
+    origin = np.asarray(origin, dtype=np.float64).reshape(3)
+    cells = np.floor((grid.positions() - origin) / voxel_size).astype(np.int64)
+    inside = ((cells >= 0) & (cells < np.array(shape))).all(axis=1)
+    cells = cells[inside]
+    keys = (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+    unique_keys, ids, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    ids = ids.ravel()
+
+    colors = grid.colors[inside].astype(np.float64)
+    averages = np.stack([np.bincount(ids, weights=colors[:, channel], minlength=len(unique_keys))
+                         for channel in range(3)], axis=1) / counts[:, None]
+    keep = np.ones(len(unique_keys), dtype=bool)
+    if rule == 'majority':
+        keep = counts * (grid.voxel_size / voxel_size) ** 3 > 0.5
+    coarse_cells = np.stack(np.unravel_index(unique_keys[keep], shape), axis=1)
+    return voxel_grid.VoxelGrid(coarse_cells, origin, voxel_size, shape,
+                                np.rint(averages[keep]).astype(np.uint8))
+
+
+def downsample(grid, factor: int, rule='any'):
+    """
+    Merges every factor x factor x factor block of cells into one voxel.
+    :param grid: VoxelGrid
+    :param factor: how many cells along each side become one
+    :param rule: one of DOWNSAMPLE_RULES
+    :return: VoxelGrid with the same origin and factor times bigger voxels
+    """
+    shape = [-(-s // factor) for s in grid.shape]
+    return resample(grid, grid.origin, grid.voxel_size * factor, shape, rule)
+
+
+class VoxelPyramid(object):
+    def __init__(self, grid, density: int, bounds=None, padding=1.1, rule='any'):
+        """
+        Mip map of a voxel grid. Level n has 2^n times bigger voxels than the grid, every level is made directly from
+        the grid so the colors are exact averages.
+        :param grid: VoxelGrid voxelized at the given density
+        :param density: amount of voxels along the longest side of the mesh the grid was made with
+        :param bounds: [bbox_min, bbox_max] of the mesh, so coarser grids are placed the same way voxel_engine places
+        them. Defaults to the bounds of the grid itself
+        :param padding: how much bigger the grid is than the bounds, only used together with bounds
+        :param rule: one of DOWNSAMPLE_RULES
+        """
+        self.density = int(density)
+        self.rule = rule
+        if bounds is None:
+            bounds = [grid.origin, grid.origin + np.array(grid.shape) * grid.voxel_size]
+            padding = 1.0
+        self.bounds = [np.asarray(bounds[0], dtype=np.float64), np.asarray(bounds[1], dtype=np.float64)]
+        self.padding = padding
+        self.levels = [grid]
+        while max(self.levels[-1].shape) > 1:
+            self.levels.append(downsample(grid, 2 ** len(self.levels), rule))
+
+    def level_for_density(self, density: int):
+        """
+        :param density: wanted amount of voxels along the longest side
+        :return: index of the coarsest level that is still at least as fine as the density
+        """
+        factor = max(self.density / max(density, 1), 1.0)
+        return min(int(np.floor(np.log2(factor) + 1e-9)), len(self.levels) - 1)
+
+    def grid_for_density(self, density: int):
+        """
+        Derives the grid for a lower density from the closest finer level, which only has to go over the voxels of that
+        level instead of voxelizing the mesh again.
+        :param density: amount of voxels along the longest side, at most the density of the pyramid
+        :return: VoxelGrid
+        """
+        if density >= self.density:
+            return self.levels[0]
+        origin, voxel_size, shape = voxel_engine.grid_for_bounds(self.bounds[0], self.bounds[1], density,
+                                                                 self.padding)
+        return resample(self.levels[self.level_for_density(density)], origin, voxel_size, shape, self.rule)
+
+
+class SparseOctree(object):
+    """
+    Stores a voxel grid as the leaves of an octree. Every 2 x 2 x 2 block of nodes that are all filled with the same
+    color is collapsed into its parent, so large solid interiors take a single node instead of one per voxel.
+
+    levels[n] holds the [cells, colors] of the leaves that are 2^n voxels wide, with cells in the coordinates of that
+    level.
+    """
+
+    def __init__(self, grid):
+        """
+        :param grid: VoxelGrid
+        """
+        self.origin = grid.origin.copy()
+        self.voxel_size = grid.voxel_size
+        self.shape = grid.shape
+        cell_type = grid.cells.dtype
+
+        self.levels = []
+        cells = grid.cells.astype(np.int64)
+        colors = grid.colors
+        level_shape = np.array(self.shape, dtype=np.int64)
+        while len(cells):
+            level_shape = -(-level_shape // 2)
+            parents = cells >> 1
+            keys = (parents[:, 0] * level_shape[1] + parents[:, 1]) * level_shape[2] + parents[:, 2]
+            order = np.argsort(keys, kind='stable')
+            cells, colors, keys, parents = cells[order], colors[order], keys[order], parents[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            counts = np.diff(np.r_[starts, len(keys)])
+            group = np.repeat(np.arange(len(starts)), counts)
+            # a block collapses when all 8 children exist and share the color of the first child
+            same = (colors == colors[starts][group]).all(axis=1)
+            uniform = np.bincount(group, weights=same, minlength=len(starts)) == 8
+            collapse = uniform[group]
+            self.levels.append([cells[~collapse].astype(cell_type), colors[~collapse]])
+            cells = parents[starts[uniform]]
+            colors = colors[starts[uniform]]
+
+    def __len__(self):
+        return sum(len(cells) for cells, _ in self.levels)
+
+    def to_grid(self):
+        """
+        Expands the leaves back into single voxels.
+        :return: VoxelGrid
+        """
+        all_cells = []
+        all_colors = []
+        for level in range(len(self.levels)):
+            cells, colors = self.levels[level]
+            width = 2 ** level
+            offsets = np.stack(np.meshgrid(*[np.arange(width)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+            all_cells.append((cells.astype(np.int64)[:, None] * width + offsets).reshape(-1, 3))
+            all_colors.append(np.repeat(colors, len(offsets), axis=0))
+        if not all_cells:
+            return voxel_grid.VoxelGrid(np.zeros((0, 3)), self.origin, self.voxel_size, self.shape)
+        return voxel_grid.VoxelGrid(np.concatenate(all_cells), self.origin, self.voxel_size, self.shape,
+                                    np.concatenate(all_colors))
+
+    def nbytes(self):
+        """
+        :return: amount of bytes used by the leaves
+        """
+        return sum(cells.nbytes + colors.nbytes for cells, colors in self.levels)
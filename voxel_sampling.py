@@ -0,0 +1,257 @@
+# Colors voxels from the mesh they were made of, without the fluid simulation. Every voxel touching the mesh takes the
+# color of the closest point on the mesh, from the texture at the UV of that point or from the vertex colors, and the
+# voxels filling the inside take the color of the surface voxels around them. Only requires numpy, and Pillow to read
+# textures.
+import hashlib
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+import voxel_bvh
+import voxel_mesh
+import voxel_parallel
+
+
+FILTERING_MODES = ('nearest', 'bilinear')
+
+# amount of decoded textures kept in memory
+IMAGE_CACHE_SIZE = 8
+IMAGE_EXTENSION = '.npy'
+
+# decoded textures by path, modification time and size, least recently used first
+_images = OrderedDict()
+
+
+def load_image(file_path: str, cache_folder=None):
+    """
+    Reads a texture into an array. Decoded textures are kept in memory, and in the cache folder if there is one, so
+    each texture only gets decoded once for as long as the file doesn't change.
+    :param file_path: path of the image
+    :param cache_folder: folder to keep decoded textures in between sessions, or None
+    :return: uint8 array (H, W, 3)
+    """
+    stats = os.stat(file_path)
+    key = (os.path.abspath(file_path), stats.st_mtime_ns, stats.st_size)
+    if key in _images:
+        _images.move_to_end(key)
+        return _images[key]
+
+    image = None
+    cache_path = ''
+    if cache_folder:
+        cache_path = os.path.join(cache_folder, hashlib.sha1(repr(key).encode()).hexdigest() + IMAGE_EXTENSION)
+        if os.path.isfile(cache_path):
+            try:
+                image = np.load(cache_path)
+                os.utime(cache_path)
+            except (OSError, ValueError):
+                image = None
+    if image is None:
+        from PIL import Image
+        with Image.open(file_path) as decoded:
+            image = np.asarray(decoded.convert('RGB'), dtype=np.uint8)
+        if cache_path:
+            os.makedirs(cache_folder, exist_ok=True)
+            with open(f'{cache_path}.{os.getpid()}.tmp', 'wb') as file:
+                np.save(file, image)
+            os.replace(f'{cache_path}.{os.getpid()}.tmp', cache_path)
+
+    _images[key] = image
+    while len(_images) > IMAGE_CACHE_SIZE:
+        _images.popitem(last=False)
+    return image
+
+
+def sample_texture(image, uvs, filtering='nearest'):
+    """
+    Looks up the texture color under each UV. UVs outside 0 to 1 wrap around like a repeating texture.
+    :param image: uint8 array (H, W, 3)
+    :param uvs: float array (N, 2) of [u, v]
+    :param filtering: 'nearest' takes the texel the UV falls in, 'bilinear' blends the 4 closest texels
+    :return: uint8 array (N, 3)
+    """
+    height, width = image.shape[:2]
+    uvs = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+    # v goes up while the image rows go down
+    x = (uvs[:, 0] % 1.0) * width
+    y = (1.0 - uvs[:, 1] % 1.0) * height
+    if filtering == 'nearest':
+        return image[np.floor(y).astype(np.int64) % height, np.floor(x).astype(np.int64) % width]
+    if filtering != 'bilinear':
+        raise ValueError(f"Unknown filtering '{filtering}', expected one of {FILTERING_MODES}")
+
+    # texel centers sit at half pixels
+    x -= 0.5
+    y -= 0.5
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0)[:, None]
+    fy = (y - y0)[:, None]
+    x0 = x0.astype(np.int64) % width
+    y0 = y0.astype(np.int64) % height
+    x1 = (x0 + 1) % width
+    y1 = (y0 + 1) % height
+    top = image[y0, x0] * (1 - fx) + image[y0, x1] * fx
+    bottom = image[y1, x0] * (1 - fx) + image[y1, x1] * fx
+    return np.clip(np.rint(top * (1 - fy) + bottom * fy), 0, 255).astype(np.uint8)
+
+
+def spread_sources(grid, known):
+    """
+    Spreads the voxels that are known to the ones that aren't, one layer of neighbours at a time, so every voxel ends
+    up with one of the known voxels closest to it through the grid. The inside of a filled mesh takes after the
+    surface around it this way, without looking for the closest point on a mesh far away.
+    :param grid: VoxelGrid
+    :param known: bool array (N,) of the voxels to spread from
+    :return: int64 array (N,) with the known voxel every voxel takes after, -1 for voxels no known voxel can reach
+    """
+    sources = np.where(known, np.arange(len(grid)), -1)
+    front = np.flatnonzero(known)
+    while len(front) and (sources < 0).any():
+        cells = grid.cells[front].astype(np.int64)
+        reached = []
+        for normal in voxel_mesh.FACE_NORMALS:
+            neighbours = grid.index_of(cells + normal)
+            new = (neighbours >= 0) & (sources[np.maximum(neighbours, 0)] < 0)
+            # a voxel reached from two sides at once takes after the first
+            neighbours, first = np.unique(neighbours[new], return_index=True)
+            sources[neighbours] = sources[front[new][first]]
+            reached.append(neighbours)
+        front = np.concatenate(reached)
+    return sources
+
+
+def closest_surface_points(grid, vertices, faces, bvh=None, progress=None):
+    """
+    Finds the closest point on the mesh to the center of every voxel that touches the mesh. The voxels inside take
+    the point of a surface voxel close to them, see spread_sources.
+    :param grid: VoxelGrid the mesh was voxelized into
+    :param vertices: float array (V, 3) of vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param bvh: voxel_bvh.TriangleBVH of the mesh, built here when it isn't given
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every voxel, or None
+    :return: [triangle of every closest point int64 array (N,), -1 where no surface voxel reaches the voxel,
+    barycentric weights of every closest point float array (N, 3)]
+    """
+    if bvh is None:
+        bvh = voxel_bvh.TriangleBVH(vertices, faces)
+    triangles, weights, _ = bvh.closest_points(grid.positions(), surface_distance(grid), progress)
+    sources = spread_sources(grid, triangles >= 0)
+    reached = sources >= 0
+    triangles = np.where(reached, triangles[sources], -1)
+    weights = np.where(reached[:, None], weights[sources], 0.0)
+    return [triangles, weights]
+
+
+def surface_distance(grid):
+    """
+    :param grid: VoxelGrid
+    :return: furthest a triangle touching a voxel can be from its center, half the diagonal of the voxel
+    """
+    return math.sqrt(3) / 2 * grid.voxel_size * (1.0 + 1e-6)
+
+
+def interpolate_corners(triangles, weights, corner_values):
+    """
+    Blends values given per triangle corner, like UVs or colors, at points on the triangles.
+    :param triangles: int array (N,) of triangle indices
+    :param weights: float array (N, 3) of barycentric weights
+    :param corner_values: array (T, 3, C) with the values of every corner of every triangle
+    :return: float array (N, C)
+    """
+    values = np.asarray(corner_values, dtype=np.float64)[triangles]
+    return np.einsum('ij,ijk->ik', weights, values)
+
+
+class MeshColorSampler(object):
+    def __init__(self, bvh, corner_values, image=None, filtering='nearest', max_distance=np.inf, alpha=False):
+        """
+        Colors points with the color of the closest point on a mesh. It only holds arrays, so it can be sent to the
+        processes of voxel_parallel.sample_colors.
+        :param bvh: voxel_bvh.TriangleBVH of the mesh
+        :param corner_values: float array (T, 3, 2) with the UV of every corner of every triangle when there is an
+        image, otherwise array (T, 3, 3) with the color of every corner
+        :param image: uint8 array (H, W, 3) of the texture, or None
+        :param filtering: one of FILTERING_MODES
+        :param max_distance: points further than this from the mesh stay white
+        :param alpha: add a fourth channel that is 255 for the points that got colored and 0 for the ones that stayed
+        white
+        """
+        self.bvh = bvh
+        self.corner_values = corner_values
+        self.image = image
+        self.filtering = filtering
+        self.max_distance = max_distance
+        self.channels = 4 if alpha else 3
+
+    def __call__(self, positions, progress=None):
+        """
+        :param positions: float array (N, 3)
+        :param progress: voxel_profile.ProgressReporter that gets advanced for every point, or None
+        :return: uint8 array (N, channels)
+        """
+        colors = np.full((len(positions), self.channels), 255, dtype=np.uint8)
+        triangles, weights, _ = self.bvh.closest_points(positions, self.max_distance, progress)
+        touched = triangles >= 0
+        blended = interpolate_corners(triangles[touched], weights[touched], self.corner_values)
+        if self.image is not None:
+            colors[touched, :3] = sample_texture(self.image, blended, self.filtering)
+        else:
+            colors[touched, :3] = np.clip(np.rint(blended), 0, 255).astype(np.uint8)
+        if self.channels == 4:
+            colors[~touched, 3] = 0
+        return colors
+
+
+def mesh_color_sampler(vertices, faces, corner_uvs=None, image=None, vertex_colors=None, filtering='nearest',
+                       max_distance=np.inf, bvh=None, alpha=False):
+    """
+    Prepares coloring points with the color of the closest point on the mesh, so the mesh only has to be put in a BVH
+    once when the points come in batches, like the chunks of a voxel_chunks.ChunkedGrid.
+    :param vertices: float array (V, 3) of vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param corner_uvs: float array (T, 3, 2) with the UV of every corner of every triangle, used with image
+    :param image: uint8 array (H, W, 3) of the texture
+    :param vertex_colors: uint8 array (V, 3), used when there is no texture
+    :param filtering: one of FILTERING_MODES
+    :param max_distance: points further than this from the mesh stay white
+    :param bvh: voxel_bvh.TriangleBVH of the mesh, built here when it isn't given
+    :param alpha: see MeshColorSampler
+    :return: MeshColorSampler, or None if the mesh has no colors to sample
+    """
+    if (image is None or corner_uvs is None) and vertex_colors is None:
+        return None
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    if bvh is None:
+        bvh = voxel_bvh.TriangleBVH(vertices, faces)
+    if image is not None and corner_uvs is not None:
+        return MeshColorSampler(bvh, corner_uvs, image, filtering, max_distance, alpha)
+    return MeshColorSampler(bvh, np.asarray(vertex_colors)[faces], None, filtering, max_distance, alpha)
+
+
+def sample_mesh_colors(grid, vertices, faces, corner_uvs=None, image=None, vertex_colors=None, filtering='nearest',
+                       bvh=None, progress=None, workers=1):
+    """
+    Colors every voxel touching the mesh with the color of the closest point on the mesh, and the voxels inside with
+    the color of a surface voxel close to them, see spread_sources.
+    :param grid: VoxelGrid the mesh was voxelized into
+    :param vertices: float array (V, 3) of vertex positions
+    :param faces: int array (T, 3) of vertex indices per triangle
+    :param corner_uvs: float array (T, 3, 2) with the UV of every corner of every triangle, used with image
+    :param image: uint8 array (H, W, 3) of the texture
+    :param vertex_colors: uint8 array (V, 3), used when there is no texture
+    :param filtering: one of FILTERING_MODES
+    :param bvh: voxel_bvh.TriangleBVH of the mesh, built here when it isn't given
+    :param progress: voxel_profile.ProgressReporter that gets advanced for every voxel, or None
+    :param workers: amount of processes to sample on, None for the amount of cores. 1 runs in this process
+    :return: uint8 array (N, 3), white where there is nothing to sample
+    """
+    # only the surface is sampled, the closest point to a voxel deep inside is slow to find as every part of the mesh
+    # is about as far away
+    sampler = mesh_color_sampler(vertices, faces, corner_uvs, image, vertex_colors, filtering, surface_distance(grid),
+                                 bvh, alpha=True)
+    if sampler is None:
+        return np.full((len(grid), 3), 255, dtype=np.uint8)
+    colors = voxel_parallel.sample_colors(grid.positions(), sampler, workers, progress)
+    sources = spread_sources(grid, colors[:, 3] > 0)
+    return np.where((sources >= 0)[:, None], colors[np.maximum(sources, 0), :3], 255).astype(np.uint8)
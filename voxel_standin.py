@@ -0,0 +1,428 @@
+# Stand-in for maya.cmds and maya.api.OpenMaya that counts and times every call made through it, so the Voxelizer
+# window can be built and driven outside of Maya. UI controls keep the values they are created or edited with, and
+# meshes live in a small scene that only holds their arrays. Nothing is drawn and no real nodes are made. Calls queued
+# with maya.utils.executeDeferred wait until run_deferred, which is where Maya would run them once it is idle. Only
+# requires numpy.
+#
+#   stand_in = voxel_standin.MayaStandIn()
+#   stand_in.install()
+#   import Voxelizer
+import sys
+import time
+import types
+import numpy as np
+import voxel_worker
+
+
+# control commands and the flag that holds their value
+CONTROL_FLAGS = {'intField': 'v', 'floatField': 'v', 'checkBox': 'v', 'optionMenu': 'v', 'textField': 'tx'}
+CONTROL_DEFAULTS = {'intField': 0, 'floatField': 0.0, 'checkBox': False, 'optionMenu': '', 'textField': ''}
+# long flag names that mean the same as the short ones
+FLAG_NAMES = {'value': 'v', 'text': 'tx', 'label': 'l', 'parent': 'p', 'query': 'q', 'edit': 'e', 'name': 'n'}
+
+
+class CallLog(object):
+    def __init__(self):
+        """
+        Amount of calls and total seconds per command name, like 'cmds.intField' or 'om.MFnMesh.getPoints'.
+        """
+        self.calls = {}
+
+    def add(self, name: str, seconds: float):
+        entry = self.calls.get(name)
+        if entry is None:
+            self.calls[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def clear(self):
+        self.calls = {}
+
+    def summary(self):
+        """
+        :return: dictionary of command name to {'calls', 'seconds'}, most called first
+        """
+        names = sorted(self.calls, key=lambda name: -self.calls[name][0])
+        return {name: {'calls': self.calls[name][0], 'seconds': self.calls[name][1]} for name in names}
+
+
+class RecordingFunction(object):
+    __slots__ = ('log', 'name', 'function', 'wrap')
+
+    def __init__(self, log, name: str, function, wrap=False):
+        """
+        Calls the function and logs how long it took.
+        :param log: CallLog
+        :param name: name the calls are logged under
+        :param function: what the call does
+        :param wrap: wrap the result in a RecordingObject, so its method calls get logged too
+        """
+        self.log = log
+        self.name = name
+        self.function = function
+        self.wrap = wrap
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self.function(*args, **kwargs)
+        if self.wrap:
+            result = RecordingObject(self.log, self.name, result)
+        self.log.add(self.name, time.perf_counter() - start)
+        return result
+
+
+class RecordingObject(object):
+    def __init__(self, log, name: str, target):
+        """
+        Logs the method calls made on the target under the given name, like 'om.MFnMesh.create'.
+        """
+        object.__setattr__(self, '_log', log)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, attribute: str):
+        value = getattr(self._target, attribute)
+        if callable(value):
+            return RecordingFunction(self._log, f'{self._name}.{attribute}', value)
+        return value
+
+    def __iter__(self):
+        return iter(self._target)
+
+    def __getitem__(self, index):
+        return self._target[index]
+
+
+def _unwrap(value):
+    """
+    :return: the object behind a RecordingObject, or the value itself
+    """
+    return value._target if isinstance(value, RecordingObject) else value
+
+
+def _flags(kwargs):
+    """
+    :return: the flags with their short names
+    """
+    return {FLAG_NAMES.get(key, key): value for key, value in kwargs.items()}
+
+
+class _Anything(object):
+    """
+    Answer of every om call the stand-in has no real answer for. Every method returns another one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, attribute: str):
+        return _Anything
+
+    def __iter__(self):
+        return iter([])
+
+    def __len__(self):
+        return 0
+
+
+class _Point(object):
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        if not np.isscalar(x):
+            x, y, z = x
+        self.x = x
+        self.y = y
+        self.z = z
+
+
+class MayaStandIn(object):
+    def __init__(self, user_app_dir='', min_time=1, max_time=24):
+        """
+        :param user_app_dir: folder cmds.internalVar(userAppDir=True) answers with
+        :param min_time: start of the playback range
+        :param max_time: end of the playback range
+        """
+        self.log = CallLog()
+        self.user_app_dir = user_app_dir
+        self.min_time = min_time
+        self.max_time = max_time
+        self.current_time = min_time
+        # answer of the next fileDialog2, None answers like a cancelled dialog
+        self.file_dialog = None
+        # [values by (control, flag), menu items by option menu]
+        self.controls = {}
+        self.menu_items = {}
+        # meshes by name, with 'points' (V, 3), 'counts', 'connects', 'triangles' (T, 3) and optional 'uvs' (U, 2),
+        # 'uv_counts' and 'uv_ids'
+        self.meshes = {}
+        self.node_count = 0
+        self.cmds = self._module('cmds', self._commands())
+        self.om = self._module('om', self._open_maya())
+        # calls queued for the main thread by background jobs
+        self.deferred = voxel_worker.ManualExecutor()
+        self.utils = types.ModuleType('maya_stand_in.utils')
+        self.utils.executeDeferred = self.deferred
+
+    def _module(self, name: str, answers):
+        """
+        :param name: prefix of the logged names
+        :param answers: dictionary of attribute name to [value, whether calls to it are logged, whether the results
+        get their method calls logged]
+        :return: module that logs every call to its functions and classes
+        """
+        module = types.ModuleType(f'maya_stand_in.{name}')
+        for attribute, (value, logged, wrap) in answers.items():
+            setattr(module, attribute, RecordingFunction(self.log, f'{name}.{attribute}', value, wrap)
+                    if logged else value)
+        module.__getattr__ = lambda attribute: RecordingFunction(self.log, f'{name}.{attribute}',
+                                                                 self._node if name == 'cmds' else _Anything)
+        return module
+
+    def install(self):
+        """
+        Makes 'import maya.cmds', 'import maya.utils' and 'import maya.api.OpenMaya' import the stand-in.
+        """
+        maya = types.ModuleType('maya')
+        api = types.ModuleType('maya.api')
+        maya.cmds = self.cmds
+        maya.utils = self.utils
+        maya.api = api
+        api.OpenMaya = self.om
+        sys.modules.update({'maya': maya, 'maya.cmds': self.cmds, 'maya.utils': self.utils, 'maya.api': api,
+                            'maya.api.OpenMaya': self.om})
+
+    def uninstall(self):
+        for name in ('maya', 'maya.cmds', 'maya.utils', 'maya.api', 'maya.api.OpenMaya'):
+            sys.modules.pop(name, None)
+
+    def run_deferred(self, job=None, timeout=None):
+        """
+        Runs the calls queued with maya.utils.executeDeferred, like Maya does when it is idle.
+        :param job: voxel_worker.BackgroundJob to keep running the queued calls of until it is over, or None to only
+        run the calls queued so far
+        :param timeout: most seconds to wait for the job, or None to wait as long as it takes
+        :return: amount of calls that ran
+        """
+        count = self.deferred.run_pending()
+        end = None if timeout is None else time.perf_counter() + timeout
+        while job is not None and job.active and (end is None or time.perf_counter() < end):
+            job.wait(0.01)
+            count += self.deferred.run_pending()
+        return count
+
+    def add_mesh(self, name: str, vertices, faces, corner_uvs=None):
+        """
+        Puts a triangle mesh in the scene.
+        :param name: name of the mesh
+        :param vertices: float array (V, 3)
+        :param faces: int array (T, 3)
+        :param corner_uvs: float array (T, 3, 2) with the UV of every corner, or None
+        """
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        mesh = {'points': np.asarray(vertices, dtype=np.float64).reshape(-1, 3),
+                'counts': np.full(len(faces), 3, dtype=np.int64), 'connects': faces.ravel(), 'triangles': faces}
+        if corner_uvs is not None:
+            mesh['uvs'] = np.asarray(corner_uvs, dtype=np.float64).reshape(-1, 2)
+            mesh['uv_counts'] = mesh['counts']
+            mesh['uv_ids'] = np.arange(len(faces) * 3, dtype=np.int64)
+        self.meshes[name] = mesh
+
+    def _node(self, *args, **kwargs):
+        """
+        Answer of every command that makes something, or that the stand-in has no real answer for.
+        :return: name of a new node
+        """
+        flags = _flags(kwargs)
+        if flags.get('q') or flags.get('e'):
+            return None
+        self.node_count += 1
+        return flags.get('n') or f'node{self.node_count}'
+
+    def _control(self, kind: str):
+        """
+        :param kind: one of CONTROL_FLAGS
+        :return: command that creates, queries and edits controls of that kind
+        """
+        flag = CONTROL_FLAGS[kind]
+
+        def command(*args, **kwargs):
+            flags = _flags(kwargs)
+            if flags.get('q'):
+                return self.controls.get((args[0], flag), CONTROL_DEFAULTS[kind])
+            if flags.get('e'):
+                name = args[0]
+            else:
+                self.node_count += 1
+                name = f'{kind}{self.node_count}'
+                self.controls[(name, flag)] = CONTROL_DEFAULTS[kind]
+            if flag in flags:
+                self.controls[(name, flag)] = flags[flag]
+            return name
+
+        return command
+
+    def _menu_item(self, *args, **kwargs):
+        flags = _flags(kwargs)
+        menu = flags.get('p')
+        items = self.menu_items.setdefault(menu, [])
+        items.append(flags.get('l', ''))
+        # option menus start on their first item
+        if len(items) == 1:
+            self.controls[(menu, 'v')] = items[0]
+        return self._node()
+
+    def _rename(self, old_name: str, new_name: str):
+        if old_name in self.meshes:
+            self.meshes[new_name] = self.meshes.pop(old_name)
+        return new_name
+
+    def _commands(self):
+        answers = {kind: [self._control(kind), True, False] for kind in CONTROL_FLAGS}
+        answers.update({
+            'menuItem': [self._menu_item, True, False],
+            'rename': [self._rename, True, False],
+            'objExists': [lambda name: name in self.meshes, True, False],
+            'delete': [lambda *names, **kwargs: [self.meshes.pop(name, None) for name in names], True, False],
+            'internalVar': [lambda **kwargs: self.user_app_dir, True, False],
+            'playbackOptions': [self._playback_options, True, False],
+            'currentTime': [self._current_time, True, False],
+            'fileDialog2': [lambda **kwargs: self.file_dialog, True, False],
+            'confirmDialog': [lambda **kwargs: kwargs.get('defaultButton', ''), True, False],
+            'xform': [lambda *args, **kwargs: [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0,
+                                                0.0, 1.0] if kwargs.get('m') else [0.0, 0.0, 0.0], True, False],
+            'exactWorldBoundingBox': [self._bounding_box, True, False],
+            'ls': [lambda *args, **kwargs: [], True, False],
+            'polyCube': [lambda **kwargs: [self._node(**kwargs), self._node()], True, False],
+        })
+        return answers
+
+    def _playback_options(self, **kwargs):
+        flags = _flags(kwargs)
+        if flags.get('q'):
+            return self.min_time if flags.get('minTime') or flags.get('min') else self.max_time
+        self.min_time = flags.get('minTime', self.min_time)
+        self.max_time = flags.get('maxTime', self.max_time)
+
+    def _current_time(self, *args, **kwargs):
+        if _flags(kwargs).get('q'):
+            return self.current_time
+        self.current_time = args[0]
+        return self.current_time
+
+    def _bounding_box(self, name: str):
+        points = self.meshes[name]['points']
+        return points.min(axis=0).tolist() + points.max(axis=0).tolist()
+
+    def _open_maya(self):
+        stand_in = self
+
+        class MSpace(object):
+            kWorld = 4
+            kObject = 2
+
+        class MDagPath(object):
+            def __init__(self, name: str):
+                self.name = name
+
+            def extendToShape(self):
+                return self
+
+            def fullPathName(self):
+                return self.name
+
+        class MSelectionList(object):
+            def __init__(self):
+                self.names = []
+
+            def add(self, name):
+                self.names.append(str(name))
+                return self
+
+            def getDagPath(self, index: int):
+                return MDagPath(self.names[index])
+
+            def getDependNode(self, index: int):
+                return self.names[index]
+
+        class MFnDependencyNode(object):
+            def __init__(self, node=None):
+                self.node = _unwrap(node)
+
+            def name(self):
+                return str(self.node)
+
+            def findPlug(self, *args):
+                return _Anything()
+
+        class MFnMesh(object):
+            def __init__(self, dag_path=None):
+                dag_path = _unwrap(dag_path)
+                self.name = dag_path.name if dag_path is not None else ''
+
+            @property
+            def mesh(self):
+                return stand_in.meshes[self.name]
+
+            @property
+            def numVertices(self):
+                return len(self.mesh['points'])
+
+            def fullPathName(self):
+                return self.name
+
+            def create(self, points, counts, connects):
+                counts = np.asarray(counts, dtype=np.int64)
+                self.name = stand_in._node()
+                stand_in.meshes[self.name] = {
+                    'points': np.array([(p.x, p.y, p.z) for p in _unwrap(points)], dtype=np.float64).reshape(-1, 3),
+                    'counts': counts, 'connects': np.asarray(connects, dtype=np.int64), 'triangles': None}
+                return self.name
+
+            def getPoints(self, space=MSpace.kObject):
+                return [_Point(*p) for p in self.mesh['points'].tolist()]
+
+            def getVertices(self):
+                return [self.mesh['counts'].tolist(), self.mesh['connects'].tolist()]
+
+            def getTriangles(self):
+                mesh = self.mesh
+                if mesh['triangles'] is None:
+                    raise NotImplementedError("The stand-in only triangulates meshes added with add_mesh")
+                return [[1] * len(mesh['triangles']), mesh['triangles'].ravel().tolist()]
+
+            def getUVs(self):
+                uvs = self.mesh.get('uvs', np.zeros((0, 2)))
+                return [uvs[:, 0].tolist(), uvs[:, 1].tolist()]
+
+            def getAssignedUVs(self):
+                return [self.mesh.get('uv_counts', np.zeros(0, dtype=np.int64)).tolist(),
+                        self.mesh.get('uv_ids', np.zeros(0, dtype=np.int64)).tolist()]
+
+            def setUVs(self, u_values, v_values):
+                self.mesh['uvs'] = np.stack([np.asarray(u_values), np.asarray(v_values)], axis=1)
+
+            def assignUVs(self, uv_counts, uv_ids):
+                self.mesh['uv_counts'] = np.asarray(uv_counts, dtype=np.int64)
+                self.mesh['uv_ids'] = np.asarray(uv_ids, dtype=np.int64)
+
+            def setFaceVertexColors(self, colors, face_ids, vertex_ids):
+                self.mesh['colors'] = len(_unwrap(colors))
+
+        def array(values=()):
+            return list(_unwrap(values))
+
+        return {
+            'MSpace': [MSpace, False, False],
+            'MSelectionList': [MSelectionList, True, True],
+            'MFnDependencyNode': [MFnDependencyNode, True, True],
+            'MFnMesh': [MFnMesh, True, True],
+            'MPoint': [_Point, True, False],
+            'MVector': [_Point, True, False],
+            'MColor': [lambda color=(0, 0, 0, 1): tuple(color), True, False],
+            'MPointArray': [array, True, False],
+            'MVectorArray': [array, True, False],
+            'MColorArray': [array, True, False],
+            'MFnArrayAttrsData': [_Anything, True, False],
+        }
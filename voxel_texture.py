@@ -0,0 +1,112 @@
+# Writes the palette texture. The whole atlas is built as one numpy array and saved in one go.
+import math
+import numpy as np
+
+
+TEXTURE_LAYOUTS = ('square', 'power_of_two', 'compact')
+TEXTURE_FORMATS = ('png', 'tga', 'exr')
+
+
+def atlas_layout(color_count: int, layout='square'):
+    """
+    Calculates how many tiles the atlas has along its width and height.
+    :param color_count: amount of colors in the palette
+    :param layout: 'square' uses the closest root above the color count on both sides like the original texture,
+    'power_of_two' rounds both sides up to a power of two, 'compact' leaves out the rows that would stay empty
+    :return: [columns, rows]
+    """
+    color_count = max(color_count, 1)
+    columns = math.ceil(math.sqrt(color_count))
+    if layout == 'square':
+        return [columns, columns]
+    rows = math.ceil(color_count / columns)
+    if layout == 'compact':
+        return [columns, rows]
+    if layout == 'power_of_two':
+        columns = 1 << (columns - 1).bit_length()
+        rows = 1 << (math.ceil(color_count / columns) - 1).bit_length()
+        return [columns, rows]
+    raise ValueError(f"Unknown texture layout '{layout}', expected one of {TEXTURE_LAYOUTS}")
+
+
+def tile_uvs(columns: int, rows: int, color_count: int):
+    """
+    Calculates the UV coordinates of the center of each color tile. Tiles are filled left to right, top to bottom.
+    :param columns: amount of tiles along the width
+    :param rows: amount of tiles along the height
+    :param color_count: amount of colors in the palette
+    :return: float array (color_count, 2) of [u, v]
+    """
+    ids = np.arange(color_count)
+    u = (ids % columns + 0.5) / columns
+    # v goes up while the image rows go down
+    v = 1 - (ids // columns + 0.5) / rows
+    return np.stack([u, v], axis=1)
+
+
+def build_atlas(palette, tile_size: int, layout='square', padding=0):
+    """
+    Builds the palette texture by repeating each color into a tile.
+    :param palette: uint8 array (P, 3)
+    :param tile_size: width and height of each color tile in pixels
+    :param layout: one of TEXTURE_LAYOUTS
+    :param padding: extra pixels of the same color around each tile, so mip maps don't bleed neighbouring colors in.
+    The power_of_two layout also rounds the tile size with padding up to a power of two
+    :return: [image uint8 array (H, W, 3), UV lookup table float array (P, 2)]
+    """
+    palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+    columns, rows = atlas_layout(len(palette), layout)
+    # the remaining tiles are filled with black
+    tiles = np.zeros((rows * columns, 3), dtype=np.uint8)
+    tiles[:len(palette)] = palette
+    pitch = tile_size + 2 * padding
+    if layout == 'power_of_two':
+        # the extra pixels go to the padding, so the whole image ends up a power of two on both sides
+        pitch = 1 << (pitch - 1).bit_length()
+    image = np.repeat(np.repeat(tiles.reshape(rows, columns, 3), pitch, axis=0), pitch, axis=1)
+    return [image, tile_uvs(columns, rows, len(palette))]
+
+
+def write_texture(image, file_path: str, file_format='png'):
+    """
+    Saves the texture to disk.
+    :param image: uint8 array (H, W, 3)
+    :param file_path: where to save the texture, without the extension
+    :param file_format: one of TEXTURE_FORMATS, exr requires the OpenEXR module
+    :return: the full path of the saved texture
+    """
+    file_format = file_format.lower()
+    if file_format not in TEXTURE_FORMATS:
+        raise ValueError(f"Unknown texture format '{file_format}', expected one of {TEXTURE_FORMATS}")
+    file_path = f'{file_path}.{file_format}'
+
+    if file_format == 'exr':
+        import OpenEXR
+        import Imath
+        height, width = image.shape[:2]
+        header = OpenEXR.Header(width, height)
+        channel = Imath.Channel(Imath.PixelType(Imath.PixelType.FLOAT))
+        header['channels'] = {'R': channel, 'G': channel, 'B': channel}
+        linear = image.astype(np.float32) / 255
+        exr = OpenEXR.OutputFile(file_path, header)
+        exr.writePixels({'R': linear[..., 0].tobytes(), 'G': linear[..., 1].tobytes(),
+                         'B': linear[..., 2].tobytes()})
+        exr.close()
+    else:
+        from PIL import Image
+        Image.fromarray(np.ascontiguousarray(image), 'RGB').save(file_path, format=file_format.upper())
+    return file_path
+
+
+def face_uvs(face_color_ids, face_counts, uv_table):
+    """
+    Calculates the UVs of a whole mesh at once. Every color gets one UV at the center of its tile, and every face
+    vertex points to the UV of the color of its face.
+    :param face_color_ids: palette index of every face
+    :param face_counts: amount of vertices of every face
+    :param uv_table: UV lookup table returned by build_atlas
+    :return: [u values, v values, UV index of every face vertex]
+    """
+    uv_table = np.asarray(uv_table, dtype=np.float64).reshape(-1, 2)
+    uv_ids = np.repeat(np.asarray(face_color_ids, dtype=np.int64), np.asarray(face_counts, dtype=np.int64))
+    return [uv_table[:, 0], uv_table[:, 1], uv_ids]
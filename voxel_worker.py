@@ -0,0 +1,178 @@
+# Runs the stages of the voxelizer that don't touch Maya on a background thread, so Maya stays responsive while they
+# run. The worker streams partial results back and hands its result over to the main thread, where the scene is
+# changed, through an executor: maya.utils.executeDeferred inside Maya, or a ManualExecutor that only runs the queued
+# calls when asked, so the scheduling and cancelling can be tested without Maya. Only requires the standard library.
+import threading
+import time
+import traceback
+from collections import deque
+import voxel_profile
+
+
+JOB_STATES = ('pending', 'running', 'committing', 'done', 'cancelled', 'failed')
+
+
+class ManualExecutor(object):
+    def __init__(self):
+        """
+        Stand-in for the main thread of Maya. Calls can be queued from any thread, and only run when run_pending is
+        called, on the thread that calls it.
+        """
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def __call__(self, function, *args):
+        """
+        Queues a call, the same way maya.utils.executeDeferred does.
+        :param function: function to call
+        :param args: arguments to call it with
+        """
+        with self.lock:
+            self.calls.append([function, args])
+
+    def __len__(self):
+        with self.lock:
+            return len(self.calls)
+
+    def run_pending(self, limit=None):
+        """
+        Runs the queued calls in the order they were queued. Calls queued while running wait for the next time.
+        :param limit: most calls to run, or None for all of them
+        :return: amount of calls that ran
+        """
+        with self.lock:
+            count = len(self.calls) if limit is None else min(limit, len(self.calls))
+            calls = [self.calls.popleft() for _ in range(count)]
+        for function, args in calls:
+            function(*args)
+        return count
+
+
+class BackgroundJob(object):
+    def __init__(self, compute, commit, executor, partial=None, finished=None,
+                 interval=voxel_profile.PROGRESS_INTERVAL):
+        """
+        A computation on a worker thread whose result gets committed on the main thread. Cancelling is cooperative:
+        the worker stops the next time it reports progress, so it takes at most the interval plus the longest step
+        between two reports, and a result that was already computed is never committed once the job is cancelled.
+        :param compute: function(progress, emit) that runs on the worker thread and returns the result. It must not
+        touch Maya. progress is a voxel_profile.ProgressReporter that raises ProgressCancelled once the job is
+        cancelled, emit(kind, value) sends a partial result to the main thread
+        :param commit: function(result) that runs on the main thread and changes the scene
+        :param executor: function(function, *args) that calls the function on the main thread later
+        :param partial: function(kind, value) that runs on the main thread for every partial result, or None. The
+        progress is sent as the kind 'progress' with [done, total, status]
+        :param finished: function(job) that runs on the main thread once the job is done, cancelled or failed, or None
+        :param interval: minimum amount of seconds between two progress reports of the worker
+        """
+        self.compute = compute
+        self.commit = commit
+        self.executor = executor
+        self.partial = partial
+        self.finished = finished
+        self.state = 'pending'
+        self.error = None
+        self.traceback = ''
+        # perf_counter of the moment cancel was called and of the moment the worker stopped
+        self.cancelled_at = None
+        self.stopped_at = None
+        self.cancel_event = threading.Event()
+        self.progress = voxel_profile.ProgressReporter(self._progress_update, self.cancel_event.is_set, interval)
+        self.thread = None
+
+    @property
+    def active(self):
+        """
+        :return: True until the job is done, cancelled or failed
+        """
+        return self.state in JOB_STATES[:3]
+
+    @property
+    def cancel_latency(self):
+        """
+        :return: seconds between cancelling and the worker stopping, or None when that didn't happen (yet)
+        """
+        if self.cancelled_at is None or self.stopped_at is None:
+            return None
+        return max(0.0, self.stopped_at - self.cancelled_at)
+
+    def start(self):
+        """
+        Starts the worker thread.
+        :return: self
+        """
+        self.state = 'running'
+        self.thread = threading.Thread(target=self._run, name='voxelizer worker', daemon=True)
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """
+        Asks the worker to stop. The finished function still gets called once it did.
+        """
+        if self.active and not self.cancel_event.is_set():
+            self.cancelled_at = time.perf_counter()
+            self.cancel_event.set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the worker thread, not for the main thread calls it queued.
+        :param timeout: most seconds to wait, or None to wait as long as it takes
+        :return: True when the worker thread stopped
+        """
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.thread is not None and not self.thread.is_alive()
+
+    def emit(self, kind: str, value):
+        """
+        Sends a partial result to the main thread. Does nothing once the job is cancelled.
+        :param kind: what the value is, like 'progress'
+        :param value: the partial result
+        """
+        if self.partial is not None and not self.cancel_event.is_set():
+            self.executor(self._deliver, kind, value)
+
+    def _progress_update(self, done: int, total: int, status: str):
+        self.emit('progress', [done, total, status])
+
+    def _deliver(self, kind: str, value):
+        # runs on the main thread, where the job can have been cancelled after the value was sent
+        if not self.cancel_event.is_set():
+            self.partial(kind, value)
+
+    def _run(self):
+        try:
+            result = self.compute(self.progress, self.emit)
+        except voxel_profile.ProgressCancelled:
+            self.stopped_at = time.perf_counter()
+            self.executor(self._finish, 'cancelled')
+        except Exception as error:
+            self.stopped_at = time.perf_counter()
+            self.error = error
+            self.traceback = traceback.format_exc()
+            self.executor(self._finish, 'failed')
+        else:
+            self.stopped_at = time.perf_counter()
+            self.executor(self._commit, result)
+
+    def _commit(self, result):
+        # runs on the main thread
+        if self.cancel_event.is_set():
+            self._finish('cancelled')
+            return
+        self.state = 'committing'
+        try:
+            self.commit(result)
+        except Exception as error:
+            self.error = error
+            self.traceback = traceback.format_exc()
+            self._finish('failed')
+            return
+        self._finish('done')
+
+    def _finish(self, state: str):
+        # runs on the main thread
+        self.state = state
+        if self.finished is not None:
+            self.finished(self)